@@ -1,8 +1,22 @@
-"""RealWorldClaw — Audit logging to SQLite."""
+"""RealWorldClaw — Audit logging to SQLite.
+
+Every audit entry (manual :func:`log_audit` calls and the write-request
+middleware) goes through one :class:`AuditSink`: a bounded in-memory queue
+drained by a background task started in the app lifespan, which inserts up
+to ``AUDIT_BATCH_SIZE`` rows per transaction every ``AUDIT_FLUSH_MS``.
+When the queue holds ``AUDIT_QUEUE_MAX`` entries, ``AUDIT_OVERFLOW`` decides
+whether the newest (``drop_newest``, default) or the oldest
+(``drop_oldest``) entry is discarded. Outside a running app (scripts,
+tests without a lifespan) entries are written immediately.
+"""
 
 from __future__ import annotations
 
+import asyncio
+import os
+import threading
 import uuid
+from collections import deque
 from typing import Optional
 from datetime import datetime, timezone
 
@@ -11,6 +25,11 @@
 
 logger = get_logger("audit")
 
+AUDIT_FLUSH_MS = int(os.environ.get("AUDIT_FLUSH_MS", "200"))
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+AUDIT_QUEUE_MAX = int(os.environ.get("AUDIT_QUEUE_MAX", "10000"))
+AUDIT_OVERFLOW = os.environ.get("AUDIT_OVERFLOW", "drop_newest").lower()
+
 AUDIT_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS audit_log (
     id TEXT PRIMARY KEY,
@@ -33,6 +52,12 @@
 CREATE INDEX IF NOT EXISTS idx_audit_path ON audit_log(path);
 """
 
+_INSERT_SQL = (
+    "INSERT INTO audit_log (id, timestamp, user_id, agent_id, action, method, path, resource, "
+    "details, request_body_summary, response_status, ip_address) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
 
 def init_audit_table() -> None:
     """Create the audit_log table if it doesn't exist."""
@@ -50,6 +75,137 @@ def init_audit_table() -> None:
             _safe_add_column(db, "audit_log", col)
 
 
+class AuditSink:
+    """Bounded queue of audit rows written in batches by one background task."""
+
+    def __init__(
+        self,
+        flush_ms: int = AUDIT_FLUSH_MS,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        max_queue: int = AUDIT_QUEUE_MAX,
+        overflow: str = AUDIT_OVERFLOW,
+    ):
+        self.flush_interval = flush_ms / 1000.0
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._queue: deque[tuple] = deque()
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.metrics = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(
+        self,
+        action: str,
+        *,
+        user_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        method: Optional[str] = None,
+        path: Optional[str] = None,
+        resource: Optional[str] = None,
+        details: Optional[str] = None,
+        request_body_summary: Optional[str] = None,
+        response_status: Optional[int] = None,
+        ip_address: Optional[str] = None,
+    ) -> bool:
+        """Queue one entry; False if it was dropped by the overflow policy."""
+        row = (
+            str(uuid.uuid4()), datetime.now(timezone.utc).isoformat(), user_id, agent_id, action,
+            method, path, resource, details, request_body_summary, response_status, ip_address,
+        )
+        if not self.running:
+            self._write([row])
+            return True
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.metrics["dropped"] += 1
+                if self.overflow != "drop_oldest":
+                    return False
+                self._queue.popleft()
+            self._queue.append(row)
+            self.metrics["queued"] += 1
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self._wake()
+        return True
+
+    def _wake(self) -> None:
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None:
+            return
+        try:
+            if asyncio.get_running_loop() is loop:
+                wakeup.set()
+                return
+        except RuntimeError:
+            pass
+        loop.call_soon_threadsafe(wakeup.set)
+
+    def _take_batch(self) -> list[tuple]:
+        with self._lock:
+            count = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _write(self, rows: list[tuple]) -> None:
+        try:
+            with get_db() as db:
+                db.cursor().executemany(_INSERT_SQL, rows)
+        except Exception:
+            self.metrics["failed"] += len(rows)
+            logger.exception("audit_write_failed", entries=len(rows))
+            return
+        self.metrics["written"] += len(rows)
+        self.metrics["batches"] += 1
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of rows taken."""
+        total = 0
+        while rows := self._take_batch():
+            await asyncio.to_thread(self._write, rows)
+            total += len(rows)
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._queue), "max_queue": self.max_queue, **self.metrics}
+
+
+audit_sink = AuditSink()
+
+
 def log_audit(
     action: str,
     *,
@@ -59,15 +215,5 @@ def log_audit(
     ip_address: Optional[str] = None,
 ) -> None:
     """Record an audit event (manual call, used by existing code)."""
-    entry_id = str(uuid.uuid4())
-    ts = datetime.now(timezone.utc).isoformat()
-    try:
-        with get_db() as db:
-            db.execute(
-                "INSERT INTO audit_log (id, timestamp, user_id, action, resource, details, ip_address) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (entry_id, ts, user_id, action, resource, details, ip_address),
-            )
+    if audit_sink.submit(action, user_id=user_id, resource=resource, details=details, ip_address=ip_address):
         logger.info("audit_event", action=action, user_id=user_id, resource=resource)
-    except Exception:
-        logger.exception("audit_write_failed", action=action)
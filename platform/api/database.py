@@ -4,12 +4,14 @@
 
 import os
 import logging
-import sqlite3
+import threading
 
 logger = logging.getLogger(__name__)
 from contextlib import contextmanager
 from pathlib import Path
 
+from .db_pool import SQLitePool, get_pg_pool, sqlite_connect
+
 DATABASE_URL = os.environ.get("DATABASE_URL")
 USE_POSTGRES = DATABASE_URL is not None and DATABASE_URL.startswith("postgres")
 
@@ -17,6 +19,7 @@
 
 if USE_POSTGRES:
     import psycopg2
+    import psycopg2.extensions
     import psycopg2.extras
 
     class PgRowWrapper:
@@ -122,22 +125,53 @@ def close(self):
             self._conn.close()
 
 
+_sqlite_pool: SQLitePool | None = None
+_sqlite_pool_lock = threading.Lock()
+
+
+def _get_sqlite_pool() -> SQLitePool:
+    """Return the pool for the current DB_PATH, replacing it if the path moved."""
+    global _sqlite_pool
+    path = str(DB_PATH)
+    pool = _sqlite_pool
+    if pool is not None and pool.path == path:
+        return pool
+    with _sqlite_pool_lock:
+        if _sqlite_pool is None or _sqlite_pool.path != path:
+            if _sqlite_pool is not None:
+                _sqlite_pool.close()
+            DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+            _sqlite_pool = SQLitePool(path)
+        return _sqlite_pool
+
+
+def get_pool_stats() -> dict:
+    """Connection pool counters for the active backend."""
+    if USE_POSTGRES:
+        return get_pg_pool(DATABASE_URL).stats()
+    return _get_sqlite_pool().stats()
+
+
 def get_connection():
+    """Open a standalone connection; the caller is responsible for closing it."""
     if USE_POSTGRES:
         conn = psycopg2.connect(DATABASE_URL)
         return PgConnectionWrapper(conn)
     else:
         DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        conn = sqlite3.connect(str(DB_PATH))
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA foreign_keys=ON")
-        return conn
+        return sqlite_connect(str(DB_PATH))
 
 
 @contextmanager
 def get_db():
-    conn = get_connection()
+    if USE_POSTGRES:
+        pool = get_pg_pool(DATABASE_URL)
+        raw = pool.acquire()
+        raw.cursor_factory = psycopg2.extensions.cursor
+        conn = PgConnectionWrapper(raw)
+    else:
+        pool = _get_sqlite_pool()
+        conn = raw = pool.acquire()
     try:
         yield conn
         conn.commit()
@@ -145,7 +179,7 @@ def get_db():
         conn.rollback()
         raise
     finally:
-        conn.close()
+        pool.release(raw)
 
 
 def _safe_add_column(db, table: str, column_def: str):
@@ -165,6 +199,13 @@ def init_db():
     from .models.user import USERS_TABLE_SQL
     from .models.files import FILES_TABLE_SQL
     from .models.community import COMMUNITY_TABLES_SQL
+    from .services.blob_store import init_blobs
+    from .services.conversations import init_conversations
+    from .services.counters import init_counters
+    from .services.mesh_analysis import init_mesh_analyses
+    from .services.post_ranking import decay_scores
+    from .services.search_index import init_search_index
+    from .services.timeline import init_timelines
 
     if USE_POSTGRES:
         # PG tables created by migration script; ensure schema catches up.
@@ -177,6 +218,8 @@ def init_db():
                 "CREATE TABLE IF NOT EXISTS messages (id TEXT PRIMARY KEY, from_user TEXT NOT NULL, to_user TEXT NOT NULL, content TEXT NOT NULL, read INTEGER DEFAULT 0, created_at TEXT NOT NULL)",
                 "CREATE TABLE IF NOT EXISTS reports (id TEXT PRIMARY KEY, reporter_id TEXT NOT NULL, target_type TEXT NOT NULL, target_id TEXT NOT NULL, reason TEXT NOT NULL, description TEXT, status TEXT DEFAULT 'pending', resolved_by TEXT, resolution_action TEXT, resolution_notes TEXT, created_at TEXT NOT NULL, resolved_at TEXT)",
                 "CREATE TABLE IF NOT EXISTS manufacturing_proofs (id TEXT PRIMARY KEY, node_id TEXT NOT NULL, submitter_id TEXT NOT NULL, order_id TEXT, proof_type TEXT NOT NULL, description TEXT, evidence_url TEXT NOT NULL, verification_status TEXT DEFAULT 'pending', verified_by TEXT, verification_notes TEXT, created_at TEXT NOT NULL, verified_at TEXT)",
+                "CREATE TABLE IF NOT EXISTS upload_sessions (id TEXT PRIMARY KEY, original_filename TEXT NOT NULL, size BIGINT NOT NULL, received BIGINT NOT NULL DEFAULT 0, part_path TEXT NOT NULL, uploader_id TEXT NOT NULL, uploader_type TEXT NOT NULL, created_at TEXT NOT NULL, expires_at TEXT NOT NULL)",
+                "CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires ON upload_sessions(expires_at)",
                 "CREATE INDEX IF NOT EXISTS idx_dm_sender_recipient ON direct_messages(sender_id, recipient_id)",
                 "CREATE INDEX IF NOT EXISTS idx_dm_created_at ON direct_messages(created_at)",
                 "CREATE INDEX IF NOT EXISTS idx_dm_recipient_read ON direct_messages(recipient_id, read, created_at)",
@@ -231,6 +274,8 @@ def init_db():
                 ("community_posts", "is_locked INTEGER NOT NULL DEFAULT 0"),
                 ("community_posts", "resolved_at TEXT"),
                 ("community_posts", "space_id TEXT DEFAULT NULL"),
+                ("community_posts", "hot_score DOUBLE PRECISION NOT NULL DEFAULT 0"),
+                ("community_posts", "feed_score DOUBLE PRECISION NOT NULL DEFAULT 0"),
                 ("community_comments", "is_best_answer INTEGER NOT NULL DEFAULT 0"),
                 ("community_comments", "parent_id TEXT DEFAULT NULL"),
                 ("nodes", "country_code TEXT"),
@@ -258,11 +303,33 @@ def init_db():
                 ("agents", "verification_badge TEXT NOT NULL DEFAULT 'none'"),
                 ("agents", "total_jobs_completed INTEGER NOT NULL DEFAULT 0"),
                 ("agents", "success_rate REAL NOT NULL DEFAULT 0"),
+                ("files", "sha256 TEXT"),
             ]:
                 try:
                     _safe_add_column(db, table, column_def)
                 except Exception as exc:
                     logger.debug("PG init: %s", exc)
+
+            for idx_sql in [
+                "CREATE INDEX IF NOT EXISTS idx_community_comments_post_created ON community_comments(post_id, created_at, id)",
+                "CREATE INDEX IF NOT EXISTS idx_community_comments_parent ON community_comments(parent_id, created_at)",
+                "CREATE INDEX IF NOT EXISTS idx_nodes_fuzzy_location ON nodes(fuzzy_latitude, fuzzy_longitude)",
+                "CREATE INDEX IF NOT EXISTS idx_community_posts_hot ON community_posts(hot_score, id)",
+                "CREATE INDEX IF NOT EXISTS idx_community_posts_feed ON community_posts(feed_score, comment_count, created_at, id)",
+                "CREATE INDEX IF NOT EXISTS idx_community_posts_created ON community_posts(created_at, id)",
+            ]:
+                try:
+                    db.execute(idx_sql)
+                except Exception as exc:
+                    logger.debug("PG init: %s", exc)
+
+            decay_scores(db, expire_all=True)  # scores rows added before the ranking columns existed
+            init_timelines(db)
+            init_search_index(db)
+            init_blobs(db)
+            init_mesh_analyses(db)
+            init_conversations(db)
+            init_counters(db)
         return
 
     with get_db() as db:
@@ -627,6 +694,8 @@ def init_db():
             ("community_posts", "resolved_at TEXT"),
             ("community_posts", "is_pinned INTEGER NOT NULL DEFAULT 0"),
             ("community_posts", "is_locked INTEGER NOT NULL DEFAULT 0"),
+            ("community_posts", "hot_score REAL NOT NULL DEFAULT 0"),
+            ("community_posts", "feed_score REAL NOT NULL DEFAULT 0"),
             ("community_comments", "is_best_answer INTEGER NOT NULL DEFAULT 0"),
         ]:
             _safe_add_column(db, table, column_def)
@@ -657,6 +726,7 @@ def init_db():
             ("nodes", "verification_level INTEGER DEFAULT 0"),
             ("nodes", "verification_score REAL DEFAULT 0"),
             ("community_posts", "country_code TEXT"),
+            ("files", "sha256 TEXT"),
         ]:
             _safe_add_column(db, table, column_def)
 
@@ -680,13 +750,19 @@ def init_db():
         for idx_sql in [
             "CREATE INDEX IF NOT EXISTS idx_community_posts_author ON community_posts(author_id)",
             "CREATE INDEX IF NOT EXISTS idx_community_posts_type ON community_posts(post_type)",
+            "CREATE INDEX IF NOT EXISTS idx_community_posts_hot ON community_posts(hot_score, id)",
+            "CREATE INDEX IF NOT EXISTS idx_community_posts_feed ON community_posts(feed_score, comment_count, created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_community_posts_created ON community_posts(created_at, id)",
             "CREATE INDEX IF NOT EXISTS idx_community_comments_post ON community_comments(post_id)",
+            "CREATE INDEX IF NOT EXISTS idx_community_comments_post_created ON community_comments(post_id, created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_community_comments_parent ON community_comments(parent_id, created_at)",
             "CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id)",
             "CREATE INDEX IF NOT EXISTS idx_orders_maker ON orders(maker_id)",
             "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)",
             "CREATE INDEX IF NOT EXISTS idx_files_owner ON files(owner_id)",
             "CREATE INDEX IF NOT EXISTS idx_agents_status ON agents(status)",
             "CREATE INDEX IF NOT EXISTS idx_nodes_status ON nodes(status)",
+            "CREATE INDEX IF NOT EXISTS idx_nodes_fuzzy_location ON nodes(fuzzy_latitude, fuzzy_longitude)",
             "CREATE INDEX IF NOT EXISTS idx_follows_follower ON follows(follower_id)",
             "CREATE INDEX IF NOT EXISTS idx_follows_following ON follows(following_id)",
         ]:
@@ -794,6 +870,17 @@ def init_db():
                 except Exception as exc:
                     logger.debug("PG init: %s", exc)
 
+        decay_scores(db, expire_all=True)  # scores rows added before the ranking columns existed
+        init_timelines(db)
+
+        init_blobs(db)
+        init_mesh_analyses(db)
+        init_conversations(db)
+        init_counters(db)
+
+        # Full-text index last: it snapshots columns added by the migrations above
+        init_search_index(db)
+
 
 if __name__ == "__main__":
     init_db()
@@ -15,16 +15,12 @@
 if USE_POSTGRES:
     import psycopg2
     import psycopg2.extras
-    from psycopg2.pool import SimpleConnectionPool
-    
-    # 创建连接池
-    _pg_pool = None
-    
-    def _init_pg_pool():
-        global _pg_pool
-        if _pg_pool is None:
-            _pg_pool = SimpleConnectionPool(1, 20, DATABASE_URL)
-        return _pg_pool
+
+    from .db_pool import PgPool, get_pg_pool
+
+    def _init_pg_pool() -> PgPool:
+        # 与 api.database 共用同一个线程安全连接池
+        return get_pg_pool(DATABASE_URL)
 
 # SQLite路径
 DB_PATH = Path(__file__).parent.parent / "data" / "realworldclaw.db"
@@ -34,10 +30,10 @@ def _init_pg_pool():
 
 
 def get_connection() -> Connection:
-    """获取数据库连接"""
+    """获取数据库连接（PG: 从连接池借出，用完需 _init_pg_pool().release(conn) 归还）"""
     if USE_POSTGRES:
         pool = _init_pg_pool()
-        conn = pool.getconn()
+        conn = pool.acquire()
         # 设置字典风格的行工厂
         conn.cursor_factory = psycopg2.extras.RealDictCursor
         return conn
@@ -56,7 +52,7 @@ def get_db() -> Iterator[Connection]:
     """获取数据库连接上下文管理器"""
     if USE_POSTGRES:
         pool = _init_pg_pool()
-        conn = pool.getconn()
+        conn = pool.acquire()
         try:
             # 设置字典风格的行工厂
             conn.cursor_factory = psycopg2.extras.RealDictCursor
@@ -66,7 +62,7 @@ def get_db() -> Iterator[Connection]:
             conn.rollback()
             raise
         finally:
-            pool.putconn(conn)
+            pool.release(conn)
     else:
         # SQLite
         conn = get_connection()
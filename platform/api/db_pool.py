@@ -0,0 +1,423 @@
+"""RealWorldClaw — Reusable database connection pools."""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment overrides)
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "10"))
+SQLITE_CACHED_STATEMENTS = int(os.environ.get("SQLITE_CACHED_STATEMENTS", "256"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "8000"))
+SQLITE_BUSY_TIMEOUT_S = float(os.environ.get("SQLITE_BUSY_TIMEOUT_S", "5"))
+
+PG_POOL_MIN = int(os.environ.get("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.environ.get("PG_POOL_MAX", "20"))
+PG_POOL_TIMEOUT_S = float(os.environ.get("PG_POOL_TIMEOUT_S", "10"))
+PG_POOL_MAX_IDLE_S = float(os.environ.get("PG_POOL_MAX_IDLE_S", "300"))
+PG_POOL_MAX_LIFETIME_S = float(os.environ.get("PG_POOL_MAX_LIFETIME_S", "1800"))
+PG_POOL_PRE_PING = os.environ.get("PG_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+PG_STATEMENT_TIMEOUT_MS = int(os.environ.get("PG_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+def sqlite_connect(path: str) -> sqlite3.Connection:
+    """Open a SQLite connection with the platform's PRAGMA setup applied once."""
+    conn = sqlite3.connect(
+        path,
+        timeout=SQLITE_BUSY_TIMEOUT_S,
+        check_same_thread=False,
+        cached_statements=SQLITE_CACHED_STATEMENTS,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    return conn
+
+
+class SQLitePool:
+    """Bounded LIFO pool of long-lived SQLite connections for one database file.
+
+    Connections are created lazily and handed to one thread at a time. When
+    every pooled connection is checked out (e.g. nested ``get_db()`` blocks)
+    an overflow connection is opened instead of blocking, and closed again on
+    release, so the pool never deadlocks a request.
+    """
+
+    def __init__(self, path: str, size: int = SQLITE_POOL_SIZE) -> None:
+        self.path = path
+        self.size = max(1, size)
+        self._idle: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._in_use = 0
+        self._created = 0
+        self._reused = 0
+        self._overflow = 0
+        self._discarded = 0
+        self._checkouts = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            if self._idle:
+                self._reused += 1
+                return self._idle.pop()
+            if self._in_use > self.size:
+                self._overflow += 1
+            self._created += 1
+        try:
+            return sqlite_connect(self.path)
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection; dirty or surplus connections are closed."""
+        reusable = True
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                reusable = False
+        conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._in_use -= 1
+            if reusable and not self._closed and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+            self._discarded += 1
+        try:
+            conn.close()
+        except sqlite3.Error as exc:
+            logger.debug("SQLite pool: close failed: %s", exc)
+
+    def close(self) -> None:
+        """Close idle connections; checked-out ones are closed on release."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error as exc:
+                logger.debug("SQLite pool: close failed: %s", exc)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "reused": self._reused,
+                "overflow": self._overflow,
+                "discarded": self._discarded,
+            }
+
+
+# ─── PostgreSQL ──────────────────────────────────────────
+
+
+_PRUNE_INTERVAL_S = 30.0
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection became free within the wait timeout."""
+
+
+class _PgSlot:
+    __slots__ = ("conn", "created_at", "returned_at", "statement_timeout_ms")
+
+    def __init__(self, conn: Any) -> None:
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+        self.statement_timeout_ms: int | None = None
+
+
+class PgPool:
+    """Thread-safe, bounded psycopg2 connection pool.
+
+    Callers beyond ``maxconn`` wait (FIFO via a condition variable) up to
+    ``timeout`` seconds. Idle connections past ``max_idle`` and connections
+    older than ``max_lifetime`` are recycled; connections are pinged before
+    being handed out and get the requested ``statement_timeout``.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        minconn: int = PG_POOL_MIN,
+        maxconn: int = PG_POOL_MAX,
+        timeout: float = PG_POOL_TIMEOUT_S,
+        max_idle: float = PG_POOL_MAX_IDLE_S,
+        max_lifetime: float = PG_POOL_MAX_LIFETIME_S,
+        pre_ping: bool = PG_POOL_PRE_PING,
+        statement_timeout_ms: int = PG_STATEMENT_TIMEOUT_MS,
+    ) -> None:
+        self._connect = connect
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self.statement_timeout_ms = statement_timeout_ms
+        self._idle: list[_PgSlot] = []
+        self._slots: dict[int, _PgSlot] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._waiting = 0
+        self._last_prune = time.monotonic()
+        # Counters
+        self._checkouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+
+    # -- checkout / return ------------------------------------------------
+
+    def acquire(self, statement_timeout_ms: int | None = None) -> Any:
+        if statement_timeout_ms is None:
+            statement_timeout_ms = self.statement_timeout_ms
+        # One deadline covers the retries after failed pre-pings too
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            slot = self._checkout_slot(start, deadline)
+            if self._prepare(slot, statement_timeout_ms):
+                return slot.conn
+            self._drop(slot)
+            if time.monotonic() >= deadline:
+                with self._cond:
+                    self._timeouts += 1
+                raise PoolTimeoutError(f"No healthy database connection within {self.timeout:.1f}s")
+
+    def _checkout_slot(self, start: float, deadline: float) -> _PgSlot:
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                now = time.monotonic()
+                while self._idle:
+                    slot = self._idle.pop()
+                    if self._expired(slot, now):
+                        self._recycle_locked(slot)
+                        continue
+                    self._record_checkout(waited, now - start)
+                    return slot
+                if len(self._slots) < self.maxconn:
+                    # Reserve the slot before connecting outside the lock
+                    placeholder = _PgSlot(None)
+                    self._slots[id(placeholder)] = placeholder
+                    self._record_checkout(waited, now - start)
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available within {self.timeout:.1f}s "
+                        f"({self.maxconn} in use)"
+                    )
+                waited = True
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._slots.pop(id(placeholder), None)
+                self._cond.notify()
+            raise
+        slot = _PgSlot(conn)
+        with self._cond:
+            self._slots.pop(id(placeholder), None)
+            self._slots[id(conn)] = slot
+            self._created += 1
+        return slot
+
+    def _record_checkout(self, waited: bool, wait_s: float) -> None:
+        self._checkouts += 1
+        if waited:
+            self._waits += 1
+            self._wait_total_s += wait_s
+            self._wait_max_s = max(self._wait_max_s, wait_s)
+
+    def _expired(self, slot: _PgSlot, now: float) -> bool:
+        if getattr(slot.conn, "closed", 0):
+            return True
+        if self.max_idle and now - slot.returned_at > self.max_idle:
+            return True
+        return bool(self.max_lifetime and now - slot.created_at > self.max_lifetime)
+
+    def _prepare(self, slot: _PgSlot, statement_timeout_ms: int) -> bool:
+        """Pre-ping and apply the per-checkout statement timeout."""
+        conn = slot.conn
+        try:
+            cur = conn.cursor()
+            try:
+                if self.pre_ping:
+                    cur.execute("SELECT 1")
+                if statement_timeout_ms != slot.statement_timeout_ms:
+                    cur.execute("SET statement_timeout = %s", (int(statement_timeout_ms),))
+            finally:
+                cur.close()
+            conn.commit()
+            slot.statement_timeout_ms = statement_timeout_ms
+            return True
+        except Exception as exc:
+            logger.warning("PG pool: discarding broken connection: %s", exc)
+            with self._cond:
+                self._ping_failures += 1
+            return False
+
+    def release(self, conn: Any) -> None:
+        """Return a connection; connections left mid-transaction are rolled back."""
+        with self._cond:
+            slot = self._slots.get(id(conn))
+        if slot is None:
+            logger.debug("PG pool: release of unknown connection ignored")
+            return
+        reusable = not getattr(conn, "closed", 0)
+        if reusable and _pg_in_transaction(conn):
+            try:
+                conn.rollback()
+            except Exception:
+                reusable = False
+        if not reusable:
+            self._drop(slot)
+            return
+        prune_due = False
+        with self._cond:
+            closed = self._closed
+            if closed:
+                self._slots.pop(id(conn), None)
+            else:
+                now = slot.returned_at = time.monotonic()
+                self._idle.append(slot)
+                self._cond.notify()
+                if now - self._last_prune > _PRUNE_INTERVAL_S:
+                    self._last_prune = now
+                    prune_due = True
+        if closed:
+            _close_quietly(conn)
+        elif prune_due:
+            self.prune()
+
+    def _drop(self, slot: _PgSlot) -> None:
+        with self._cond:
+            self._recycle_locked(slot)
+            self._cond.notify()
+
+    def _recycle_locked(self, slot: _PgSlot) -> None:
+        self._slots.pop(id(slot.conn), None)
+        self._recycled += 1
+        _close_quietly(slot.conn)
+
+    # -- maintenance ------------------------------------------------------
+
+    def prune(self) -> int:
+        """Close idle connections past their idle/lifetime limits, keeping ``minconn``."""
+        now = time.monotonic()
+        pruned = 0
+        with self._cond:
+            keep: list[_PgSlot] = []
+            for slot in self._idle:
+                if self._expired(slot, now) and len(self._slots) > self.minconn:
+                    self._recycle_locked(slot)
+                    pruned += 1
+                else:
+                    keep.append(slot)
+            self._idle = keep
+        return pruned
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            for slot in idle:
+                self._slots.pop(id(slot.conn), None)
+            self._cond.notify_all()
+        for slot in idle:
+            _close_quietly(slot.conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            total = len(self._slots)
+            idle = len(self._idle)
+            in_use = total - idle
+            return {
+                "backend": "postgres",
+                "size": self.maxconn,
+                "open": total,
+                "idle": idle,
+                "in_use": in_use,
+                "waiting": self._waiting,
+                "saturation": round(in_use / self.maxconn, 3),
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_total_ms": round(self._wait_total_s * 1000, 2),
+                "wait_max_ms": round(self._wait_max_s * 1000, 2),
+            }
+
+
+def _pg_in_transaction(conn: Any) -> bool:
+    try:
+        return conn.get_transaction_status() != 0  # TRANSACTION_STATUS_IDLE
+    except Exception:
+        return True
+
+
+def _close_quietly(conn: Any) -> None:
+    if conn is None:
+        return
+    try:
+        conn.close()
+    except Exception as exc:
+        logger.debug("PG pool: close failed: %s", exc)
+
+
+_pg_pools: dict[str, PgPool] = {}
+_pg_pools_lock = threading.Lock()
+
+
+def get_pg_pool(dsn: str) -> PgPool:
+    """Process-wide pool for ``dsn``, shared by every database module."""
+    pool = _pg_pools.get(dsn)
+    if pool is not None:
+        return pool
+    with _pg_pools_lock:
+        pool = _pg_pools.get(dsn)
+        if pool is None:
+            import psycopg2
+
+            pool = PgPool(lambda: psycopg2.connect(dsn))
+            _pg_pools[dsn] = pool
+        return pool
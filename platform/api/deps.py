@@ -2,13 +2,15 @@
 
 from __future__ import annotations
 
-from typing import Callable
+import time
+from typing import Callable, Optional
 
 from fastapi import Depends, Header, HTTPException
 from jose import JWTError
 
 from .api_keys import find_agent_by_api_key
 from .database import get_db
+from .identity_cache import identity_cache
 from .security import decode_token
 
 
@@ -29,6 +31,10 @@ def get_current_user(authorization: str = Header(...)) -> dict:
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token payload")
 
+    identity = resolve_bearer_identity(token)
+    if identity and identity["identity_type"] == "user":
+        return identity
+
     with get_db() as db:
         row = db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
     if not row:
@@ -48,7 +54,7 @@ def _check(user: dict = Depends(get_current_user)) -> dict:
     return _check
 
 
-def _resolve_agent_identity(raw_api_key: str) -> dict | None:
+def _load_agent_identity(raw_api_key: str) -> dict | None:
     with get_db() as db:
         row = find_agent_by_api_key(db, raw_api_key)
     if not row:
@@ -59,7 +65,8 @@ def _resolve_agent_identity(raw_api_key: str) -> dict | None:
     return result
 
 
-def _resolve_bearer_identity(token: str) -> dict | None:
+def _load_bearer_identity(token: str) -> tuple[dict | None, Optional[float]]:
+    """(identity, seconds it may be cached at most)."""
     # Try JWT first
     try:
         payload = decode_token(token)
@@ -72,12 +79,35 @@ def _resolve_bearer_identity(token: str) -> dict | None:
                     result = dict(row)
                     result["identity_type"] = "user"
                     result["identity_id"] = row["id"]
-                    return result
+                    max_age = payload["exp"] - time.time() if "exp" in payload else None
+                    return result, max_age
     except JWTError:
         pass
 
     # Bearer token can also be an agent API key
-    return _resolve_agent_identity(token)
+    return _load_agent_identity(token), None
+
+
+def resolve_agent_identity(raw_api_key: str) -> dict | None:
+    """Agent behind an API key, or None. Served from :data:`identity_cache` when possible."""
+    found, identity = identity_cache.get("agent", raw_api_key)
+    if found:
+        return identity
+    generation = identity_cache.generation
+    identity = _load_agent_identity(raw_api_key)
+    identity_cache.put("agent", raw_api_key, identity, generation)
+    return identity
+
+
+def resolve_bearer_identity(token: str) -> dict | None:
+    """User (JWT) or agent (API key) behind a bearer token, or None. Cached like the above."""
+    found, identity = identity_cache.get("bearer", token)
+    if found:
+        return identity
+    generation = identity_cache.generation
+    identity, max_age = _load_bearer_identity(token)
+    identity_cache.put("bearer", token, identity, generation, max_age)
+    return identity
 
 
 def get_authenticated_identity(
@@ -93,7 +123,7 @@ def get_authenticated_identity(
     """
     # Independent auth path for agents.
     if x_agent_api_key:
-        agent = _resolve_agent_identity(x_agent_api_key)
+        agent = resolve_agent_identity(x_agent_api_key)
         if agent:
             return agent
 
@@ -101,7 +131,7 @@ def get_authenticated_identity(
         if not authorization.startswith("Bearer "):
             raise HTTPException(status_code=401, detail="Invalid authorization header format")
         token = authorization.removeprefix("Bearer ")
-        identity = _resolve_bearer_identity(token)
+        identity = resolve_bearer_identity(token)
         if identity:
             return identity
     elif not x_agent_api_key:
@@ -0,0 +1,651 @@
+"""Cross-process transports for WebSocket-bound events.
+
+``ws_manager.manager`` only knows the sockets of its own process, so events
+that must reach a dashboard go through :class:`api.events.EventBridge`, which
+publishes them on a transport topic per ``channel:target`` (e.g.
+``rwc:printer:p1``). Each worker subscribes only to the topics of targets it
+currently holds a socket for, and delivers what it receives to its local
+connection manager.
+
+Transports (``EVENT_TRANSPORT``):
+
+- ``local`` (default): no transport; events go straight to this process's
+  sockets, as with a single worker.
+- ``redis``: Redis-protocol PUBLISH/SUBSCRIBE over the stdlib RESP client.
+- ``postgres``: LISTEN/NOTIFY on ``DATABASE_URL`` (needs psycopg2).
+- ``multiprocess``: a small broker on ``EVENT_BROKER_ADDRESS`` hosted by the
+  first worker that binds it; for tests and single-host multi-worker setups.
+  Peers authenticate with ``EVENT_BROKER_AUTHKEY``, which must be set, and
+  exchange JSON frames only, never pickles.
+
+Outgoing messages are buffered for ``EVENT_BATCH_MS`` (or until
+``EVENT_BATCH_MAX`` are pending) and sent as one JSON array per topic.
+Batches and subscription changes are written by a worker thread, never on
+the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import select
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Awaitable, Callable
+
+from .resp import RedisURL, RespConnection
+
+try:
+    import psycopg2
+except ImportError:  # pragma: no cover - only needed for the postgres transport
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+EVENT_TRANSPORT = os.environ.get("EVENT_TRANSPORT", "local").lower()
+EVENT_REDIS_URL = os.environ.get(
+    "EVENT_REDIS_URL", os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+)
+EVENT_BROKER_ADDRESS = os.environ.get("EVENT_BROKER_ADDRESS", "127.0.0.1:7390")
+EVENT_BROKER_AUTHKEY = os.environ.get("EVENT_BROKER_AUTHKEY", "")
+EVENT_BATCH_MS = float(os.environ.get("EVENT_BATCH_MS", "5"))
+EVENT_BATCH_MAX = int(os.environ.get("EVENT_BATCH_MAX", "100"))
+TOPIC_PREFIX = "rwc:"
+_RECONNECT_DELAY_S = 1.0
+_MAX_FRAME = 16 * 1024 * 1024  # bytes per broker frame
+
+Deliver = Callable[[dict], Awaitable[None]]
+
+
+def topic_for(channel: str, target_id: str) -> str:
+    return f"{TOPIC_PREFIX}{channel}:{target_id}"
+
+
+class EventTransport:
+    """Batching, subscription bookkeeping and a reconnecting reader thread.
+
+    Subclasses implement the ``_open_subscriber`` / ``_read_loop`` /
+    ``_send_subscribe`` / ``_send`` primitives; everything here is shared.
+    """
+
+    name = "base"
+    max_payload: int | None = None  # bytes per published message
+
+    def __init__(self, batch_ms: float = EVENT_BATCH_MS, batch_max: int = EVENT_BATCH_MAX):
+        self.batch_delay = batch_ms / 1000.0
+        self.batch_max = batch_max
+        self._topics: set[str] = set()
+        self._lock = threading.Lock()  # guards _topics and subscription commands
+        self._connected = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._deliver: Deliver | None = None
+        self._buffers: dict[str, list[str]] = {}
+        self._buffered = 0
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Future] = set()
+        # One thread sends batches and subscription commands, in order
+        self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"events-{self.name}-pub")
+        self.metrics = {
+            "published": 0,
+            "batches_sent": 0,
+            "batches_received": 0,
+            "received": 0,
+            "delivered": 0,
+            "publish_errors": 0,
+            "delivery_errors": 0,
+            "reconnects": 0,
+        }
+
+    # ─── Lifecycle ───────────────────────────────────────
+
+    async def start(self, deliver: Deliver) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._deliver = deliver
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=f"events-{self.name}-sub", daemon=True)
+        self._thread.start()
+
+    async def wait_ready(self, timeout: float = 5.0) -> bool:
+        return await asyncio.to_thread(self._connected.wait, timeout)
+
+    async def stop(self) -> None:
+        await self.flush()
+        self._stopping.set()
+        self._interrupt()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 5)
+            self._thread = None
+        self._publisher.shutdown(wait=True)
+        self._close_publisher()
+
+    # ─── Subscriptions ───────────────────────────────────
+
+    def subscribe(self, topic: str) -> None:
+        with self._lock:
+            if topic in self._topics:
+                return
+            self._topics.add(topic)
+        self._command(self._send_subscribe, [topic])
+
+    def unsubscribe(self, topic: str) -> None:
+        with self._lock:
+            if topic not in self._topics:
+                return
+            self._topics.discard(topic)
+        self._command(self._send_unsubscribe, [topic])
+
+    def _command(self, fn, topics: list[str]) -> None:
+        """Queue a subscription command for the publisher thread; callers may be on the event loop.
+
+        When disconnected nothing is sent: the reader resubscribes on reconnect.
+        """
+        if not self._connected.is_set() or self._stopping.is_set():
+            return
+        try:
+            self._publisher.submit(self._run_command, fn, topics)
+        except RuntimeError:
+            pass  # executor already shut down
+
+    def _run_command(self, fn, topics: list[str]) -> None:
+        with self._lock:
+            if not self._connected.is_set():
+                return
+            try:
+                fn(topics)
+            except (OSError, ConnectionError, EOFError) as exc:
+                logger.warning("Event transport %s: subscription update failed: %s", self.name, exc)
+                self._interrupt()
+
+    # ─── Publishing ──────────────────────────────────────
+
+    def publish(self, topic: str, message: dict) -> None:
+        """Buffer a message; it is sent with the next batch for its topic."""
+        self._buffers.setdefault(topic, []).append(json.dumps(message))
+        self._buffered += 1
+        self.metrics["published"] += 1
+        if self._buffered >= self.batch_max:
+            self._flush_now()
+        elif self._flush_handle is None:
+            loop = self._loop or asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.batch_delay, self._flush_now)
+
+    def _flush_now(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._buffers:
+            return
+        buffers, self._buffers, self._buffered = self._buffers, {}, 0
+        loop = self._loop or asyncio.get_running_loop()
+        future = loop.run_in_executor(self._publisher, self._send_batches, buffers)
+        self._flushes.add(future)
+        future.add_done_callback(self._flushes.discard)
+
+    async def flush(self) -> None:
+        """Send everything buffered and wait until it has been handed to the backend."""
+        self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes), return_exceptions=True)
+
+    def _pack(self, messages: list[str]) -> list[tuple[str, int]]:
+        """Join messages into JSON array payloads under ``max_payload``; (payload, count) pairs."""
+        if self.max_payload is None:
+            return [("[" + ",".join(messages) + "]", len(messages))]
+        payloads, chunk, size = [], [], 2
+        for text in messages:
+            length = len(text.encode()) + 1
+            if length + 2 > self.max_payload:
+                logger.warning("Event transport %s: dropping %d-byte message over the payload limit",
+                               self.name, length)
+                self.metrics["publish_errors"] += 1
+                continue
+            if chunk and size + length > self.max_payload:
+                payloads.append(("[" + ",".join(chunk) + "]", len(chunk)))
+                chunk, size = [], 2
+            chunk.append(text)
+            size += length
+        if chunk:
+            payloads.append(("[" + ",".join(chunk) + "]", len(chunk)))
+        return payloads
+
+    def _send_batches(self, buffers: dict[str, list[str]]) -> None:
+        for topic, messages in buffers.items():
+            for payload, count in self._pack(messages):
+                try:
+                    self._send(topic, payload)
+                    self.metrics["batches_sent"] += 1
+                except Exception as exc:
+                    self.metrics["publish_errors"] += count
+                    logger.warning("Event transport %s: publish to %s failed: %s", self.name, topic, exc)
+                    self._close_publisher()
+
+    # ─── Receiving ───────────────────────────────────────
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._open_subscriber()
+                with self._lock:
+                    self._connected.set()
+                    if self._topics:
+                        self._send_subscribe(sorted(self._topics))
+                self._read_loop()
+            except Exception as exc:
+                if not self._stopping.is_set():
+                    logger.warning("Event transport %s disconnected: %s", self.name, exc)
+            finally:
+                self._connected.clear()
+                self._close_subscriber()
+            if not self._stopping.is_set():
+                self.metrics["reconnects"] += 1
+                self._stopping.wait(_RECONNECT_DELAY_S)
+
+    def _received(self, topic: str, payload: str) -> None:
+        """Called on the reader thread for every batch the backend hands us."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._dispatch, topic, payload)
+
+    def _dispatch(self, topic: str, payload: str) -> None:
+        if topic not in self._topics:
+            return  # unsubscribed while the batch was in flight
+        try:
+            messages = json.loads(payload)
+        except ValueError:
+            self.metrics["delivery_errors"] += 1
+            return
+        self.metrics["batches_received"] += 1
+        self.metrics["received"] += len(messages)
+        asyncio.ensure_future(self._deliver_all(messages))
+
+    async def _deliver_all(self, messages: list[dict]) -> None:
+        for message in messages:
+            try:
+                await self._deliver(message)
+                self.metrics["delivered"] += 1
+            except Exception:
+                self.metrics["delivery_errors"] += 1
+                logger.exception("Event transport %s: delivery failed", self.name)
+
+    def stats(self) -> dict:
+        return {
+            "transport": self.name,
+            "connected": self._connected.is_set(),
+            "subscriptions": len(self._topics),
+            "buffered": self._buffered,
+            **self.metrics,
+        }
+
+    # ─── Backend primitives ──────────────────────────────
+
+    def _open_subscriber(self) -> None:
+        raise NotImplementedError
+
+    def _read_loop(self) -> None:
+        raise NotImplementedError
+
+    def _send_subscribe(self, topics: list[str]) -> None:
+        raise NotImplementedError
+
+    def _send_unsubscribe(self, topics: list[str]) -> None:
+        raise NotImplementedError
+
+    def _send(self, topic: str, payload: str) -> None:
+        raise NotImplementedError
+
+    def _interrupt(self) -> None:
+        """Wake the reader thread so it notices ``_stopping`` or a broken connection."""
+
+    def _close_subscriber(self) -> None:
+        pass
+
+    def _close_publisher(self) -> None:
+        pass
+
+
+class RedisTransport(EventTransport):
+    """PUBLISH/SUBSCRIBE on any Redis-protocol server."""
+
+    name = "redis"
+
+    def __init__(self, url: str = EVENT_REDIS_URL, **kwargs):
+        super().__init__(**kwargs)
+        self.url = RedisURL.parse(url)
+        self._sub: RespConnection | None = None
+        self._pub: RespConnection | None = None
+
+    def _open_subscriber(self) -> None:
+        self._sub = RespConnection.open(self.url, timeout=None)
+
+    def _read_loop(self) -> None:
+        while not self._stopping.is_set():
+            reply = self._sub.read()
+            if isinstance(reply, list) and reply and reply[0] == "message":
+                self._received(reply[1], reply[2])
+
+    def _send_subscribe(self, topics: list[str]) -> None:
+        self._sub.send("SUBSCRIBE", *topics)
+
+    def _send_unsubscribe(self, topics: list[str]) -> None:
+        self._sub.send("UNSUBSCRIBE", *topics)
+
+    def _send(self, topic: str, payload: str) -> None:
+        if self._pub is None:
+            self._pub = RespConnection.open(self.url, timeout=2.0)
+        self._pub.command("PUBLISH", topic, payload)
+
+    def _interrupt(self) -> None:
+        if self._sub is not None:
+            self._sub.shutdown()
+
+    def _close_subscriber(self) -> None:
+        if self._sub is not None:
+            self._sub.close()
+            self._sub = None
+
+    def _close_publisher(self) -> None:
+        if self._pub is not None:
+            self._pub.close()
+            self._pub = None
+
+
+def _pg_channel(topic: str) -> str:
+    # NOTIFY channels are identifiers (max 63 bytes); hash topics into a safe name
+    return "rwc_" + hashlib.sha1(topic.encode()).hexdigest()
+
+
+class PostgresTransport(EventTransport):
+    """LISTEN/NOTIFY on the application database.
+
+    psycopg2 connections must not be used from two threads at once, so
+    LISTEN/UNLISTEN commands are queued and run by the reader thread, which
+    is woken through a socket pair.
+    """
+
+    name = "postgres"
+    max_payload = 7900  # NOTIFY payloads must stay under 8000 bytes
+
+    def __init__(self, dsn: str | None = None, **kwargs):
+        if psycopg2 is None:
+            raise RuntimeError("EVENT_TRANSPORT=postgres requires psycopg2")
+        super().__init__(**kwargs)
+        self.dsn = dsn or os.environ.get("DATABASE_URL", "")
+        self._sub = None
+        self._pub = None
+        self._channels: dict[str, str] = {}  # channel -> topic
+        self._pending: deque[tuple[str, str]] = deque()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+
+    def _open_subscriber(self) -> None:
+        self._sub = psycopg2.connect(self.dsn)
+        self._sub.autocommit = True
+        self._pending.clear()
+
+    def _queue(self, verb: str, topics: list[str]) -> None:
+        for topic in topics:
+            channel = _pg_channel(topic)
+            if verb == "LISTEN":
+                self._channels[channel] = topic
+            else:
+                self._channels.pop(channel, None)
+            self._pending.append((verb, channel))
+        self._interrupt()
+
+    def _send_subscribe(self, topics: list[str]) -> None:
+        self._queue("LISTEN", topics)
+
+    def _send_unsubscribe(self, topics: list[str]) -> None:
+        self._queue("UNLISTEN", topics)
+
+    def _read_loop(self) -> None:
+        cur = self._sub.cursor()
+        while not self._stopping.is_set():
+            readable, _, _ = select.select([self._sub, self._wake_r], [], [], 5.0)
+            if self._wake_r in readable:
+                try:
+                    while self._wake_r.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            while self._pending:
+                verb, channel = self._pending.popleft()
+                cur.execute(f'{verb} "{channel}"')
+            self._sub.poll()
+            while self._sub.notifies:
+                notify = self._sub.notifies.pop(0)
+                topic = self._channels.get(notify.channel)
+                if topic is not None:
+                    self._received(topic, notify.payload)
+
+    def _send(self, topic: str, payload: str) -> None:
+        if self._pub is None:
+            self._pub = psycopg2.connect(self.dsn)
+            self._pub.autocommit = True
+        with self._pub.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", (_pg_channel(topic), payload))
+
+    def _interrupt(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _close_subscriber(self) -> None:
+        if self._sub is not None:
+            try:
+                self._sub.close()
+            except Exception:
+                pass
+            self._sub = None
+
+    def _close_publisher(self) -> None:
+        if self._pub is not None:
+            try:
+                self._pub.close()
+            except Exception:
+                pass
+            self._pub = None
+
+
+def _send_frame(conn: Connection, *parts) -> None:
+    conn.send_bytes(json.dumps(parts).encode())
+
+
+def _recv_frame(conn: Connection) -> list:
+    """Next JSON frame; raises ValueError for anything else (frames are never unpickled)."""
+    frame = json.loads(conn.recv_bytes(_MAX_FRAME))
+    if not isinstance(frame, list) or not frame:
+        raise ValueError("Malformed event frame")
+    return frame
+
+
+def _require_authkey(authkey: bytes) -> bytes:
+    if not authkey:
+        raise RuntimeError(
+            "EVENT_TRANSPORT=multiprocess requires EVENT_BROKER_AUTHKEY; "
+            "refusing to run the event broker without authentication."
+        )
+    return authkey
+
+
+def _parse_address(address: str) -> tuple[str, int] | str:
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address  # Unix socket path
+
+
+class EventBroker:
+    """Topic fan-out hub for :class:`MultiprocessTransport` clients."""
+
+    def __init__(self, address: tuple[str, int] | str = ("127.0.0.1", 0), authkey: bytes = b""):
+        self._listener = Listener(address, authkey=_require_authkey(authkey))
+        self.address = self._listener.address
+        self._subs: dict[str, set[Connection]] = {}
+        self._send_locks: dict[Connection, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self) -> "EventBroker":
+        threading.Thread(target=self._accept_loop, name="events-broker", daemon=True).start()
+        return self
+
+    def subscribers(self, topic: str) -> int:
+        with self._lock:
+            return len(self._subs.get(topic, ()))
+
+    def _accept_loop(self) -> None:
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                if self._closed:
+                    return
+                continue
+            with self._lock:
+                self._send_locks[conn] = threading.Lock()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: Connection) -> None:
+        try:
+            while True:
+                op, *args = _recv_frame(conn)
+                if op == "sub":
+                    with self._lock:
+                        for topic in args[0]:
+                            self._subs.setdefault(topic, set()).add(conn)
+                elif op == "unsub":
+                    with self._lock:
+                        for topic in args[0]:
+                            self._subs.get(topic, set()).discard(conn)
+                            if not self._subs.get(topic):
+                                self._subs.pop(topic, None)
+                elif op == "pub":
+                    self._fan_out(*args)
+        except (EOFError, OSError, ValueError, TypeError):
+            pass
+        finally:
+            self._drop(conn)
+
+    def _fan_out(self, topic: str, payload: str) -> None:
+        with self._lock:
+            targets = [(c, self._send_locks.get(c)) for c in self._subs.get(topic, ())]
+        for conn, lock in targets:
+            if lock is None:
+                continue
+            try:
+                with lock:
+                    _send_frame(conn, "msg", topic, payload)
+            except (OSError, ValueError):
+                self._drop(conn)
+
+    def _drop(self, conn: Connection) -> None:
+        with self._lock:
+            self._send_locks.pop(conn, None)
+            for topic in [t for t, conns in self._subs.items() if conn in conns]:
+                self._subs[topic].discard(conn)
+                if not self._subs[topic]:
+                    del self._subs[topic]
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        self._closed = True
+        self._listener.close()
+        with self._lock:
+            conns = list(self._send_locks)
+        for conn in conns:
+            self._drop(conn)
+
+
+class MultiprocessTransport(EventTransport):
+    """Client of an :class:`EventBroker`; hosts the broker itself if nobody has bound the address."""
+
+    name = "multiprocess"
+
+    def __init__(
+        self,
+        address: tuple[str, int] | str | None = None,
+        authkey: bytes | None = None,
+        host_broker: bool = True,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.address = address if address is not None else _parse_address(EVENT_BROKER_ADDRESS)
+        self.authkey = _require_authkey(authkey if authkey is not None else EVENT_BROKER_AUTHKEY.encode())
+        self.host_broker = host_broker
+        self.broker: EventBroker | None = None
+        self._sub: Connection | None = None
+        self._pub: Connection | None = None
+
+    def _connect(self) -> Connection:
+        return Client(self.address, authkey=self.authkey)
+
+    def _open_subscriber(self) -> None:
+        if self.host_broker and self.broker is None:
+            try:
+                self.broker = EventBroker(self.address, self.authkey).start()
+                logger.info("Event broker listening on %s", self.broker.address)
+            except OSError:
+                pass  # another worker hosts it
+        self._sub = self._connect()
+
+    def _read_loop(self) -> None:
+        while not self._stopping.is_set():
+            if self._sub.poll(0.5):
+                _, topic, payload = _recv_frame(self._sub)
+                self._received(topic, payload)
+
+    def _send_subscribe(self, topics: list[str]) -> None:
+        _send_frame(self._sub, "sub", topics)
+
+    def _send_unsubscribe(self, topics: list[str]) -> None:
+        _send_frame(self._sub, "unsub", topics)
+
+    def _send(self, topic: str, payload: str) -> None:
+        if self._pub is None:
+            self._pub = self._connect()
+        _send_frame(self._pub, "pub", topic, payload)
+
+    def _close_subscriber(self) -> None:
+        if self._sub is not None:
+            try:
+                self._sub.close()
+            except OSError:
+                pass
+            self._sub = None
+
+    def _close_publisher(self) -> None:
+        if self._pub is not None:
+            try:
+                self._pub.close()
+            except OSError:
+                pass
+            self._pub = None
+
+    async def stop(self) -> None:
+        await super().stop()
+        if self.broker is not None:
+            self.broker.close()
+            self.broker = None
+
+
+def create_transport(kind: str = EVENT_TRANSPORT) -> EventTransport | None:
+    """Build the configured transport; ``None`` means in-process delivery only."""
+    if kind == "redis":
+        return RedisTransport(EVENT_REDIS_URL)
+    if kind == "postgres":
+        return PostgresTransport()
+    if kind == "multiprocess":
+        return MultiprocessTransport()
+    return None
@@ -1,15 +1,34 @@
-"""Event bus for RealWorldClaw — pub/sub with WebSocket integration."""
+"""Event bus for RealWorldClaw — pub/sub with WebSocket integration.
+
+Handlers run in the publishing process. WebSocket-bound messages go through
+:data:`event_bridge`, which hands them to the configured cross-process
+transport (see :mod:`api.event_transport`) so a dashboard connected to any
+worker receives them; without a transport they go straight to this
+process's connection manager. The bridge also carries broadcasts that every
+worker must see, such as :func:`identity_changed` and :func:`aggregates_changed`.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import logging
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Callable, Awaitable
+from typing import TYPE_CHECKING, Any, Callable, Awaitable
+
+from .event_transport import EventTransport, topic_for
+from .identity_cache import identity_cache
+from .services.response_cache import response_cache
+
+if TYPE_CHECKING:
+    from .ws_manager import ConnectionManager
 
 logger = logging.getLogger(__name__)
 
 EventHandler = Callable[["Event"], Awaitable[None]]
+BroadcastHandler = Callable[[dict], None]
+
+BROADCAST_TARGET = "*"
 
 
 @dataclass
@@ -48,31 +67,157 @@ async def publish(self, event: Event) -> None:
                 logger.exception("Error in event handler for %s", event.type)
 
 
-# Singleton
+class EventBridge:
+    """Deliver WebSocket messages to whichever worker holds the target's sockets.
+
+    The bridge subscribes the transport to ``channel:target`` topics as the
+    local connection manager gains and loses targets, so each worker only
+    receives messages for sockets it actually has. Broadcast channels are
+    subscribed on every worker and handed to their registered handler.
+    """
+
+    def __init__(self, ws: "ConnectionManager | None" = None) -> None:
+        self._ws = ws
+        self.transport: EventTransport | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._broadcast_handlers: dict[str, BroadcastHandler] = {}
+
+    @property
+    def ws(self) -> "ConnectionManager":
+        if self._ws is None:
+            from .ws_manager import manager
+            self._ws = manager
+        return self._ws
+
+    async def start(self, transport: EventTransport | None) -> None:
+        if transport is None:
+            return
+        self.transport = transport
+        self._loop = asyncio.get_running_loop()
+        self.ws.add_target_listener(self._on_target)
+        for channel, target_id in self.ws.targets():
+            transport.subscribe(topic_for(channel, target_id))
+        for channel in self._broadcast_handlers:
+            transport.subscribe(topic_for(channel, BROADCAST_TARGET))
+        await transport.start(self._deliver)
+
+    async def stop(self) -> None:
+        if self.transport is None:
+            return
+        self.ws.remove_target_listener(self._on_target)
+        transport, self.transport, self._loop = self.transport, None, None
+        await transport.stop()
+
+    def on_broadcast(self, channel: str, handler: BroadcastHandler) -> None:
+        self._broadcast_handlers[channel] = handler
+        if self.transport is not None:
+            self.transport.subscribe(topic_for(channel, BROADCAST_TARGET))
+
+    def broadcast(self, channel: str, data: dict[str, Any]) -> None:
+        """Hand ``data`` to the ``channel`` handler of every worker; callable from any thread.
+
+        Without a transport there are no other workers and nothing is sent.
+        """
+        if self.transport is None or self._loop is None:
+            return
+        message = {"channel": channel, "target": BROADCAST_TARGET, "data": data}
+        self._loop.call_soon_threadsafe(self.transport.publish, topic_for(channel, BROADCAST_TARGET), message)
+
+    async def send(
+        self, channel: str, target_id: str, data: dict[str, Any], coalesce_key: str | None = None
+    ) -> None:
+        if self.transport is None:
+            await self.ws.send_to(channel, target_id, data, coalesce_key=coalesce_key)
+            return
+        self.transport.publish(
+            topic_for(channel, target_id),
+            {"channel": channel, "target": target_id, "data": data, "coalesce_key": coalesce_key},
+        )
+
+    def _on_target(self, channel: str, target_id: str, held: bool) -> None:
+        if self.transport is None:
+            return
+        if held:
+            self.transport.subscribe(topic_for(channel, target_id))
+        else:
+            self.transport.unsubscribe(topic_for(channel, target_id))
+
+    async def _deliver(self, message: dict) -> None:
+        if message["target"] == BROADCAST_TARGET:
+            handler = self._broadcast_handlers.get(message["channel"])
+            if handler is not None:
+                handler(message["data"])
+            return
+        await self.ws.send_to(
+            message["channel"], message["target"], message["data"], coalesce_key=message.get("coalesce_key")
+        )
+
+    def stats(self) -> dict:
+        if self.transport is None:
+            return {"transport": "local"}
+        return self.transport.stats()
+
+
+# Singletons
 event_bus = EventBus()
+event_bridge = EventBridge()
 
 
 # --- Wire events to WebSocket manager ---
 
+# Events that report current state, where a newer one supersedes a queued one
+_STATE_EVENTS = frozenset({"printer_status_changed", "print_progress"})
+
 async def _ws_printer_handler(event: Event) -> None:
-    from .ws_manager import manager
     printer_id = event.data.get("printer_id", "")
     if printer_id:
-        await manager.send_to("printer", printer_id, event.to_dict())
+        # Slow dashboards only need the newest status of each state event type;
+        # discrete events such as module_discovered are all delivered
+        coalesce_key = event.type if event.type in _STATE_EVENTS else None
+        await event_bridge.send("printer", printer_id, event.to_dict(), coalesce_key=coalesce_key)
 
 
 async def _ws_order_handler(event: Event) -> None:
-    from .ws_manager import manager
     user_id = event.data.get("user_id", "")
     if user_id:
-        await manager.send_to("orders", user_id, event.to_dict())
+        await event_bridge.send("orders", user_id, event.to_dict())
 
 
 async def _ws_notification_handler(event: Event) -> None:
-    from .ws_manager import manager
     user_id = event.data.get("user_id", "")
     if user_id:
-        await manager.send_to("notifications", user_id, event.to_dict())
+        await event_bridge.send("notifications", user_id, event.to_dict())
+
+
+def identity_changed(identity_type: str, identity_id: str) -> None:
+    """Drop the cached credentials of a user or agent on this and every other worker.
+
+    Synchronous so threadpool routes can call it right after their write commits.
+    """
+    identity_cache.invalidate(identity_type, identity_id)
+    event_bridge.broadcast("identity", {"identity_type": identity_type, "identity_id": identity_id})
+
+
+async def _identity_handler(event: Event) -> None:
+    identity_changed(event.data["identity_type"], event.data["identity_id"])
+
+
+def _identity_broadcast(data: dict) -> None:
+    identity_cache.invalidate(data["identity_type"], data["identity_id"])
+
+
+def aggregates_changed(*groups: str) -> None:
+    """Drop cached aggregate responses of ``groups`` on this and every other worker."""
+    response_cache.invalidate(*groups)
+    event_bridge.broadcast("aggregates", {"groups": list(groups)})
+
+
+async def _aggregates_handler(event: Event) -> None:
+    aggregates_changed(*event.data["groups"])
+
+
+def _aggregates_broadcast(data: dict) -> None:
+    response_cache.invalidate(*data["groups"])
 
 
 def setup_event_handlers() -> None:
@@ -82,3 +227,7 @@ def setup_event_handlers() -> None:
     event_bus.subscribe("order_status_changed", _ws_order_handler)
     event_bus.subscribe("module_discovered", _ws_printer_handler)
     event_bus.subscribe("notification", _ws_notification_handler)
+    event_bus.subscribe("identity_changed", _identity_handler)
+    event_bridge.on_broadcast("identity", _identity_broadcast)
+    event_bus.subscribe("aggregates_changed", _aggregates_handler)
+    event_bridge.on_broadcast("aggregates", _aggregates_broadcast)
@@ -0,0 +1,154 @@
+"""Cache of resolved request identities.
+
+Every authenticated request used to decode its JWT and load the user row, or
+hash its agent API key and look the agent up (twice on a miss, because of the
+plaintext fallback). :data:`identity_cache` keeps the resolved identity dicts
+in a bounded LRU keyed by a SHA-256 of the presented credential, so the raw
+token never sits in memory as a key.
+
+Entries live for ``IDENTITY_CACHE_TTL_S`` seconds and never past the JWT's own
+expiry. Unknown credentials are cached as misses for
+``IDENTITY_CACHE_NEGATIVE_TTL_S`` so a client hammering a bad key costs one
+lookup per window instead of two queries per request.
+
+Routes that change a user or agent in a way auth cares about (status, role,
+password, profile, key rotation, deletion) call
+:func:`api.events.identity_changed` after their write commits; that drops the
+principal's entries here and, through the event bridge, on every other
+worker. Other columns in the cached rows (reputation, counters) may be up to
+one TTL stale. A store that started before an invalidation is discarded, so a
+request racing the write cannot put the old row back.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+IDENTITY_CACHE_TTL_S = float(os.environ.get("IDENTITY_CACHE_TTL_S", "30"))
+IDENTITY_CACHE_NEGATIVE_TTL_S = float(os.environ.get("IDENTITY_CACHE_NEGATIVE_TTL_S", "10"))
+IDENTITY_CACHE_MAX = int(os.environ.get("IDENTITY_CACHE_MAX", "10000"))
+
+
+class _Entry(NamedTuple):
+    identity: Optional[dict]
+    expires: float  # time.monotonic()
+    principal: Optional[tuple[str, str]]
+
+
+def _key(namespace: str, credential: str) -> bytes:
+    return hashlib.sha256(f"{namespace}:{credential}".encode("utf-8")).digest()
+
+
+class IdentityCache:
+    """TTL LRU of identity dicts (or ``None`` for rejected credentials)."""
+
+    def __init__(
+        self,
+        ttl: float = IDENTITY_CACHE_TTL_S,
+        negative_ttl: float = IDENTITY_CACHE_NEGATIVE_TTL_S,
+        max_size: int = IDENTITY_CACHE_MAX,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, _Entry] = OrderedDict()
+        self._by_principal: dict[tuple[str, str], set[bytes]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    @property
+    def generation(self) -> int:
+        """Read before resolving a miss and pass to :meth:`put`."""
+        return self._generation
+
+    def get(self, namespace: str, credential: str) -> tuple[bool, Optional[dict]]:
+        """(found, identity). A found ``None`` means the credential was rejected recently."""
+        if self.max_size <= 0:
+            return False, None
+        key = _key(namespace, credential)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    if entry.identity is None:
+                        self.metrics["negative_hits"] += 1
+                        return True, None
+                    self.metrics["hits"] += 1
+                    return True, dict(entry.identity)
+                self._drop(key)
+            self.metrics["misses"] += 1
+        return False, None
+
+    def put(
+        self,
+        namespace: str,
+        credential: str,
+        identity: Optional[dict],
+        generation: int,
+        max_age: Optional[float] = None,
+    ) -> None:
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl if identity is not None else self.negative_ttl
+        if max_age is not None:
+            ttl = min(ttl, max_age)
+        if ttl <= 0:
+            return
+        principal = (identity["identity_type"], identity["identity_id"]) if identity is not None else None
+        key = _key(namespace, credential)
+        with self._lock:
+            if generation != self._generation:
+                return  # invalidated while this identity was being loaded
+            self._drop(key)
+            self._entries[key] = _Entry(dict(identity) if identity is not None else None, time.monotonic() + ttl, principal)
+            if principal is not None:
+                self._by_principal.setdefault(principal, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.metrics["evictions"] += 1
+
+    def forget(self, namespace: str, credential: str) -> None:
+        with self._lock:
+            self._drop(_key(namespace, credential))
+
+    def invalidate(self, identity_type: str, identity_id: str) -> int:
+        """Drop every cached credential of one user or agent; returns how many."""
+        with self._lock:
+            self._generation += 1
+            keys = self._by_principal.pop((identity_type, identity_id), set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.metrics["invalidations"] += 1
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_principal.clear()
+
+    def _drop(self, key: bytes) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.principal is None:
+            return
+        keys = self._by_principal.get(entry.principal)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_principal[entry.principal]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["negative_hits"] + self.metrics["misses"]
+            hit_rate = (self.metrics["hits"] + self.metrics["negative_hits"]) / lookups if lookups else 0.0
+            return {"size": len(self._entries), "hit_rate": round(hit_rate, 4), **self.metrics}
+
+
+identity_cache = IdentityCache()
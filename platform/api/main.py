@@ -2,23 +2,29 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 import traceback
-from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from .audit import init_audit_table
-from .database import get_db, init_db
-from .events import setup_event_handlers
+from .audit import audit_sink, init_audit_table
+from .database import init_db
+from .db_pool import PoolTimeoutError
+from .event_transport import create_transport
+from .events import event_bridge, setup_event_handlers
 from .logging_config import setup_logging
 from .middleware import RequestLoggingMiddleware, AuditLogMiddleware
 from .rate_limit import RateLimitMiddleware
 from .routers import admin, agents, audit as audit_router, auth, community, components, developers, evolution, files, health, makers, match, messages, moderation, nodes, orders, proof, search, social, spaces, tags, ws
+from .services import blob_store, heartbeats, post_ranking, timeline
+from .services.counters import counter_snapshot
+from .services.mesh_analysis import mesh_analyzer
+from .services.passwords import password_pool
 from .ws_manager import manager
 
 VERSION = "0.1.0"
@@ -29,11 +35,27 @@ async def lifespan(app: FastAPI):
     setup_logging()
     init_db()
     init_audit_table()
+    await audit_sink.start()
     setup_event_handlers()
+    await event_bridge.start(create_transport())
     manager.start_heartbeat()
+    await mesh_analyzer.start()
+    background = [
+        asyncio.create_task(post_ranking.decay_loop()),
+        asyncio.create_task(timeline.trim_loop()),
+        asyncio.create_task(heartbeats.flush_loop()),
+        asyncio.create_task(blob_store.gc_loop(files.blob_store)),
+    ]
     print("🐾 RealWorldClaw API ready!")
     yield
+    for task in background:
+        task.cancel()
+    await asyncio.to_thread(heartbeats.heartbeat_buffer.flush)
     manager.stop_heartbeat()
+    await mesh_analyzer.stop()
+    password_pool.shutdown()
+    await event_bridge.stop()
+    await audit_sink.stop()
     print("👋 Shutting down...")
 
 
@@ -55,6 +77,7 @@ async def lifespan(app: FastAPI):
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Rate limiting & request logging middleware (order matters: rate limit first)
@@ -87,6 +110,13 @@ async def lifespan(app: FastAPI):
 app.include_router(developers.router, prefix="/api/v1")
 
 
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """Database pool saturated — shed load instead of queueing forever."""
+    logging.getLogger("uvicorn.error").warning("DB pool timeout on %s %s: %s", request.method, request.url.path, exc)
+    return JSONResponse(status_code=503, content={"detail": "Service busy, please retry"}, headers={"Retry-After": "1"})
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Log full traceback for unhandled exceptions instead of silent 500."""
@@ -113,42 +143,17 @@ def health():
 @app.get("/api/v1/stats")
 def stats():
     """Return counts of components, agents, and today's activity."""
-    with get_db() as db:
-        component_count = db.execute("SELECT COUNT(*) as c FROM components").fetchone()["c"]
-        agent_count = db.execute("SELECT COUNT(*) as c FROM agents").fetchone()["c"]
-        maker_count = db.execute("SELECT COUNT(*) as c FROM makers").fetchone()["c"]
-        order_count = db.execute("SELECT COUNT(*) as c FROM orders").fetchone()["c"]
-        user_count = db.execute("SELECT COUNT(*) as c FROM users").fetchone()["c"]
-        post_count = db.execute("SELECT COUNT(*) as c FROM community_posts").fetchone()["c"]
-        space_count = db.execute("SELECT COUNT(*) as c FROM nodes").fetchone()["c"]
-        comment_count = db.execute("SELECT COUNT(*) as c FROM community_comments").fetchone()["c"]
-
-        # Today's activity metrics (UTC)
-        today_start = datetime.now(timezone.utc).strftime("%Y-%m-%dT00:00:00")
-        posts_today = db.execute(
-            "SELECT COUNT(*) as c FROM community_posts WHERE created_at >= ?", (today_start,)
-        ).fetchone()["c"]
-        comments_today = db.execute(
-            "SELECT COUNT(*) as c FROM community_comments WHERE created_at >= ?", (today_start,)
-        ).fetchone()["c"]
-        active_today = db.execute(
-            """SELECT COUNT(DISTINCT author_id) as c FROM (
-                SELECT author_id FROM community_posts WHERE created_at >= ?
-                UNION
-                SELECT author_id FROM community_comments WHERE created_at >= ?
-            )""", (today_start, today_start)
-        ).fetchone()["c"]
-
+    counters = counter_snapshot.get()
     return {
-        "components": component_count,
-        "agents": agent_count,
-        "makers": maker_count,
-        "orders": order_count,
-        "users": user_count,
-        "posts": post_count,
-        "spaces": space_count,
-        "comments": comment_count,
-        "active_today": active_today,
-        "posts_today": posts_today,
-        "comments_today": comments_today,
+        "components": counters["components"],
+        "agents": counters["agents"],
+        "makers": counters["makers"],
+        "orders": counters["orders"],
+        "users": counters["users"],
+        "posts": counters["posts"],
+        "spaces": counters["spaces"],
+        "comments": counters["comments"],
+        "active_today": counters["active_today"],
+        "posts_today": counters["posts_today"],
+        "comments_today": counters["comments_today"],
     }
@@ -69,6 +69,7 @@ class CommentResponse(BaseModel):
     parent_id: Optional[str] = None
     author_name: Optional[str] = None
     replies: Optional[list['CommentResponse']] = None
+    reply_count: int = 0  # direct replies, including ones not expanded in ``replies``
     is_best_answer: bool = False
     created_at: str
     updated_at: str
@@ -134,6 +135,7 @@ class PostListResponse(BaseModel):
     page: int
     limit: int
     has_next: bool
+    next_cursor: Optional[str] = None  # pass back as ``cursor`` for the next page
 
 
 class PostDetailResponse(PostResponse):
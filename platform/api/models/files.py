@@ -1,9 +1,9 @@
 """File upload model for design files."""
 
 from __future__ import annotations
+from typing import Optional
 
-
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # ─── Request / Response schemas ──────────────────────────
@@ -14,6 +14,20 @@ class FileUploadResponse(BaseModel):
     size: int
     file_type: str
     uploaded_at: str
+    sha256: Optional[str] = None
+
+
+class MeshAnalysisInfo(BaseModel):
+    status: str  # "pending", "done" or "failed"
+    format: Optional[str] = None
+    triangles: Optional[int] = None
+    volume_mm3: Optional[float] = None
+    surface_area_mm2: Optional[float] = None
+    bbox_min: Optional[list[float]] = None
+    bbox_max: Optional[list[float]] = None
+    size_mm: Optional[list[float]] = None
+    watertight: Optional[bool] = None
+    error: Optional[str] = None
 
 
 class FileInfoResponse(BaseModel):
@@ -26,6 +40,8 @@ class FileInfoResponse(BaseModel):
     uploader_id: str
     uploader_type: str  # "user" or "agent"
     uploaded_at: str
+    sha256: Optional[str] = None
+    mesh: Optional[MeshAnalysisInfo] = None  # STL/OBJ/3MF only
 
 
 class MyFilesResponse(BaseModel):
@@ -33,6 +49,33 @@ class MyFilesResponse(BaseModel):
     total: int
 
 
+class SignedUrlResponse(BaseModel):
+    url: str
+    expires_at: str
+
+
+class FileClaimRequest(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., gt=0)
+
+
+class UploadSessionComplete(BaseModel):
+    sha256: Optional[str] = Field(None, min_length=64, max_length=64)
+
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    received: int
+    chunk_size: int
+    expires_at: str
+
+
 # ─── DB schema creation ─────────────────────────────────
 
 FILES_TABLE_SQL = """
@@ -44,6 +87,7 @@ class MyFilesResponse(BaseModel):
     file_type TEXT NOT NULL,
     mime_type TEXT NOT NULL,
     file_path TEXT NOT NULL,
+    sha256 TEXT,
     uploader_id TEXT NOT NULL,
     uploader_type TEXT NOT NULL,  -- 'user' or 'agent'
     uploaded_at TEXT NOT NULL,
@@ -53,4 +97,18 @@ class MyFilesResponse(BaseModel):
 CREATE INDEX IF NOT EXISTS idx_files_uploader ON files(uploader_id, uploader_type);
 CREATE INDEX IF NOT EXISTS idx_files_type ON files(file_type);
 CREATE INDEX IF NOT EXISTS idx_files_uploaded_at ON files(uploaded_at);
+
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id TEXT PRIMARY KEY,
+    original_filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    received INTEGER NOT NULL DEFAULT 0,
+    part_path TEXT NOT NULL,
+    uploader_id TEXT NOT NULL,
+    uploader_type TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires ON upload_sessions(expires_at);
 """
\ No newline at end of file
@@ -84,6 +84,16 @@ class NodeHeartbeatRequest(BaseModel):
     queue_length: int = Field(default=0, ge=0)
 
 
+class NodeBulkHeartbeatItem(NodeHeartbeatRequest):
+    """One node's entry in a bulk heartbeat"""
+    node_id: str = Field(..., min_length=1, max_length=64)
+
+
+class NodeBulkHeartbeatRequest(BaseModel):
+    """Heartbeats for several nodes of the same owner"""
+    heartbeats: List[NodeBulkHeartbeatItem] = Field(..., min_length=1, max_length=500)
+
+
 class NodeMatchRequest(BaseModel):
     """Request to find nodes matching design requirements"""
     required_materials: List[MaterialSupport] = Field(default_factory=list)
@@ -94,6 +104,7 @@ class NodeMatchRequest(BaseModel):
     max_distance_km: Optional[float] = Field(None, gt=0)
     latitude: Optional[float] = Field(None, ge=-90.0, le=90.0)
     longitude: Optional[float] = Field(None, ge=-180.0, le=180.0)
+    k: Optional[int] = Field(None, ge=1, le=500, description="Return only the k nearest matches")
 
 
 class NodeUpdateRequest(BaseModel):
@@ -424,11 +424,39 @@ class OrderStatusUpdate(BaseModel):
     status: OrderStatus
 
 
+class SliceProfileOverrides(BaseModel):
+    """Subset of ``printer_adapter.SliceProfile`` that affects print time and filament."""
+    layer_height: Optional[float] = Field(None, gt=0, le=1.0)
+    nozzle_diameter: Optional[float] = Field(None, gt=0, le=2.0)
+    infill_density: Optional[int] = Field(None, ge=0, le=100)
+    wall_count: Optional[int] = Field(None, ge=1, le=20)
+    top_layers: Optional[int] = Field(None, ge=0, le=50)
+    bottom_layers: Optional[int] = Field(None, ge=0, le=50)
+    support: Optional[bool] = None
+    speed: Optional[int] = Field(None, gt=0, le=1000)
+
+
 class OrderEstimateRequest(BaseModel):
     material: str = "PLA"
     quantity: int = 1
     urgency: str = "normal"
     maker_id: Optional[str] = None
+    file_id: Optional[str] = None
+    profile: Optional[SliceProfileOverrides] = None
+
+
+class QuoteOption(BaseModel):
+    material: str = "PLA"
+    quantity: int = Field(1, ge=1, le=10000)
+    urgency: str = "normal"
+
+
+class OrderBatchEstimateRequest(BaseModel):
+    options: list[QuoteOption] = Field(..., min_length=1, max_length=200)
+    file_id: Optional[str] = None
+    profile: Optional[SliceProfileOverrides] = None
+    maker_ids: Optional[list[str]] = Field(None, max_length=200)  # default: every open maker that fits
+    max_makers: int = Field(10, ge=1, le=200)  # cheapest makers listed per option
 
 
 class OrderShippingUpdate(BaseModel):
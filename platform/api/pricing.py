@@ -1,18 +1,158 @@
-"""Pricing engine for manufacturing orders."""
+"""Pricing engine for manufacturing orders.
+
+A quote is ``maker rate x print hours x quantity x urgency``. Print hours
+come from :func:`estimate_print` when the design's mesh has been analysed
+(volume, surface area and height sliced against a ``SliceProfile``);
+without geometry the flat ``DEFAULT_HOURS_PER_UNIT`` is used.
+:func:`quote_grid` prices many quantity/urgency options against many maker
+rates at once (one outer product with NumPy, nested loops without), and
+print estimates are memoized per (content hash, profile) since the same
+design is quoted over and over.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from typing import Optional
+
+from printer_adapter import SliceProfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_HOURLY_RATE = 30.0  # 默认30元/小时
+DEFAULT_HOURS_PER_UNIT = 2.0
+PRICING_CACHE_MAX = int(os.environ.get("PRICING_CACHE_MAX", "4096"))
+
+# g/cm³; unknown materials are priced as PLA
+MATERIAL_DENSITY_G_CM3 = {
+    "PLA": 1.24, "PETG": 1.27, "ABS": 1.04, "ASA": 1.07, "TPU": 1.21, "NYLON": 1.14, "PA": 1.14, "PC": 1.20,
+}
+
+# Print-time model constants
+LINE_WIDTH_FACTOR = 1.125   # extrusion width relative to the nozzle
+PRINT_EFFICIENCY = 0.5      # average speed vs. the profile's peak speed (accel, travel, slow walls)
+LAYER_OVERHEAD_S = 1.5      # layer change, retraction, wipe
+SUPPORT_FACTOR = 0.15       # support material as a share of part volume
+MIN_HOURS_PER_UNIT = 0.1
+
+# Profile fields that change time or mass; others (temperatures, bed size) do not
+_PROFILE_KEY_FIELDS = (
+    "layer_height", "nozzle_diameter", "infill_density", "wall_count",
+    "top_layers", "bottom_layers", "support", "speed",
+)
+_PROFILE_FIELDS = {f.name for f in fields(SliceProfile)}
+
+
+@dataclass(frozen=True)
+class PrintEstimate:
+    hours_per_unit: float
+    extruded_cm3: float
+    layers: int
+
+    def filament_g(self, material: str) -> float:
+        return round(self.extruded_cm3 * material_density(material), 2)
+
+
+def material_density(material: Optional[str]) -> float:
+    return MATERIAL_DENSITY_G_CM3.get((material or "PLA").upper(), MATERIAL_DENSITY_G_CM3["PLA"])
+
+
+def urgency_multiplier(urgency: str) -> float:
+    return 1.5 if urgency == "express" else 1.0
+
+
+def slice_profile(overrides: Optional[dict] = None) -> SliceProfile:
+    """Default ``SliceProfile`` with the given (non-None) fields replaced."""
+    changes = {k: v for k, v in (overrides or {}).items() if v is not None and k in _PROFILE_FIELDS}
+    return replace(SliceProfile(), **changes)
+
+
+def estimate_print(volume_mm3: float, surface_area_mm2: float, height_mm: float, profile: SliceProfile) -> PrintEstimate:
+    """Print time and extruded volume of one part from its mesh metrics.
+
+    Walls are ``wall_count`` extrusion widths over the whole surface, top and
+    bottom skins cover the average cross-section, and the rest of the
+    interior is filled at ``infill_density``.
+    """
+    line_width = profile.nozzle_diameter * LINE_WIDTH_FACTOR
+    layers = max(1, math.ceil(height_mm / profile.layer_height))
+    shell = min(volume_mm3, surface_area_mm2 * profile.wall_count * line_width)
+    cross_section = volume_mm3 / height_mm if height_mm > 0 else 0.0
+    skin = min(volume_mm3 - shell, cross_section * (profile.top_layers + profile.bottom_layers) * profile.layer_height)
+    interior = max(volume_mm3 - shell - skin, 0.0)
+    extruded = shell + skin + interior * profile.infill_density / 100.0
+    if profile.support:
+        extruded += volume_mm3 * SUPPORT_FACTOR
+    flow = line_width * profile.layer_height * profile.speed * PRINT_EFFICIENCY  # mm³/s
+    seconds = extruded / flow + layers * LAYER_OVERHEAD_S
+    return PrintEstimate(
+        hours_per_unit=round(max(seconds / 3600.0, MIN_HOURS_PER_UNIT), 3),
+        extruded_cm3=round(extruded / 1000.0, 3),
+        layers=layers,
+    )
+
+
+class _EstimateCache:
+    """LRU of :class:`PrintEstimate` keyed by (content hash, relevant profile fields)."""
+
+    def __init__(self, max_size: int = PRICING_CACHE_MAX):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple, PrintEstimate] = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0}
+
+    def get(self, sha256: str, metrics: dict, profile: SliceProfile) -> PrintEstimate:
+        key = (sha256, *(getattr(profile, name) for name in _PROFILE_KEY_FIELDS))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.metrics["hits"] += 1
+                return cached
+            self.metrics["misses"] += 1
+        estimate = estimate_print(metrics["volume_mm3"], metrics["surface_area_mm2"], metrics["height_mm"], profile)
+        with self._lock:
+            self._entries[key] = estimate
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return estimate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), **self.metrics}
+
+
+estimate_cache = _EstimateCache()
+
+
+def quote_grid(hours_per_unit: float, rates: list[float], options: list[tuple[int, str]]) -> list[list[float]]:
+    """Totals for every (quantity, urgency) option against every maker rate: ``grid[option][maker]``."""
+    factors = [hours_per_unit * quantity * urgency_multiplier(urgency) for quantity, urgency in options]
+    if np is not None:
+        return np.round(np.outer(factors, np.asarray(rates, dtype=np.float64)), 2).tolist()
+    return [[round(factor * rate, 2) for rate in rates] for factor in factors]
+
 
 def estimate_price(
     material: str,
     quantity: int,
-    maker_hourly_rate: float = 30.0,  # 默认30元/小时
-    estimated_hours_per_unit: float = 2.0,
+    maker_hourly_rate: float = DEFAULT_HOURLY_RATE,
+    estimated_hours_per_unit: float = DEFAULT_HOURS_PER_UNIT,
     urgency: str = "normal"
 ) -> dict:
     """Calculate estimated order price."""
-    urgency_multiplier = 1.5 if urgency == "express" else 1.0
+    urgency_mult = urgency_multiplier(urgency)
     base_cost = maker_hourly_rate * estimated_hours_per_unit * quantity
-    total = round(base_cost * urgency_multiplier, 2)
+    total = round(base_cost * urgency_mult, 2)
     platform_fee = 0.0  # 零抽佣
-    
+
     return {
         "estimated_price_cny": total,
         "platform_fee_cny": platform_fee,
@@ -21,7 +161,7 @@ def estimate_price(
             "maker_rate_per_hour": maker_hourly_rate,
             "hours_per_unit": estimated_hours_per_unit,
             "quantity": quantity,
-            "urgency_multiplier": urgency_multiplier,
+            "urgency_multiplier": urgency_mult,
             "base_cost": round(base_cost, 2),
         }
-    }
\ No newline at end of file
+    }
@@ -1,15 +1,41 @@
-"""RealWorldClaw — Simple in-memory IP-based rate limiting."""
+"""RealWorldClaw — rate limiting shared by the HTTP middleware and per-action limits.
+
+Limits use GCRA (generic cell rate algorithm), a token bucket that stores a
+single "theoretical arrival time" per key: ``limit`` requests may burst, then
+one more is allowed every ``window / limit`` seconds.
+
+Backends (``RATE_LIMIT_BACKEND``):
+
+- ``local`` (default): per-process, bounded LRU of keys with periodic eviction
+  of keys whose bucket has refilled.
+- ``redis``: shared by every worker via one Lua script per hit, spoken over
+  the Redis protocol (RESP) with the standard library only. Any server that
+  implements EVALSHA/EVAL works. Hits use a small connection pool, and the
+  middleware runs them on the threadpool. On errors the limiter fails open
+  and stops contacting the server for a backoff period that doubles up to
+  ``RATE_LIMIT_REDIS_BACKOFF_MAX_S``.
+"""
 
 from __future__ import annotations
 
+import logging
+import math
 import os
+import threading
 import time
-from collections import defaultdict
-from typing import Callable
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Protocol
 
-from fastapi import HTTPException, Request
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
+
+from .resp import RedisProtocolError, RedisURL, RespConnection
+
+logger = logging.getLogger(__name__)
+
 
 def _is_testing() -> bool:
     return os.getenv("TESTING", "").lower() in ("1", "true", "yes")
@@ -20,33 +46,227 @@ def _is_testing() -> bool:
 AUTH_LIMIT = 10  # per minute
 WINDOW = 60  # seconds
 
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "local").lower()
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_REDIS_POOL = int(os.environ.get("RATE_LIMIT_REDIS_POOL", "8"))
+RATE_LIMIT_REDIS_BACKOFF_MAX_S = float(os.environ.get("RATE_LIMIT_REDIS_BACKOFF_MAX_S", "30"))
+_BACKOFF_BASE_S = 0.5
+_EVICT_INTERVAL_S = 60
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the next request would be allowed (0 when allowed)
+
+
+class RateLimiter(Protocol):
+    blocking: bool  # hit() does network I/O; async callers must not run it on the event loop
 
-class _TokenBucket:
-    """Simple sliding-window counter per IP."""
+    def hit(self, key: str, limit: int, window: float) -> RateLimitResult: ...
 
-    def __init__(self) -> None:
-        self._hits: dict[str, list[float]] = defaultdict(list)
+    def reset(self) -> None: ...
 
-    def is_allowed(self, key: str, limit: int, window: int) -> tuple[bool, int]:
-        now = time.monotonic()
-        bucket = self._hits[key]
-        # Prune old entries
-        cutoff = now - window
-        self._hits[key] = bucket = [t for t in bucket if t > cutoff]
-        if len(bucket) >= limit:
-            return False, limit - len(bucket)
-        bucket.append(now)
-        return True, limit - len(bucket)
 
-    def cleanup(self, max_age: float = 300) -> None:
-        """Remove stale keys (call periodically if needed)."""
-        now = time.monotonic()
-        stale = [k for k, v in self._hits.items() if not v or v[-1] < now - max_age]
+def _gcra(tat: float | None, now: float, limit: int, window: float) -> tuple[float | None, RateLimitResult]:
+    """One GCRA step: return (new TAT to store or None when denied, result)."""
+    interval = window / limit
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + interval
+    allow_at = new_tat - window
+    if allow_at - now > 1e-9:  # tolerance for float rounding at the burst edge
+        return None, RateLimitResult(False, 0, allow_at - now)
+    remaining = int((window - (new_tat - now)) / interval + 1e-9)
+    return new_tat, RateLimitResult(True, max(0, remaining), 0.0)
+
+
+# ─── Local backend ───────────────────────────────────────
+
+
+class LocalRateLimiter:
+    """In-process GCRA with O(1) state per key and a bounded LRU key store."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._tat: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_evict = clock() + _EVICT_INTERVAL_S
+
+    def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        now = self._clock()
+        with self._lock:
+            new_tat, result = _gcra(self._tat.get(key), now, limit, window)
+            if new_tat is not None:
+                self._tat[key] = new_tat
+                while len(self._tat) > self.max_keys:
+                    self._tat.popitem(last=False)
+            if key in self._tat:
+                # Denied keys count as recent too, so a blocked client stays blocked
+                self._tat.move_to_end(key)
+            if now >= self._next_evict:
+                self._evict_locked(now)
+        return result
+
+    def _evict_locked(self, now: float) -> int:
+        # A key whose TAT has passed has a full bucket: same as an unknown key
+        stale = [k for k, tat in self._tat.items() if tat <= now]
         for k in stale:
-            del self._hits[k]
+            del self._tat[k]
+        self._next_evict = now + _EVICT_INTERVAL_S
+        return len(stale)
+
+    def evict(self) -> int:
+        """Drop keys whose bucket has fully refilled; returns how many were removed."""
+        with self._lock:
+            return self._evict_locked(self._clock())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tat.clear()
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+
+# ─── Redis backend ───────────────────────────────────────
+
+# KEYS[1] = bucket key; ARGV = limit, window seconds. Uses the server clock so
+# every worker agrees on "now". Returns {allowed, remaining, retry_after}.
+_GCRA_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = window / limit
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if tat == nil or tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - window
+if allow_at - now > 1e-9 then
+  return {0, 0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, math.floor((window - (new_tat - now)) / interval + 1e-9), '0'}
+"""
+
+
+class RedisRateLimiter:
+    """GCRA evaluated atomically in Redis so limits hold across workers and machines."""
+
+    blocking = True
+
+    def __init__(
+        self,
+        url: str = RATE_LIMIT_REDIS_URL,
+        prefix: str = "rl:",
+        timeout: float = 0.5,
+        pool_size: int = RATE_LIMIT_REDIS_POOL,
+        backoff_max: float = RATE_LIMIT_REDIS_BACKOFF_MAX_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.url = RedisURL.parse(url)
+        self.prefix = prefix
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._idle: list[RespConnection] = []
+        self._sha: str | None = None
+        self._lock = threading.Lock()  # guards the idle pool and the breaker state
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def _connect(self) -> RespConnection:
+        return RespConnection.open(self.url, self.timeout)
+
+    def _acquire(self) -> RespConnection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, conn: RespConnection) -> None:
+        with self._lock:
+            self._failures = 0
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _trip(self, exc: Exception) -> None:
+        """Fail open and leave the server alone for a doubling backoff."""
+        with self._lock:
+            self._failures += 1
+            delay = min(self.backoff_max, _BACKOFF_BASE_S * 2 ** (self._failures - 1))
+            self._retry_at = self._clock() + delay
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        logger.warning("Rate limiter backend unavailable, allowing requests for %.1fs: %s", delay, exc)
+
+    def _eval(self, conn: RespConnection, key: str, limit: int, window: float) -> list:
+        if self._sha is None:
+            self._sha = conn.command("SCRIPT", "LOAD", _GCRA_LUA)
+        try:
+            return conn.command("EVALSHA", self._sha, 1, key, limit, window)
+        except RedisProtocolError as exc:
+            if not str(exc).startswith("NOSCRIPT"):
+                raise
+            # Script cache flushed (restart/failover): send the body once more
+            return conn.command("EVAL", _GCRA_LUA, 1, key, limit, window)
+
+    def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        if self._clock() < self._retry_at:
+            return RateLimitResult(True, limit, 0.0)
+        conn = None
+        try:
+            conn = self._acquire()
+            allowed, remaining, retry_after = self._eval(conn, self.prefix + key, limit, window)
+        except (OSError, ConnectionError, RedisProtocolError, ValueError) as exc:
+            if conn is not None:
+                conn.close()
+            self._trip(exc)
+            return RateLimitResult(True, limit, 0.0)
+        self._release(conn)
+        return RateLimitResult(bool(allowed), int(remaining), float(retry_after))
+
+    def reset(self) -> None:
+        """Drop every bucket under this limiter's prefix (FLUSHDB when the prefix is empty)."""
+        conn = self._acquire()
+        if not self.prefix:
+            conn.command("FLUSHDB")
+        else:
+            cursor = "0"
+            while True:
+                cursor, keys = conn.command("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+                if keys:
+                    conn.command("DEL", *keys)
+                if cursor == "0":
+                    break
+        with self._lock:
+            self._retry_at = 0.0
+        self._release(conn)
+
+
+def _create_limiter() -> RateLimiter:
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimiter(RATE_LIMIT_REDIS_URL)
+    return LocalRateLimiter()
+
+
+limiter: RateLimiter = _create_limiter()
 
 
-_bucket = _TokenBucket()
+def check_rate(key: str, limit: int, window: float) -> bool:
+    """Per-action limit shared across routers: True if allowed, False if rate-limited."""
+    if _is_testing():
+        return True
+    return limiter.hit(key, limit, window).allowed
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
@@ -62,16 +282,24 @@ async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Determine limit
         is_auth = any(path.startswith(p) for p in AUTH_PREFIXES)
         limit = AUTH_LIMIT if is_auth else DEFAULT_LIMIT
-        key = f"{client_ip}:auth" if is_auth else client_ip
+        key = f"ip:{client_ip}:auth" if is_auth else f"ip:{client_ip}"
 
-        allowed, remaining = _bucket.is_allowed(key, limit, WINDOW)
-        if not allowed:
-            raise HTTPException(
+        if limiter.blocking:
+            result = await run_in_threadpool(limiter.hit, key, limit, WINDOW)
+        else:
+            result = limiter.hit(key, limit, WINDOW)
+        if not result.allowed:
+            return JSONResponse(
                 status_code=429,
-                detail="Too many requests. Please try again later.",
+                content={"detail": "Too many requests. Please try again later."},
+                headers={
+                    "Retry-After": str(max(1, math.ceil(result.retry_after))),
+                    "X-RateLimit-Limit": str(limit),
+                    "X-RateLimit-Remaining": "0",
+                },
             )
 
         response = await call_next(request)
         response.headers["X-RateLimit-Limit"] = str(limit)
-        response.headers["X-RateLimit-Remaining"] = str(max(0, remaining))
+        response.headers["X-RateLimit-Remaining"] = str(result.remaining)
         return response
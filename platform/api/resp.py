@@ -0,0 +1,98 @@
+"""Minimal Redis protocol (RESP2) client on the standard library.
+
+Shared by the Redis rate limiter and the Redis event transport so neither
+needs redis-py. Any server speaking RESP2 (Redis, Valkey, KeyDB, Dragonfly)
+works.
+"""
+
+from __future__ import annotations
+
+import socket
+from dataclasses import dataclass
+from urllib.parse import unquote, urlparse
+
+
+class RedisProtocolError(RuntimeError):
+    pass
+
+
+@dataclass
+class RedisURL:
+    host: str
+    port: int
+    password: str | None
+    db: int
+
+    @classmethod
+    def parse(cls, url: str) -> "RedisURL":
+        parsed = urlparse(url)
+        return cls(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            password=unquote(parsed.password) if parsed.password else None,
+            db=int(parsed.path.lstrip("/") or 0),
+        )
+
+
+class RespConnection:
+    """One RESP2 connection: request/reply commands, or raw send/read for pub/sub."""
+
+    def __init__(self, host: str, port: int, timeout: float | None):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._sock.makefile("rb")
+
+    @classmethod
+    def open(cls, url: RedisURL, timeout: float | None) -> "RespConnection":
+        conn = cls(url.host, url.port, timeout)
+        if url.password:
+            conn.command("AUTH", url.password)
+        if url.db:
+            conn.command("SELECT", url.db)
+        return conn
+
+    def send(self, *args) -> None:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(parts))
+
+    def command(self, *args) -> object:
+        self.send(*args)
+        return self.read()
+
+    def read(self) -> object:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisProtocolError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            size = int(payload)
+            if size < 0:
+                return None
+            data = self._file.read(size + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            size = int(payload)
+            return None if size < 0 else [self.read() for _ in range(size)]
+        raise RedisProtocolError(f"Unexpected reply: {line!r}")
+
+    def shutdown(self) -> None:
+        """Unblock a thread waiting in :meth:`read` (used to stop subscribers)."""
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        try:
+            self._file.close()
+            self._sock.close()
+        except OSError:
+            pass
@@ -11,6 +11,7 @@
 
 from ..database import get_db
 from ..deps import require_role
+from ..services.counters import counter_snapshot
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -20,23 +21,18 @@
 @router.get("/stats")
 def admin_stats(user: dict = Depends(require_role("admin"))):
     """System statistics for the monitoring dashboard."""
+    counters = counter_snapshot.get()
     with get_db() as db:
-        total_users = db.execute("SELECT COUNT(*) as c FROM users").fetchone()["c"]
-        total_orders = db.execute("SELECT COUNT(*) as c FROM orders").fetchone()["c"]
-        active_makers = db.execute(
-            "SELECT COUNT(*) as c FROM makers WHERE availability = 'open'"
-        ).fetchone()["c"]
-
-        # 24h request count from audit log (approximate)
+        # 24h request count from audit log (approximate); a range scan on idx_audit_timestamp
         since = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
         audit_24h = db.execute(
             "SELECT COUNT(*) as c FROM audit_log WHERE timestamp > ?", (since,)
         ).fetchone()["c"]
 
     return {
-        "total_users": total_users,
-        "total_orders": total_orders,
-        "active_makers": active_makers,
+        "total_users": counters["users"],
+        "total_orders": counters["orders"],
+        "active_makers": counters["makers_open"],
         "audit_events_24h": audit_24h,
     }
 
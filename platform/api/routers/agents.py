@@ -17,8 +17,10 @@
 from fastapi import APIRouter, Depends, File, Header, HTTPException, UploadFile
 from pydantic import BaseModel
 
-from ..api_keys import find_agent_by_api_key, hash_api_key
+from ..api_keys import hash_api_key
 from ..database import get_db
+from ..deps import resolve_agent_identity
+from ..events import identity_changed
 from ..models.schemas import (
     AgentRegisterRequest,
     AgentRegisterResponse,
@@ -147,12 +149,10 @@ def get_current_agent(authorization: str = Header(...)):
     """简易鉴权：从 Bearer token 查找 agent"""
     if not authorization.startswith("Bearer "):
         raise HTTPException(401, "Invalid authorization header")
-    api_key = authorization[7:]
-    with get_db() as db:
-        row = find_agent_by_api_key(db, api_key)
-    if not row:
+    agent = resolve_agent_identity(authorization[7:])
+    if not agent:
         raise HTTPException(401, "Invalid API key")
-    return dict(row)
+    return agent
 
 
 # ─── GET /agents ──────────────────────────────────────────
@@ -316,6 +316,7 @@ async def claim_agent(
             "UPDATE agents SET status = 'active', claim_token = NULL, verification_code = NULL, updated_at = ? WHERE id = ?",
             (now, row["id"]),
         )
+    identity_changed("agent", row["id"])
     return {
         "agent_id": row["id"],
         "status": "active",
@@ -408,6 +409,7 @@ def update_me(req: AgentUpdateRequest, agent: dict = Depends(get_current_agent))
         if new_tier != row["tier"]:
             db.execute("UPDATE agents SET tier = ? WHERE id = ?", (new_tier, row["id"]))
             row = db.execute("SELECT * FROM agents WHERE id = ?", (agent["id"],)).fetchone()
+    identity_changed("agent", agent["id"])
 
     return _row_to_agent(row)
 
@@ -447,6 +449,7 @@ async def upload_agent_avatar(
             "UPDATE agents SET avatar_url = ?, updated_at = ? WHERE id = ?",
             (avatar_url, now, agent_id),
         )
+    identity_changed("agent", agent_id)
 
     return {"agent_id": agent_id, "avatar_url": avatar_url, "updated_at": now}
 
@@ -465,6 +468,7 @@ def rotate_agent_key(agent_id: str, agent: dict = Depends(get_current_agent)):
             "UPDATE agents SET api_key = ?, updated_at = ? WHERE id = ?",
             (new_api_key_hash, now, agent_id),
         )
+    identity_changed("agent", agent_id)
 
     return {"agent_id": agent_id, "api_key": new_api_key, "rotated_at": now}
 
@@ -2,33 +2,20 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
-import time
 import uuid
-from collections import defaultdict
 from datetime import datetime, timezone
 
 import httpx
 
 logger = logging.getLogger(__name__)
 
-# Simple in-memory rate limiter (resets on restart — fine for SQLite scale)
-_rate_buckets: dict[str, list[float]] = defaultdict(list)
-
 
 def _rate_check(key: str, max_calls: int, window_sec: int) -> bool:
     """Return True if request is allowed, False if rate-limited."""
-    if os.environ.get("TESTING"):
-        return True
-    now = time.monotonic()
-    bucket = _rate_buckets[key]
-    # Prune expired entries
-    _rate_buckets[key] = bucket = [t for t in bucket if now - t < window_sec]
-    if len(bucket) >= max_calls:
-        return False
-    bucket.append(now)
-    return True
+    return check_rate(f"auth:{key}", max_calls, window_sec)
 
 
 def _conflict_from_user_integrity_error(exc: Exception) -> HTTPException | None:
@@ -43,13 +30,16 @@ def _conflict_from_user_integrity_error(exc: Exception) -> HTTPException | None:
     return HTTPException(status_code=409, detail="User already exists")
 
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from google.oauth2 import id_token as google_id_token
 from google.auth.transport import requests as google_auth_requests
 from pydantic import BaseModel, Field
 
 from ..database import get_db
 from ..deps import get_current_user
+from ..events import aggregates_changed, identity_changed
+from ..identity_cache import identity_cache
 from ..models.user import (
     AuthResponse,
     RefreshRequest,
@@ -63,21 +53,40 @@ def _conflict_from_user_integrity_error(exc: Exception) -> HTTPException | None:
     create_access_token,
     create_refresh_token,
     decode_token,
-    hash_password,
-    verify_password,
 )
+from ..rate_limit import check_rate
+from ..services import conversations, timeline
+from ..services.passwords import PasswordPoolBusy, password_pool
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-@router.post("/register", response_model=AuthResponse, status_code=201)
-def register(req: UserRegisterRequest):
-    if not _rate_check(f"reg:{req.email}", max_calls=5, window_sec=3600):
-        raise HTTPException(status_code=429, detail="Too many registration attempts. Try again later.")
-    now = datetime.now(timezone.utc).isoformat()
-    user_id = f"usr_{uuid.uuid4().hex[:12]}"
-    hashed = hash_password(req.password)
+def _auth_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503, detail="Authentication is busy. Try again shortly.", headers={"Retry-After": "1"}
+    )
+
+
+async def _hash_password(password: str) -> str:
+    try:
+        return await password_pool.hash(password)
+    except PasswordPoolBusy:
+        raise _auth_busy()
 
+
+async def _verify_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    try:
+        return await password_pool.verify(plain, hashed)
+    except PasswordPoolBusy:
+        raise _auth_busy()
+
+
+# The routes below are async so they can await the password pool. Rate checks
+# (possibly Redis) and database work are sync and run on the threadpool
+# through these helpers, never on the event loop.
+
+
+def _insert_user(req: UserRegisterRequest, user_id: str, hashed: str, now: str):
     with get_db() as db:
         # Check duplicates
         if db.execute("SELECT 1 FROM users WHERE email = ?", (req.email,)).fetchone():
@@ -96,7 +105,34 @@ def register(req: UserRegisterRequest):
             if conflict:
                 raise conflict
             raise
-        row = db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+
+
+def _find_login_user(req: UserLoginRequest):
+    with get_db() as db:
+        if req.email:
+            return db.execute("SELECT * FROM users WHERE email = ?", (req.email.lower().strip(),)).fetchone()
+        if req.username:
+            return db.execute("SELECT * FROM users WHERE username = ?", (req.username,)).fetchone()
+    raise HTTPException(status_code=400, detail="Email or username required")
+
+
+def _store_password(user_id: str, hashed: str, now: str | None = None) -> None:
+    with get_db() as db:
+        if now is None:
+            db.execute("UPDATE users SET hashed_password = ? WHERE id = ?", (hashed, user_id))
+        else:
+            db.execute("UPDATE users SET hashed_password = ?, updated_at = ? WHERE id = ?", (hashed, now, user_id))
+
+
+@router.post("/register", response_model=AuthResponse, status_code=201)
+async def register(req: UserRegisterRequest):
+    if not await run_in_threadpool(_rate_check, f"reg:{req.email}", max_calls=5, window_sec=3600):
+        raise HTTPException(status_code=429, detail="Too many registration attempts. Try again later.")
+    now = datetime.now(timezone.utc).isoformat()
+    user_id = f"usr_{uuid.uuid4().hex[:12]}"
+    hashed = await _hash_password(req.password)
+    row = await run_in_threadpool(_insert_user, req, user_id, hashed, now)
 
     token_data = {"sub": user_id, "role": "user"}
     return AuthResponse(
@@ -107,25 +143,24 @@ def register(req: UserRegisterRequest):
 
 
 @router.post("/login", response_model=AuthResponse)
-def login(req: UserLoginRequest):
+async def login(req: UserLoginRequest):
     login_key = f"login:{req.email or req.username}"
-    if not _rate_check(login_key, max_calls=20, window_sec=300):
+    if not await run_in_threadpool(_rate_check, login_key, max_calls=20, window_sec=300):
         raise HTTPException(status_code=429, detail="Too many login attempts. Try again in 5 minutes.")
 
-    with get_db() as db:
-        if req.email:
-            row = db.execute("SELECT * FROM users WHERE email = ?", (req.email.lower().strip(),)).fetchone()
-        elif req.username:
-            row = db.execute("SELECT * FROM users WHERE username = ?", (req.username,)).fetchone()
-        else:
-            raise HTTPException(status_code=400, detail="Email or username required")
+    row = await run_in_threadpool(_find_login_user, req)
 
-    if not row or not verify_password(req.password, row["hashed_password"]):
-        time.sleep(1)  # Brute-force delay
+    verified, new_hash = await _verify_password(req.password, row["hashed_password"]) if row else (False, None)
+    if not verified:
+        await asyncio.sleep(1)  # Brute-force delay
         logger.warning("Failed login attempt for %s", req.email or req.username)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     if not row["is_active"]:
         raise HTTPException(status_code=403, detail="Account deactivated")
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made
+        await run_in_threadpool(_store_password, row["id"], new_hash)
+        identity_changed("user", row["id"])
 
     token_data = {"sub": row["id"], "role": row["role"]}
     return AuthResponse(
@@ -192,6 +227,7 @@ def update_me(req: UserUpdateRequest, user: dict = Depends(get_current_user)):
         values = list(updates.values()) + [now, user["id"]]
         db.execute(f"UPDATE users SET {set_clause}, updated_at = ? WHERE id = ?", values)
         row = db.execute("SELECT * FROM users WHERE id = ?", (user["id"],)).fetchone()
+    identity_changed("user", user["id"])
 
     return _user_response(row)
 
@@ -202,20 +238,24 @@ class _ChangePasswordRequest(BaseModel):
 
 
 @router.post("/change-password")
-def change_password(req: _ChangePasswordRequest, user: dict = Depends(get_current_user)):
-    if not verify_password(req.current_password, user["hashed_password"]):
+async def change_password(req: _ChangePasswordRequest, user: dict = Depends(get_current_user)):
+    verified, _ = await _verify_password(req.current_password, user["hashed_password"])
+    if not verified:
         raise HTTPException(status_code=400, detail="Current password is incorrect")
 
     now = datetime.now(timezone.utc).isoformat()
-    hashed = hash_password(req.new_password)
-    with get_db() as db:
-        db.execute("UPDATE users SET hashed_password = ?, updated_at = ? WHERE id = ?", (hashed, now, user["id"]))
+    hashed = await _hash_password(req.new_password)
+    await run_in_threadpool(_store_password, user["id"], hashed, now)
+    identity_changed("user", user["id"])
 
     return {"message": "Password updated successfully"}
 
 
 @router.post("/logout")
-def logout():
+def logout(authorization: str | None = Header(default=None)):
+    # Tokens are stateless; only this worker's cached resolution is dropped
+    if authorization and authorization.startswith("Bearer "):
+        identity_cache.forget("bearer", authorization.removeprefix("Bearer "))
     return {"message": "Logged out successfully"}
 
 
@@ -228,9 +268,11 @@ def delete_account(user: dict = Depends(get_current_user)):
     with get_db() as db:
         # Delete private messages in both directions first.
         db.execute("DELETE FROM direct_messages WHERE sender_id = ? OR recipient_id = ?", (user_id, user_id))
+        conversations.remove_user(db, user_id)
 
         # Remove follow relationships.
         db.execute("DELETE FROM follows WHERE follower_id = ? OR following_id = ?", (user_id, user_id))
+        timeline.remove_user(db, user_id)
 
         # Remove comments and votes authored by this user.
         db.execute("DELETE FROM community_comments WHERE author_id = ?", (user_id,))
@@ -246,6 +288,8 @@ def delete_account(user: dict = Depends(get_current_user)):
 
         # Finally remove user account.
         db.execute("DELETE FROM users WHERE id = ?", (user_id,))
+    identity_changed("user", user_id)
+    aggregates_changed("community_regions")
 
     logger.info("Account deleted: user=%s", user_id)
     return {"message": "Account deleted. Your data has been removed."}
@@ -276,7 +320,10 @@ def _oauth_find_or_create(db, *, email: str, username: str, oauth_provider: str,
     while db.execute("SELECT 1 FROM users WHERE username = ?", (uname,)).fetchone():
         suffix += 1
         uname = f"{base}_{suffix}"
-    hashed = hash_password(uuid.uuid4().hex)  # random password
+    try:
+        hashed = password_pool.hash_blocking(uuid.uuid4().hex)  # random password
+    except PasswordPoolBusy:
+        raise _auth_busy()
     db.execute(
         """INSERT INTO users (id, email, username, hashed_password, role, is_active, oauth_provider, oauth_id, created_at, updated_at)
            VALUES (?, ?, ?, ?, 'user', 1, ?, ?, ?, ?)""",
@@ -2,27 +2,27 @@
 
 from __future__ import annotations
 import logging
-import os
 logger = logging.getLogger(__name__)
 
+import base64
 import html
 import json
 import re
-import time
 import uuid
-from collections import defaultdict
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 
-from jose import JWTError
-
-from ..api_keys import find_agent_by_api_key
 from ..database import get_db
-from ..deps import get_authenticated_identity
+from ..deps import get_authenticated_identity, resolve_bearer_identity
+from ..events import aggregates_changed
 from ..notifications import send_notification
-from ..security import decode_token
+from ..rate_limit import check_rate
 from ..services.evolution import grant_agent_xp
+from ..services import counters, post_ranking, search_index, timeline
+from ..services.hydration import fetch_post_tags, resolve_authors
+from ..services.response_cache import response_cache
 from ..models.community import (
     CommentCreateRequest,
     CommentResponse,
@@ -42,20 +42,9 @@
 # Lightweight HTML sanitizer (no extra dependency)
 _TAG_RE = re.compile(r"<[^>]{0,500}>")  # bounded to prevent ReDoS
 
-# Simple in-memory rate limiter for community actions
-_community_rate: dict[str, list[float]] = defaultdict(list)
-
 def _rate_check(key: str, max_calls: int, window: int) -> bool:
-    if os.environ.get("TESTING"):
-        return True
     """Return True if request is allowed, False if rate-limited."""
-    now = time.monotonic()
-    bucket = _community_rate[key]
-    _community_rate[key] = [t for t in bucket if now - t < window]
-    if len(_community_rate[key]) >= max_calls:
-        return False
-    _community_rate[key].append(now)
-    return True
+    return check_rate(f"community:{key}", max_calls, window)
 
 def _sanitize(text: str) -> str:
     """Strip all HTML tags and escape remaining entities."""
@@ -66,33 +55,7 @@ def _get_optional_identity(authorization: str | None) -> dict | None:
     """Best-effort auth parse for endpoints that are public but can use identity-aware filters."""
     if not authorization or not authorization.startswith("Bearer "):
         return None
-
-    token = authorization.removeprefix("Bearer ")
-
-    try:
-        payload = decode_token(token)
-        if payload.get("type") == "access":
-            user_id = payload.get("sub")
-            if user_id:
-                with get_db() as db:
-                    row = db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
-                if row and row["is_active"]:
-                    result = dict(row)
-                    result["identity_type"] = "user"
-                    result["identity_id"] = row["id"]
-                    return result
-    except JWTError:
-        pass
-
-    with get_db() as db:
-        row = find_agent_by_api_key(db, token)
-    if row:
-        result = dict(row)
-        result["identity_type"] = "agent"
-        result["identity_id"] = row["id"]
-        return result
-
-    return None
+    return resolve_bearer_identity(authorization.removeprefix("Bearer "))
 
 
 def _resolve_author_type(author_id: str, db) -> str:
@@ -113,51 +76,201 @@ def _resolve_author_type(author_id: str, db) -> str:
     return "human"
 
 
-def _build_comment_tree(comments: list[dict], db=None) -> list[CommentResponse]:
-    """Build nested comment structure from flat list."""
-    comment_map = {}
-    root_comments = []
-    
-    # Create CommentResponse objects with author names
+def _build_comment_tree(
+    comments: list[dict],
+    db=None,
+    *,
+    authors: dict[str, dict] | None = None,
+    root_ids: set[str] | None = None,
+    reply_counts: dict[str, int] | None = None,
+) -> list[CommentResponse]:
+    """Build nested comment structure from a flat list in O(n), independent of row order.
+
+    Roots are comments without a parent plus any ids in ``root_ids`` (used when
+    building a page of subtrees). Authors are resolved in one batch unless
+    ``authors`` is given. ``reply_counts`` supplies direct-reply totals for
+    comments whose children were not fetched.
+    """
+    if authors is None:
+        authors = resolve_authors(db, (row.get("author_id") for row in comments)) if db is not None else {}
+    root_ids = root_ids or set()
+    reply_counts = reply_counts or {}
+
+    comment_map: dict[str, CommentResponse] = {}
     for row in comments:
-        # Resolve author name
-        author_name = None
-        if db and row.get("author_id"):
-            try:
-                user_row = db.execute("SELECT username FROM users WHERE id = ?", (row["author_id"],)).fetchone()
-                if user_row:
-                    author_name = user_row["username"]
-            except Exception:
-                pass
-        
-        author_type = _resolve_author_type(row["author_id"], db) if db else row.get("author_type", "human")
-        
-        comment = CommentResponse(
+        author = authors.get(row.get("author_id"))
+        comment_map[row["id"]] = CommentResponse(
             id=row["id"],
             post_id=row["post_id"],
             content=row["content"],
             author_id=row["author_id"],
-            author_type=author_type,
+            author_type=author["author_type"] if author else row.get("author_type", "human"),
             parent_id=row.get("parent_id"),
-            author_name=author_name,
+            author_name=author["author_name"] if author else None,
             replies=[],
+            reply_count=reply_counts.get(row["id"], 0),
             is_best_answer=bool(row.get("is_best_answer", 0)),
             created_at=row["created_at"],
-            updated_at=row["updated_at"]
+            updated_at=row["updated_at"],
         )
-        comment_map[row["id"]] = comment
-        
-        # Add to root if no parent, otherwise add to parent's replies
-        if row.get("parent_id") is None:
+
+    # Link in a second pass so a reply listed before its parent is not dropped
+    root_comments = []
+    for row in comments:
+        comment = comment_map[row["id"]]
+        parent_id = row.get("parent_id")
+        if parent_id is None or row["id"] in root_ids:
             root_comments.append(comment)
-        else:
-            parent = comment_map.get(row["parent_id"])
-            if parent:
-                parent.replies.append(comment)
-    
+            continue
+        parent = comment_map.get(parent_id)
+        if parent:
+            parent.replies.append(comment)
+            if parent.id not in reply_counts:
+                parent.reply_count += 1
+
     return root_comments
 
 
+def _encode_cursor(created_at: str, item_id: str) -> str:
+    """Opaque keyset cursor for ``(created_at, id)`` ordered pages."""
+    return base64.urlsafe_b64encode(f"{created_at}|{item_id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.rsplit("|", 1)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, item_id
+
+
+def _encode_keyset(values: list) -> str:
+    """Opaque keyset cursor for post lists: the sort key of the last row on a page."""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decode_keyset(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+_CREATED_KEY = ("community_posts.created_at", lambda r: r["created_at"])
+# Sort order -> (SQL expression, row getter) pairs, all descending; ``id`` is
+# appended as the final tiebreaker so every order is a strict keyset.
+_POST_SORT_KEYS = {
+    PostSortType.newest: [_CREATED_KEY],
+    PostSortType.following: [_CREATED_KEY],
+    PostSortType.popular: [
+        ("community_posts.likes_count", lambda r: r["likes_count"]),
+        ("community_posts.comment_count", lambda r: r["comment_count"]),
+        _CREATED_KEY,
+    ],
+    PostSortType.hot: [("community_posts.hot_score", lambda r: r["hot_score"])],
+    PostSortType.best: [
+        ("(community_posts.upvotes - community_posts.downvotes)", lambda r: r["upvotes"] - r["downvotes"]),
+        _CREATED_KEY,
+    ],
+}
+_ID_KEY = ("community_posts.id", lambda r: r["id"])
+_FEED_ORDER = "feed_score DESC, comment_count DESC, created_at DESC, id DESC"
+
+
+_MAX_THREAD_DEPTH = 1000  # guards the recursive CTE against parent_id cycles
+
+
+def _load_comment_page(
+    db,
+    post_id: str,
+    parent_id: str | None,
+    limit: int,
+    cursor: str | None = None,
+    offset: int = 0,
+    depth: int | None = None,
+) -> tuple[list[CommentResponse], str | None]:
+    """Load one page of comments under ``parent_id`` (top level when None) with their reply subtrees.
+
+    Uses a constant number of queries regardless of thread size: the page, one
+    recursive CTE for descendants down to ``depth`` levels, one GROUP BY for the
+    reply counts of collapsed comments, and the batched author lookup.
+    """
+    conditions = ["post_id = ?"]
+    params: list = [post_id]
+    if parent_id is None:
+        conditions.append("parent_id IS NULL")
+    else:
+        conditions.append("parent_id = ?")
+        params.append(parent_id)
+    if cursor:
+        after_created, after_id = _decode_cursor(cursor)
+        conditions.append("(created_at > ? OR (created_at = ? AND id > ?))")
+        params.extend([after_created, after_created, after_id])
+        offset = 0
+
+    page_rows = [dict(r) for r in db.execute(
+        f"""
+        SELECT * FROM community_comments
+        WHERE {" AND ".join(conditions)}
+        ORDER BY created_at ASC, id ASC
+        LIMIT ? OFFSET ?
+        """,
+        params + [limit + 1, offset],
+    ).fetchall()]
+
+    next_cursor = None
+    if len(page_rows) > limit:
+        page_rows = page_rows[:limit]
+        last = page_rows[-1]
+        next_cursor = _encode_cursor(last["created_at"], last["id"])
+    if not page_rows:
+        return [], None
+
+    max_depth = _MAX_THREAD_DEPTH if depth is None else depth
+    page_ids = [r["id"] for r in page_rows]
+    rows = list(page_rows)
+    frontier = page_ids
+    if max_depth > 0:
+        placeholders = ",".join("?" * len(page_ids))
+        descendants = [dict(r) for r in db.execute(
+            f"""
+            WITH RECURSIVE thread(id, depth) AS (
+                SELECT id, 1 FROM community_comments WHERE parent_id IN ({placeholders})
+                UNION ALL
+                SELECT c.id, t.depth + 1 FROM community_comments c
+                JOIN thread t ON c.parent_id = t.id
+                WHERE t.depth < ?
+            )
+            SELECT c.*, t.depth AS thread_depth FROM community_comments c
+            JOIN thread t ON t.id = c.id
+            ORDER BY c.created_at ASC, c.id ASC
+            """,
+            page_ids + [max_depth],
+        ).fetchall()]
+        rows.extend(descendants)
+        frontier = [r["id"] for r in descendants if r["thread_depth"] == max_depth]
+
+    # Children of the deepest loaded level were not fetched — count them instead
+    reply_counts: dict[str, int] = {}
+    for i in range(0, len(frontier), 500):
+        chunk = frontier[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for r in db.execute(
+            f"SELECT parent_id, COUNT(*) AS c FROM community_comments WHERE parent_id IN ({placeholders}) GROUP BY parent_id",
+            chunk,
+        ).fetchall():
+            reply_counts[r["parent_id"]] = r["c"]
+    for comment_id in frontier:
+        reply_counts.setdefault(comment_id, 0)
+
+    tree = _build_comment_tree(rows, db, root_ids=set(page_ids), reply_counts=reply_counts)
+    return tree, next_cursor
+
+
 def _require_claimed_agent(identity: dict) -> None:
     """Block write operations for unclaimed agents."""
     if identity.get("identity_type") != "agent":
@@ -179,9 +292,7 @@ def _require_claimed_agent(identity: dict) -> None:
 router = APIRouter(prefix="/community", tags=["community"])
 
 
-@router.get("/map/regions")
-async def get_community_map_regions():
-    """Return community post counts grouped by country_code."""
+def _post_region_counts() -> list[dict]:
     with get_db() as db:
         _safe_add_column(db, "community_posts", "country_code TEXT")
 
@@ -191,7 +302,7 @@ async def get_community_map_regions():
             FROM community_posts
             WHERE country_code IS NOT NULL
             GROUP BY country_code
-            ORDER BY post_count DESC
+            ORDER BY post_count DESC, country_code ASC
             """
         ).fetchall()
 
@@ -201,8 +312,27 @@ async def get_community_map_regions():
     ]
 
 
-def _row_to_post_response(row: dict, db=None) -> PostResponse:
-    """Convert database row to PostResponse."""
+@router.get("/map/regions")
+async def get_community_map_regions(request: Request):
+    """Return community post counts grouped by country_code (cached, with an ETag)."""
+    return response_cache.respond(request, "community_regions", _post_region_counts)
+
+
+_HUMAN_AUTHOR = {"author_name": None, "author_type": "human"}
+
+
+def _row_to_post_response(
+    row: dict,
+    db=None,
+    *,
+    author: dict | None = None,
+    tags: list[str] | None = None,
+) -> PostResponse:
+    """Convert database row to PostResponse.
+
+    ``author``/``tags`` come from a batch hydration pass (see
+    ``_rows_to_post_responses``); when omitted they are looked up via ``db``.
+    """
     images = None
     if row["images"]:
         try:
@@ -215,32 +345,15 @@ def _row_to_post_response(row: dict, db=None) -> PostResponse:
     upvotes = row["upvotes"] if "upvotes" in keys else 0
     downvotes = row["downvotes"] if "downvotes" in keys else 0
 
-    # Resolve author name and type from email
-    author_name = None
-    author_type = _resolve_author_type(row["author_id"], db) if db else row.get("author_type", "human")
-    if db and row.get("author_id"):
-        try:
-            user_row = db.execute("SELECT username FROM users WHERE id = ?", (row["author_id"],)).fetchone()
-            if user_row:
-                author_name = user_row["username"]
-        except Exception as e:
-            logger.exception("Unexpected error in _row_to_post_response: %s", e)
+    if author is None and db is not None:
+        author = resolve_authors(db, [row["author_id"]]).get(row["author_id"], _HUMAN_AUTHOR)
+    if author is not None:
+        author_name, author_type = author["author_name"], author["author_type"]
+    else:
+        author_name, author_type = None, row.get("author_type", "human")
 
-    tags: list[str] = []
-    if db:
-        try:
-            tag_rows = db.execute(
-                """
-                SELECT t.name FROM tags t
-                JOIN post_tags pt ON pt.tag_id = t.id
-                WHERE pt.post_id = ?
-                ORDER BY t.name ASC
-                """,
-                (row["id"],),
-            ).fetchall()
-            tags = [tr["name"] for tr in tag_rows]
-        except Exception:
-            tags = []
+    if tags is None:
+        tags = fetch_post_tags(db, [row["id"]]).get(row["id"], []) if db is not None else []
 
     template_type = row["template_type"] if "template_type" in keys else None
 
@@ -271,6 +384,21 @@ def _row_to_post_response(row: dict, db=None) -> PostResponse:
     )
 
 
+def _rows_to_post_responses(rows, db) -> list[PostResponse]:
+    """Convert a page of post rows, hydrating authors and tags in a constant number of queries."""
+    rows = [dict(row) for row in rows]
+    authors = resolve_authors(db, (row["author_id"] for row in rows))
+    tags = fetch_post_tags(db, (row["id"] for row in rows))
+    return [
+        _row_to_post_response(
+            row,
+            author=authors.get(row["author_id"], _HUMAN_AUTHOR),
+            tags=tags.get(row["id"], []),
+        )
+        for row in rows
+    ]
+
+
 @router.post("/posts", response_model=PostResponse, status_code=201)
 async def create_post(
     post: PostCreateRequest,
@@ -279,7 +407,7 @@ async def create_post(
     """Create a new community post."""
     _require_claimed_agent(identity)
     # Rate limit check
-    if not _rate_check(f"post:{identity['identity_id']}", max_calls=10, window=3600):
+    if not await run_in_threadpool(_rate_check, f"post:{identity['identity_id']}", max_calls=10, window=3600):
         raise HTTPException(429, "Too many posts. Try again later.")
     
     # Sanitize user input
@@ -308,8 +436,8 @@ async def create_post(
             INSERT INTO community_posts (
                 id, title, content, post_type, author_id, author_type,
                 file_id, images, template_type,
-                comment_count, likes_count, created_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0, ?, ?)
+                comment_count, likes_count, hot_score, feed_score, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0, 0, ?, ?, ?)
         """, (
             post_id,
             post.title,
@@ -320,9 +448,11 @@ async def create_post(
             post.file_id,
             images_json,
             post.template_type.value if post.template_type else None,
+            post_ranking.RECENT_FEED_SCORE,
             now,
             now
         ))
+        counters.record_activity(db, identity["identity_id"], now)
 
         for raw_tag in post.tags:
             tag_name = raw_tag.strip()
@@ -339,6 +469,8 @@ async def create_post(
                     (post_id, tag_row["id"]),
                 )
 
+        timeline.fan_out_post(db, post_id, identity["identity_id"], now)
+
         if identity.get("identity_type") == "agent":
             grant_agent_xp(db, identity["identity_id"], 10)
 
@@ -348,6 +480,10 @@ async def create_post(
         """, (post_id,)).fetchone()
         response = _row_to_post_response(dict(row), db)
 
+    if identity.get("identity_type") == "agent":
+        aggregates_changed("community_regions", "leaderboard")
+    else:
+        aggregates_changed("community_regions")
     logger.info("Post created: id=%s by=%s type=%s", post_id, identity["identity_id"], post.post_type)
     return response
 
@@ -360,9 +496,13 @@ async def get_posts(
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(20, ge=1, le=100, description="Posts per page"),
     sort: PostSortType = Query(PostSortType.newest, description="Sort order"),
+    cursor: str | None = Query(None, description="Keyset cursor from next_cursor (replaces page)"),
     authorization: str | None = Header(default=None),
 ):
-    """Get list of community posts with pagination and filtering."""
+    """Get list of community posts with pagination and filtering.
+
+    Pass ``next_cursor`` back as ``cursor`` to page by keyset instead of OFFSET.
+    """
     
     # Build query conditions
     conditions = []
@@ -382,69 +522,62 @@ async def get_posts(
             raise HTTPException(status_code=401, detail="Authentication required for following feed")
 
         with get_db() as db:
-            follow_rows = db.execute(
-                "SELECT following_id FROM follows WHERE follower_id = ?",
-                (identity["identity_id"],),
-            ).fetchall()
-
-        following_ids = [row["following_id"] for row in follow_rows]
-        if not following_ids:
-            return PostListResponse(posts=[], total=0, page=page, limit=limit, has_next=False)
-
-        placeholders = ",".join(["?" for _ in following_ids])
-        conditions.append(f"author_id IN ({placeholders})")
-        params.extend(following_ids)
+            followed_clause, followed_params = timeline.followed_posts_clause(db, identity["identity_id"])
+        conditions.append(followed_clause)
+        params.extend(followed_params)
 
-    joins = ""
     if tag:
-        joins += " JOIN post_tags pt ON pt.post_id = community_posts.id JOIN tags t ON t.id = pt.tag_id "
-        conditions.append("LOWER(t.name) = LOWER(?)")
+        conditions.append(
+            "community_posts.id IN (SELECT pt.post_id FROM post_tags pt JOIN tags t ON t.id = pt.tag_id"
+            " WHERE LOWER(t.name) = LOWER(?))"
+        )
         params.append(tag)
 
     where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
 
-    # Build sort clause
-    if sort == PostSortType.newest:
-        order_clause = "ORDER BY created_at DESC"
-    elif sort == PostSortType.popular:
-        order_clause = "ORDER BY likes_count DESC, comment_count DESC, created_at DESC"
-    elif sort == PostSortType.hot:
-        # Hot sort: score divided by age decay (simplified for SQLite)
-        order_clause = "ORDER BY CAST((upvotes - downvotes) AS REAL) / ((julianday('now') - julianday(created_at)) * 24 + 2) DESC"
-    elif sort == PostSortType.best:
-        # Best sort: highest net score, then newest
-        order_clause = "ORDER BY (upvotes - downvotes) DESC, created_at DESC"
-    else:
-        order_clause = "ORDER BY created_at DESC"
-    
+    # Hot order reads the stored, periodically decayed hot_score (see services.post_ranking)
+    sort_keys = _POST_SORT_KEYS.get(sort, _POST_SORT_KEYS[PostSortType.newest]) + [_ID_KEY]
+    order_clause = "ORDER BY " + ", ".join(f"{expr} DESC" for expr, _ in sort_keys)
+
+    page_conditions = list(conditions)
+    page_params = list(params)
     offset = (page - 1) * limit
-    
+    if cursor:
+        after = _decode_keyset(cursor, len(sort_keys))
+        exprs = ", ".join(expr for expr, _ in sort_keys)
+        page_conditions.append(f"({exprs}) < ({', '.join('?' for _ in sort_keys)})")
+        page_params.extend(after)
+        offset = 0
+    page_where = "WHERE " + " AND ".join(page_conditions) if page_conditions else ""
+
     with get_db() as db:
         _ensure_community_schema(db)
 
         # Get total count
-        count_query = f"SELECT COUNT(DISTINCT community_posts.id) FROM community_posts {joins} {where_clause}"
+        count_query = f"SELECT COUNT(*) FROM community_posts {where_clause}"
         total = db.execute(count_query, params).fetchone()[0]
 
         # Get posts
         posts_query = f"""
-            SELECT DISTINCT community_posts.* FROM community_posts
-            {joins}
-            {where_clause}
+            SELECT community_posts.* FROM community_posts
+            {page_where}
             {order_clause}
             LIMIT ? OFFSET ?
         """
-        rows = db.execute(posts_query, params + [limit, offset]).fetchall()
-        posts = [_row_to_post_response(dict(row), db) for row in rows]
-    
-    has_next = offset + len(posts) < total
-    
+        rows = [dict(r) for r in db.execute(posts_query, page_params + [limit + 1, offset]).fetchall()]
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        posts = _rows_to_post_responses(rows, db)
+
+    next_cursor = _encode_keyset([get(rows[-1]) for _, get in sort_keys]) if has_next else None
+
     return PostListResponse(
         posts=posts,
         total=total,
         page=page,
         limit=limit,
-        has_next=has_next
+        has_next=has_next,
+        next_cursor=next_cursor,
     )
 
 
@@ -605,6 +738,8 @@ def _ensure_community_schema(db) -> None:
     _safe_add_column(db, "community_posts", "resolved_at TEXT")
     _safe_add_column(db, "community_posts", "is_pinned INTEGER NOT NULL DEFAULT 0")
     _safe_add_column(db, "community_posts", "is_locked INTEGER NOT NULL DEFAULT 0")
+    _safe_add_column(db, "community_posts", "hot_score REAL NOT NULL DEFAULT 0")
+    _safe_add_column(db, "community_posts", "feed_score REAL NOT NULL DEFAULT 0")
 
     _safe_add_column(db, "community_comments", "parent_id TEXT DEFAULT NULL")
     _safe_add_column(db, "community_comments", "is_best_answer INTEGER NOT NULL DEFAULT 0")
@@ -635,7 +770,11 @@ async def search_community(
 
         has_post_tags = _table_exists(db, "post_tags") and _table_exists(db, "tags")
 
-        if has_post_tags:
+        post_hits = search_index.search(db, "posts", q, limit, offset)
+        if post_hits is not None:
+            post_rows = search_index.fetch_ranked(db, "SELECT * FROM community_posts", post_hits.ids)
+            post_total = post_hits.total
+        elif has_post_tags:
             post_rows = db.execute(
                 """
                 WITH post_relevance AS (
@@ -702,7 +841,10 @@ async def search_community(
                 (search_term, search_term),
             ).fetchone()["c"]
 
-        posts = [_row_to_post_response(dict(row), db).model_dump() for row in post_rows]
+        posts = [post.model_dump() for post in _rows_to_post_responses(post_rows, db)]
+        if post_hits is not None:
+            for post in posts:
+                post["snippet"] = post_hits.snippets.get(post["id"], "")
 
         agents: list[dict] = []
         agent_total = 0
@@ -723,28 +865,38 @@ async def search_community(
             created_col = "created_at" if has_created_at else "datetime('now') AS created_at"
             order_col = "created_at DESC" if has_created_at else "name ASC"
 
-            agent_rows = db.execute(
-                f"""
-                SELECT id, name, {display_name_col}, {bio_col}, description, {avatar_col}, {status_col}, {tier_col}, {created_col}
-                FROM agents
-                WHERE LOWER(name) LIKE LOWER(?)
-                   OR LOWER({bio_search_expr}) LIKE LOWER(?)
-                ORDER BY {order_col}
-                LIMIT ? OFFSET ?
-                """,
-                (search_term, search_term, limit, offset),
-            ).fetchall()
-            agents = [dict(row) for row in agent_rows]
-
-            agent_total = db.execute(
-                f"""
-                SELECT COUNT(*) AS c
-                FROM agents
-                WHERE LOWER(name) LIKE LOWER(?)
-                   OR LOWER({bio_search_expr}) LIKE LOWER(?)
-                """,
-                (search_term, search_term),
-            ).fetchone()["c"]
+            agent_select = (
+                f"SELECT id, name, {display_name_col}, {bio_col}, description, {avatar_col}, "
+                f"{status_col}, {tier_col}, {created_col} FROM agents"
+            )
+            agent_hits = search_index.search(db, "agents", q, limit, offset)
+            if agent_hits is not None:
+                agents = [dict(row) for row in search_index.fetch_ranked(db, agent_select, agent_hits.ids)]
+                for agent in agents:
+                    agent["snippet"] = agent_hits.snippets.get(agent["id"], "")
+                agent_total = agent_hits.total
+            else:
+                agent_rows = db.execute(
+                    f"""
+                    {agent_select}
+                    WHERE LOWER(name) LIKE LOWER(?)
+                       OR LOWER({bio_search_expr}) LIKE LOWER(?)
+                    ORDER BY {order_col}
+                    LIMIT ? OFFSET ?
+                    """,
+                    (search_term, search_term, limit, offset),
+                ).fetchall()
+                agents = [dict(row) for row in agent_rows]
+
+                agent_total = db.execute(
+                    f"""
+                    SELECT COUNT(*) AS c
+                    FROM agents
+                    WHERE LOWER(name) LIKE LOWER(?)
+                       OR LOWER({bio_search_expr}) LIKE LOWER(?)
+                    """,
+                    (search_term, search_term),
+                ).fetchone()["c"]
 
         nodes: list[dict] = []
         node_total = 0
@@ -757,28 +909,37 @@ async def search_community(
             node_created_col = "created_at" if has_node_created_at else "datetime('now') AS created_at"
             node_order_col = "created_at DESC" if has_node_created_at else "name ASC"
 
-            node_rows = db.execute(
-                f"""
-                SELECT id, owner_id, name, {node_description_col}, node_type, status, {node_created_col}
-                FROM nodes
-                WHERE LOWER(name) LIKE LOWER(?)
-                   OR LOWER({node_description_search}) LIKE LOWER(?)
-                ORDER BY {node_order_col}
-                LIMIT ? OFFSET ?
-                """,
-                (search_term, search_term, limit, offset),
-            ).fetchall()
-            nodes = [dict(row) for row in node_rows]
-
-            node_total = db.execute(
-                f"""
-                SELECT COUNT(*) AS c
-                FROM nodes
-                WHERE LOWER(name) LIKE LOWER(?)
-                   OR LOWER({node_description_search}) LIKE LOWER(?)
-                """,
-                (search_term, search_term),
-            ).fetchone()["c"]
+            node_select = (
+                f"SELECT id, owner_id, name, {node_description_col}, node_type, status, {node_created_col} FROM nodes"
+            )
+            node_hits = search_index.search(db, "nodes", q, limit, offset)
+            if node_hits is not None:
+                nodes = [dict(row) for row in search_index.fetch_ranked(db, node_select, node_hits.ids)]
+                for node in nodes:
+                    node["snippet"] = node_hits.snippets.get(node["id"], "")
+                node_total = node_hits.total
+            else:
+                node_rows = db.execute(
+                    f"""
+                    {node_select}
+                    WHERE LOWER(name) LIKE LOWER(?)
+                       OR LOWER({node_description_search}) LIKE LOWER(?)
+                    ORDER BY {node_order_col}
+                    LIMIT ? OFFSET ?
+                    """,
+                    (search_term, search_term, limit, offset),
+                ).fetchall()
+                nodes = [dict(row) for row in node_rows]
+
+                node_total = db.execute(
+                    f"""
+                    SELECT COUNT(*) AS c
+                    FROM nodes
+                    WHERE LOWER(name) LIKE LOWER(?)
+                       OR LOWER({node_description_search}) LIKE LOWER(?)
+                    """,
+                    (search_term, search_term),
+                ).fetchone()["c"]
 
     return {
         "posts": posts,
@@ -792,56 +953,72 @@ async def search_community(
 async def get_personalized_feed(
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(20, ge=1, le=100, description="Posts per page"),
+    cursor: str | None = Query(None, description="Keyset cursor from next_cursor (replaces page)"),
     identity: dict = Depends(get_authenticated_identity),
 ):
-    """Personalized feed for authenticated users."""
-    offset = (page - 1) * limit
-    now = datetime.now(timezone.utc)
-    recent_cutoff = (now - timedelta(hours=24)).isoformat()
+    """Personalized feed for authenticated users.
 
+    Posts rank by the stored ``feed_score`` (recent ×1.5, has comments ×1.2)
+    times 2.0 for posts in the caller's follow timeline. That boost puts every
+    timeline post ahead of the rest, so the feed is read as two index-ordered
+    segments, timeline then global, without touching the follow list.
+    """
     with get_db() as db:
-        follow_ids: list[str] = []
-        if _table_exists(db, "follows"):
-            try:
-                follow_rows = db.execute(
-                    "SELECT following_id FROM follows WHERE follower_id = ?",
-                    (identity["identity_id"],),
-                ).fetchall()
-                follow_ids = [r["following_id"] for r in follow_rows]
-            except Exception:
-                follow_ids = []
-
-        score_expr = """
-            (
-                (CASE WHEN created_at >= ? THEN 1.5 ELSE 1.0 END)
-                * (CASE WHEN comment_count > 0 THEN 1.2 ELSE 1.0 END)
-                {follow_weight}
-            )
-        """
-
-        if follow_ids:
-            placeholders = ",".join(["?" for _ in follow_ids])
-            follow_weight = f"* (CASE WHEN author_id IN ({placeholders}) THEN 2.0 ELSE 1.0 END)"
-            score_sql = score_expr.format(follow_weight=follow_weight)
-            score_params = [recent_cutoff, *follow_ids]
-        else:
-            score_sql = score_expr.format(follow_weight="")
-            score_params = [recent_cutoff]
+        # Home timeline (fan-out-on-write, see services.timeline) first, then everything else
+        followed_clause, followed_params = timeline.followed_posts_clause(db, identity["identity_id"])
+        segments = [
+            (followed_clause, followed_params),
+            (f"NOT {followed_clause}", followed_params),
+        ]
 
         count_row = db.execute("SELECT COUNT(*) AS cnt FROM community_posts").fetchone()
         total = int(count_row["cnt"] if count_row else 0)
 
-        query = f"""
-            SELECT *, {score_sql} AS ranking_score
-            FROM community_posts
-            ORDER BY ranking_score DESC, comment_count DESC, created_at DESC
-            LIMIT ? OFFSET ?
-        """
-        rows = db.execute(query, score_params + [limit, offset]).fetchall()
-        posts = [_row_to_post_response(dict(row), db) for row in rows]
-
-    has_next = offset + len(posts) < total
-    return PostListResponse(posts=posts, total=total, page=page, limit=limit, has_next=has_next)
+        start_segment, after = 0, None
+        offset = (page - 1) * limit
+        if cursor:
+            start_segment, *after = _decode_keyset(cursor, 5)
+            if not isinstance(start_segment, int) or not 0 <= start_segment < len(segments):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            offset = 0
+
+        page_rows: list[tuple[int, dict]] = []
+        for index in range(start_segment, len(segments)):
+            where, where_params = segments[index]
+            params = list(where_params)
+            if after is not None and index == start_segment:
+                where += " AND (feed_score, comment_count, created_at, id) < (?, ?, ?, ?)"
+                params.extend(after)
+            rows = db.execute(
+                f"SELECT * FROM community_posts WHERE {where} ORDER BY {_FEED_ORDER} LIMIT ? OFFSET ?",
+                params + [limit + 1 - len(page_rows), offset],
+            ).fetchall()
+            if offset:
+                # OFFSET paging: skip whole segments until the offset lands inside one
+                if rows:
+                    offset = 0
+                else:
+                    seg_total = db.execute(
+                        f"SELECT COUNT(*) AS cnt FROM community_posts WHERE {where}", params
+                    ).fetchone()["cnt"]
+                    offset = max(0, offset - int(seg_total))
+            page_rows.extend((index, dict(r)) for r in rows)
+            if len(page_rows) > limit:
+                break
+
+        has_next = len(page_rows) > limit
+        page_rows = page_rows[:limit]
+        posts = _rows_to_post_responses([row for _, row in page_rows], db)
+
+    next_cursor = None
+    if has_next:
+        index, last = page_rows[-1]
+        next_cursor = _encode_keyset(
+            [index, last["feed_score"], last["comment_count"], last["created_at"], last["id"]]
+        )
+    return PostListResponse(
+        posts=posts, total=total, page=page, limit=limit, has_next=has_next, next_cursor=next_cursor
+    )
 
 
 @router.get("/posts/{post_id}", response_model=PostDetailResponse)
@@ -868,7 +1045,7 @@ async def create_comment(
     """Add a comment to a post."""
     _require_claimed_agent(identity)
     # Rate limit check
-    if not _rate_check(f"comment:{identity['identity_id']}", max_calls=30, window=3600):
+    if not await run_in_threadpool(_rate_check, f"comment:{identity['identity_id']}", max_calls=30, window=3600):
         raise HTTPException(429, "Too many comments. Try again later.")
     
     comment.content = _sanitize(comment.content)
@@ -911,6 +1088,7 @@ async def create_comment(
             now,
             now
         ))
+        counters.record_activity(db, identity["identity_id"], now)
 
         # Update comment count on post
         db.execute("""
@@ -918,6 +1096,7 @@ async def create_comment(
             SET comment_count = comment_count + 1, updated_at = ?
             WHERE id = ?
         """, (now, post_id))
+        post_ranking.refresh_post_scores(db, post_id)
 
         if identity.get("identity_type") == "agent":
             grant_agent_xp(db, identity["identity_id"], 5)
@@ -945,6 +1124,9 @@ async def create_comment(
                 (parent_row["author_id"],),
             ).fetchone()
 
+    if identity.get("identity_type") == "agent":
+        aggregates_changed("leaderboard")
+
     if post_author:
         await send_notification(
             post_author["email"],
@@ -978,12 +1160,19 @@ async def create_comment(
 @router.get("/posts/{post_id}/comments", response_model=list[CommentResponse])
 async def get_post_comments(
     post_id: str,
-    limit: int = Query(200, ge=1, le=500, description="Comments per request"),
-    offset: int = Query(0, ge=0, description="Comments offset")
+    response: Response,
+    limit: int = Query(200, ge=1, le=500, description="Top-level comments per page"),
+    offset: int = Query(0, ge=0, description="Top-level comments offset (ignored with cursor)"),
+    cursor: str | None = Query(None, description="Keyset cursor from X-Next-Cursor"),
+    depth: int | None = Query(None, ge=0, le=50, description="Reply levels to expand (default: all)"),
 ):
-    """Get comments for a specific post with nested structure."""
-    
-    # Verify post exists
+    """Get top-level comments for a post with nested replies.
+
+    Pages are keyed on ``(created_at, id)``; when more top-level comments exist
+    the next cursor is returned in the ``X-Next-Cursor`` header. With ``depth``
+    set, deeper replies are collapsed and can be expanded through
+    ``GET /community/comments/{comment_id}/replies``.
+    """
     with get_db() as db:
         post_row = db.execute("""
             SELECT id FROM community_posts WHERE id = ?
@@ -991,21 +1180,35 @@ async def get_post_comments(
         
         if not post_row:
             raise HTTPException(status_code=404, detail="Post not found")
-        
-        # Get ALL comments for this post to build tree properly
-        # (We need all to establish parent-child relationships)
-        rows = db.execute("""
-            SELECT * FROM community_comments 
-            WHERE post_id = ?
-            ORDER BY created_at ASC
-        """, (post_id,)).fetchall()
-        
-        comments = [dict(row) for row in rows]
-        
-        # Build nested structure
-        nested_comments = _build_comment_tree(comments, db)
-    
-    return nested_comments
+
+        comments, next_cursor = _load_comment_page(db, post_id, None, limit, cursor, offset, depth)
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return comments
+
+
+@router.get("/comments/{comment_id}/replies", response_model=list[CommentResponse])
+async def get_comment_replies(
+    comment_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500, description="Direct replies per page"),
+    cursor: str | None = Query(None, description="Keyset cursor from X-Next-Cursor"),
+    depth: int | None = Query(None, ge=0, le=50, description="Reply levels to expand below each reply"),
+):
+    """Lazily expand the reply subtree of a single comment."""
+    with get_db() as db:
+        parent = db.execute(
+            "SELECT id, post_id FROM community_comments WHERE id = ?", (comment_id,)
+        ).fetchone()
+        if not parent:
+            raise HTTPException(status_code=404, detail="Comment not found")
+
+        replies, next_cursor = _load_comment_page(db, parent["post_id"], comment_id, limit, cursor, depth=depth)
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return replies
 
 
 @router.post("/posts/{post_id}/resolve")
@@ -1185,6 +1388,8 @@ async def vote_post(
             db.execute(f"UPDATE community_posts SET {col} = {col} + 1 WHERE id = ?", (post_id,))
             user_vote = direction
         
+        post_ranking.refresh_post_scores(db, post_id)
+
         # Get updated counts
         row = db.execute(
             "SELECT upvotes, downvotes FROM community_posts WHERE id = ?", (post_id,)
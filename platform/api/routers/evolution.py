@@ -4,12 +4,14 @@
 
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, Field
 
 from ..database import get_db
 from ..deps import require_role
+from ..events import aggregates_changed
 from ..services.evolution import grant_agent_xp, level_for_xp
+from ..services.response_cache import response_cache
 
 router = APIRouter(prefix="/evolution", tags=["evolution"])
 
@@ -19,8 +21,7 @@ class GrantXPRequest(BaseModel):
     reason: str | None = Field(default=None, max_length=500)
 
 
-@router.get("/leaderboard")
-def get_evolution_leaderboard():
+def _leaderboard() -> dict:
     with get_db() as db:
         rows = db.execute(
             """
@@ -42,6 +43,11 @@ def get_evolution_leaderboard():
     }
 
 
+@router.get("/leaderboard")
+def get_evolution_leaderboard(request: Request):
+    return response_cache.respond(request, "leaderboard", _leaderboard)
+
+
 @router.get("/{agent_id}")
 def get_agent_evolution(agent_id: str):
     with get_db() as db:
@@ -92,6 +98,7 @@ def grant_xp(
             raise HTTPException(status_code=404, detail="Agent not found")
         db.execute("UPDATE agents SET updated_at = ? WHERE id = ?", (now, agent_id))
 
+    aggregates_changed("leaderboard")
     return {
         **updated,
         "granted_xp": req.xp,
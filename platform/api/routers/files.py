@@ -3,15 +3,42 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi import Path as PathParam
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 
 from ..database import get_db
 from ..deps import get_authenticated_identity
-from ..models.files import FileInfoResponse, FileUploadResponse, MyFilesResponse
+from ..models.files import (
+    FileClaimRequest,
+    FileInfoResponse,
+    FileUploadResponse,
+    MeshAnalysisInfo,
+    MyFilesResponse,
+    SignedUrlResponse,
+    UploadSessionComplete,
+    UploadSessionCreate,
+    UploadSessionResponse,
+)
+from ..services.uploads import (
+    MAX_RESUMABLE_FILE_SIZE,
+    RESUMABLE_CHUNK_SIZE,
+    UPLOAD_SESSION_TTL_H,
+    UploadTooLarge,
+    hash_file,
+    parse_content_range,
+    purge_expired_sessions,
+    MultipartSpool,
+)
+from ..services.blob_store import BlobStore
+from ..services.downloads import FILES_SIGNED_URL_TTL_S, file_response, sign_download, verify_download
+from ..services.mesh_analysis import MESH_FILE_TYPES, analysis_dict, mesh_analyzer
 
 router = APIRouter(prefix="/files", tags=["files"])
 
@@ -20,8 +47,14 @@
 ALLOWED_EXTENSIONS = {".stl", ".obj", ".step", ".stp", ".3mf", ".png", ".jpg", ".jpeg"}
 UPLOAD_DIR = Path(__file__).parent.parent.parent / "uploads"
 
-# Ensure upload directory exists
+PARTIAL_DIR = UPLOAD_DIR / ".partial"  # same filesystem as the blobs, so storing is a rename
+SHA256_PATTERN = r"^[0-9a-f]{64}$"
+
+# Ensure upload directories exist
 UPLOAD_DIR.mkdir(exist_ok=True)
+PARTIAL_DIR.mkdir(exist_ok=True)
+
+blob_store = BlobStore(UPLOAD_DIR / "blobs")
 
 
 def _get_file_extension(filename: str) -> str:
@@ -50,71 +83,384 @@ def _get_mime_type(filename: str) -> str:
     return mime_types.get(ext, "application/octet-stream")
 
 
-@router.post("/upload", response_model=FileUploadResponse)
-async def upload_file(
-    file: UploadFile = File(...),
-    identity: dict = Depends(get_authenticated_identity)
-):
-    """Upload a design file (STL/OBJ/STEP/3MF) or image (PNG/JPG)."""
-    
-    # Validate file
-    if not file.filename:
+_MULTIPART_OVERHEAD = 64 * 1024  # boundaries and part headers around the file body
+
+
+def _validate_filename(filename: str) -> None:
+    if not filename:
         raise HTTPException(status_code=400, detail="No file provided")
-    
-    if not _is_allowed_file(file.filename):
+    if not _is_allowed_file(filename):
         allowed = ", ".join(ALLOWED_EXTENSIONS)
         raise HTTPException(
-            status_code=400, 
+            status_code=400,
             detail=f"File type not allowed. Allowed types: {allowed}"
         )
-    
-    # Read file content and check size
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413, 
-            detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
-        )
-    
-    # Generate file ID and create unique filename
+
+
+@router.post(
+    "/upload",
+    response_model=FileUploadResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"multipart/form-data": {"schema": {
+                "type": "object",
+                "required": ["file"],
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            }}},
+        },
+    },
+)
+async def upload_file(
+    request: Request,
+    identity: dict = Depends(get_authenticated_identity)
+):
+    """Upload a design file (STL/OBJ/STEP/3MF) or image (PNG/JPG) as the ``file`` form field.
+
+    The body is parsed as it arrives, so the size limit and the file type
+    are enforced before the rest of the upload is read.
+    """
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+    )
+    try:
+        declared = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        declared = 0
+    if declared > MAX_FILE_SIZE + _MULTIPART_OVERHEAD:
+        raise too_large
+
+    try:
+        spool = MultipartSpool(request.headers.get("content-type", ""), "file", PARTIAL_DIR, MAX_FILE_SIZE)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data body with a 'file' field")
+
+    # Stream the file part to a temp file, hashing as we go
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(spool.feed, chunk)
+            if spool.filename is not None:
+                _validate_filename(spool.filename)
+        spooled = await run_in_threadpool(spool.finish)
+    except UploadTooLarge:
+        spool.abort()
+        raise too_large
+    except ValueError:
+        spool.abort()
+        raise HTTPException(status_code=400, detail="Malformed multipart body")
+    except BaseException:
+        spool.abort()
+        raise
+
+    if spooled is None:
+        raise HTTPException(status_code=422, detail="Missing file field")
+    filename, temp_path, size, sha256 = spooled
+    return _record_file(filename, size, sha256, identity, temp_path=temp_path)
+
+
+def _record_file(
+    original_filename: str, size: int, sha256: str, identity: dict, temp_path: Optional[Path] = None
+) -> FileUploadResponse:
+    """Store the body in the blob store and insert the ``files`` row pointing at it.
+
+    Without ``temp_path`` the caller must already hold a file with this body
+    (upload skipped by hash). The temp file is moved into the blob store only
+    after the row has committed, and deleted if recording fails.
+    """
     file_id = str(uuid.uuid4())
-    file_extension = _get_file_extension(file.filename)
-    stored_filename = f"{file_id}{file_extension}"
-    file_path = UPLOAD_DIR / stored_filename
-    
-    # Save file to disk
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
-    # Save metadata to database
     now = datetime.now(timezone.utc).isoformat()
-    
-    with get_db() as db:
-        db.execute("""
-            INSERT INTO files (
-                id, filename, original_filename, size, file_type, mime_type, 
-                file_path, uploader_id, uploader_type, uploaded_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            file_id,
-            stored_filename,
-            file.filename,
-            len(content),
-            file_extension,
-            _get_mime_type(file.filename),
-            str(file_path),
-            identity["identity_id"],
-            identity["identity_type"],
-            now,
-            now
-        ))
-    
+    try:
+        with get_db() as db:
+            if temp_path is not None:
+                blob_path = blob_store.adopt(db, sha256, size)
+            else:
+                blob = blob_store.add_ref(db, sha256, identity["identity_id"], identity["identity_type"])
+                if blob is None:
+                    raise HTTPException(status_code=404, detail="Unknown file hash; upload the file")
+                blob_path, size = blob["path"], blob["size"]
+            db.execute("""
+                INSERT INTO files (
+                    id, filename, original_filename, size, file_type, mime_type,
+                    file_path, sha256, uploader_id, uploader_type, uploaded_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                file_id,
+                sha256,
+                original_filename,
+                size,
+                _get_file_extension(original_filename),
+                _get_mime_type(original_filename),
+                str(blob_path),
+                sha256,
+                identity["identity_id"],
+                identity["identity_type"],
+                now,
+                now
+            ))
+    except BaseException:
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
+        raise
+    if temp_path is not None:
+        blob_store.place(temp_path, sha256)
+    if _get_file_extension(original_filename) in MESH_FILE_TYPES:
+        mesh_analyzer.notify()
     return FileUploadResponse(
         file_id=file_id,
-        filename=file.filename,
-        size=len(content),
-        file_type=file_extension,
-        uploaded_at=now
+        filename=original_filename,
+        size=size,
+        file_type=_get_file_extension(original_filename),
+        uploaded_at=now,
+        sha256=sha256,
+    )
+
+
+# ─── Upload by hash ──────────────────────────────────────
+
+
+@router.head("/blobs/{sha256}")
+def head_blob(
+    sha256: str = PathParam(..., pattern=SHA256_PATTERN),
+    identity: dict = Depends(get_authenticated_identity),
+):
+    """200 if one of your files has this SHA-256 (claim it instead of uploading), else 404."""
+    with get_db() as db:
+        blob = blob_store.held_by(db, sha256, identity["identity_id"], identity["identity_type"])
+    if blob is None:
+        return Response(status_code=404)
+    return Response(status_code=200, headers={"X-File-Size": str(blob["size"])})
+
+
+@router.post("/blobs/{sha256}", response_model=FileUploadResponse)
+def claim_blob(
+    request: FileClaimRequest,
+    sha256: str = PathParam(..., pattern=SHA256_PATTERN),
+    identity: dict = Depends(get_authenticated_identity),
+):
+    """Register another file with the body of one you already have, without uploading it again."""
+    if not _is_allowed_file(request.filename):
+        allowed = ", ".join(ALLOWED_EXTENSIONS)
+        raise HTTPException(status_code=400, detail=f"File type not allowed. Allowed types: {allowed}")
+    return _record_file(request.filename, 0, sha256, identity)
+
+
+# ─── Resumable uploads ───────────────────────────────────
+#
+# POST /uploads                    -> create a session for {filename, size}
+# PUT  /uploads/{id}               -> body bytes with "Content-Range: bytes start-end/size"
+# GET  /uploads/{id}               -> how many bytes the server has (resume point)
+# POST /uploads/{id}/complete      -> verify (optional sha256), store, return the file
+# DELETE /uploads/{id}             -> abort
+
+
+def _session_response(row) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        upload_id=row["id"],
+        filename=row["original_filename"],
+        size=row["size"],
+        received=row["received"],
+        chunk_size=RESUMABLE_CHUNK_SIZE,
+        expires_at=row["expires_at"],
+    )
+
+
+def _get_session(upload_id: str, identity: dict):
+    with get_db() as db:
+        row = db.execute(
+            "SELECT * FROM upload_sessions WHERE id = ? AND uploader_id = ? AND uploader_type = ?",
+            (upload_id, identity["identity_id"], identity["identity_type"]),
+        ).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return row
+
+
+def _offset_conflict(received: int) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"Upload offset mismatch; server has {received} bytes",
+        headers={"Upload-Offset": str(received)},
+    )
+
+
+@router.post("/uploads", response_model=UploadSessionResponse)
+def create_upload_session(request: UploadSessionCreate, identity: dict = Depends(get_authenticated_identity)):
+    """Start a resumable upload for a large design file."""
+    if not _is_allowed_file(request.filename):
+        allowed = ", ".join(ALLOWED_EXTENSIONS)
+        raise HTTPException(status_code=400, detail=f"File type not allowed. Allowed types: {allowed}")
+    if request.size > MAX_RESUMABLE_FILE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {MAX_RESUMABLE_FILE_SIZE // (1024*1024)}MB",
+        )
+
+    upload_id = str(uuid.uuid4())
+    part_path = PARTIAL_DIR / f"{upload_id}.part"
+    part_path.touch()
+    now = datetime.now(timezone.utc)
+    with get_db() as db:
+        purge_expired_sessions(db, now)
+        db.execute(
+            """
+            INSERT INTO upload_sessions (
+                id, original_filename, size, received, part_path, uploader_id, uploader_type,
+                created_at, expires_at
+            ) VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?)
+            """,
+            (
+                upload_id, request.filename, request.size, str(part_path),
+                identity["identity_id"], identity["identity_type"],
+                now.isoformat(), (now + timedelta(hours=UPLOAD_SESSION_TTL_H)).isoformat(),
+            ),
+        )
+        row = db.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+    return _session_response(row)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+def get_upload_session(upload_id: str, identity: dict = Depends(get_authenticated_identity)):
+    """Report the resume offset of an upload session."""
+    return _session_response(_get_session(upload_id, identity))
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    content_range: str = Header(...),
+    identity: dict = Depends(get_authenticated_identity),
+):
+    """Append one chunk. Chunks must start at or before the server's offset;
+    bytes the server already has are skipped, so retrying a chunk is safe."""
+    session = _get_session(upload_id, identity)
+    try:
+        start, end, total = parse_content_range(content_range)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if total != session["size"]:
+        raise HTTPException(status_code=400, detail="Content-Range total does not match the upload size")
+    received = session["received"]
+    if start > received:
+        raise _offset_conflict(received)
+
+    expected = end - start + 1
+    got = 0
+    written = 0
+    with open(session["part_path"], "r+b") as part:
+        part.seek(received)
+        try:
+            async for chunk in request.stream():
+                if got + len(chunk) > expected:
+                    raise HTTPException(status_code=400, detail="Body is longer than Content-Range")
+                # Skip bytes of a retried chunk that were already stored
+                piece = chunk[max(0, received - start - got):]
+                got += len(chunk)
+                if piece:
+                    await run_in_threadpool(part.write, piece)
+                    written += len(piece)
+        except ClientDisconnect:
+            pass  # keep what arrived; the client resumes from the new offset
+        finally:
+            part.flush()
+            if written:
+                with get_db() as db:
+                    cur = db.execute(
+                        "UPDATE upload_sessions SET received = ? WHERE id = ? AND received = ?",
+                        (received + written, upload_id, received),
+                    )
+                    if cur.rowcount == 0:
+                        raise _offset_conflict(received)
+
+    if got < expected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Body is shorter than Content-Range; server has {received + written} bytes",
+            headers={"Upload-Offset": str(received + written)},
+        )
+    return _session_response(_get_session(upload_id, identity))
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=FileUploadResponse)
+async def complete_upload(
+    upload_id: str,
+    request: Optional[UploadSessionComplete] = None,
+    identity: dict = Depends(get_authenticated_identity),
+):
+    """Finish a resumable upload: verify it, move it into place and register the file."""
+    session = _get_session(upload_id, identity)
+    if session["received"] != session["size"]:
+        raise _offset_conflict(session["received"])
+
+    part_path = Path(session["part_path"])
+    sha256 = await run_in_threadpool(hash_file, part_path)
+    if request is not None and request.sha256 and request.sha256.lower() != sha256:
+        raise HTTPException(status_code=422, detail="Checksum mismatch; upload the file again")
+
+    with get_db() as db:
+        db.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+    return _record_file(session["original_filename"], session["size"], sha256, identity, temp_path=part_path)
+
+
+@router.delete("/uploads/{upload_id}")
+def abort_upload(upload_id: str, identity: dict = Depends(get_authenticated_identity)):
+    """Abort a resumable upload and discard the received bytes."""
+    session = _get_session(upload_id, identity)
+    Path(session["part_path"]).unlink(missing_ok=True)
+    with get_db() as db:
+        db.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+    return {"message": "Upload aborted", "upload_id": upload_id}
+
+
+def _mesh_analyses(db, rows) -> dict:
+    """Cached mesh analyses for the given ``files`` rows, keyed by content hash."""
+    hashes = sorted({row["sha256"] for row in rows if row["sha256"] and row["file_type"] in MESH_FILE_TYPES})
+    if not hashes:
+        return {}
+    placeholders = ",".join("?" for _ in hashes)
+    found = db.execute(f"SELECT * FROM mesh_analyses WHERE sha256 IN ({placeholders})", hashes).fetchall()
+    return {row["sha256"]: row for row in found}
+
+
+def _is_owner(row, identity: Optional[dict]) -> bool:
+    return (
+        identity is not None
+        and row["uploader_id"] == identity["identity_id"]
+        and row["uploader_type"] == identity["identity_type"]
+    )
+
+
+def _get_optional_identity(
+    authorization: Optional[str] = Header(default=None),
+    x_agent_api_key: Optional[str] = Header(default=None, alias="x-agent-api-key"),
+) -> Optional[dict]:
+    """Identity behind valid credentials, or None; public routes use it for owner-only fields."""
+    if not authorization and not x_agent_api_key:
+        return None
+    try:
+        return get_authenticated_identity(authorization, x_agent_api_key)
+    except HTTPException:
+        return None
+
+
+def _file_info(row, analyses: dict, include_hash: bool = True) -> FileInfoResponse:
+    """``include_hash`` is for the uploader only: the hash is what ``/files/blobs`` claims go by."""
+    mesh = None
+    if row["sha256"] and row["file_type"] in MESH_FILE_TYPES:
+        mesh = MeshAnalysisInfo(**analysis_dict(analyses.get(row["sha256"])))
+    return FileInfoResponse(
+        file_id=row["id"],
+        filename=row["original_filename"],
+        original_filename=row["original_filename"],
+        size=row["size"],
+        file_type=row["file_type"],
+        mime_type=row["mime_type"],
+        uploader_id=row["uploader_id"],
+        uploader_type=row["uploader_type"],
+        uploaded_at=row["uploaded_at"],
+        sha256=row["sha256"] if include_hash else None,
+        mesh=mesh,
     )
 
 
@@ -128,21 +474,9 @@ async def get_my_files(identity: dict = Depends(get_authenticated_identity)):
             WHERE uploader_id = ? AND uploader_type = ?
             ORDER BY uploaded_at DESC
         """, (identity["identity_id"], identity["identity_type"])).fetchall()
-    
-    files = [
-        FileInfoResponse(
-            file_id=row["id"],
-            filename=row["original_filename"],
-            original_filename=row["original_filename"],
-            size=row["size"],
-            file_type=row["file_type"],
-            mime_type=row["mime_type"],
-            uploader_id=row["uploader_id"],
-            uploader_type=row["uploader_type"],
-            uploaded_at=row["uploaded_at"]
-        )
-        for row in rows
-    ]
+        analyses = _mesh_analyses(db, rows)
+
+    files = [_file_info(row, analyses) for row in rows]
     
     return MyFilesResponse(
         files=files,
@@ -151,33 +485,24 @@ async def get_my_files(identity: dict = Depends(get_authenticated_identity)):
 
 
 @router.get("/{file_id}", response_model=FileInfoResponse)
-async def get_file_info(file_id: str):
-    """Get file metadata."""
+async def get_file_info(file_id: str, identity: Optional[dict] = Depends(_get_optional_identity)):
+    """Get file metadata; ``sha256`` is only shown to the uploader."""
     
     with get_db() as db:
         row = db.execute("""
             SELECT * FROM files WHERE id = ?
         """, (file_id,)).fetchone()
+        analyses = _mesh_analyses(db, [row] if row else [])
     
     if not row:
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileInfoResponse(
-        file_id=row["id"],
-        filename=row["original_filename"],
-        original_filename=row["original_filename"],
-        size=row["size"],
-        file_type=row["file_type"],
-        mime_type=row["mime_type"],
-        uploader_id=row["uploader_id"],
-        uploader_type=row["uploader_type"],
-        uploaded_at=row["uploaded_at"]
-    )
+    return _file_info(row, analyses, include_hash=_is_owner(row, identity))
 
 
 @router.get("/{file_id}/download")
-async def download_file(file_id: str, identity: dict = Depends(get_authenticated_identity)):
-    """Download a file."""
+def download_file(file_id: str, request: Request, identity: dict = Depends(get_authenticated_identity)):
+    """Download a file (supports ``Range`` and ``If-None-Match``)."""
 
     with get_db() as db:
         row = db.execute("""
@@ -187,15 +512,64 @@ async def download_file(file_id: str, identity: dict = Depends(get_authenticated
     if not row:
         raise HTTPException(status_code=404, detail="File not found")
 
-    if row["uploader_id"] != identity["identity_id"] or row["uploader_type"] != identity["identity_type"]:
+    if not _is_owner(row, identity):
         raise HTTPException(status_code=403, detail="Forbidden")
 
     file_path = Path(row["file_path"])
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found on disk")
 
-    return FileResponse(
-        path=str(file_path),
-        filename=row["original_filename"],
-        media_type=row["mime_type"]
-    )
\ No newline at end of file
+    return file_response(request, file_path, row["original_filename"], row["mime_type"], row["sha256"], UPLOAD_DIR)
+
+
+@router.post("/{file_id}/signed-url", response_model=SignedUrlResponse)
+def create_signed_url(file_id: str, request: Request, identity: dict = Depends(get_authenticated_identity)):
+    """Short-lived download URL that works without credentials."""
+    with get_db() as db:
+        row = db.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not _is_owner(row, identity):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if not row["sha256"]:
+        raise HTTPException(status_code=409, detail="File predates content-addressed storage; upload it again")
+
+    expires = int(datetime.now(timezone.utc).timestamp()) + FILES_SIGNED_URL_TTL_S
+    filename = row["original_filename"]
+    url = request.url_for("download_signed", sha256=row["sha256"], filename=quote(filename, safe=""))
+    url = url.include_query_params(expires=expires, signature=sign_download(row["sha256"], filename, expires))
+    return SignedUrlResponse(url=str(url), expires_at=datetime.fromtimestamp(expires, timezone.utc).isoformat())
+
+
+@router.get("/signed/{sha256}/{filename}", name="download_signed")
+def download_signed(
+    request: Request,
+    sha256: str = PathParam(..., pattern=SHA256_PATTERN),
+    filename: str = PathParam(...),
+    expires: int = Query(...),
+    signature: str = Query(...),
+):
+    """Serve a signed URL; the signature replaces authentication and the DB lookup."""
+    if not verify_download(sha256, filename, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+    file_path = blob_store.path_for(sha256)
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found on disk")
+    return file_response(request, file_path, filename, _get_mime_type(filename), sha256, UPLOAD_DIR)
+
+
+@router.delete("/{file_id}")
+def delete_file(file_id: str, identity: dict = Depends(get_authenticated_identity)):
+    """Delete one of your files; its stored body goes once no other file references it."""
+    with get_db() as db:
+        row = db.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="File not found")
+        if not _is_owner(row, identity):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        if row["sha256"]:
+            blob_store.release(db, row["sha256"])
+        else:
+            Path(row["file_path"]).unlink(missing_ok=True)  # stored before the blob store
+    return {"message": "File deleted", "file_id": file_id}
@@ -12,8 +12,18 @@
 
 import psutil  # optional — graceful fallback
 from fastapi import APIRouter
-
-from ..database import DB_PATH, get_db
+from fastapi.concurrency import run_in_threadpool
+
+from ..audit import audit_sink
+from ..database import DB_PATH, get_db, get_pool_stats
+from ..events import event_bridge
+from ..identity_cache import identity_cache
+from ..pricing import estimate_cache
+from ..services.heartbeats import heartbeat_buffer
+from ..services.mesh_analysis import mesh_analyzer
+from ..services.passwords import password_pool
+from ..services.response_cache import response_cache
+from ..ws_manager import manager as ws_manager
 
 router = APIRouter(tags=["health"])
 
@@ -26,9 +36,8 @@ def health_basic():
     return {"status": "ok"}
 
 
-@router.get("/health/detailed")
-def health_detailed():
-    """Detailed health: DB, disk, memory, uptime."""
+def _system_checks() -> tuple[bool, dict, dict]:
+    """Blocking probes of the database, disk and memory; returns (db ok, disk, memory)."""
     # Database
     db_ok = True
     try:
@@ -57,12 +66,32 @@ def health_detailed():
     except Exception as e:
         logger.exception("Memory info retrieval failed: %s", e)
         memory_info = {"note": "psutil not available"}
+    return db_ok, disk_info, memory_info
+
+
+@router.get("/health/detailed")
+async def health_detailed():
+    """Detailed health: DB, connection pool, WebSocket queues, disk, memory, uptime.
 
+    Async so the WebSocket and event-bridge stats are read on the event loop
+    that mutates them; the blocking probes run on the threadpool.
+    """
+    db_ok, disk_info, memory_info = await run_in_threadpool(_system_checks)
     uptime_s = round(time.time() - _START_TIME, 1)
 
     return {
         "status": "ok" if db_ok else "degraded",
         "database": "connected" if db_ok else "disconnected",
+        "database_pool": get_pool_stats(),
+        "websocket": ws_manager.stats(),
+        "events": event_bridge.stats(),
+        "heartbeats": heartbeat_buffer.stats(),
+        "audit": audit_sink.stats(),
+        "mesh_analysis": mesh_analyzer.stats(),
+        "pricing_cache": estimate_cache.stats(),
+        "identity_cache": identity_cache.stats(),
+        "password_hashing": password_pool.stats(),
+        "response_cache": response_cache.stats(),
         "disk": disk_info,
         "memory": memory_info,
         "uptime_seconds": uptime_s,
@@ -1,4 +1,4 @@
-"""智能匹配引擎（MVP版：关键词+标签匹配）"""
+"""智能匹配引擎（关键词+标签匹配，倒排索引检索）"""
 
 from __future__ import annotations
 
@@ -9,68 +9,11 @@
 
 from ..database import get_db
 from ..models.schemas import ComponentResponse, MatchRequest, MatchResponse, MatchResult
+from ..services.component_index import get_component_index
 
 router = APIRouter(prefix="/match", tags=["match"])
 
 
-def _compute_score(component: dict, req: MatchRequest) -> tuple[float, str]:
-    """简单匹配评分：关键词 + 标签 + 硬件 + 预算"""
-    score = 0.0
-    reasons = []
-    tags = json.loads(component["tags"] or "[]")
-    json.loads(component["capabilities"] or "[]")
-    need_lower = req.need.lower()
-
-    # 1. 关键词匹配 (0-0.3)
-    text = f"{component['display_name']} {component['description']} {' '.join(tags)}".lower()
-    keywords = need_lower.split()
-    matched_kw = sum(1 for kw in keywords if kw in text)
-    kw_score = min(matched_kw / max(len(keywords), 1) * 0.3, 0.3)
-    score += kw_score
-    if kw_score > 0.1:
-        reasons.append(f"关键词匹配 {matched_kw}/{len(keywords)}")
-
-    # 2. 标签匹配 (0-0.25)
-    hw_set = set(h.lower() for h in req.hardware_available)
-    tag_overlap = len(hw_set & set(t.lower() for t in tags))
-    tag_score = min(tag_overlap * 0.08, 0.25)
-    score += tag_score
-    if tag_overlap:
-        reasons.append(f"标签重叠 {tag_overlap} 个")
-
-    # 3. 硬件匹配 (0-0.25)
-    compute = (component["compute"] or "").lower()
-    if compute and compute in hw_set:
-        score += 0.25
-        reasons.append("计算平台匹配")
-    elif compute:
-        score += 0.05
-
-    # 4. 预算匹配 (0-0.1)
-    cost = component["estimated_cost_cny"]
-    if req.budget_cny and cost:
-        if cost <= req.budget_cny:
-            score += 0.1
-            reasons.append("预算内")
-        elif cost <= req.budget_cny * 1.3:
-            score += 0.05
-
-    # 5. 材料匹配 (0-0.15)
-    component_material = (component.get("material") or "").lower()
-    printer_materials = [m.lower() for m in getattr(req, "printer_materials", None) or []]
-    if component_material and printer_materials:
-        if component_material in printer_materials:
-            score += 0.15
-            reasons.append(f"材料匹配 ({component_material})")
-
-    # 6. 社区评价加分 (0-0.1)
-    if component["review_count"] > 0:
-        score += min(component["rating"] / 5.0 * 0.1, 0.1)
-
-    reason = "；".join(reasons) if reasons else "基础匹配"
-    return round(min(score, 1.0), 3), reason
-
-
 def _row_to_component_resp(row) -> ComponentResponse:
     return ComponentResponse(
         id=row["id"],
@@ -92,26 +35,27 @@ def _row_to_component_resp(row) -> ComponentResponse:
 @router.post("", response_model=MatchResponse)
 def match_components(req: MatchRequest):
     with get_db() as db:
-        rows = db.execute(
-            "SELECT * FROM components WHERE status != 'flagged'"
-        ).fetchall()
-
-    scored = []
-    for row in rows:
-        s, reason = _compute_score(dict(row), req)
-        if s > 0.05:
-            scored.append((s, reason, row))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = scored[: req.limit]
+        top = get_component_index(db).search(req, req.limit)
+        # Serve fresh rows (downloads etc.) for the winners only
+        ids = [component_id for _, _, component_id in top]
+        rows = {}
+        if ids:
+            placeholders = ",".join("?" * len(ids))
+            rows = {
+                row["id"]: row
+                for row in db.execute(
+                    f"SELECT * FROM components WHERE id IN ({placeholders}) AND status != 'flagged'", ids
+                ).fetchall()
+            }
 
     matches = [
         MatchResult(
-            component=_row_to_component_resp(row),
+            component=_row_to_component_resp(rows[component_id]),
             score=s,
             reason=reason,
         )
-        for s, reason, row in top
+        for s, reason, component_id in top
+        if component_id in rows
     ]
 
     suggestions = []
@@ -2,15 +2,17 @@
 
 from __future__ import annotations
 
+import base64
 import uuid
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from pydantic import BaseModel, Field
 
 from ..database import get_db
 from ..deps import get_authenticated_identity
 from ..notifications import send_notification
+from ..services import conversations
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
@@ -18,7 +20,7 @@
 def get_messages_identity(authorization: str | None = Header(None)) -> dict:
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header required")
-    return get_authenticated_identity(authorization=authorization)
+    return get_authenticated_identity(authorization=authorization, x_agent_api_key=None)
 
 
 class MessageSendRequest(BaseModel):
@@ -65,14 +67,8 @@ async def send_message(
         )
 
         # Mark previous received messages from recipient as read when sender replies
-        db.execute(
-            """
-            UPDATE direct_messages
-            SET read = 1
-            WHERE sender_id = ? AND recipient_id = ?
-            """,
-            (request.recipient_id, sender_id),
-        )
+        conversations.mark_read(db, sender_id, request.recipient_id)
+        conversations.record_message(db, message_id, sender_id, request.recipient_id, content, now)
 
     # DM notification trigger
     await send_notification(
@@ -228,78 +224,67 @@ def mark_message_read(
     return {"id": message_id, "read": True}
 
 
+def _encode_cursor(created_at: str, peer_id: str) -> str:
+    """Opaque keyset cursor for ``(last_created_at, peer_id)`` ordered inbox pages."""
+    return base64.urlsafe_b64encode(f"{created_at}|{peer_id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, peer_id = raw.rsplit("|", 1)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, peer_id
+
+
 @router.get("")
-def list_conversations(identity: dict = Depends(get_messages_identity)):
+def list_conversations(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="Keyset cursor from next_cursor"),
+    identity: dict = Depends(get_messages_identity),
+):
     current_user_id = identity["identity_id"]
+    after = _decode_cursor(cursor) if cursor else None
 
     with get_db() as db:
-        rows = db.execute(
-            """
-            SELECT dm.*
-            FROM direct_messages dm
-            JOIN (
-                SELECT
-                    CASE WHEN sender_id = ? THEN recipient_id ELSE sender_id END AS other_user_id,
-                    MAX(created_at) AS last_created_at
-                FROM direct_messages
-                WHERE sender_id = ? OR recipient_id = ?
-                GROUP BY other_user_id
-            ) latest
-              ON (
-                (CASE WHEN dm.sender_id = ? THEN dm.recipient_id ELSE dm.sender_id END) = latest.other_user_id
-                AND dm.created_at = latest.last_created_at
-              )
-            WHERE dm.sender_id = ? OR dm.recipient_id = ?
-            ORDER BY dm.created_at DESC
-            """,
-            (
-                current_user_id,
-                current_user_id,
-                current_user_id,
-                current_user_id,
-                current_user_id,
-                current_user_id,
-            ),
-        ).fetchall()
+        rows = conversations.list_conversations(db, current_user_id, limit + 1, after)
 
-        conversations = []
-        for row in rows:
-            row = dict(row)
-            other_user_id = (
-                row["recipient_id"]
-                if row["sender_id"] == current_user_id
-                else row["sender_id"]
-            )
-            user_row = db.execute(
-                "SELECT id, username FROM users WHERE id = ?",
-                (other_user_id,),
-            ).fetchone()
-
-            unread_count = db.execute(
-                """
-                SELECT COUNT(*) AS cnt FROM direct_messages
-                WHERE sender_id = ? AND recipient_id = ? AND read = 0
-                """,
-                (other_user_id, current_user_id),
-            ).fetchone()["cnt"]
-
-            conversations.append(
-                {
-                    "user_id": other_user_id,
-                    "username": user_row["username"] if user_row else None,
-                    "last_message": {
-                        "id": row["id"],
-                        "sender_id": row["sender_id"],
-                        "recipient_id": row["recipient_id"],
-                        "content": row["content"],
-                        "read": bool(row["read"]),
-                        "created_at": row["created_at"],
-                    },
-                    "unread_count": unread_count,
-                }
-            )
-
-    return {"conversations": conversations}
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["last_created_at"], rows[-1]["peer_id"])
+
+    return {
+        "conversations": [
+            {
+                "user_id": row["peer_id"],
+                "username": row["username"],
+                "last_message": {
+                    "id": row["last_message_id"],
+                    "sender_id": row["last_sender_id"],
+                    "recipient_id": current_user_id if row["last_sender_id"] == row["peer_id"] else row["peer_id"],
+                    "content": row["last_preview"],
+                    "read": bool(row["last_read"]),
+                    "created_at": row["last_created_at"],
+                },
+                "unread_count": row["unread_count"],
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+@router.post("/{user_id}/read")
+def mark_conversation_read(
+    user_id: str,
+    identity: dict = Depends(get_messages_identity),
+):
+    """Mark every message ``user_id`` sent to the caller as read."""
+    with get_db() as db:
+        marked = conversations.mark_read(db, identity["identity_id"], user_id)
+    return {"user_id": user_id, "marked_read": marked}
 
 
 @router.get("/{user_id}")
@@ -328,14 +313,7 @@ def get_conversation_history(
             (current_user_id, user_id, user_id, current_user_id),
         ).fetchall()
 
-        db.execute(
-            """
-            UPDATE direct_messages
-            SET read = 1
-            WHERE sender_id = ? AND recipient_id = ? AND read = 0
-            """,
-            (user_id, current_user_id),
-        )
+        conversations.mark_read(db, current_user_id, user_id)
 
     return {
         "user": {"id": other_user["id"], "username": other_user["username"]},
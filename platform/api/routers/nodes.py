@@ -7,18 +7,18 @@
 
 
 import json
-import math
 import random
 import uuid
 from datetime import datetime, timezone, timedelta
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
 from ..database import get_db
 from ..models.nodes import (
     NodeRegisterRequest,
     NodeHeartbeatRequest,
+    NodeBulkHeartbeatRequest,
     NodeMatchRequest,
     NodeUpdateRequest,
     NodeResponse,
@@ -31,13 +31,19 @@
     NodeHeartbeatStatusResponse,
 )
 from ..deps import get_authenticated_identity
+from ..events import aggregates_changed
+from ..services import geo
+from ..services.heartbeats import Heartbeat, heartbeat_buffer
+from ..services.response_cache import response_cache
 
 router = APIRouter(prefix="/nodes", tags=["nodes"])
 
 # Constants for location fuzzing and heartbeat timeout
 LOCATION_FUZZ_DEGREES = 0.01  # ~1km radius
 HEARTBEAT_TIMEOUT_MINUTES = 5
-EARTH_RADIUS_KM = 6371.0
+EARTH_RADIUS_KM = geo.EARTH_RADIUS_KM
+# First ring searched for k-nearest queries; grows 4x until k nodes are found
+NEAREST_START_RADIUS_KM = 25.0
 
 # Simple offline reverse-geocoding using coarse country bounding boxes.
 # ORDER MATTERS: small/specific countries MUST come before overlapping large ones
@@ -90,16 +96,52 @@ def _fuzz_location(latitude: float, longitude: float) -> tuple[float, float]:
 
 def _haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """Calculate distance between two points using Haversine formula (in km)"""
-    # Convert to radians
-    lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlng = lng2 - lng1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return EARTH_RADIUS_KM * c
+    return geo.haversine_km(lat1, lng1, lat2, lng2)
+
+
+def _nodes_within(db, where: str, params: list, lat: float, lng: float, radius_km: float) -> list[tuple[dict, float]]:
+    """Node rows matching ``where`` within ``radius_km`` of a point, nearest first.
+
+    A bounding-box range scan on the fuzzy-location index loads only candidate
+    rows; exact distances are computed for those alone.
+    """
+    box, box_params = geo.bbox_clause(lat, lng, radius_km, "fuzzy_latitude", "fuzzy_longitude")
+    rows = db.execute(f"SELECT * FROM nodes WHERE {where} AND {box}", [*params, *box_params]).fetchall()
+
+    hits = []
+    for row in rows:
+        row_dict = dict(row)
+        # Use fuzzy coordinates for distance calculation to maintain privacy
+        distance = _haversine_distance(lat, lng, row_dict["fuzzy_latitude"], row_dict["fuzzy_longitude"])
+        if distance <= radius_km:
+            hits.append((row_dict, distance))
+    hits.sort(key=lambda hit: hit[1])
+    return hits
+
+
+def _nearest_nodes(
+    db,
+    where: str,
+    params: list,
+    lat: float,
+    lng: float,
+    k: int,
+    max_km: float = geo.MAX_DISTANCE_KM,
+    accept=None,
+) -> list[tuple[dict, float]]:
+    """The ``k`` nearest nodes matching ``where`` (and ``accept``) within ``max_km``.
+
+    Searches outward in growing rings, so a dense area answers from the first
+    small box instead of scanning every node up to ``max_km``.
+    """
+    radius = min(NEAREST_START_RADIUS_KM, max_km)
+    while True:
+        hits = _nodes_within(db, where, params, lat, lng, radius)
+        if accept is not None:
+            hits = [hit for hit in hits if accept(hit[0])]
+        if len(hits) >= k or radius >= max_km:
+            return hits[:k]
+        radius = min(radius * 4, max_km)
 
 
 def _compute_online_status(last_heartbeat: str | None) -> str:
@@ -237,36 +279,45 @@ def register_node(request: NodeRegisterRequest, identity: dict = Depends(get_aut
         # Fetch and return the created node
         row = db.execute("SELECT * FROM nodes WHERE id = ?", (node_id,)).fetchone()
         
+    aggregates_changed("node_regions")
     logger.info("Node registered: id=%s by=%s", node_id, identity["identity_id"])
     return _row_to_node_detail(dict(row))
 
 
-@router.get("/map")
-async def get_map_nodes(level: str = "node", country_code: str = None):
-    """Get map data. level=node returns node list; level=region returns country aggregation."""
+def _region_counts() -> list[dict]:
     with get_db() as db:
-        if level == "region":
-            rows = db.execute(
-                """
-                SELECT
-                    country_code,
-                    COUNT(*) AS node_count,
-                    SUM(CASE WHEN status IN ('online','idle') THEN 1 ELSE 0 END) AS online_count
-                FROM nodes
-                WHERE country_code IS NOT NULL
-                GROUP BY country_code
-                ORDER BY node_count DESC
-                """
-            ).fetchall()
-            return [
-                {
-                    "country_code": row["country_code"],
-                    "node_count": row["node_count"],
-                    "online_count": row["online_count"] or 0,
-                }
-                for row in rows
-            ]
+        rows = db.execute(
+            """
+            SELECT
+                country_code,
+                COUNT(*) AS node_count,
+                SUM(CASE WHEN status IN ('online','idle') THEN 1 ELSE 0 END) AS online_count
+            FROM nodes
+            WHERE country_code IS NOT NULL
+            GROUP BY country_code
+            ORDER BY node_count DESC, country_code ASC
+            """
+        ).fetchall()
+    return [
+        {
+            "country_code": row["country_code"],
+            "node_count": row["node_count"],
+            "online_count": row["online_count"] or 0,
+        }
+        for row in rows
+    ]
 
+
+@router.get("/map")
+async def get_map_nodes(request: Request, level: str = "node", country_code: str = None):
+    """Get map data. level=node returns node list; level=region returns country aggregation.
+
+    The region aggregation is served from ``response_cache`` with an ETag.
+    """
+    if level == "region":
+        return response_cache.respond(request, "node_regions", _region_counts)
+
+    with get_db() as db:
         # Default node-level response
         cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=HEARTBEAT_TIMEOUT_MINUTES)
 
@@ -304,69 +355,72 @@ async def get_map_nodes(level: str = "node", country_code: str = None):
 
 @router.post("/{node_id}/heartbeat")
 def node_heartbeat(node_id: str, request: NodeHeartbeatRequest, identity: dict = Depends(get_authenticated_identity)):
-    """Update node heartbeat and status for a specific node owned by current identity."""
+    """Record a heartbeat for a node owned by the current identity.
+
+    The write is buffered and flushed to ``nodes`` in batches (see
+    ``services.heartbeats``); the response does not wait for it.
+    """
     now = datetime.now(timezone.utc).isoformat()
 
     with get_db() as db:
-        node = db.execute(
-            "SELECT id FROM nodes WHERE id = ? AND owner_id = ?",
-            (node_id, identity["identity_id"]),
-        ).fetchone()
+        owned = heartbeat_buffer.owned_nodes(db, identity["identity_id"], [node_id])
+    if not owned:
+        raise HTTPException(status_code=403, detail="Node not found or access denied")
 
-        if not node:
-            raise HTTPException(status_code=403, detail="Node not found or access denied")
+    heartbeat_buffer.submit(
+        node_id, Heartbeat(request.status.value, request.current_job_id, request.queue_length, now)
+    )
+    logger.debug("Node heartbeat: id=%s by=%s status=%s", node_id, identity["identity_id"], request.status.value)
+
+    return {"message": "Heartbeat updated", "timestamp": now}
 
-        db.execute(
-            """
-            UPDATE nodes
-            SET status = ?, current_job_id = ?, queue_length = ?,
-                last_heartbeat = ?, updated_at = ?
-            WHERE id = ?
-            """,
-            (
-                request.status.value,
-                request.current_job_id,
-                request.queue_length,
-                now,
-                now,
-                node_id,
-            ),
-        )
 
-        logger.info("Node heartbeat: id=%s by=%s status=%s", node_id, identity["identity_id"], request.status.value)
+@router.post("/heartbeats")
+def bulk_node_heartbeat(request: NodeBulkHeartbeatRequest, identity: dict = Depends(get_authenticated_identity)):
+    """Record heartbeats for many nodes of the current identity in one request.
 
-        return {"message": "Heartbeat updated", "timestamp": now}
+    Nodes the identity does not own are listed in ``rejected``; the rest are
+    accepted.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    node_ids = list(dict.fromkeys(hb.node_id for hb in request.heartbeats))
+
+    with get_db() as db:
+        owned = heartbeat_buffer.owned_nodes(db, identity["identity_id"], node_ids)
+
+    accepted = []
+    for hb in request.heartbeats:
+        if hb.node_id in owned:
+            heartbeat_buffer.submit(hb.node_id, Heartbeat(hb.status.value, hb.current_job_id, hb.queue_length, now))
+            accepted.append(hb.node_id)
+    logger.debug("Bulk heartbeat: by=%s accepted=%d", identity["identity_id"], len(accepted))
+
+    return {
+        "accepted": list(dict.fromkeys(accepted)),
+        "rejected": [node_id for node_id in node_ids if node_id not in owned],
+        "timestamp": now,
+    }
 
 
 @router.get("/nearby", response_model=NearbyNodesResponse)
 def get_nearby_nodes(
     lat: float = Query(..., description="Latitude (also accepts 'latitude')", ge=-90.0, le=90.0),
     lng: float = Query(..., description="Longitude (also accepts 'longitude')", ge=-180.0, le=180.0),
-    radius: float = Query(50.0, description="Search radius in kilometers", gt=0.0, le=1000.0)
+    radius: float = Query(50.0, description="Search radius in kilometers", gt=0.0, le=1000.0),
+    k: Optional[int] = Query(None, ge=1, le=500, description="Return only the k nearest nodes"),
 ):
-    """Find nodes within specified radius of given coordinates"""
+    """Find nodes within specified radius of given coordinates, nearest first"""
     with get_db() as db:
-        # Get all active nodes
+        # Active nodes only
         cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=HEARTBEAT_TIMEOUT_MINUTES)
-        
-        rows = db.execute("""
-            SELECT * FROM nodes 
-            WHERE status != 'offline'
-            AND (last_heartbeat IS NULL OR last_heartbeat > ?)
-        """, (cutoff_time.isoformat(),)).fetchall()
-        
-        # Filter by distance using Haversine formula
-        nearby_nodes = []
-        for row in rows:
-            row_dict = dict(row)
-            # Use fuzzy coordinates for distance calculation to maintain privacy
-            distance = _haversine_distance(
-                lat, lng, 
-                row_dict["fuzzy_latitude"], row_dict["fuzzy_longitude"]
-            )
-            
-            if distance <= radius:
-                nearby_nodes.append(_row_to_node_response(row_dict))
+        where = "status != 'offline' AND (last_heartbeat IS NULL OR last_heartbeat > ?)"
+        params = [cutoff_time.isoformat()]
+
+        if k is not None:
+            hits = _nearest_nodes(db, where, params, lat, lng, k, max_km=radius)
+        else:
+            hits = _nodes_within(db, where, params, lat, lng, radius)
+        nearby_nodes = [_row_to_node_response(row_dict) for row_dict, _ in hits]
         
         return NearbyNodesResponse(
             nodes=nearby_nodes,
@@ -436,36 +490,38 @@ def match_nodes_get(
     lat: float = Query(None, ge=-90.0, le=90.0),
     lng: float = Query(None, ge=-180.0, le=180.0),
     radius: float = Query(100.0, gt=0, le=5000),
+    k: Optional[int] = Query(None, ge=1, le=500, description="Return only the k nearest matches"),
 ):
     """GET version of node matching — find nodes by material, type, and location."""
     with get_db() as db:
-        query = "SELECT * FROM nodes WHERE 1=1"
+        where = "1=1"
         params = []
 
         if node_type:
-            query += " AND node_type = ?"
+            where += " AND node_type = ?"
             params.append(node_type)
 
         if material:
-            query += " AND materials LIKE ?"
+            where += " AND materials LIKE ?"
             params.append(f'%"{material}"%')
 
-        rows = db.execute(query, params).fetchall()
-
-        results = []
-        for row in rows:
-            row_dict = dict(row)
-            distance = None
-            if lat is not None and lng is not None:
-                distance = _haversine_distance(lat, lng, row_dict["fuzzy_latitude"], row_dict["fuzzy_longitude"])
-                if distance > radius:
-                    continue
-            node_resp = _row_to_node_response(row_dict)
-            results.append({"node": node_resp, "distance_km": round(distance, 2) if distance is not None else None})
-
-        # Sort by distance if location provided
         if lat is not None and lng is not None:
-            results.sort(key=lambda x: x["distance_km"] or 0)
+            # Nearest first
+            if k is not None:
+                hits = _nearest_nodes(db, where, params, lat, lng, k, max_km=radius)
+            else:
+                hits = _nodes_within(db, where, params, lat, lng, radius)
+            results = [
+                {"node": _row_to_node_response(row_dict), "distance_km": round(distance, 2)}
+                for row_dict, distance in hits
+            ]
+        else:
+            query = f"SELECT * FROM nodes WHERE {where}"
+            if k is not None:
+                query += " LIMIT ?"
+                params.append(k)
+            rows = db.execute(query, params).fetchall()
+            results = [{"node": _row_to_node_response(dict(row)), "distance_km": None} for row in rows]
 
         return {"matches": results, "total": len(results)}
 
@@ -477,58 +533,51 @@ def match_nodes(request: NodeMatchRequest):
         # Base query for active nodes
         cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=HEARTBEAT_TIMEOUT_MINUTES)
         
-        query = """
-            SELECT * FROM nodes 
-            WHERE status = 'online'
-            AND (last_heartbeat IS NULL OR last_heartbeat > ?)
-        """
+        where = "status = 'online' AND (last_heartbeat IS NULL OR last_heartbeat > ?)"
         params = [cutoff_time.isoformat()]
         
         # Add build volume constraints
         if request.min_build_volume_x is not None:
-            query += " AND (build_volume_x IS NULL OR build_volume_x >= ?)"
+            where += " AND (build_volume_x IS NULL OR build_volume_x >= ?)"
             params.append(request.min_build_volume_x)
         
         if request.min_build_volume_y is not None:
-            query += " AND (build_volume_y IS NULL OR build_volume_y >= ?)"
+            where += " AND (build_volume_y IS NULL OR build_volume_y >= ?)"
             params.append(request.min_build_volume_y)
         
         if request.min_build_volume_z is not None:
-            query += " AND (build_volume_z IS NULL OR build_volume_z >= ?)"
+            where += " AND (build_volume_z IS NULL OR build_volume_z >= ?)"
             params.append(request.min_build_volume_z)
         
-        rows = db.execute(query, params).fetchall()
-        
-        # Filter by materials, capabilities, and distance in Python
-        matching_nodes = []
-        
-        for row in rows:
-            row_dict = dict(row)
-            
+        required_materials = [m.value for m in request.required_materials]
+
+        def _supports(row_dict: dict) -> bool:
             # Check material support
-            if request.required_materials:
+            if required_materials:
                 node_materials = json.loads(row_dict["materials"]) if row_dict["materials"] else []
-                required_materials = [m.value for m in request.required_materials]
                 if not all(mat in node_materials for mat in required_materials):
-                    continue
-            
+                    return False
             # Check capabilities
             if request.required_capabilities:
                 node_capabilities = json.loads(row_dict["capabilities"]) if row_dict["capabilities"] else []
                 if not all(cap in node_capabilities for cap in request.required_capabilities):
-                    continue
-            
-            # Check distance if location provided
-            if (request.latitude is not None and request.longitude is not None 
-                and request.max_distance_km is not None):
-                distance = _haversine_distance(
-                    request.latitude, request.longitude,
-                    row_dict["fuzzy_latitude"], row_dict["fuzzy_longitude"]
-                )
-                if distance > request.max_distance_km:
-                    continue
-            
-            matching_nodes.append(_row_to_node_response(row_dict))
+                    return False
+            return True
+
+        has_location = request.latitude is not None and request.longitude is not None
+        if has_location and request.k is not None:
+            max_km = request.max_distance_km if request.max_distance_km is not None else geo.MAX_DISTANCE_KM
+            rows = [row_dict for row_dict, _ in _nearest_nodes(
+                db, where, params, request.latitude, request.longitude, request.k, max_km=max_km, accept=_supports,
+            )]
+        elif has_location and request.max_distance_km is not None:
+            hits = _nodes_within(db, where, params, request.latitude, request.longitude, request.max_distance_km)
+            rows = [row_dict for row_dict, _ in hits if _supports(row_dict)]
+        else:
+            rows = [dict(row) for row in db.execute(f"SELECT * FROM nodes WHERE {where}", params).fetchall()]
+            rows = [row_dict for row_dict in rows if _supports(row_dict)][:request.k]
+
+        matching_nodes = [_row_to_node_response(row_dict) for row_dict in rows]
         
         return NodeMatchResponse(
             matches=matching_nodes,
@@ -667,5 +716,8 @@ def delete_node(node_id: str, identity: dict = Depends(get_authenticated_identit
         
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Node not found")
-        
-        return {"message": "Node deleted successfully", "node_id": node_id}
\ No newline at end of file
+
+        heartbeat_buffer.forget_node(node_id)
+
+    aggregates_changed("node_regions")
+    return {"message": "Node deleted successfully", "node_id": node_id}
\ No newline at end of file
@@ -25,6 +25,7 @@
 from ..database import get_db
 from ..models.schemas import (
     OrderAcceptRequest,
+    OrderBatchEstimateRequest,
     OrderCreateRequest,
     OrderEstimateRequest,
     OrderMessageCreate,
@@ -32,9 +33,19 @@
     OrderShippingUpdate,
     OrderStatusUpdate,
 )
-from ..services.matching import match_maker_for_order
+from ..services.matching import candidate_makers, match_maker_for_order
+from ..services.mesh_analysis import MESH_FILE_TYPES, analysis_dict, cached_analysis
 from ..deps import get_authenticated_identity
-from ..pricing import estimate_price
+from ..pricing import (
+    DEFAULT_HOURLY_RATE,
+    DEFAULT_HOURS_PER_UNIT,
+    PrintEstimate,
+    estimate_cache,
+    estimate_price,
+    quote_grid,
+    slice_profile,
+    urgency_multiplier,
+)
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
@@ -125,6 +136,28 @@ def _get_user_role_for_order(db, order: dict, agent_id: str) -> str | None:
 
 # ─── Routes ──────────────────────────────────────────────
 
+def _file_geometry(db, file_id: str) -> tuple[str | None, dict | None]:
+    """(content hash, mesh analysis) of an uploaded design; (None, None) when it is not a mesh."""
+    row = db.execute("SELECT sha256, file_type FROM files WHERE id = ?", (file_id,)).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not row["sha256"] or row["file_type"] not in MESH_FILE_TYPES:
+        return None, None
+    return row["sha256"], analysis_dict(cached_analysis(db, row["sha256"]))
+
+
+def _print_estimate(sha256: str | None, geometry: dict | None, profile=None) -> PrintEstimate | None:
+    """Geometry-based print estimate, or None until the mesh has been analysed."""
+    if not geometry or geometry["status"] != "done":
+        return None
+    metrics = {
+        "volume_mm3": geometry["volume_mm3"],
+        "surface_area_mm2": geometry["surface_area_mm2"],
+        "height_mm": geometry["size_mm"][2],
+    }
+    return estimate_cache.get(sha256, metrics, profile or slice_profile())
+
+
 @router.post("", status_code=201)
 def create_order(body: OrderCreateRequest, identity: dict = Depends(get_authenticated_identity)):
     logger.info("Creating order: identity=%s type=%s qty=%d", identity["identity_id"], body.order_type, body.quantity)
@@ -163,10 +196,12 @@ def create_order(body: OrderCreateRequest, identity: dict = Depends(get_authenti
             pass
 
         # 使用定价引擎计算价格
+        estimate = _print_estimate(*_file_geometry(db, body.file_id)) if body.file_id else None
         pricing_result = estimate_price(
             material=body.material or body.material_preference or "PLA",
             quantity=body.quantity,
             maker_hourly_rate=maker_hourly_rate,
+            estimated_hours_per_unit=estimate.hours_per_unit if estimate else DEFAULT_HOURS_PER_UNIT,
             urgency=body.urgency.value
         )
         
@@ -221,19 +256,19 @@ def list_orders(identity: dict = Depends(get_authenticated_identity), page: int
 
         maker_ids = [r["id"] for r in db.execute("SELECT id FROM makers WHERE owner_id = ?", (agent_id,)).fetchall()]
 
-    results: dict = {"as_customer": [], "as_maker": []}
-    for r in customer_orders:
-        results["as_customer"].append(_customer_view(dict(r)))
-
-    if maker_ids:
-        placeholders = ",".join("?" * len(maker_ids))
-        with get_db() as db:
+        maker_orders = []
+        if maker_ids:
+            placeholders = ",".join("?" * len(maker_ids))
             maker_orders = db.execute(
                 f"SELECT * FROM orders WHERE maker_id IN ({placeholders}) ORDER BY created_at DESC LIMIT ? OFFSET ?",
                 maker_ids + [per_page, offset],
             ).fetchall()
-        for r in maker_orders:
-            results["as_maker"].append(_maker_view(dict(r)))
+
+    results: dict = {"as_customer": [], "as_maker": []}
+    for r in customer_orders:
+        results["as_customer"].append(_customer_view(dict(r)))
+    for r in maker_orders:
+        results["as_maker"].append(_maker_view(dict(r)))
 
     return results
 
@@ -402,7 +437,10 @@ def confirm_delivery(order_id: str, identity: dict = Depends(get_authenticated_i
             (now, now, order_id),
         )
         if order["maker_id"]:
-            db.execute("UPDATE makers SET total_orders = total_orders + 1 WHERE id = ?", (order["maker_id"],))
+            db.execute(
+                "UPDATE makers SET total_orders = total_orders + 1, updated_at = ? WHERE id = ?",
+                (now, order["maker_id"]),
+            )
 
     return {"order_id": order_id, "status": "completed"}
 
@@ -442,7 +480,10 @@ def review_order(order_id: str, body: OrderReviewRequest, identity: dict = Depen
                 (order["maker_id"],),
             ).fetchone()
             if avg and avg["avg_r"]:
-                db.execute("UPDATE makers SET rating = ? WHERE id = ?", (round(avg["avg_r"], 2), order["maker_id"]))
+                db.execute(
+                    "UPDATE makers SET rating = ?, updated_at = ? WHERE id = ?",
+                    (round(avg["avg_r"], 2), now, order["maker_id"]),
+                )
 
     return {"id": review_id, "order_id": order_id, "rating": body.rating, "comment": body.comment, "created_at": now}
 
@@ -611,18 +652,95 @@ def estimate_order_price(body: OrderEstimateRequest, identity: dict = Depends(ge
     """Get a price estimate before creating an order."""
     # 如果指定了maker_id，用maker的hourly_rate
     # 否则用默认值
-    maker_hourly_rate = 30.0  # 默认值
-    
-    if body.maker_id:
-        with get_db() as db:
+    maker_hourly_rate = DEFAULT_HOURLY_RATE
+    sha256 = geometry = None
+
+    with get_db() as db:
+        if body.maker_id:
             maker = db.execute("SELECT pricing_per_hour_cny FROM makers WHERE id = ?", (body.maker_id,)).fetchone()
             if maker and maker["pricing_per_hour_cny"]:
                 maker_hourly_rate = maker["pricing_per_hour_cny"]
-    
+        if body.file_id:
+            sha256, geometry = _file_geometry(db, body.file_id)
+
+    estimate = _print_estimate(sha256, geometry, slice_profile(body.profile.model_dump() if body.profile else None))
     result = estimate_price(
         material=body.material or "PLA",
         quantity=body.quantity or 1,
         maker_hourly_rate=maker_hourly_rate,
+        estimated_hours_per_unit=estimate.hours_per_unit if estimate else DEFAULT_HOURS_PER_UNIT,
         urgency=body.urgency or "normal"
     )
+    if body.file_id:
+        result["geometry"] = geometry
+        result["breakdown"]["hours_source"] = "geometry" if estimate else "default"
+        if estimate:
+            result["breakdown"]["filament_g_per_unit"] = estimate.filament_g(body.material or "PLA")
     return result
+
+
+@router.post("/estimate/batch")
+def estimate_order_prices(body: OrderBatchEstimateRequest, identity: dict = Depends(get_authenticated_identity)):
+    """Quote many material/quantity/urgency options against every candidate maker in one call.
+
+    Without ``maker_ids`` the candidates for an option are the open makers
+    offering its material whose build volume fits the part.
+    """
+    sha256 = geometry = None
+    with get_db() as db:
+        if body.file_id:
+            sha256, geometry = _file_geometry(db, body.file_id)
+        size = geometry["size_mm"] if geometry and geometry["status"] == "done" else None
+        if body.maker_ids:
+            placeholders = ",".join("?" for _ in body.maker_ids)
+            makers = [dict(r) for r in db.execute(
+                f"SELECT id, pricing_per_hour_cny FROM makers WHERE id IN ({placeholders})", body.maker_ids
+            ).fetchall()]
+            eligible = None  # explicitly requested makers are quoted for every option
+        else:
+            eligible, by_id = {}, {}
+            for material in {option.material for option in body.options}:
+                rows = candidate_makers(db, material, size)
+                eligible[material] = {row["id"] for row in rows}
+                by_id.update((row["id"], row) for row in rows)
+            makers = list(by_id.values())
+
+    estimate = _print_estimate(sha256, geometry, slice_profile(body.profile.model_dump() if body.profile else None))
+    hours = estimate.hours_per_unit if estimate else DEFAULT_HOURS_PER_UNIT
+    rates = [float(m["pricing_per_hour_cny"]) for m in makers]
+    combos = [(option.quantity, option.urgency) for option in body.options]
+    grid = quote_grid(hours, rates, combos)
+    reference = quote_grid(hours, [DEFAULT_HOURLY_RATE], combos)
+
+    quotes = []
+    for option, totals, (default_total,) in zip(body.options, grid, reference):
+        priced = sorted(
+            (total, maker["id"], rate)
+            for total, maker, rate in zip(totals, makers, rates)
+            if eligible is None or maker["id"] in eligible[option.material]
+        )
+        quote = {
+            "material": option.material,
+            "quantity": option.quantity,
+            "urgency": option.urgency,
+            "urgency_multiplier": urgency_multiplier(option.urgency),
+            "candidates": len(priced),
+            "makers": [
+                {"maker_id": maker_id, "maker_rate_per_hour": rate, "estimated_price_cny": total}
+                for total, maker_id, rate in priced[:body.max_makers]
+            ],
+            "default_rate_price_cny": default_total,  # at the platform's default hourly rate
+            "platform_fee_cny": 0.0,  # 零抽佣
+        }
+        if estimate:
+            quote["filament_g_per_unit"] = estimate.filament_g(option.material)
+        quotes.append(quote)
+
+    return {
+        "file_id": body.file_id,
+        "geometry": geometry,
+        "hours_per_unit": hours,
+        "hours_source": "geometry" if estimate else "default",
+        "layers": estimate.layers if estimate else None,
+        "quotes": quotes,
+    }
@@ -11,6 +11,7 @@
 
 from ..database import get_db
 from ..deps import get_authenticated_identity, require_role
+from ..events import aggregates_changed
 from ..services.evolution import grant_agent_xp
 
 router = APIRouter(prefix="/proof", tags=["proof"])
@@ -66,6 +67,9 @@ def submit_proof(req: ProofSubmitRequest, identity: dict = Depends(get_authentic
         if identity.get("identity_type") == "agent":
             grant_agent_xp(db, identity["identity_id"], 50)
 
+    if identity.get("identity_type") == "agent":
+        aggregates_changed("leaderboard")
+
     return {
         "id": proof_id,
         "node_id": req.node_id,
@@ -155,4 +159,7 @@ def verify_proof(
 
         updated = db.execute("SELECT * FROM manufacturing_proofs WHERE id = ?", (proof_id,)).fetchone()
 
+    if status == "verified":
+        aggregates_changed("leaderboard")
+
     return dict(updated)
@@ -7,6 +7,7 @@
 
 from ..database import get_db
 from ..models.search import SearchResponse, SearchResult
+from ..services import search_index
 
 router = APIRouter(prefix="/search", tags=["search"])
 
@@ -26,21 +27,36 @@ async def search(
     posts = []
     spaces = []
     users = []
+    post_count = 0
+    node_count = 0
+    user_count = 0
     
     with get_db() as db:
         # Search posts
         if type in ["post", "all"]:
-            post_rows = db.execute("""
+            post_select = """
                 SELECT id, title, content, author_id, created_at, upvotes, downvotes, comment_count
-                FROM community_posts 
-                WHERE title LIKE ? OR content LIKE ?
-                ORDER BY upvotes DESC, created_at DESC
-                LIMIT ? OFFSET ?
-            """, (search_term, search_term, limit, offset)).fetchall()
+                FROM community_posts"""
+            post_hits = search_index.search(db, "posts", q, limit, offset)
+            if post_hits is not None:
+                post_rows = search_index.fetch_ranked(db, post_select, post_hits.ids)
+                post_count = post_hits.total
+            else:
+                post_rows = db.execute(post_select + """
+                    WHERE title LIKE ? OR content LIKE ?
+                    ORDER BY upvotes DESC, created_at DESC
+                    LIMIT ? OFFSET ?
+                """, (search_term, search_term, limit, offset)).fetchall()
+                post_count = db.execute(
+                    "SELECT COUNT(*) as c FROM community_posts WHERE title LIKE ? OR content LIKE ?",
+                    (search_term, search_term)
+                ).fetchone()["c"]
             
             for row in post_rows:
                 content = row["content"] or ""
                 snippet = content[:200] + "..." if len(content) > 200 else content
+                if post_hits is not None:
+                    snippet = post_hits.snippets.get(row["id"]) or snippet
                 posts.append(SearchResult(
                     type="post",
                     id=row["id"],
@@ -59,17 +75,29 @@ async def search(
         
         # Search spaces (nodes)
         if type in ["node", "all"]:
-            node_rows = db.execute("""
+            node_select = """
                 SELECT id, name, description, owner_id, node_type, capabilities, materials, status, created_at
-                FROM nodes 
-                WHERE name LIKE ? OR description LIKE ?
-                ORDER BY status DESC, created_at DESC
-                LIMIT ? OFFSET ?
-            """, (search_term, search_term, limit, offset)).fetchall()
+                FROM nodes"""
+            node_hits = search_index.search(db, "nodes", q, limit, offset)
+            if node_hits is not None:
+                node_rows = search_index.fetch_ranked(db, node_select, node_hits.ids)
+                node_count = node_hits.total
+            else:
+                node_rows = db.execute(node_select + """
+                    WHERE name LIKE ? OR description LIKE ?
+                    ORDER BY status DESC, created_at DESC
+                    LIMIT ? OFFSET ?
+                """, (search_term, search_term, limit, offset)).fetchall()
+                node_count = db.execute(
+                    "SELECT COUNT(*) as c FROM nodes WHERE name LIKE ? OR description LIKE ?",
+                    (search_term, search_term)
+                ).fetchone()["c"]
             
             for row in node_rows:
                 description = row["description"] or ""
                 snippet = description[:200] + "..." if len(description) > 200 else description
+                if node_hits is not None:
+                    snippet = node_hits.snippets.get(row["id"]) or snippet
                 spaces.append(SearchResult(
                     type="node",
                     id=row["id"],
@@ -87,13 +115,23 @@ async def search(
         
         # Search users
         if type in ["user", "all"]:
-            user_rows = db.execute("""
+            user_select = """
                 SELECT id, username, email, created_at
-                FROM users
-                WHERE username LIKE ?
-                ORDER BY created_at DESC
-                LIMIT ? OFFSET ?
-            """, (search_term, limit, offset)).fetchall()
+                FROM users"""
+            user_hits = search_index.search(db, "users", q, limit, offset)
+            if user_hits is not None:
+                user_rows = search_index.fetch_ranked(db, user_select, user_hits.ids)
+                user_count = user_hits.total
+            else:
+                user_rows = db.execute(user_select + """
+                    WHERE username LIKE ?
+                    ORDER BY created_at DESC
+                    LIMIT ? OFFSET ?
+                """, (search_term, limit, offset)).fetchall()
+                user_count = db.execute(
+                    "SELECT COUNT(*) as c FROM users WHERE username LIKE ?",
+                    (search_term,)
+                ).fetchone()["c"]
             
             for row in user_rows:
                 users.append(SearchResult(
@@ -108,26 +146,6 @@ async def search(
                     metadata={}
                 ))
         
-        # Totals
-        post_count = 0
-        node_count = 0
-        user_count = 0
-        if type in ["post", "all"]:
-            post_count = db.execute(
-                "SELECT COUNT(*) as c FROM community_posts WHERE title LIKE ? OR content LIKE ?",
-                (search_term, search_term)
-            ).fetchone()["c"]
-        if type in ["node", "all"]:
-            node_count = db.execute(
-                "SELECT COUNT(*) as c FROM nodes WHERE name LIKE ? OR description LIKE ?",
-                (search_term, search_term)
-            ).fetchone()["c"]
-        if type in ["user", "all"]:
-            user_count = db.execute(
-                "SELECT COUNT(*) as c FROM users WHERE username LIKE ?",
-                (search_term,)
-            ).fetchone()["c"]
-        
         total = post_count + node_count + user_count
     
     # Combined results for backward compat
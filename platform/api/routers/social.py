@@ -19,6 +19,7 @@
 from ..database import get_db
 from ..deps import get_authenticated_identity
 from ..notifications import send_notification
+from ..services import timeline
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/social", tags=["social"])
@@ -58,6 +59,7 @@ def follow_user(user_id: str, identity: dict = Depends(get_authenticated_identit
                 raise HTTPException(409, "Already following") from exc
             raise
 
+        timeline.on_follow(db, follower_id, user_id)
         target_user = db.execute("SELECT email, username FROM users WHERE id = ?", (user_id,)).fetchone()
 
     if target_user:
@@ -86,6 +88,7 @@ def unfollow_user(user_id: str, identity: dict = Depends(get_authenticated_ident
         )
         if result.rowcount == 0:
             raise HTTPException(404, "Not following this user")
+        timeline.on_unfollow(db, follower_id, user_id)
 
     logger.info("Unfollow: %s → %s", follower_id, user_id)
     return {"message": "Unfollowed"}
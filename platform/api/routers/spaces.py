@@ -12,6 +12,7 @@
 
 from ..database import get_db
 from ..deps import get_authenticated_identity
+from ..services.hydration import resolve_authors
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/spaces", tags=["spaces"])
@@ -93,12 +94,15 @@ def get_space(name: str):
             raise HTTPException(404, "Space not found")
 
         # Get recent posts
-        posts = db.execute(
-            """SELECT id, title, author_name, upvotes, downvotes, comment_count, created_at
+        posts = [dict(p) for p in db.execute(
+            """SELECT id, title, author_id, upvotes, downvotes, comment_count, created_at
                FROM community_posts WHERE space_id = ?
                ORDER BY created_at DESC LIMIT 20""",
             (row["id"],),
-        ).fetchall()
+        ).fetchall()]
+        authors = resolve_authors(db, (p["author_id"] for p in posts))
+        for p in posts:
+            p.update(authors.get(p["author_id"], {}))
 
         # Get members
         members = db.execute(
@@ -110,7 +114,7 @@ def get_space(name: str):
 
     return {
         **dict(row),
-        "posts": [dict(p) for p in posts],
+        "posts": posts,
         "members": [dict(m) for m in members],
     }
 
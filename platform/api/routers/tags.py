@@ -2,15 +2,17 @@
 
 from collections import defaultdict
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 
 from ..database import get_db
+from ..services.response_cache import response_cache
 
 router = APIRouter(prefix="/tags", tags=["tags"])
 
+TAG_CATEGORIES = frozenset({"craft", "material", "equipment", "scene"})
 
-@router.get("")
-async def list_tags(category: str | None = Query(None, description="craft/material/equipment/scene")):
+
+def _tag_listing(category: str | None) -> dict:
     with get_db() as db:
         if category:
             rows = db.execute(
@@ -29,3 +31,11 @@ async def list_tags(category: str | None = Query(None, description="craft/materi
         grouped[row["category"]].append(dict(row))
 
     return {"categories": grouped}
+
+
+@router.get("")
+async def list_tags(request: Request, category: str | None = Query(None, description="craft/material/equipment/scene")):
+    if category and category not in TAG_CATEGORIES:
+        # Not cached: arbitrary query strings would otherwise each take a cache slot
+        return _tag_listing(category)
+    return response_cache.respond(request, "tags", lambda: _tag_listing(category), key=category or None)
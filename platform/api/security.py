@@ -18,8 +18,16 @@
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes at any other cost need an update, so changing BCRYPT_ROUNDS rehashes on next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 
 def hash_password(password: str) -> str:
@@ -30,6 +38,11 @@ def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
 
+def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """(matches, replacement hash or None when the stored one is current)."""
+    return pwd_context.verify_and_update(plain, hashed)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -0,0 +1,159 @@
+"""Content-addressed, reference-counted storage for uploaded file bodies.
+
+Each distinct body is stored once at ``<root>/ab/cd/<sha256>`` and described
+by a ``file_blobs`` row whose ``ref_count`` is the number of ``files`` rows
+pointing at it. Uploading a body that is already stored only bumps the
+count, and clients that already hold a file with a given hash can register
+another copy without uploading it (``HEAD``/``POST /files/blobs/{sha256}``).
+Knowing a hash is not proof of having the bytes, so claims are limited to
+blobs the caller already references. Blobs whose count dropped to zero are
+deleted by :meth:`BlobStore.collect_garbage` once they have been
+unreferenced for ``BLOB_GC_GRACE_S`` seconds.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from .. import database
+
+logger = logging.getLogger(__name__)
+
+BLOB_GC_INTERVAL_S = int(os.environ.get("BLOB_GC_INTERVAL_S", "3600"))
+BLOB_GC_GRACE_S = int(os.environ.get("BLOB_GC_GRACE_S", "3600"))
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS file_blobs (
+        sha256 TEXT PRIMARY KEY,
+        size BIGINT NOT NULL,
+        path TEXT NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL,
+        released_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_file_blobs_unreferenced ON file_blobs(ref_count, released_at)",
+    "CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files(sha256)",
+]
+
+
+def init_blobs(db) -> None:
+    """Create the blob table (``files.sha256`` must already exist)."""
+    for sql in _SCHEMA:
+        db.execute(sql)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class BlobStore:
+    """Blob files under ``root`` sharded by the first two hash bytes."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        # Serializes file moves against garbage collection within this process
+        self._lock = threading.Lock()
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def lookup(self, db, sha256: str):
+        return db.execute("SELECT * FROM file_blobs WHERE sha256 = ?", (sha256,)).fetchone()
+
+    def adopt(self, db, sha256: str, size: int) -> Path:
+        """Add one reference to the blob of a finished upload, creating its row if needed.
+
+        The body itself is moved in by :meth:`place` once the transaction has
+        committed, so a failed insert never leaves an unreferenced file behind.
+        """
+        path = self.path_for(sha256)
+        db.execute(
+            """
+            INSERT INTO file_blobs (sha256, size, path, ref_count, created_at) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (sha256) DO UPDATE SET ref_count = file_blobs.ref_count + 1, released_at = NULL
+            """,
+            (sha256, size, str(path), _now()),
+        )
+        return path
+
+    def place(self, temp_path: Path, sha256: str) -> Path:
+        """Move a temp file into the blob path; deleted instead when the body is already stored."""
+        path = self.path_for(sha256)
+        with self._lock:
+            if path.exists():
+                temp_path.unlink(missing_ok=True)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_path, path)
+        return path
+
+    def held_by(self, db, sha256: str, owner_id: str, owner_type: str):
+        """The blob row when one of ``owner``'s files already has this body, else None."""
+        return db.execute(
+            """
+            SELECT b.* FROM file_blobs b
+            WHERE b.sha256 = ? AND EXISTS (
+                SELECT 1 FROM files f WHERE f.sha256 = b.sha256 AND f.uploader_id = ? AND f.uploader_type = ?
+            )
+            """,
+            (sha256, owner_id, owner_type),
+        ).fetchone()
+
+    def add_ref(self, db, sha256: str, owner_id: str, owner_type: str):
+        """Reference a blob ``owner`` already holds; returns its row, or None otherwise."""
+        if self.held_by(db, sha256, owner_id, owner_type) is None:
+            return None
+        db.execute(
+            "UPDATE file_blobs SET ref_count = ref_count + 1, released_at = NULL WHERE sha256 = ?",
+            (sha256,),
+        )
+        return self.lookup(db, sha256)
+
+    def release(self, db, sha256: str) -> None:
+        db.execute(
+            """
+            UPDATE file_blobs SET ref_count = ref_count - 1,
+                released_at = CASE WHEN ref_count <= 1 THEN ? ELSE released_at END
+            WHERE sha256 = ? AND ref_count > 0
+            """,
+            (_now(), sha256),
+        )
+
+    def collect_garbage(self, db, grace_s: float = BLOB_GC_GRACE_S) -> int:
+        """Delete blobs unreferenced for longer than ``grace_s``; returns blobs removed."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=grace_s)).isoformat()
+        rows = db.execute(
+            "SELECT sha256, path FROM file_blobs WHERE ref_count <= 0 AND released_at <= ?", (cutoff,)
+        ).fetchall()
+        removed = 0
+        with self._lock:
+            for row in rows:
+                cur = db.execute(
+                    "DELETE FROM file_blobs WHERE sha256 = ? AND ref_count <= 0", (row["sha256"],)
+                )
+                if cur.rowcount:
+                    Path(row["path"]).unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+
+async def gc_loop(store: BlobStore, interval: float = BLOB_GC_INTERVAL_S) -> None:
+    """Background task started from the app lifespan."""
+
+    def collect() -> int:
+        with database.get_db() as db:
+            return store.collect_garbage(db)
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            count = await asyncio.to_thread(collect)
+            if count:
+                logger.info("Blob GC: %d unreferenced blobs removed", count)
+        except Exception:
+            logger.exception("Blob GC failed")
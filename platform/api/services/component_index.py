@@ -0,0 +1,282 @@
+"""组件倒排索引 — in-memory inverted index behind ``POST /match``.
+
+Component text (display_name, description, tags) is tokenized into words
+plus CJK character bigrams, so Chinese needs like ``手机支架`` match without
+spaces. Tags, compute platform and material get their own posting lists.
+A query scores only the components that appear in at least one posting
+list for its terms, and keeps the top k with a heap.
+
+The index follows the ``components`` table by signature (row count + newest
+``updated_at``): new or updated rows are upserted incrementally and the
+index is rebuilt only when rows disappear, so every write to ``components``
+must bump ``updated_at``. Searches run without a lock, so a published index is
+never modified: catching up works on a copy that then replaces it.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+
+from .. import database
+from ..models.schemas import MatchRequest
+
+logger = logging.getLogger(__name__)
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"([{_CJK}]+)|([^\W_{_CJK}]+)")
+
+# Components scoring at or below this are not returned
+MIN_SCORE = 0.05
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens; CJK runs become character bigrams (single chars stay unigrams)."""
+    tokens: list[str] = []
+    for cjk, word in _TOKEN_RE.findall((text or "").lower()):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def _doc_tokens(text: str) -> set[str]:
+    # Index CJK unigrams too so single-character query terms can match
+    tokens = set(tokenize(text))
+    for cjk, _ in _TOKEN_RE.findall((text or "").lower()):
+        tokens.update(cjk)
+    return tokens
+
+
+def _is_cjk(token: str) -> bool:
+    return bool(re.match(rf"[{_CJK}]", token))
+
+
+@dataclass
+class _Doc:
+    id: str
+    tokens: set[str]
+    tags: set[str]
+    compute: str
+    material: str
+    cost: float | None
+    rating: float
+    review_count: int
+    updated_at: str
+    flagged: bool
+    seq: int  # insertion order, breaks score ties
+
+
+@dataclass
+class ComponentIndex:
+    docs: dict[str, _Doc] = field(default_factory=dict)
+    postings: dict[str, set[str]] = field(default_factory=dict)
+    tag_postings: dict[str, set[str]] = field(default_factory=dict)
+    compute_postings: dict[str, set[str]] = field(default_factory=dict)
+    material_postings: dict[str, set[str]] = field(default_factory=dict)
+    max_updated_at: str = ""
+    _seq: int = 0
+    _vocab: list[str] | None = None  # sorted text tokens for prefix lookups
+
+    # ─── Maintenance ─────────────────────────────────────
+
+    def copy(self) -> "ComponentIndex":
+        """Independent posting lists (docs are never mutated, so they are shared)."""
+        return ComponentIndex(
+            docs=dict(self.docs),
+            postings={k: set(v) for k, v in self.postings.items()},
+            tag_postings={k: set(v) for k, v in self.tag_postings.items()},
+            compute_postings={k: set(v) for k, v in self.compute_postings.items()},
+            material_postings={k: set(v) for k, v in self.material_postings.items()},
+            max_updated_at=self.max_updated_at,
+            _seq=self._seq,
+            _vocab=self._vocab,
+        )
+
+    def upsert(self, row) -> None:
+        """Add or replace one component row; flagged components stay out of the postings."""
+        row = dict(row)
+        self.remove(row["id"])
+        tags = json.loads(row["tags"] or "[]")
+        doc = _Doc(
+            id=row["id"],
+            tokens=_doc_tokens(f"{row['display_name']} {row['description']} {' '.join(tags)}"),
+            tags={t.lower() for t in tags},
+            compute=(row["compute"] or "").lower(),
+            material=(row.get("material") or "").lower(),
+            cost=row["estimated_cost_cny"],
+            rating=row["rating"] or 0.0,
+            review_count=row["review_count"] or 0,
+            updated_at=row["updated_at"] or "",
+            flagged=row["status"] == "flagged",
+            seq=self._seq,
+        )
+        self._seq += 1
+        self.docs[doc.id] = doc
+        self.max_updated_at = max(self.max_updated_at, doc.updated_at)
+        if doc.flagged:
+            return
+        for token in doc.tokens:
+            self.postings.setdefault(token, set()).add(doc.id)
+        for tag in doc.tags:
+            self.tag_postings.setdefault(tag, set()).add(doc.id)
+        if doc.compute:
+            self.compute_postings.setdefault(doc.compute, set()).add(doc.id)
+        if doc.material:
+            self.material_postings.setdefault(doc.material, set()).add(doc.id)
+        self._vocab = None
+
+    def remove(self, component_id: str) -> None:
+        doc = self.docs.pop(component_id, None)
+        if doc is None or doc.flagged:
+            return
+        for index, keys in (
+            (self.postings, doc.tokens),
+            (self.tag_postings, doc.tags),
+            (self.compute_postings, {doc.compute}),
+            (self.material_postings, {doc.material}),
+        ):
+            for key in keys:
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(component_id)
+                    if not ids:
+                        del index[key]
+        self._vocab = None
+
+    # ─── Query ───────────────────────────────────────────
+
+    def _expand(self, token: str) -> set[str]:
+        """Indexed tokens a query token matches: exact for CJK, by prefix for words."""
+        if _is_cjk(token):
+            return {token} if token in self.postings else set()
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        start = bisect.bisect_left(self._vocab, token)
+        end = bisect.bisect_left(self._vocab, token + "\uffff")
+        return set(self._vocab[start:end])
+
+    def search(self, req: MatchRequest, limit: int) -> list[tuple[float, str, str]]:
+        """Top ``limit`` (score, reason, component_id) for a match request, best first."""
+        keywords = [kw for kw in req.need.lower().split() if kw]
+        keyword_terms = [[self._expand(t) for t in tokenize(kw)] for kw in keywords]
+        hw_set = {h.lower() for h in req.hardware_available}
+        printer_materials = {m.lower() for m in req.printer_materials or []}
+
+        candidates: set[str] = set()
+        for terms in keyword_terms:
+            for expanded in terms:
+                for token in expanded:
+                    candidates |= self.postings[token]
+        for hw in hw_set:
+            candidates |= self.tag_postings.get(hw, set())
+            candidates |= self.compute_postings.get(hw, set())
+        for material in printer_materials:
+            candidates |= self.material_postings.get(material, set())
+
+        scored = []
+        for component_id in candidates:
+            doc = self.docs[component_id]
+            score, reason = _score(doc, req, keywords, keyword_terms, hw_set, printer_materials)
+            if score > MIN_SCORE:
+                scored.append((score, -doc.seq, component_id, reason))
+        top = heapq.nlargest(limit, scored, key=lambda s: (s[0], s[1]))
+        return [(score, reason, component_id) for score, _, component_id, reason in top]
+
+
+def _score(doc: _Doc, req: MatchRequest, keywords, keyword_terms, hw_set, printer_materials) -> tuple[float, str]:
+    """匹配评分：关键词 + 标签 + 硬件 + 预算 + 材料 + 社区评价"""
+    score = 0.0
+    reasons = []
+
+    # 1. 关键词匹配 (0-0.3) — each keyword counts by the share of its tokens found
+    matched_kw = 0.0
+    for terms in keyword_terms:
+        if terms:
+            matched_kw += sum(1 for expanded in terms if not doc.tokens.isdisjoint(expanded)) / len(terms)
+    kw_score = min(matched_kw / max(len(keywords), 1) * 0.3, 0.3)
+    score += kw_score
+    if kw_score > 0.1:
+        reasons.append(f"关键词匹配 {round(matched_kw, 1):g}/{len(keywords)}")
+
+    # 2. 标签匹配 (0-0.25)
+    tag_overlap = len(hw_set & doc.tags)
+    tag_score = min(tag_overlap * 0.08, 0.25)
+    score += tag_score
+    if tag_overlap:
+        reasons.append(f"标签重叠 {tag_overlap} 个")
+
+    # 3. 硬件匹配 (0-0.25)
+    if doc.compute and doc.compute in hw_set:
+        score += 0.25
+        reasons.append("计算平台匹配")
+    elif doc.compute:
+        score += 0.05
+
+    # 4. 预算匹配 (0-0.1)
+    if req.budget_cny and doc.cost:
+        if doc.cost <= req.budget_cny:
+            score += 0.1
+            reasons.append("预算内")
+        elif doc.cost <= req.budget_cny * 1.3:
+            score += 0.05
+
+    # 5. 材料匹配 (0-0.15)
+    if doc.material and doc.material in printer_materials:
+        score += 0.15
+        reasons.append(f"材料匹配 ({doc.material})")
+
+    # 6. 社区评价加分 (0-0.1)
+    if doc.review_count > 0:
+        score += min(doc.rating / 5.0 * 0.1, 0.1)
+
+    reason = "；".join(reasons) if reasons else "基础匹配"
+    return round(min(score, 1.0), 3), reason
+
+
+# ─── Process-wide index ──────────────────────────────────
+
+_index: ComponentIndex | None = None
+_index_key: str | None = None
+_lock = threading.Lock()
+
+
+def _db_key() -> str:
+    return database.DATABASE_URL if database.USE_POSTGRES else str(database.DB_PATH)
+
+
+def get_component_index(db) -> ComponentIndex:
+    """Return the index, catching up with the ``components`` table first."""
+    global _index, _index_key
+    sig = db.execute("SELECT COUNT(*) AS n, MAX(updated_at) AS v FROM components").fetchone()
+    count, newest = sig["n"], sig["v"] or ""
+
+    with _lock:
+        key = _db_key()
+        index = _index if _index_key == key else None
+        if index is not None and len(index.docs) == count and index.max_updated_at == newest:
+            return index
+
+        if index is not None:
+            index = index.copy()  # the published one may be in use by a search
+            for row in db.execute(
+                "SELECT * FROM components WHERE updated_at >= ?", (index.max_updated_at,)
+            ).fetchall():
+                index.upsert(row)
+        if index is None or len(index.docs) != count:
+            # Rows were deleted (or the database changed): rebuild from scratch
+            index = ComponentIndex()
+            for row in db.execute("SELECT * FROM components").fetchall():
+                index.upsert(row)
+            logger.info("Component index rebuilt (%d components)", len(index.docs))
+        index._vocab = sorted(index.postings)
+        _index, _index_key = index, key
+        return index
@@ -0,0 +1,138 @@
+"""Direct-message inbox summaries.
+
+``conversations`` holds one row per participant and counterparty. Each row
+carries the last message's ID, sender, preview and time, plus that
+participant's unread counter. Rows are updated in the same transaction as the
+``direct_messages`` write (:func:`record_message`, :func:`mark_read`). Listing
+an inbox is then one keyset query on ``(owner_id, last_created_at, peer_id)``,
+however long the message history is.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_PREVIEW_CHARS = 280
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS conversations (
+        owner_id TEXT NOT NULL,
+        peer_id TEXT NOT NULL,
+        last_message_id TEXT NOT NULL,
+        last_sender_id TEXT NOT NULL,
+        last_preview TEXT NOT NULL,
+        last_read INTEGER NOT NULL DEFAULT 0,
+        last_created_at TEXT NOT NULL,
+        unread_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (owner_id, peer_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_owner_recent ON conversations(owner_id, last_created_at, peer_id)",
+]
+
+
+def init_conversations(db) -> None:
+    """Create the summary table; build it from ``direct_messages`` on first run."""
+    for sql in _SCHEMA:
+        db.execute(sql)
+    if db.execute("SELECT 1 FROM conversations LIMIT 1").fetchone() is None:
+        if db.execute("SELECT 1 FROM direct_messages LIMIT 1").fetchone() is not None:
+            rebuild_conversations(db)
+
+
+def rebuild_conversations(db) -> None:
+    """Recompute every summary from ``direct_messages``."""
+    db.execute("DELETE FROM conversations")
+    db.execute(
+        """
+        INSERT INTO conversations (
+            owner_id, peer_id, last_message_id, last_sender_id, last_preview,
+            last_read, last_created_at, unread_count
+        )
+        SELECT owner_id, peer_id, id, sender_id, SUBSTR(content, 1, ?), read, created_at,
+               (SELECT COUNT(*) FROM direct_messages u
+                WHERE u.sender_id = ranked.peer_id AND u.recipient_id = ranked.owner_id AND u.read = 0)
+        FROM (
+            SELECT sides.*, ROW_NUMBER() OVER (
+                PARTITION BY owner_id, peer_id ORDER BY created_at DESC, id DESC
+            ) AS rn
+            FROM (
+                SELECT sender_id AS owner_id, recipient_id AS peer_id, id, sender_id, content, read, created_at
+                FROM direct_messages
+                UNION ALL
+                SELECT recipient_id, sender_id, id, sender_id, content, read, created_at
+                FROM direct_messages
+            ) sides
+        ) ranked
+        WHERE rn = 1
+        """,
+        (CONVERSATION_PREVIEW_CHARS,),
+    )
+    logger.info("Conversation summaries rebuilt")
+
+
+def record_message(db, message_id: str, sender_id: str, recipient_id: str, content: str, created_at: str) -> None:
+    """Make a just-inserted message the last one of both participants' summaries."""
+    preview = content[:CONVERSATION_PREVIEW_CHARS]
+    for owner_id, peer_id, unread in ((sender_id, recipient_id, 0), (recipient_id, sender_id, 1)):
+        db.execute(
+            """
+            INSERT INTO conversations (
+                owner_id, peer_id, last_message_id, last_sender_id, last_preview,
+                last_read, last_created_at, unread_count
+            ) VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+            ON CONFLICT (owner_id, peer_id) DO UPDATE SET
+                last_message_id = excluded.last_message_id,
+                last_sender_id = excluded.last_sender_id,
+                last_preview = excluded.last_preview,
+                last_read = 0,
+                last_created_at = excluded.last_created_at,
+                unread_count = conversations.unread_count + excluded.unread_count
+            """,
+            (owner_id, peer_id, message_id, sender_id, preview, created_at, unread),
+        )
+
+
+def mark_read(db, reader_id: str, peer_id: str) -> int:
+    """Mark everything ``peer_id`` sent to ``reader_id`` as read; returns messages updated."""
+    cursor = db.execute(
+        "UPDATE direct_messages SET read = 1 WHERE sender_id = ? AND recipient_id = ? AND read = 0",
+        (peer_id, reader_id),
+    )
+    db.execute(
+        "UPDATE conversations SET unread_count = 0 WHERE owner_id = ? AND peer_id = ?",
+        (reader_id, peer_id),
+    )
+    db.execute(
+        """
+        UPDATE conversations SET last_read = 1
+        WHERE last_sender_id = ? AND ((owner_id = ? AND peer_id = ?) OR (owner_id = ? AND peer_id = ?))
+        """,
+        (peer_id, reader_id, peer_id, peer_id, reader_id),
+    )
+    return cursor.rowcount
+
+
+def list_conversations(db, owner_id: str, limit: int, after: Optional[tuple[str, str]] = None) -> list:
+    """Newest-first summaries of ``owner_id``'s inbox, after the ``(last_created_at, peer_id)`` keyset."""
+    where, params = "c.owner_id = ?", [owner_id]
+    if after:
+        where += " AND (c.last_created_at < ? OR (c.last_created_at = ? AND c.peer_id < ?))"
+        params += [after[0], after[0], after[1]]
+    return db.execute(
+        f"""
+        SELECT c.*, u.username
+        FROM conversations c LEFT JOIN users u ON u.id = c.peer_id
+        WHERE {where}
+        ORDER BY c.last_created_at DESC, c.peer_id DESC
+        LIMIT ?
+        """,
+        (*params, limit),
+    ).fetchall()
+
+
+def remove_user(db, user_id: str) -> None:
+    """Drop a deleted account's inbox and its rows in everyone else's."""
+    db.execute("DELETE FROM conversations WHERE owner_id = ? OR peer_id = ?", (user_id, user_id))
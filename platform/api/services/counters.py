@@ -0,0 +1,319 @@
+"""Platform counters for ``/api/v1/stats`` and ``/admin/stats``.
+
+Row counts of the big tables live in ``platform_counters`` and per-day post
+and comment counts in ``platform_daily``. Both are kept exact by triggers on
+the source tables, SQLite triggers or a PL/pgSQL function on Postgres, so
+every writer is covered, including raw SQL and migrations. The stats
+endpoints read a handful of rows instead of running a ``COUNT(*)`` per table,
+each a sequential scan on Postgres.
+
+Distinct active authors per day (``active_today``) are estimated with a
+HyperLogLog sketch. ``platform_activity`` stores one ``(day, register, rank)``
+row per register, so adding an author is an idempotent max-upsert from the
+post/comment write paths (:func:`record_activity`). With
+``2**ACTIVITY_HLL_PRECISION`` registers the standard error is about 3%, and
+small days are counted exactly by the linear-counting correction. Deleting
+content does not lower the estimate.
+
+:data:`counter_snapshot` caches the assembled numbers for
+``STATS_SNAPSHOT_TTL_S`` seconds per process, so the polled landing-page
+endpoint is O(1).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from .. import database
+
+logger = logging.getLogger(__name__)
+
+STATS_SNAPSHOT_TTL_S = float(os.environ.get("STATS_SNAPSHOT_TTL_S", "5"))
+ACTIVITY_RETENTION_DAYS = int(os.environ.get("ACTIVITY_RETENTION_DAYS", "30"))
+ACTIVITY_HLL_PRECISION = 10
+
+
+@dataclass(frozen=True)
+class _Counter:
+    name: str
+    table: str
+    # Optional row predicate; "{row}" is replaced by new/old/the table name
+    predicate: Optional[str] = None
+    watched: Optional[str] = None  # column whose UPDATE can flip the predicate
+
+
+COUNTERS = (
+    _Counter("components", "components"),
+    _Counter("agents", "agents"),
+    _Counter("makers", "makers"),
+    _Counter("makers_open", "makers", "COALESCE({row}.availability = 'open', FALSE)", "availability"),
+    _Counter("orders", "orders"),
+    _Counter("users", "users"),
+    _Counter("posts", "community_posts"),
+    _Counter("spaces", "nodes"),
+    _Counter("comments", "community_comments"),
+)
+
+# Per-day row counts keyed by the first ten characters (YYYY-MM-DD) of created_at
+DAILY = (("posts", "community_posts"), ("comments", "community_comments"))
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS platform_counters (
+        name TEXT PRIMARY KEY,
+        value BIGINT NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS platform_daily (
+        day TEXT NOT NULL,
+        name TEXT NOT NULL,
+        value BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS platform_activity (
+        day TEXT NOT NULL,
+        register INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        PRIMARY KEY (day, register)
+    )""",
+]
+
+_PG_FUNCTIONS = [
+    """CREATE OR REPLACE FUNCTION rwc_bump_counter() RETURNS trigger AS $$
+    BEGIN
+        UPDATE platform_counters SET value = value + TG_ARGV[1]::int WHERE name = TG_ARGV[0];
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION rwc_bump_daily() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO platform_daily (day, name, value) VALUES (substr(NEW.created_at::text, 1, 10), TG_ARGV[0], 1)
+            ON CONFLICT (day, name) DO UPDATE SET value = platform_daily.value + 1;
+        ELSE
+            UPDATE platform_daily SET value = value - 1
+            WHERE day = substr(OLD.created_at::text, 1, 10) AND name = TG_ARGV[0];
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+]
+
+
+def _is_sqlite(db) -> bool:
+    return isinstance(db, sqlite3.Connection)
+
+
+def _counter_triggers(counter: _Counter) -> list[tuple[str, str, Optional[str], int]]:
+    """(trigger name, event, WHEN condition, delta) for one counter."""
+    base = f"counter_{counter.name}"
+    if counter.predicate is None:
+        return [(f"{base}_ai", "INSERT", None, 1), (f"{base}_ad", "DELETE", None, -1)]
+    new, old = counter.predicate.format(row="new"), counter.predicate.format(row="old")
+    update = f"UPDATE OF {counter.watched}"
+    return [
+        (f"{base}_ai", "INSERT", new, 1),
+        (f"{base}_ad", "DELETE", old, -1),
+        (f"{base}_au_on", update, f"{new} AND NOT {old}", 1),
+        (f"{base}_au_off", update, f"{old} AND NOT {new}", -1),
+    ]
+
+
+def _sqlite_triggers() -> list[str]:
+    sqls = []
+    for counter in COUNTERS:
+        for name, event, when, delta in _counter_triggers(counter):
+            condition = f" WHEN {when}" if when else ""
+            sqls.append(
+                f"""CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {counter.table}{condition} BEGIN
+                    UPDATE platform_counters SET value = value + ({delta}) WHERE name = '{counter.name}';
+                END"""
+            )
+    for name, table in DAILY:
+        sqls += [
+            f"""CREATE TRIGGER IF NOT EXISTS daily_{name}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO platform_daily (day, name, value) VALUES (substr(new.created_at, 1, 10), '{name}', 1)
+                ON CONFLICT (day, name) DO UPDATE SET value = value + 1;
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS daily_{name}_ad AFTER DELETE ON {table} BEGIN
+                UPDATE platform_daily SET value = value - 1
+                WHERE day = substr(old.created_at, 1, 10) AND name = '{name}';
+            END""",
+        ]
+    return sqls
+
+
+def _pg_triggers() -> list[str]:
+    sqls = []
+    for counter in COUNTERS:
+        for name, event, when, delta in _counter_triggers(counter):
+            condition = f" WHEN ({when})" if when else ""
+            sqls += [
+                f"DROP TRIGGER IF EXISTS {name} ON {counter.table}",
+                f"CREATE TRIGGER {name} AFTER {event} ON {counter.table} FOR EACH ROW{condition} "
+                f"EXECUTE FUNCTION rwc_bump_counter('{counter.name}', '{delta}')",
+            ]
+    for name, table in DAILY:
+        sqls += [
+            f"DROP TRIGGER IF EXISTS daily_{name} ON {table}",
+            f"CREATE TRIGGER daily_{name} AFTER INSERT OR DELETE ON {table} FOR EACH ROW "
+            f"EXECUTE FUNCTION rwc_bump_daily('{name}')",
+        ]
+    return sqls
+
+
+def init_counters(db) -> None:
+    """Create the counter tables and triggers; seed counters that don't exist yet."""
+    for sql in _SCHEMA:
+        db.execute(sql)
+    if _is_sqlite(db):
+        for sql in _sqlite_triggers():
+            db.execute(sql)
+    else:
+        for sql in _PG_FUNCTIONS + _pg_triggers():
+            db.execute(sql)
+
+    seeded = {row["name"] for row in db.execute("SELECT name FROM platform_counters").fetchall()}
+    missing = [counter for counter in COUNTERS if counter.name not in seeded]
+    for counter in missing:
+        _seed_counter(db, counter)
+    if len(missing) == len(COUNTERS):  # first run: daily buckets and today's activity too
+        _seed_daily(db)
+        _seed_activity(db, _today())
+    prune_activity(db)
+
+
+def _seed_counter(db, counter: _Counter) -> None:
+    where = f" WHERE {counter.predicate.format(row=counter.table)}" if counter.predicate else ""
+    count = db.execute(f"SELECT COUNT(*) FROM {counter.table}{where}").fetchone()[0]
+    db.execute(
+        "INSERT INTO platform_counters (name, value) VALUES (?, ?) "
+        "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+        (counter.name, count),
+    )
+
+
+def _seed_daily(db) -> None:
+    for name, table in DAILY:
+        db.execute("DELETE FROM platform_daily WHERE name = ?", (name,))
+        db.execute(
+            f"""
+            INSERT INTO platform_daily (day, name, value)
+            SELECT substr(created_at, 1, 10), ?, COUNT(*) FROM {table} GROUP BY substr(created_at, 1, 10)
+            """,
+            (name,),
+        )
+
+
+def _seed_activity(db, day: str) -> None:
+    rows = db.execute(
+        """
+        SELECT author_id FROM community_posts WHERE created_at >= ?
+        UNION
+        SELECT author_id FROM community_comments WHERE created_at >= ?
+        """,
+        (day, day),
+    ).fetchall()
+    for row in rows:
+        record_activity(db, row["author_id"], day)
+
+
+def rebuild_counters(db) -> None:
+    """Recount everything from the source tables (after bulk imports or restores)."""
+    for counter in COUNTERS:
+        _seed_counter(db, counter)
+    _seed_daily(db)
+    db.execute("DELETE FROM platform_activity")
+    _seed_activity(db, _today())
+    logger.info("Platform counters rebuilt")
+
+
+# ─── Distinct-actor sketch ───────────────────────────────
+
+
+def _register_and_rank(actor_id: str, precision: int = ACTIVITY_HLL_PRECISION) -> tuple[int, int]:
+    h = int.from_bytes(hashlib.blake2b(actor_id.encode("utf-8"), digest_size=8).digest(), "big")
+    bits = 64 - precision
+    rest = h & ((1 << bits) - 1)
+    return h >> bits, bits - rest.bit_length() + 1
+
+
+def estimate_distinct(ranks: list[int], precision: int = ACTIVITY_HLL_PRECISION) -> int:
+    """HyperLogLog estimate from the non-zero register ranks."""
+    m = 1 << precision
+    empty = m - len(ranks)
+    harmonic = sum(2.0 ** -rank for rank in ranks) + empty
+    estimate = (0.7213 / (1 + 1.079 / m)) * m * m / harmonic
+    if estimate <= 2.5 * m and empty > 0:
+        estimate = m * math.log(m / empty)  # linear counting for small cardinalities
+    return round(estimate)
+
+
+def record_activity(db, actor_id: str, created_at: str) -> None:
+    """Count ``actor_id`` as active on the day of ``created_at``."""
+    register, rank = _register_and_rank(actor_id)
+    db.execute(
+        """
+        INSERT INTO platform_activity (day, register, rank) VALUES (?, ?, ?)
+        ON CONFLICT (day, register) DO UPDATE SET rank = excluded.rank
+        WHERE excluded.rank > platform_activity.rank
+        """,
+        (created_at[:10], register, rank),
+    )
+
+
+def prune_activity(db, now: Optional[datetime] = None) -> None:
+    cutoff = ((now or datetime.now(timezone.utc)) - timedelta(days=ACTIVITY_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    db.execute("DELETE FROM platform_activity WHERE day < ?", (cutoff,))
+
+
+# ─── Reading ─────────────────────────────────────────────
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def read_counters(db, day: Optional[str] = None) -> dict:
+    """Totals, the day's post/comment counts and its estimated active authors."""
+    day = day or _today()
+    result = {name: 0 for name in (c.name for c in COUNTERS)}
+    for row in db.execute("SELECT name, value FROM platform_counters").fetchall():
+        result[row["name"]] = row["value"]
+    for name, _ in DAILY:
+        result[f"{name}_today"] = 0
+    for row in db.execute("SELECT name, value FROM platform_daily WHERE day = ?", (day,)).fetchall():
+        result[f"{row['name']}_today"] = row["value"]
+    ranks = [row["rank"] for row in db.execute("SELECT rank FROM platform_activity WHERE day = ?", (day,)).fetchall()]
+    result["active_today"] = estimate_distinct(ranks)
+    return result
+
+
+class CounterSnapshot:
+    """Per-process copy of :func:`read_counters`, refreshed at most every ``ttl`` seconds."""
+
+    def __init__(self, ttl: float = STATS_SNAPSHOT_TTL_S):
+        self.ttl = ttl
+        self._value: Optional[dict] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> dict:
+        with self._lock:
+            if self._value is None or time.monotonic() >= self._expires:
+                with database.get_db() as db:
+                    self._value = read_counters(db)
+                self._expires = time.monotonic() + self.ttl
+            return dict(self._value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._value = None
+
+
+counter_snapshot = CounterSnapshot()
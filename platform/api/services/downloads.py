@@ -0,0 +1,96 @@
+"""Conditional, ranged and offloaded responses for file downloads.
+
+Files in the blob store get a strong ``ETag`` built from their SHA-256, so a
+repeat request with a matching ``If-None-Match`` is answered 304 without
+opening the file. ``Range``/``If-Range`` requests, including multi-range,
+are served as 206 by Starlette's ``FileResponse``. That response also hands
+the path to the server (``http.response.pathsend``) when the server can send
+files itself.
+
+Setting ``FILES_SENDFILE_HEADER`` offloads the transfer to the front proxy,
+which then sends the bytes and ranges with ``sendfile(2)``. Use
+``X-Accel-Redirect`` for nginx, with ``FILES_SENDFILE_PREFIX`` mapped to the
+uploads directory by an internal location, or ``X-Sendfile`` for
+Apache/lighttpd.
+
+Signed URLs let clients such as printer nodes fetch a file for
+``FILES_SIGNED_URL_TTL_S`` seconds without credentials. The HMAC covers the
+content hash, the download name and the expiry, so serving a signed URL
+needs no database access. Deleting a file does not revoke URLs that were
+already issued; they simply expire.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from ..security import SECRET_KEY
+
+FILES_SIGNED_URL_TTL_S = int(os.environ.get("FILES_SIGNED_URL_TTL_S", "300"))
+FILES_SENDFILE_HEADER = os.environ.get("FILES_SENDFILE_HEADER", "")
+FILES_SENDFILE_PREFIX = os.environ.get("FILES_SENDFILE_PREFIX", "/_uploads/")
+
+
+def etag_for(sha256: str) -> str:
+    return f'"{sha256}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """``If-None-Match`` evaluation (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def sign_download(sha256: str, filename: str, expires: int) -> str:
+    message = f"{sha256}/{filename}:{expires}".encode("utf-8")
+    return hmac.new(SECRET_KEY.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def verify_download(sha256: str, filename: str, expires: int, signature: str, now: Optional[float] = None) -> bool:
+    if expires < (time.time() if now is None else now):
+        return False
+    return hmac.compare_digest(sign_download(sha256, filename, expires), signature)
+
+
+def _offloaded(path: Path, root: Path, filename: str, media_type: str, headers: dict) -> Optional[Response]:
+    if FILES_SENDFILE_HEADER.lower() == "x-accel-redirect":
+        try:
+            target = FILES_SENDFILE_PREFIX.rstrip("/") + "/" + path.resolve().relative_to(root.resolve()).as_posix()
+        except ValueError:
+            return None  # outside the mapped directory; serve it ourselves
+    else:
+        target = str(path.resolve())
+    headers = {
+        **headers,
+        FILES_SENDFILE_HEADER: target,
+        "Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}",
+    }
+    return Response(media_type=media_type, headers=headers)
+
+
+def file_response(
+    request: Request, path: Path, filename: str, media_type: str, sha256: Optional[str], root: Path
+) -> Response:
+    """Serve ``path`` honouring ``If-None-Match``, ``Range`` and the sendfile offload setting."""
+    headers = {"Cache-Control": "private, no-cache"}
+    if sha256:
+        headers["ETag"] = etag_for(sha256)
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    if FILES_SENDFILE_HEADER:
+        response = _offloaded(path, root, filename, media_type, headers)
+        if response is not None:
+            return response
+    return FileResponse(path=str(path), filename=filename, media_type=media_type, headers=headers)
@@ -0,0 +1,66 @@
+"""Geospatial helpers — great-circle distance and index-friendly bounding boxes."""
+
+from __future__ import annotations
+
+import math
+
+EARTH_RADIUS_KM = 6371.0
+# Half the circumference: no two points on the sphere are farther apart
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in km."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> tuple[float, float, list[tuple[float, float]]]:
+    """Return ``(min_lat, max_lat, lng_ranges)`` enclosing the circle around a point.
+
+    The box is exact for the circle's extent in latitude and uses the widest
+    longitude span reached inside it, so every point within ``radius_km`` is
+    inside the box. Longitude ranges split in two across the antimeridian and
+    widen to the whole globe when the circle covers a pole.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angular)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90.0 or max_lat >= 90.0 or angular >= math.pi / 2:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+
+    ratio = math.sin(angular) / math.cos(math.radians(lat))
+    if ratio >= 1.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    dlng = math.degrees(math.asin(ratio))
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180.0:
+        return min_lat, max_lat, [(min_lng + 360.0, 180.0), (-180.0, max_lng)]
+    if max_lng > 180.0:
+        return min_lat, max_lat, [(min_lng, 180.0), (-180.0, max_lng - 360.0)]
+    return min_lat, max_lat, [(min_lng, max_lng)]
+
+
+def bbox_clause(
+    lat: float, lng: float, radius_km: float, lat_col: str = "latitude", lng_col: str = "longitude"
+) -> tuple[str, list[float]]:
+    """SQL predicate + params restricting ``lat_col``/``lng_col`` to :func:`bounding_box`.
+
+    Pair it with a composite ``(lat_col, lng_col)`` index so the range scan
+    only touches candidate rows; callers still check the exact distance.
+    """
+    min_lat, max_lat, lng_ranges = bounding_box(lat, lng, radius_km)
+    params: list[float] = [min_lat, max_lat]
+    lng_parts = []
+    for lo, hi in lng_ranges:
+        if (lo, hi) == (-180.0, 180.0):
+            lng_parts = []
+            params = [min_lat, max_lat]
+            break
+        lng_parts.append(f"{lng_col} BETWEEN ? AND ?")
+        params.extend([lo, hi])
+    clause = f"{lat_col} BETWEEN ? AND ?"
+    if lng_parts:
+        clause += " AND (" + " OR ".join(lng_parts) + ")"
+    return clause, params
@@ -0,0 +1,187 @@
+"""Write-coalescing ingestion for node heartbeats.
+
+Heartbeats land in an in-memory latest-value buffer keyed by node and are
+answered immediately; :func:`flush_loop` writes the buffer to ``nodes`` with
+one ``executemany`` per ``HEARTBEAT_FLUSH_MS`` instead of one transaction per
+heartbeat, so a node that reports several times between flushes costs one
+row update. ``HEARTBEAT_FLUSH_MS=0`` writes every heartbeat through
+immediately (still via the same batched statement).
+
+Node ownership is cached for ``HEARTBEAT_OWNER_CACHE_TTL_S`` so the
+authorization SELECT is not repeated for every beat; deleting a node through
+the API evicts it. Positive lookups only are cached.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .. import database
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_FLUSH_MS = int(os.environ.get("HEARTBEAT_FLUSH_MS", "500"))
+HEARTBEAT_OWNER_CACHE_TTL_S = float(os.environ.get("HEARTBEAT_OWNER_CACHE_TTL_S", "300"))
+HEARTBEAT_OWNER_CACHE_MAX = int(os.environ.get("HEARTBEAT_OWNER_CACHE_MAX", "100000"))
+
+_UPDATE_SQL = """
+    UPDATE nodes
+    SET status = ?, current_job_id = ?, queue_length = ?,
+        last_heartbeat = ?, updated_at = ?
+    WHERE id = ?
+"""
+
+
+@dataclass
+class Heartbeat:
+    status: str
+    current_job_id: str | None
+    queue_length: int
+    received_at: str
+
+    def params(self, node_id: str) -> tuple:
+        return (self.status, self.current_job_id, self.queue_length, self.received_at, self.received_at, node_id)
+
+
+class HeartbeatBuffer:
+    """Latest heartbeat per node plus a TTL/LRU cache of node owners."""
+
+    def __init__(
+        self,
+        flush_ms: int = HEARTBEAT_FLUSH_MS,
+        owner_ttl: float = HEARTBEAT_OWNER_CACHE_TTL_S,
+        owner_max: int = HEARTBEAT_OWNER_CACHE_MAX,
+        clock=time.monotonic,
+    ):
+        self.flush_ms = flush_ms
+        self.owner_ttl = owner_ttl
+        self.owner_max = owner_max
+        self._clock = clock
+        self._pending: dict[str, Heartbeat] = {}
+        self._owners: OrderedDict[str, tuple[str, float]] = OrderedDict()  # node_id -> (owner_id, expires)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.metrics = {
+            "received": 0,
+            "coalesced": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "owner_cache_hits": 0,
+            "owner_cache_misses": 0,
+        }
+
+    # ─── Ownership ───────────────────────────────────────
+
+    def _cached_owner(self, node_id: str) -> str | None:
+        entry = self._owners.get(node_id)
+        if entry is None:
+            return None
+        owner_id, expires = entry
+        if expires <= self._clock():
+            del self._owners[node_id]
+            return None
+        self._owners.move_to_end(node_id)
+        return owner_id
+
+    def _remember_owner(self, node_id: str, owner_id: str) -> None:
+        self._owners[node_id] = (owner_id, self._clock() + self.owner_ttl)
+        self._owners.move_to_end(node_id)
+        while len(self._owners) > self.owner_max:
+            self._owners.popitem(last=False)
+
+    def owned_nodes(self, db, owner_id: str, node_ids: list[str]) -> set[str]:
+        """Subset of ``node_ids`` owned by ``owner_id``; only cache misses hit the database."""
+        owned, missing = set(), []
+        with self._lock:
+            for node_id in node_ids:
+                cached = self._cached_owner(node_id)
+                if cached is None:
+                    missing.append(node_id)
+                elif cached == owner_id:
+                    owned.add(node_id)
+            self.metrics["owner_cache_hits"] += len(node_ids) - len(missing)
+            self.metrics["owner_cache_misses"] += len(missing)
+        if missing:
+            placeholders = ",".join("?" for _ in missing)
+            rows = db.execute(
+                f"SELECT id, owner_id FROM nodes WHERE id IN ({placeholders})", missing
+            ).fetchall()
+            with self._lock:
+                for row in rows:
+                    self._remember_owner(row["id"], row["owner_id"])
+                    if row["owner_id"] == owner_id:
+                        owned.add(row["id"])
+        return owned
+
+    def forget_node(self, node_id: str) -> None:
+        """Drop a deleted node's cached owner and any unflushed heartbeat."""
+        with self._lock:
+            self._owners.pop(node_id, None)
+            self._pending.pop(node_id, None)
+
+    # ─── Buffering ───────────────────────────────────────
+
+    def submit(self, node_id: str, heartbeat: Heartbeat) -> None:
+        with self._lock:
+            if self._pending.get(node_id) is not None:
+                self.metrics["coalesced"] += 1
+            self._pending[node_id] = heartbeat
+            self.metrics["received"] += 1
+        if self.flush_ms <= 0:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every buffered heartbeat in one transaction; returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            try:
+                with database.get_db() as db:
+                    db.cursor().executemany(_UPDATE_SQL, [hb.params(node_id) for node_id, hb in batch.items()])
+            except Exception:
+                with self._lock:
+                    self.metrics["flush_errors"] += 1
+                    # Put the batch back unless a newer heartbeat arrived meanwhile
+                    for node_id, hb in batch.items():
+                        self._pending.setdefault(node_id, hb)
+                raise
+            with self._lock:
+                self.metrics["flushes"] += 1
+                self.metrics["flushed"] += len(batch)
+            return len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "owner_cache_size": len(self._owners),
+                "flush_ms": self.flush_ms,
+                **self.metrics,
+            }
+
+
+heartbeat_buffer = HeartbeatBuffer()
+
+
+async def flush_loop(buffer: HeartbeatBuffer = heartbeat_buffer) -> None:
+    """Background task started from the app lifespan."""
+    if buffer.flush_ms <= 0:
+        return
+    interval = buffer.flush_ms / 1000.0
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            count = await asyncio.to_thread(buffer.flush)
+            if count:
+                logger.debug("Heartbeat flush: %d nodes", count)
+        except Exception:
+            logger.exception("Heartbeat flush failed")
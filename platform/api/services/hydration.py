@@ -0,0 +1,77 @@
+"""Batch hydration helpers — resolve authors and tags for a page of rows in O(1) queries."""
+
+from __future__ import annotations
+
+import logging
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# Stay well below SQLite's host-parameter limit on old builds (999).
+_IN_CHUNK = 500
+
+_AGENT_EMAIL_DOMAIN = "@agents.rwc.dev"
+
+
+def _chunks(ids: list[str]) -> Iterable[list[str]]:
+    for i in range(0, len(ids), _IN_CHUNK):
+        yield ids[i:i + _IN_CHUNK]
+
+
+def _unique(ids: Iterable[str | None]) -> list[str]:
+    return list(dict.fromkeys(i for i in ids if i))
+
+
+def resolve_authors(db, author_ids: Iterable[str | None]) -> dict[str, dict]:
+    """Map author_id -> {"author_name", "author_type"} for users and agents.
+
+    ``author_type`` is ``"agent"`` when the id is a registered agent or a user
+    with an ``@agents.rwc.dev`` email, otherwise ``"human"``; ``author_name`` is
+    the user's username (``None`` when the id is not a user).
+    """
+    ids = _unique(author_ids)
+    resolved = {aid: {"author_name": None, "author_type": "human"} for aid in ids}
+    if not ids or db is None:
+        return resolved
+
+    try:
+        for chunk in _chunks(ids):
+            placeholders = ",".join("?" * len(chunk))
+            for row in db.execute(f"SELECT id FROM agents WHERE id IN ({placeholders})", chunk).fetchall():
+                resolved[row["id"]]["author_type"] = "agent"
+            for row in db.execute(
+                f"SELECT id, username, email FROM users WHERE id IN ({placeholders})", chunk
+            ).fetchall():
+                entry = resolved[row["id"]]
+                entry["author_name"] = row["username"]
+                if row["email"] and _AGENT_EMAIL_DOMAIN in row["email"]:
+                    entry["author_type"] = "agent"
+    except Exception as e:
+        logger.exception("Author hydration failed: %s", e)
+    return resolved
+
+
+def fetch_post_tags(db, post_ids: Iterable[str | None]) -> dict[str, list[str]]:
+    """Map post_id -> sorted tag names via a single post_tags/tags join per chunk."""
+    ids = _unique(post_ids)
+    tags: dict[str, list[str]] = {pid: [] for pid in ids}
+    if not ids or db is None:
+        return tags
+
+    try:
+        for chunk in _chunks(ids):
+            placeholders = ",".join("?" * len(chunk))
+            rows = db.execute(
+                f"""
+                SELECT pt.post_id, t.name FROM post_tags pt
+                JOIN tags t ON t.id = pt.tag_id
+                WHERE pt.post_id IN ({placeholders})
+                ORDER BY t.name ASC
+                """,
+                chunk,
+            ).fetchall()
+            for row in rows:
+                tags[row["post_id"]].append(row["name"])
+    except Exception as e:
+        logger.warning("Tag hydration failed: %s", e)
+    return tags
@@ -1,51 +1,222 @@
 """Maker匹配引擎 — 为订单找到最优Maker/Builder
 
-权重：地理距离40% + 材料匹配20% + 评分20% + 价格20%
+权重：地理距离40% + 材料匹配20% + 评分20% + 价格20%（可通过 MATCH_WEIGHT_* 环境变量调整）
 
 匹配规则：
 - print_only订单：maker和builder都能接
 - full_build订单：只有builder能接
+
+Open makers are kept in a columnar snapshot (location codes, material
+bitsets, rating, price) that is rebuilt only when the set of open makers
+changes, so a match scores every candidate in one pass without re-reading
+and re-parsing maker rows. With NumPy installed the pass is vectorized and
+top-k uses ``argpartition``; without it the same columns are scored in pure
+Python with ``heapq.nlargest``.
 """
 
 from __future__ import annotations
 
+import heapq
 import json
+import os
 import sqlite3
+import threading
+from dataclasses import dataclass
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@dataclass(frozen=True)
+class MatchWeights:
+    geo: float = 0.4
+    material: float = 0.2
+    rating: float = 0.2
+    price: float = 0.2
+
+
+DEFAULT_WEIGHTS = MatchWeights(
+    geo=float(os.environ.get("MATCH_WEIGHT_GEO", "0.4")),
+    material=float(os.environ.get("MATCH_WEIGHT_MATERIAL", "0.2")),
+    rating=float(os.environ.get("MATCH_WEIGHT_RATING", "0.2")),
+    price=float(os.environ.get("MATCH_WEIGHT_PRICE", "0.2")),
+)
+
+
+# ─── Snapshot ────────────────────────────────────────────
+
+
+class _MakerSnapshot:
+    """Columnar view of open makers; row ``i`` of every column is the same maker."""
 
+    def __init__(self, signature: tuple, rows: list[dict]):
+        self.signature = signature
+        self.rows = rows
+        self.materials: list[list[str]] = []
+        self.vocab: dict[str, int] = {}  # lowercase material -> bit
+        self._codes: dict[str, int] = {}
 
-def _geo_score(maker_province: str, maker_city: str, maker_district: str,
-               order_province: str, order_city: str, order_district: str) -> float:
-    """地理距离得分：同区1.0，同城0.8，同省0.5，跨省0.2"""
-    if maker_province == order_province:
-        if maker_city == order_city:
-            if maker_district == order_district:
-                return 1.0
-            return 0.8
-        return 0.5
-    return 0.2
+        province, city, district, bits, builder = [], [], [], [], []
+        for row in rows:
+            materials = json.loads(row["materials"]) if isinstance(row["materials"], str) else (row["materials"] or [])
+            self.materials.append(materials)
+            mask = 0
+            for m in materials:
+                mask |= 1 << self.vocab.setdefault(m.lower(), len(self.vocab))
+            bits.append(mask)
+            province.append(self._code(row["location_province"]))
+            city.append(self._code(row["location_city"]))
+            district.append(self._code(row["location_district"]))
+            builder.append(row["maker_type"] == "builder")
 
+        self.province, self.city, self.district = province, city, district
+        self.material_bits = bits
+        self.is_builder = builder
+        self.rating = [float(row["rating"] or 0.0) for row in rows]
+        self.price = [float(row["pricing_per_hour_cny"]) for row in rows]
+        self.build_volume = [
+            sorted((row["build_volume_x"] or 0.0, row["build_volume_y"] or 0.0, row["build_volume_z"] or 0.0))
+            for row in rows
+        ]
+
+        if np is not None:
+            self.np_province = np.array(province, dtype=np.int64)
+            self.np_city = np.array(city, dtype=np.int64)
+            self.np_district = np.array(district, dtype=np.int64)
+            self.np_rating = np.minimum(np.array(self.rating, dtype=np.float64) / 5.0, 1.0)
+            self.np_price = np.array(self.price, dtype=np.float64)
+            # Material sets as a (makers x vocab) boolean matrix
+            self.np_materials = np.zeros((len(rows), max(len(self.vocab), 1)), dtype=bool)
+            for i, mask in enumerate(bits):
+                for bit in range(mask.bit_length()):
+                    if mask >> bit & 1:
+                        self.np_materials[i, bit] = True
+
+    def _code(self, value: str | None) -> int:
+        # Location names are interned to ints; equal names share a code
+        return self._codes.setdefault(value or "", len(self._codes))
+
+    def code_of(self, value: str | None) -> int:
+        return self._codes.get(value or "", -1)
+
+    def preference_mask(self, preferred: str | None) -> int | None:
+        """Bits of every known material that matches the preference (substring either way)."""
+        if not preferred:
+            return None
+        p = preferred.lower()
+        mask = 0
+        for name, bit in self.vocab.items():
+            if p in name or name in p:
+                mask |= 1 << bit
+        return mask
+
+
+_snapshot: _MakerSnapshot | None = None
+_snapshot_lock = threading.Lock()
+
+
+def _get_snapshot(db) -> _MakerSnapshot:
+    """Return the open-maker snapshot, rebuilding it when the open set has changed.
+
+    The signature is (count, newest ``updated_at``) of open makers, so every
+    write to ``makers`` must bump ``updated_at``; that also catches writes made
+    by other workers.
+    """
+    global _snapshot
+    sig_row = db.execute(
+        "SELECT COUNT(*) AS n, MAX(updated_at) AS v FROM makers WHERE availability = 'open'"
+    ).fetchone()
+    signature = (sig_row["n"], sig_row["v"])
+    snap = _snapshot
+    if snap is not None and snap.signature == signature:
+        return snap
 
-def _material_score(maker_materials: list[str], preferred: str | None) -> float:
-    """材料匹配得分"""
-    if not preferred:
-        return 1.0  # 无偏好，全部匹配
-    for m in maker_materials:
-        if preferred.lower() in m.lower() or m.lower() in preferred.lower():
-            return 1.0
-    return 0.0
+    rows = [dict(r) for r in db.execute("SELECT * FROM makers WHERE availability = 'open'").fetchall()]
+    snap = _MakerSnapshot(signature, rows)
+    with _snapshot_lock:
+        _snapshot = snap
+    return snap
 
 
-def _rating_score(rating: float) -> float:
-    """评分得分：0-5映射到0-1"""
-    return min(rating / 5.0, 1.0)
+def candidate_makers(db, material: str | None = None, size_mm=None) -> list[dict]:
+    """Open makers offering ``material`` whose build volume fits a part of ``size_mm`` (in any orientation)."""
+    snap = _get_snapshot(db)
+    mask = snap.preference_mask(material)
+    part = sorted(size_mm) if size_mm else None
+    return [
+        row
+        for i, row in enumerate(snap.rows)
+        if (mask is None or snap.material_bits[i] & mask)
+        and (part is None or all(p <= b for p, b in zip(part, snap.build_volume[i])))
+    ]
 
 
-def _price_score(price: float, all_prices: list[float]) -> float:
-    """价格得分：越便宜越高分"""
-    if not all_prices or max(all_prices) == min(all_prices):
-        return 1.0
-    mn, mx = min(all_prices), max(all_prices)
-    return 1.0 - (price - mn) / (mx - mn)
+# ─── Scoring ─────────────────────────────────────────────
+
+
+def _score_python(snap, idx, order_codes, pref_mask, weights):
+    """Pure-Python scoring over the snapshot columns; returns [(score, i, geo, mat, rat, pri)]."""
+    op, oc, od = order_codes
+    prices = [snap.price[i] for i in idx]
+    mn, mx = min(prices), max(prices)
+    span = mx - mn
+
+    scored = []
+    for i in idx:
+        # 地理距离得分：同区1.0，同城0.8，同省0.5，跨省0.2
+        if snap.province[i] == op:
+            if snap.city[i] == oc:
+                geo = 1.0 if snap.district[i] == od else 0.8
+            else:
+                geo = 0.5
+        else:
+            geo = 0.2
+        # 材料匹配：无偏好全部匹配；评分0-5映射到0-1；价格越便宜越高分
+        mat = 1.0 if pref_mask is None or snap.material_bits[i] & pref_mask else 0.0
+        rat = min(snap.rating[i] / 5.0, 1.0)
+        pri = 1.0 if span == 0 else 1.0 - (snap.price[i] - mn) / span
+        total = geo * weights.geo + mat * weights.material + rat * weights.rating + pri * weights.price
+        scored.append((round(total, 4), i, geo, mat, rat, pri))
+    return scored
+
+
+def _top_python(scored, limit):
+    # nlargest is stable like sorted(reverse=True): ties keep snapshot order
+    return heapq.nlargest(limit, scored, key=lambda s: s[0])
+
+
+def _score_numpy(snap, idx, order_codes, pref_mask, weights, limit):
+    op, oc, od = order_codes
+    idx = np.asarray(idx, dtype=np.int64)
+    same_p = snap.np_province[idx] == op
+    same_c = same_p & (snap.np_city[idx] == oc)
+    same_d = same_c & (snap.np_district[idx] == od)
+    geo = np.where(same_d, 1.0, np.where(same_c, 0.8, np.where(same_p, 0.5, 0.2)))
+
+    if pref_mask is None:
+        mat = np.ones(len(idx))
+    else:
+        wanted = np.array([(pref_mask >> b) & 1 for b in range(snap.np_materials.shape[1])], dtype=bool)
+        mat = snap.np_materials[idx][:, wanted].any(axis=1).astype(np.float64)
+
+    rat = snap.np_rating[idx]
+    price = snap.np_price[idx]
+    span = price.max() - price.min()
+    pri = np.ones(len(idx)) if span == 0 else 1.0 - (price - price.min()) / span
+
+    total = np.round(geo * weights.geo + mat * weights.material + rat * weights.rating + pri * weights.price, 4)
+    if limit < len(total):
+        top = np.argpartition(-total, limit - 1)[:limit]
+    else:
+        top = np.arange(len(total))
+    # Highest score first; ties keep snapshot order
+    top = top[np.lexsort((top, -total[top]))]
+    return [
+        (float(total[j]), int(idx[j]), float(geo[j]), float(mat[j]), float(rat[j]), float(pri[j]))
+        for j in top
+    ]
 
 
 def match_maker_for_order(
@@ -56,6 +227,7 @@ def match_maker_for_order(
     material_preference: str | None = None,
     order_type: str = "print_only",
     limit: int = 5,
+    weights: MatchWeights | None = None,
 ) -> list[dict]:
     """返回按综合得分排序的最优Maker列表。
 
@@ -64,45 +236,32 @@ def match_maker_for_order(
 
     Each result: {maker_id, score, geo_score, material_score, rating_score, price_score, ...maker fields}
     """
+    weights = weights or DEFAULT_WEIGHTS
+    snap = _get_snapshot(db)
     if order_type == "full_build":
-        rows = db.execute(
-            "SELECT * FROM makers WHERE availability = 'open' AND maker_type = 'builder'",
-        ).fetchall()
+        idx = [i for i, is_builder in enumerate(snap.is_builder) if is_builder]
     else:
-        rows = db.execute(
-            "SELECT * FROM makers WHERE availability = 'open'",
-        ).fetchall()
-
-    if not rows:
+        idx = list(range(len(snap.rows)))
+    if not idx or limit <= 0:
         return []
 
-    makers = [dict(r) for r in rows]
-    all_prices = [m["pricing_per_hour_cny"] for m in makers]
-
-    scored: list[dict] = []
-    for m in makers:
-        materials = json.loads(m["materials"]) if isinstance(m["materials"], str) else m["materials"]
-        geo = _geo_score(
-            m["location_province"], m["location_city"], m["location_district"],
-            order_province, order_city, order_district,
-        )
-        mat = _material_score(materials, material_preference)
-        rat = _rating_score(m["rating"])
-        pri = _price_score(m["pricing_per_hour_cny"], all_prices)
-
-        total = geo * 0.4 + mat * 0.2 + rat * 0.2 + pri * 0.2
-
-        scored.append({
-            **m,
-            "materials_list": materials,
-            "score": round(total, 4),
+    order_codes = (snap.code_of(order_province), snap.code_of(order_city), snap.code_of(order_district))
+    pref_mask = snap.preference_mask(material_preference)
+
+    if np is not None:
+        top = _score_numpy(snap, idx, order_codes, pref_mask, weights, limit)
+    else:
+        top = _top_python(_score_python(snap, idx, order_codes, pref_mask, weights), limit)
+
+    return [
+        {
+            **snap.rows[i],
+            "materials_list": snap.materials[i],
+            "score": score,
             "geo_score": round(geo, 2),
             "material_score": round(mat, 2),
             "rating_score": round(rat, 2),
             "price_score": round(pri, 2),
-        })
-
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    return scored[:limit]
-
-
+        }
+        for score, i, geo, mat, rat, pri in top
+    ]
@@ -0,0 +1,557 @@
+"""Geometry analysis of uploaded STL, OBJ and 3MF models.
+
+:func:`analyze_mesh` reads a model from disk and returns its triangle count,
+volume, surface area, bounding box and whether it is watertight (every edge
+shared by exactly two triangles). The format is sniffed from the bytes, not
+the file name, so a result depends only on content and is cached per
+SHA-256 in ``mesh_analyses``: identical uploads are analysed once.
+
+With NumPy installed, binary STL is memory-mapped and all geometry is
+vectorised; without it the same numbers are computed in pure Python, which
+is fine for small parts but slow for large meshes. Lengths are millimetres
+(3MF ``unit`` is converted).
+
+Analysis runs off the request path: uploads wake :data:`mesh_analyzer`,
+whose background task (started in the app lifespan) analyses every
+referenced mesh blob without a cached result. Failures are cached too, with
+``error`` set, so a broken file is not retried.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import struct
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from .. import database
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MESH_FILE_TYPES = (".stl", ".obj", ".3mf")
+MESH_ANALYSIS_BATCH = int(os.environ.get("MESH_ANALYSIS_BATCH", "8"))
+MESH_ANALYSIS_INTERVAL_S = float(os.environ.get("MESH_ANALYSIS_INTERVAL_S", "60"))
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS mesh_analyses (
+        sha256 TEXT PRIMARY KEY,
+        format TEXT,
+        triangles INTEGER,
+        volume_mm3 DOUBLE PRECISION,
+        surface_area_mm2 DOUBLE PRECISION,
+        bbox TEXT,
+        watertight INTEGER,
+        error TEXT,
+        duration_ms DOUBLE PRECISION,
+        analyzed_at TEXT NOT NULL
+    )""",
+]
+
+_ASCII_VERTEX = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+_NS_3MF = "{http://schemas.microsoft.com/3dmanufacturing/core/2015/02}"
+_UNITS_3MF = {
+    "micron": 0.001, "millimeter": 1.0, "centimeter": 10.0, "inch": 25.4, "foot": 304.8, "meter": 1000.0,
+}
+_MAX_COMPONENT_DEPTH = 16
+
+
+def init_mesh_analyses(db) -> None:
+    for sql in _SCHEMA:
+        db.execute(sql)
+
+
+class MeshError(ValueError):
+    """The file is not a mesh this module can read."""
+
+
+@dataclass
+class MeshStats:
+    format: str
+    triangles: int
+    volume_mm3: float
+    surface_area_mm2: float
+    bbox_min: tuple[float, float, float]
+    bbox_max: tuple[float, float, float]
+    watertight: bool
+
+    @property
+    def size_mm(self) -> tuple[float, float, float]:
+        return tuple(round(hi - lo, 4) for lo, hi in zip(self.bbox_min, self.bbox_max))
+
+
+# ─── Readers ─────────────────────────────────────────────
+# Each returns (vertices, faces): a float array of shape (V, 3) and an int
+# array of shape (T, 3) with NumPy, or the equivalent lists of tuples.
+
+
+def _weld(corners: list) -> tuple[list, list]:
+    """Triangle soup (three corner tuples per face) → shared vertices + index faces."""
+    index: dict[tuple, int] = {}
+    ids = [index.setdefault(c, len(index)) for c in corners]
+    return list(index), [tuple(ids[i:i + 3]) for i in range(0, len(ids), 3)]
+
+
+def _weld_np(corners):
+    """Vectorised :func:`_weld`: corners with identical coordinates become one vertex.
+
+    Corners are grouped by a 64-bit hash of their coordinate bits (one sort of
+    integers instead of a lexicographic row sort); if the hash ever merged
+    two different points, the exact row-wise ``np.unique`` is used instead.
+    """
+    corners = np.array(corners, dtype=corners.dtype).reshape(-1, 3)  # one contiguous copy
+    corners += 0  # -0.0 and 0.0 weld together
+    bits = corners.view(np.uint32 if corners.itemsize == 4 else np.uint64).astype(np.uint64)
+    key = bits[:, 0] * np.uint64(0x9E3779B97F4A7C15) ^ bits[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F)
+    key ^= bits[:, 2] * np.uint64(0x165667B19E3779F9)
+    order = np.argsort(key)
+    sorted_key, sorted_corners = key[order], np.take(corners, order, axis=0)  # take() is the fast row gather
+    first = np.empty(len(key), dtype=bool)
+    first[:1] = True
+    np.not_equal(sorted_key[1:], sorted_key[:-1], out=first[1:])
+    differs = sorted_corners[1:] != sorted_corners[:-1]
+    if not np.any((differs[:, 0] | differs[:, 1] | differs[:, 2]) & ~first[1:]):
+        inverse = np.empty(len(key), dtype=np.int64)
+        inverse[order] = np.cumsum(first) - 1
+        vertices = sorted_corners[first]
+    else:
+        rows = corners.view(np.dtype((np.void, corners.itemsize * 3))).ravel()
+        unique, inverse = np.unique(rows, return_inverse=True)
+        vertices = unique.view(corners.dtype).reshape(-1, 3)
+    return vertices.astype(np.float64), inverse.reshape(-1, 3)
+
+
+def _binary_stl_count(path: Path, size: int) -> Optional[int]:
+    """Triangle count if the file is laid out as binary STL, else None."""
+    if size < 84:
+        return None
+    with open(path, "rb") as f:
+        header = f.read(84)
+    count = struct.unpack_from("<I", header, 80)[0]
+    if size == 84 + 50 * count or (size > 84 + 50 * count and not header.startswith(b"solid")):
+        return count
+    return None
+
+
+def _read_binary_stl(path: Path, count: int):
+    if np is not None:
+        record = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attr", "<u2")])
+        data = np.memmap(path, dtype=record, mode="r", offset=84, shape=(count,))
+        return _weld_np(data["vertices"])
+    corners = []
+    with open(path, "rb") as f:
+        f.seek(84)
+        body = f.read(50 * count)
+    for values in struct.iter_unpack("<12fH", body):
+        corners.extend((values[3:6], values[6:9], values[9:12]))
+    return _weld(corners)
+
+
+def _read_ascii_stl(data: bytes):
+    matches = _ASCII_VERTEX.findall(data)
+    if not matches or len(matches) % 3:
+        raise MeshError("ASCII STL without complete facets")
+    try:
+        if np is not None:
+            return _weld_np(np.array(matches, dtype=np.float64))
+        return _weld([(float(x), float(y), float(z)) for x, y, z in matches])
+    except ValueError as exc:
+        raise MeshError(f"Bad vertex coordinate: {exc}") from None
+
+
+def _read_obj(data: bytes):
+    vertices: list[tuple[float, float, float]] = []
+    faces: list[tuple[int, int, int]] = []
+    try:
+        for line in data.splitlines():
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == b"v":
+                vertices.append((float(parts[1]), float(parts[2]), float(parts[3])))
+            elif parts[0] == b"f":
+                ids = []
+                for token in parts[1:]:
+                    i = int(token.split(b"/", 1)[0])
+                    ids.append(i - 1 if i > 0 else len(vertices) + i)
+                faces.extend((ids[0], ids[k], ids[k + 1]) for k in range(1, len(ids) - 1))  # fan
+    except (ValueError, IndexError) as exc:
+        raise MeshError(f"Malformed OBJ: {exc}") from None
+    if any(i < 0 or i >= len(vertices) for face in faces for i in face):
+        raise MeshError("OBJ face references a missing vertex")
+    if np is not None:
+        return np.array(vertices, dtype=np.float64).reshape(-1, 3), np.array(faces, dtype=np.int64).reshape(-1, 3)
+    return vertices, faces
+
+
+def _transform(vertices: list, matrix: Optional[list[float]]) -> list:
+    """Apply a 3MF affine transform (row-vector convention, 12 values)."""
+    if matrix is None:
+        return vertices
+    m = matrix
+    return [
+        (x * m[0] + y * m[3] + z * m[6] + m[9], x * m[1] + y * m[4] + z * m[7] + m[10],
+         x * m[2] + y * m[5] + z * m[8] + m[11])
+        for x, y, z in vertices
+    ]
+
+
+def _compose(outer: Optional[list[float]], inner: Optional[list[float]]) -> Optional[list[float]]:
+    """Transform equivalent to applying ``inner`` first, then ``outer``."""
+    if outer is None or inner is None:
+        return outer or inner
+    rows = [inner[0:3], inner[3:6], inner[6:9], inner[9:12]]
+    out = _transform(rows[:3], outer[:9] + [0.0, 0.0, 0.0]) + _transform([rows[3]], outer)
+    return [value for row in out for value in row]
+
+
+def _parse_transform(value: Optional[str]) -> Optional[list[float]]:
+    if not value:
+        return None
+    numbers = [float(v) for v in value.split()]
+    if len(numbers) != 12:
+        raise MeshError("3MF transform must have 12 values")
+    return numbers
+
+
+def _read_3mf(path: Path):
+    try:
+        with zipfile.ZipFile(path) as zf:
+            name = _model_part(zf)
+            with zf.open(name) as f:
+                scale, objects, build = _parse_3mf_model(f)
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as exc:
+        raise MeshError(f"Unreadable 3MF: {exc}") from None
+
+    vertices: list = []
+    faces: list = []
+
+    def place(object_id: str, matrix: Optional[list[float]], depth: int) -> None:
+        if depth > _MAX_COMPONENT_DEPTH or object_id not in objects:
+            raise MeshError(f"3MF object {object_id} is missing or nested too deep")
+        kind, payload = objects[object_id]
+        if kind == "mesh":
+            obj_vertices, obj_faces = payload
+            offset = len(vertices)
+            vertices.extend(_transform(obj_vertices, matrix))
+            faces.extend((a + offset, b + offset, c + offset) for a, b, c in obj_faces)
+        else:
+            for child_id, child_matrix in payload:
+                place(child_id, _compose(matrix, child_matrix), depth + 1)
+
+    for object_id, matrix in build or [(oid, None) for oid, (kind, _) in objects.items() if kind == "mesh"]:
+        place(object_id, matrix, 0)
+    if scale != 1.0:
+        vertices = [(x * scale, y * scale, z * scale) for x, y, z in vertices]
+    if np is not None:
+        return np.array(vertices, dtype=np.float64).reshape(-1, 3), np.array(faces, dtype=np.int64).reshape(-1, 3)
+    return vertices, faces
+
+
+def _model_part(zf: zipfile.ZipFile) -> str:
+    """Name of the 3D model part, from the package relationships when present."""
+    try:
+        rels = ET.fromstring(zf.read("_rels/.rels"))
+    except KeyError:
+        return "3D/3dmodel.model"
+    for rel in rels:
+        if rel.get("Type", "").endswith("/3dmodel"):
+            return rel.get("Target", "").lstrip("/")
+    return "3D/3dmodel.model"
+
+
+def _parse_3mf_model(f):
+    """(unit scale, {object id: ("mesh", (vertices, faces)) | ("components", [...])}, build items)."""
+    scale = 1.0
+    objects: dict[str, tuple] = {}
+    build: list[tuple[str, Optional[list[float]]]] = []
+    vertices: list = []
+    faces: list = []
+    components: list = []
+    try:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            tag = elem.tag.removeprefix(_NS_3MF)
+            if event == "start":
+                if tag == "model":
+                    scale = _UNITS_3MF.get(elem.get("unit", "millimeter"), 1.0)
+                elif tag == "object":
+                    vertices, faces, components = [], [], []
+                continue
+            if tag == "vertex":
+                vertices.append((float(elem.get("x")), float(elem.get("y")), float(elem.get("z"))))
+            elif tag == "triangle":
+                faces.append((int(elem.get("v1")), int(elem.get("v2")), int(elem.get("v3"))))
+            elif tag == "component":
+                components.append((elem.get("objectid"), _parse_transform(elem.get("transform"))))
+            elif tag == "object":
+                if faces:
+                    if any(i < 0 or i >= len(vertices) for face in faces for i in face):
+                        raise MeshError("3MF triangle references a missing vertex")
+                    objects[elem.get("id")] = ("mesh", (vertices, faces))
+                elif components:
+                    objects[elem.get("id")] = ("components", components)
+            elif tag == "item":
+                build.append((elem.get("objectid"), _parse_transform(elem.get("transform"))))
+            if tag in ("vertex", "triangle", "object"):
+                elem.clear()
+    except MeshError:
+        raise
+    except (TypeError, ValueError) as exc:
+        raise MeshError(f"Malformed 3MF model: {exc}") from None
+    return scale, objects, build
+
+
+# ─── Geometry ────────────────────────────────────────────
+
+
+def _closed_np(faces, vertex_count: int) -> bool:
+    """True when every undirected edge is shared by exactly two faces."""
+    a, b = faces.astype(np.int64), np.roll(faces, -1, axis=1).astype(np.int64)
+    keys = (np.minimum(a, b) * vertex_count + np.maximum(a, b)).ravel()
+    keys.sort()
+    # Sorted keys must come in equal pairs, and consecutive pairs must differ
+    return bool(
+        len(keys) % 2 == 0
+        and np.array_equal(keys[0::2], keys[1::2])
+        and not np.any(keys[2::2] == keys[1:-1:2])
+    )
+
+
+_NON_FINITE = "Mesh has a NaN or infinite vertex coordinate"
+
+
+def _stats_numpy(fmt: str, vertices, faces) -> MeshStats:
+    used = np.zeros(len(vertices), dtype=bool)
+    used[faces.ravel()] = True
+    points = vertices if used.all() else vertices[used]
+    if not np.isfinite(points).all():
+        raise MeshError(_NON_FINITE)
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    shifted = vertices - lo  # keep magnitudes small for the volume sum
+    v0, v1, v2 = (np.take(shifted, faces[:, k], axis=0) for k in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    area = 0.5 * np.sqrt(np.einsum("ij,ij->i", normals, normals)).sum()
+    volume = np.einsum("ij,ij->", v0, normals) / 6.0  # v0 · (v1 × v2) == v0 · ((v1 - v0) × (v2 - v0))
+    return MeshStats(
+        format=fmt,
+        triangles=len(faces),
+        volume_mm3=round(abs(float(volume)), 4),
+        surface_area_mm2=round(float(area), 4),
+        bbox_min=tuple(round(float(v), 4) for v in lo),
+        bbox_max=tuple(round(float(v), 4) for v in hi),
+        watertight=_closed_np(faces, len(vertices)),
+    )
+
+
+def _stats_python(fmt: str, vertices: list, faces: list) -> MeshStats:
+    lo = [math.inf] * 3
+    hi = [-math.inf] * 3
+    for face in faces:
+        for i in face:
+            for axis, value in enumerate(vertices[i]):
+                if not math.isfinite(value):
+                    raise MeshError(_NON_FINITE)
+                lo[axis] = min(lo[axis], value)
+                hi[axis] = max(hi[axis], value)
+    volume = area = 0.0
+    edges: Counter = Counter()
+    for a, b, c in faces:
+        (px, py, pz), (qx, qy, qz), (rx, ry, rz) = (
+            [v - o for v, o in zip(vertices[i], lo)] for i in (a, b, c)
+        )
+        ux, uy, uz, wx, wy, wz = qx - px, qy - py, qz - pz, rx - px, ry - py, rz - pz
+        area += 0.5 * math.sqrt((uy * wz - uz * wy) ** 2 + (uz * wx - ux * wz) ** 2 + (ux * wy - uy * wx) ** 2)
+        volume += (px * (qy * rz - qz * ry) + py * (qz * rx - qx * rz) + pz * (qx * ry - qy * rx)) / 6.0
+        for e in ((a, b), (b, c), (c, a)):
+            edges[(e[0], e[1]) if e[0] < e[1] else (e[1], e[0])] += 1
+    return MeshStats(
+        format=fmt,
+        triangles=len(faces),
+        volume_mm3=round(abs(volume), 4),
+        surface_area_mm2=round(area, 4),
+        bbox_min=tuple(round(v, 4) for v in lo),
+        bbox_max=tuple(round(v, 4) for v in hi),
+        watertight=all(count == 2 for count in edges.values()),
+    )
+
+
+def analyze_mesh(path: Path) -> MeshStats:
+    """Sniff the format of ``path`` and compute its geometry; raises :class:`MeshError`."""
+    path = Path(path)
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        head = f.read(512)
+    if head.startswith(b"PK\x03\x04"):
+        fmt, (vertices, faces) = "3mf", _read_3mf(path)
+    elif (count := _binary_stl_count(path, size)) is not None:
+        fmt, (vertices, faces) = "stl", _read_binary_stl(path, count)
+    else:
+        data = path.read_bytes()
+        if head.lstrip().startswith(b"solid") and b"facet" in data:
+            fmt, (vertices, faces) = "stl", _read_ascii_stl(data)
+        else:
+            fmt, (vertices, faces) = "obj", _read_obj(data)
+    if len(faces) == 0:
+        raise MeshError("Mesh has no triangles")
+    stats = (_stats_numpy if np is not None else _stats_python)(fmt, vertices, faces)
+    if not (math.isfinite(stats.volume_mm3) and math.isfinite(stats.surface_area_mm2)):
+        raise MeshError("Mesh is too large to measure")
+    return stats
+
+
+# ─── Cache and background stage ──────────────────────────
+
+
+def cached_analysis(db, sha256: str):
+    return db.execute("SELECT * FROM mesh_analyses WHERE sha256 = ?", (sha256,)).fetchone()
+
+
+def analysis_dict(row) -> Optional[dict]:
+    """API shape of a ``mesh_analyses`` row (None → analysis still pending)."""
+    if row is None:
+        return {"status": "pending"}
+    if row["error"]:
+        return {"status": "failed", "error": row["error"]}
+    bbox = json.loads(row["bbox"])
+    return {
+        "status": "done",
+        "format": row["format"],
+        "triangles": row["triangles"],
+        "volume_mm3": row["volume_mm3"],
+        "surface_area_mm2": row["surface_area_mm2"],
+        "bbox_min": bbox[:3],
+        "bbox_max": bbox[3:],
+        "size_mm": [round(hi - lo, 4) for lo, hi in zip(bbox[:3], bbox[3:])],
+        "watertight": bool(row["watertight"]),
+    }
+
+
+def _store(db, sha256: str, stats: Optional[MeshStats], error: Optional[str], duration_ms: float) -> None:
+    db.execute(
+        """
+        INSERT INTO mesh_analyses (sha256, format, triangles, volume_mm3, surface_area_mm2, bbox,
+            watertight, error, duration_ms, analyzed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (sha256) DO NOTHING
+        """,
+        (
+            sha256,
+            stats.format if stats else None,
+            stats.triangles if stats else None,
+            stats.volume_mm3 if stats else None,
+            stats.surface_area_mm2 if stats else None,
+            json.dumps(list(stats.bbox_min + stats.bbox_max)) if stats else None,
+            int(stats.watertight) if stats else None,
+            error,
+            round(duration_ms, 2),
+            datetime.now(timezone.utc).isoformat(),
+        ),
+    )
+
+
+class MeshAnalyzer:
+    """Analyses mesh blobs that have no cached result, a few per wake-up."""
+
+    def __init__(self, batch: int = MESH_ANALYSIS_BATCH, interval: float = MESH_ANALYSIS_INTERVAL_S):
+        self.batch = batch
+        self.interval = interval
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.metrics = {"analyzed": 0, "failed": 0, "last_ms": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def notify(self) -> None:
+        """Called after a mesh upload; safe from any thread."""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(wakeup.set)
+
+    def analyze_pending(self, limit: Optional[int] = None) -> int:
+        """Analyse up to ``limit`` referenced mesh blobs lacking a result; returns how many."""
+        placeholders = ",".join("?" for _ in MESH_FILE_TYPES)
+        with database.get_db() as db:
+            rows = db.execute(
+                f"""
+                SELECT DISTINCT b.sha256, b.path FROM files f
+                JOIN file_blobs b ON b.sha256 = f.sha256
+                LEFT JOIN mesh_analyses m ON m.sha256 = f.sha256
+                WHERE m.sha256 IS NULL AND b.ref_count > 0 AND f.file_type IN ({placeholders})
+                LIMIT ?
+                """,
+                (*MESH_FILE_TYPES, limit or self.batch),
+            ).fetchall()
+        for row in rows:
+            started = time.perf_counter()
+            stats, error = None, None
+            try:
+                stats = analyze_mesh(Path(row["path"]))
+            except MeshError as exc:
+                error = str(exc)
+            except FileNotFoundError:
+                error = "Stored file is missing"
+            except Exception as exc:
+                logger.exception("Mesh analysis of %s failed", row["sha256"])
+                error = f"Analysis failed: {type(exc).__name__}"
+            duration_ms = (time.perf_counter() - started) * 1000
+            with database.get_db() as db:
+                _store(db, row["sha256"], stats, error, duration_ms)
+            self.metrics["failed" if error else "analyzed"] += 1
+            self.metrics["last_ms"] = round(duration_ms, 2)
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while await asyncio.to_thread(self.analyze_pending) >= self.batch:
+                    pass
+            except Exception:
+                logger.exception("Mesh analysis pass failed")
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()  # pick up anything uploaded while we were down
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = self._wakeup = None
+
+    def stats(self) -> dict:
+        return {"numpy": np is not None, "running": self.running, **self.metrics}
+
+
+mesh_analyzer = MeshAnalyzer()
@@ -0,0 +1,132 @@
+"""Dedicated worker pool for bcrypt password hashing.
+
+bcrypt is deliberately slow (a few hundred ms at cost 12). Run inline in sync
+routes, it occupied Starlette's shared threadpool, so a burst of logins
+starved every other sync route. Auth routes now await :data:`password_pool`
+instead. It runs at most ``PASSWORD_HASH_WORKERS`` hashes at once, on threads
+by default (bcrypt releases the GIL) or on processes with
+``PASSWORD_HASH_EXECUTOR=process``. Once ``PASSWORD_HASH_QUEUE_MAX``
+operations are running or waiting, further ones raise :class:`PasswordPoolBusy`
+right away. Routes turn that into a 503, which sheds a credential-stuffing
+burst instead of queueing it behind real users.
+
+The cost comes from ``BCRYPT_ROUNDS`` (see :mod:`api.security`). A successful
+verify against a hash of another cost returns a replacement hash for the
+caller to store.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from ..security import hash_password, verify_and_update_password
+
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_MAX = int(os.environ.get("PASSWORD_HASH_QUEUE_MAX", "64"))
+PASSWORD_HASH_EXECUTOR = os.environ.get("PASSWORD_HASH_EXECUTOR", "thread").lower()
+_LATENCY_WINDOW = 512
+
+
+class PasswordPoolBusy(Exception):
+    """Too many password operations are already queued."""
+
+
+class PasswordPool:
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        queue_max: int = PASSWORD_HASH_QUEUE_MAX,
+        kind: str = PASSWORD_HASH_EXECUTOR,
+    ):
+        self.workers = max(1, workers)
+        self.queue_max = max(self.workers, queue_max)
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._latency_ms = {"hash": deque(maxlen=_LATENCY_WINDOW), "verify": deque(maxlen=_LATENCY_WINDOW)}
+        self.metrics = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0, "errors": 0}
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password")
+        return self._executor
+
+    def _submit(self, op: str, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.queue_max:
+                self.metrics["rejected"] += 1
+                raise PasswordPoolBusy(self._pending)
+            self._pending += 1
+            executor = self._get_executor()
+        started = time.perf_counter()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(lambda f: self._done(op, started, f))
+        return future
+
+    def _done(self, op: str, started: float, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._latency_ms[op].append((time.perf_counter() - started) * 1000)
+            if future.cancelled() or future.exception() is not None:
+                self.metrics["errors"] += 1
+            elif op == "hash":
+                self.metrics["hashed"] += 1
+            else:
+                self.metrics["verified"] += 1
+                if future.result()[1] is not None:
+                    self.metrics["rehashed"] += 1
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit("hash", hash_password, password))
+
+    async def verify(self, plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+        """(matches, replacement hash when the stored one uses another cost)."""
+        return await asyncio.wrap_future(self._submit("verify", verify_and_update_password, plain, hashed))
+
+    def hash_blocking(self, password: str) -> str:
+        """For sync callers; still bounded and shed by the pool."""
+        return self._submit("hash", hash_password, password).result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latency = {}
+            for op, samples in self._latency_ms.items():
+                ordered = sorted(samples)
+                latency[op] = {
+                    "p50_ms": round(ordered[len(ordered) // 2], 1) if ordered else None,
+                    "p95_ms": round(ordered[int(len(ordered) * 0.95)], 1) if ordered else None,
+                    "max_ms": round(ordered[-1], 1) if ordered else None,
+                }
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "pending": self._pending,
+                "queue_max": self.queue_max,
+                "latency": latency,
+                **self.metrics,
+            }
+
+
+password_pool = PasswordPool()
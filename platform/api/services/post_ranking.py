@@ -0,0 +1,129 @@
+"""Stored ranking scores for community posts.
+
+``community_posts.hot_score`` holds ``(upvotes - downvotes) / (age_hours + 2)``
+and ``feed_score`` the post-only part of the personalized feed ranking
+(recent ×1.5, has comments ×1.2). Both are written when a post is voted on or
+commented and refreshed by :func:`decay_scores`, which the API runs every
+``HOT_SCORE_DECAY_INTERVAL_S`` seconds, so list endpoints read them straight
+from an index instead of ranking the whole table per request.
+
+``feed_score = 0`` marks rows that were never scored (legacy rows, inserts
+from other code paths); the decay pass fills them in.
+
+Hot scores only decay for ``HOT_SCORE_HORIZON_DAYS``; an older post scores 0
+and is left alone by later passes, so a pass touches the posts of the last
+few weeks rather than every post ever voted on.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from .. import database
+
+logger = logging.getLogger(__name__)
+
+HOT_SCORE_DECAY_INTERVAL_S = int(os.environ.get("HOT_SCORE_DECAY_INTERVAL_S", "300"))
+HOT_SCORE_HORIZON_DAYS = int(os.environ.get("HOT_SCORE_HORIZON_DAYS", "30"))
+FEED_RECENT_HOURS = 24
+# A followed author's post always outranks any other post (every feed_score is
+# within [1.0, 1.8]), which lets the feed read followed and other posts as two
+# index-ordered segments.
+FEED_FOLLOW_BOOST = 2.0
+RECENT_FEED_SCORE = 1.5
+
+# One placeholder: the "recent" cutoff timestamp
+FEED_SCORE_SQL = (
+    "((CASE WHEN created_at >= ? THEN 1.5 ELSE 1.0 END)"
+    " * (CASE WHEN comment_count > 0 THEN 1.2 ELSE 1.0 END))"
+)
+
+
+def _parse_ts(value: str) -> datetime:
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def hot_score(upvotes: int, downvotes: int, created_at: str, now: datetime | None = None) -> float:
+    """Net votes divided by age in hours plus two; 0 past the decay horizon."""
+    net = (upvotes or 0) - (downvotes or 0)
+    if net == 0:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    age_hours = max((now - _parse_ts(created_at)).total_seconds() / 3600.0, 0.0)
+    if age_hours >= HOT_SCORE_HORIZON_DAYS * 24:
+        return 0.0
+    return net / (age_hours + 2.0)
+
+
+def _recent_cutoff(now: datetime) -> str:
+    return (now - timedelta(hours=FEED_RECENT_HOURS)).isoformat()
+
+
+def refresh_post_scores(db, post_id: str, now: datetime | None = None) -> None:
+    """Recompute both stored scores of one post after a vote or comment."""
+    now = now or datetime.now(timezone.utc)
+    row = db.execute(
+        "SELECT upvotes, downvotes, created_at FROM community_posts WHERE id = ?", (post_id,)
+    ).fetchone()
+    if row is None:
+        return
+    db.execute(
+        f"UPDATE community_posts SET hot_score = ?, feed_score = {FEED_SCORE_SQL} WHERE id = ?",
+        (hot_score(row["upvotes"], row["downvotes"], row["created_at"], now), _recent_cutoff(now), post_id),
+    )
+
+
+def decay_scores(db, now: datetime | None = None, expire_all: bool = False) -> int:
+    """Re-age stored scores; returns the number of posts whose hot score was rewritten.
+
+    Only voted posts can have a non-zero hot score, and only posts still
+    carrying the recency boost (or never scored) need a new feed score.
+    Hot scores are recomputed for posts inside the decay horizon plus one
+    day, which zeroes the posts that crossed it since the last pass.
+    ``expire_all`` (used at startup) also zeroes any older post.
+    """
+    now = now or datetime.now(timezone.utc)
+    horizon = now - timedelta(days=HOT_SCORE_HORIZON_DAYS)
+    cutoff = _recent_cutoff(now)
+    db.execute(
+        f"UPDATE community_posts SET feed_score = {FEED_SCORE_SQL}"
+        " WHERE feed_score = 0 OR (feed_score >= ? AND created_at < ?)",
+        (cutoff, RECENT_FEED_SCORE, cutoff),
+    )
+    if expire_all:
+        db.execute(
+            "UPDATE community_posts SET hot_score = 0 WHERE hot_score != 0 AND created_at < ?",
+            (horizon.isoformat(),),
+        )
+    rows = db.execute(
+        "SELECT id, upvotes, downvotes, created_at, hot_score FROM community_posts"
+        " WHERE created_at >= ? AND (upvotes != downvotes OR hot_score != 0)",
+        ((horizon - timedelta(days=1)).isoformat(),),
+    ).fetchall()
+    updates = [
+        (score, r["id"]) for r in rows
+        if (score := hot_score(r["upvotes"], r["downvotes"], r["created_at"], now)) != r["hot_score"]
+    ]
+    if updates:
+        db.cursor().executemany("UPDATE community_posts SET hot_score = ? WHERE id = ?", updates)
+    return len(updates)
+
+
+def _decay_once() -> int:
+    with database.get_db() as db:
+        return decay_scores(db)
+
+
+async def decay_loop(interval: float = HOT_SCORE_DECAY_INTERVAL_S) -> None:
+    """Background task started from the app lifespan."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            count = await asyncio.to_thread(_decay_once)
+            logger.debug("Post ranking decay: %d hot scores refreshed", count)
+        except Exception:
+            logger.exception("Post ranking decay failed")
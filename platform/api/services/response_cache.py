@@ -0,0 +1,187 @@
+"""Shared response cache for anonymous aggregate endpoints.
+
+The region map, the community region counts, the tag list and the evolution
+leaderboard are the busiest anonymous reads. Each one ran a ``GROUP BY`` or a
+sort over a whole table on every homepage visit, even though the results
+change slowly. :data:`response_cache` keeps each rendered JSON body with a
+strong ``ETag`` (a SHA-256 of the body), so every worker gives identical
+content the same tag. Routes return :meth:`ResponseCache.respond`, which:
+
+* answers a matching ``If-None-Match`` with 304 and no body;
+* sends ``Cache-Control: public, max-age=RESPONSE_CACHE_TTL_S,
+  stale-while-revalidate=RESPONSE_CACHE_STALE_S`` so a CDN or browser can
+  absorb repeat traffic;
+* recomputes a missing or expired entry on one request at a time.
+  Concurrent requests are served the stale body for up to
+  ``RESPONSE_CACHE_STALE_S`` seconds, or wait for that computation when
+  there is nothing to serve (e.g. right after an invalidation), instead of
+  running the same aggregate together.
+
+Entries are grouped (``node_regions``, ``community_regions``, ``tags``,
+``leaderboard``). Routes that change what a group reports call
+:func:`api.events.aggregates_changed` after their write commits. That call
+drops the group here and, through the event bridge, on every other worker.
+Changes no route announces, such as nodes going offline through heartbeats,
+show up within one TTL. A computation that started before an invalidation is
+not stored.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, NamedTuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from .downloads import etag_for, etag_matches
+
+RESPONSE_CACHE_TTL_S = float(os.environ.get("RESPONSE_CACHE_TTL_S", "30"))
+RESPONSE_CACHE_STALE_S = float(os.environ.get("RESPONSE_CACHE_STALE_S", "300"))
+RESPONSE_CACHE_MAX = int(os.environ.get("RESPONSE_CACHE_MAX", "256"))
+
+
+class _Entry(NamedTuple):
+    body: bytes
+    etag: str
+    expires: float  # time.monotonic()
+
+
+class ResponseCache:
+    """TTL LRU of rendered JSON bodies keyed by ``(group, key)``."""
+
+    def __init__(
+        self,
+        ttl: float = RESPONSE_CACHE_TTL_S,
+        stale: float = RESPONSE_CACHE_STALE_S,
+        max_size: int = RESPONSE_CACHE_MAX,
+    ):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, Hashable], _Entry] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._refreshing: dict[tuple[str, Hashable], threading.Event] = {}
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0, "evictions": 0}
+
+    @property
+    def cache_control(self) -> str:
+        if self.ttl <= 0:
+            return "no-cache"
+        return f"public, max-age={int(self.ttl)}, stale-while-revalidate={int(self.stale)}"
+
+    def _lookup(self, slot: tuple[str, Hashable]) -> tuple[_Entry | None, threading.Event, int | None]:
+        """(entry to serve, refresh event, generation to store under).
+
+        Without an entry, a None generation means another request is computing
+        the slot: wait for the event and look again. Otherwise the caller owns
+        the event and sets it through :meth:`_done`.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(slot)
+            pending = self._refreshing.get(slot)
+            if entry is not None:
+                self._entries.move_to_end(slot)
+                if entry.expires > now:
+                    self.metrics["hits"] += 1
+                    return entry, pending, None
+                if pending is not None and entry.expires + self.stale > now:
+                    self.metrics["stale_hits"] += 1
+                    return entry, pending, None
+            if pending is not None:
+                return None, pending, None
+            self.metrics["misses"] += 1
+            self._refreshing[slot] = done = threading.Event()
+            return None, done, self._generations.get(slot[0], 0)
+
+    def _done(self, slot: tuple[str, Hashable], done: threading.Event) -> None:
+        """Release requests waiting on the computation behind ``done``; call with the lock held."""
+        if self._refreshing.get(slot) is done:
+            del self._refreshing[slot]
+        done.set()
+
+    def _render(self, data: Any) -> _Entry:
+        body = JSONResponse(jsonable_encoder(data)).body
+        return _Entry(body, etag_for(hashlib.sha256(body).hexdigest()), time.monotonic() + self.ttl)
+
+    def _store(self, slot: tuple[str, Hashable], data: Any, done: threading.Event, generation: int) -> _Entry:
+        entry = self._render(data)
+        with self._lock:
+            self._done(slot, done)
+            if self._generations.get(slot[0], 0) == generation:
+                self._entries[slot] = entry
+                self._entries.move_to_end(slot)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.metrics["evictions"] += 1
+        return entry
+
+    def get(self, group: str, compute: Callable[[], Any], key: Hashable = ()) -> _Entry:
+        """The cached entry for ``(group, key)``, running ``compute`` for its data on a miss."""
+        if self.ttl <= 0:
+            return self._render(compute())
+        slot = (group, key)
+        while True:
+            entry, done, generation = self._lookup(slot)
+            if entry is not None:
+                return entry
+            if generation is not None:
+                break
+            done.wait()
+        try:
+            data = compute()
+        except BaseException:
+            with self._lock:
+                self._done(slot, done)
+            raise
+        return self._store(slot, data, done, generation)
+
+    def respond(self, request: Request, group: str, compute: Callable[[], Any], key: Hashable = ()) -> Response:
+        """Cached JSON response for ``(group, key)``, or 304 when ``If-None-Match`` matches."""
+        entry = self.get(group, compute, key)
+        headers = {"ETag": entry.etag, "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            with self._lock:
+                self.metrics["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def invalidate(self, *groups: str) -> int:
+        """Drop every entry of ``groups``; returns how many were dropped."""
+        with self._lock:
+            for group in groups:
+                self._generations[group] = self._generations.get(group, 0) + 1
+            stale = [slot for slot in self._entries if slot[0] in groups]
+            for slot in stale:
+                del self._entries[slot]
+            self.metrics["invalidations"] += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for done in self._refreshing.values():
+                done.set()
+            self._refreshing.clear()
+            for group in self._generations:
+                self._generations[group] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            served = self.metrics["hits"] + self.metrics["stale_hits"] + self.metrics["misses"]
+            return {
+                "size": len(self._entries),
+                "ttl_s": self.ttl,
+                "hit_rate": round((self.metrics["hits"] + self.metrics["stale_hits"]) / served, 3) if served else None,
+                **self.metrics,
+            }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,403 @@
+"""Full-text search index — SQLite FTS5 tables kept in sync by triggers, Postgres tsvector + GIN.
+
+Callers ask for ranked ids with :func:`search`; ``None`` means the index can't
+serve the query (FTS5 missing, CJK text that the word tokenizer can't split,
+or no searchable terms) and the caller should fall back to its LIKE scan.
+
+Each FTS row stores its source row's ``id`` in an ``UNINDEXED`` column and
+queries join on that, so hits always name the right row. The triggers find
+FTS rows by the source ``rowid`` (FTS5 can only look rows up by rowid) and
+also check the ``id``. SQLite may renumber the rowids of tables without an
+INTEGER PRIMARY KEY on ``VACUUM``; :func:`init_search_index` notices rowids
+that no longer line up and rebuilds, as does :func:`rebuild_search_index`.
+
+On Postgres the post tags are copied into ``community_posts.search_tags`` by
+a trigger on ``post_tags``, so the ``tsvector`` covers the same text as the
+SQLite index.
+"""
+
+from __future__ import annotations
+
+import html
+import logging
+import re
+import sqlite3
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Sentinels passed to snippet()/ts_headline(), swapped for <mark> after escaping
+_HL_START = "\x02"
+_HL_END = "\x03"
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+# The unicode61 tokenizer keeps a run of CJK characters as one token, so
+# substring matches inside Chinese/Japanese/Korean text still need LIKE.
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+
+@dataclass(frozen=True)
+class _Index:
+    table: str
+    fts: str
+    columns: tuple[str, ...]
+    weights: tuple[float, ...]
+    # SQL expressions (over alias ``src``) used to backfill each FTS column
+    backfill: tuple[str, ...]
+    # Postgres: (column, weight) pairs for the generated tsvector
+    pg_columns: tuple[tuple[str, str], ...]
+    pg_snippet_column: str
+    # Postgres: weight of the trigger-maintained ``search_tags`` column, if indexed
+    pg_tags_weight: str | None = None
+
+
+_POST_TAGS_EXPR = (
+    "COALESCE((SELECT group_concat(t.name, ' ') FROM post_tags pt "
+    "JOIN tags t ON t.id = pt.tag_id WHERE pt.post_id = {post_id}), '')"
+)
+
+INDEXES: dict[str, _Index] = {
+    "posts": _Index(
+        table="community_posts",
+        fts="community_posts_fts",
+        columns=("title", "content", "tags"),
+        weights=(3.0, 1.0, 2.0),
+        backfill=("src.title", "src.content", _POST_TAGS_EXPR.format(post_id="src.id")),
+        pg_columns=(("title", "A"), ("content", "C")),
+        pg_snippet_column="content",
+        pg_tags_weight="B",
+    ),
+    "nodes": _Index(
+        table="nodes",
+        fts="nodes_fts",
+        columns=("name", "description"),
+        weights=(3.0, 1.0),
+        backfill=("src.name", "COALESCE(src.description, '')"),
+        pg_columns=(("name", "A"), ("description", "B")),
+        pg_snippet_column="description",
+    ),
+    "agents": _Index(
+        table="agents",
+        fts="agents_fts",
+        columns=("name", "display_name", "bio", "description"),
+        weights=(3.0, 3.0, 1.0, 1.0),
+        backfill=(
+            "src.name",
+            "COALESCE(src.display_name, '')",
+            "COALESCE(src.bio, '')",
+            "COALESCE(src.description, '')",
+        ),
+        pg_columns=(("name", "A"), ("display_name", "A"), ("bio", "B"), ("description", "B")),
+        pg_snippet_column="bio",
+    ),
+    "users": _Index(
+        table="users",
+        fts="users_fts",
+        columns=("username",),
+        weights=(1.0,),
+        backfill=("src.username",),
+        pg_columns=(("username", "A"),),
+        pg_snippet_column="username",
+    ),
+}
+
+
+@dataclass
+class SearchHits:
+    ids: list[str]
+    snippets: dict[str, str]
+    total: int
+
+
+def _is_sqlite(db) -> bool:
+    return isinstance(db, sqlite3.Connection)
+
+
+# ─── Schema ──────────────────────────────────────────────
+
+
+def _sqlite_triggers(idx: _Index) -> list[str]:
+    cols = ", ".join(idx.columns)
+    exprs = [expr.replace("src.", "new.") for expr in idx.backfill]
+    new_values = ", ".join(exprs)
+    set_clause = ", ".join(f"{col} = {expr}" for col, expr in zip(idx.columns, exprs))
+    # Only columns that exist on the source table; post tags sync via post_tags triggers
+    watched = ", ".join(col for col, _ in idx.pg_columns)
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {idx.fts}_ai AFTER INSERT ON {idx.table} BEGIN
+            INSERT INTO {idx.fts}(rowid, id, {cols}) VALUES (new.rowid, new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {idx.fts}_au AFTER UPDATE OF {watched} ON {idx.table} BEGIN
+            UPDATE {idx.fts} SET {set_clause} WHERE rowid = new.rowid AND id = new.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {idx.fts}_ad AFTER DELETE ON {idx.table} BEGIN
+            DELETE FROM {idx.fts} WHERE rowid = old.rowid AND id = old.id;
+        END""",
+    ]
+
+
+_POST_TAG_TRIGGERS = {
+    "post_tags_fts_ai": f"""CREATE TRIGGER IF NOT EXISTS post_tags_fts_ai AFTER INSERT ON post_tags BEGIN
+        UPDATE community_posts_fts SET tags = {_POST_TAGS_EXPR.format(post_id="new.post_id")}
+        WHERE rowid = (SELECT rowid FROM community_posts WHERE id = new.post_id) AND id = new.post_id;
+    END""",
+    "post_tags_fts_ad": f"""CREATE TRIGGER IF NOT EXISTS post_tags_fts_ad AFTER DELETE ON post_tags BEGIN
+        UPDATE community_posts_fts SET tags = {_POST_TAGS_EXPR.format(post_id="old.post_id")}
+        WHERE rowid = (SELECT rowid FROM community_posts WHERE id = old.post_id) AND id = old.post_id;
+    END""",
+}
+
+
+def _drop_legacy_fts(db, idx: _Index) -> None:
+    """Drop an FTS table created before it stored ``id``, with its triggers, so it is recreated."""
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (idx.fts,)
+    ).fetchone()
+    if exists is None:
+        return
+    try:
+        db.execute(f"SELECT id FROM {idx.fts} LIMIT 0")
+        return
+    except sqlite3.OperationalError:
+        pass
+    triggers = [f"{idx.fts}_ai", f"{idx.fts}_au", f"{idx.fts}_ad"]
+    if idx.table == "community_posts":
+        triggers += list(_POST_TAG_TRIGGERS)
+    for name in triggers:
+        db.execute(f"DROP TRIGGER IF EXISTS {name}")
+    db.execute(f"DROP TABLE {idx.fts}")
+
+
+def init_search_index(db) -> None:
+    """Create the full-text index and sync machinery; backfill when out of step."""
+    if not _is_sqlite(db):
+        _init_pg_search_index(db)
+        return
+
+    try:
+        for idx in INDEXES.values():
+            _drop_legacy_fts(db, idx)
+            db.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {idx.fts} USING fts5("
+                f"id UNINDEXED, {', '.join(idx.columns)}, tokenize='unicode61 remove_diacritics 2')"
+            )
+            for sql in _sqlite_triggers(idx):
+                db.execute(sql)
+        for sql in _POST_TAG_TRIGGERS.values():
+            db.execute(sql)
+    except sqlite3.OperationalError as exc:
+        # SQLite built without FTS5 — search keeps using LIKE scans
+        logger.warning("Full-text index unavailable: %s", exc)
+        return
+
+    for name, idx in INDEXES.items():
+        indexed = db.execute(f"SELECT COUNT(*) FROM {idx.fts}").fetchone()[0]
+        source = db.execute(f"SELECT COUNT(*) FROM {idx.table}").fetchone()[0]
+        # Rows whose rowid still points at the same source row (VACUUM may renumber)
+        aligned = db.execute(
+            f"SELECT COUNT(*) FROM {idx.fts} f JOIN {idx.table} src ON src.rowid = f.rowid AND src.id = f.id"
+        ).fetchone()[0]
+        if indexed != source or aligned != source:
+            _rebuild_sqlite(db, idx)
+            logger.info("Rebuilt %s full-text index (%d rows)", name, source)
+
+
+def _rebuild_sqlite(db, idx: _Index) -> None:
+    db.execute(f"DELETE FROM {idx.fts}")
+    db.execute(
+        f"INSERT INTO {idx.fts}(rowid, id, {', '.join(idx.columns)}) "
+        f"SELECT src.rowid, src.id, {', '.join(idx.backfill)} FROM {idx.table} src"
+    )
+
+
+def rebuild_search_index(db) -> None:
+    """Repopulate every FTS table from its source table (SQLite only)."""
+    if not _is_sqlite(db) or not _fts_ready(db):
+        return
+    for idx in INDEXES.values():
+        _rebuild_sqlite(db, idx)
+
+
+_PG_POST_TAGS_SQL = (
+    "ALTER TABLE community_posts ADD COLUMN IF NOT EXISTS search_tags TEXT NOT NULL DEFAULT ''",
+    """CREATE OR REPLACE FUNCTION community_posts_sync_search_tags() RETURNS trigger
+       LANGUAGE plpgsql AS $$
+       DECLARE pid TEXT;
+       BEGIN
+           IF TG_OP = 'DELETE' THEN pid := OLD.post_id; ELSE pid := NEW.post_id; END IF;
+           UPDATE community_posts SET search_tags = COALESCE((
+               SELECT string_agg(t.name, ' ') FROM post_tags pt JOIN tags t ON t.id = pt.tag_id
+               WHERE pt.post_id = pid), '')
+           WHERE id = pid;
+           RETURN NULL;
+       END $$""",
+    "DROP TRIGGER IF EXISTS post_tags_search_tags ON post_tags",
+    """CREATE TRIGGER post_tags_search_tags AFTER INSERT OR DELETE ON post_tags
+       FOR EACH ROW EXECUTE FUNCTION community_posts_sync_search_tags()""",
+    # Backfill posts tagged before the column existed
+    """UPDATE community_posts p SET search_tags = COALESCE((
+           SELECT string_agg(t.name, ' ') FROM post_tags pt JOIN tags t ON t.id = pt.tag_id
+           WHERE pt.post_id = p.id), '')
+       WHERE p.search_tags = '' AND EXISTS (SELECT 1 FROM post_tags pt WHERE pt.post_id = p.id)""",
+)
+
+
+def _pg_run(db, *statements: str) -> bool:
+    for sql in statements:
+        try:
+            db.execute(sql)
+            db.commit()
+        except Exception as exc:
+            logger.warning("PG search index: %s", exc)
+            db.rollback()
+            return False
+    return True
+
+
+def _init_pg_search_index(db) -> None:
+    for idx in INDEXES.values():
+        columns = list(idx.pg_columns)
+        if idx.pg_tags_weight is not None:
+            if not _pg_run(db, *_PG_POST_TAGS_SQL):
+                continue
+            columns.append(("search_tags", idx.pg_tags_weight))
+        vector = " || ".join(
+            f"setweight(to_tsvector('simple', coalesce({col}, '')), '{weight}')" for col, weight in columns
+        )
+        # The column comment records the expression, so a changed definition is regenerated
+        current = db.execute(
+            "SELECT col_description(c.oid, a.attnum) AS note FROM pg_class c"
+            " JOIN pg_attribute a ON a.attrelid = c.oid"
+            " WHERE c.relname = ? AND a.attname = 'search_tsv' AND NOT a.attisdropped",
+            (idx.table,),
+        ).fetchone()
+        if current is not None and current["note"] == vector:
+            continue
+        drop = [f"ALTER TABLE {idx.table} DROP COLUMN search_tsv"] if current is not None else []
+        _pg_run(
+            db,
+            *drop,
+            f"ALTER TABLE {idx.table} ADD COLUMN search_tsv tsvector GENERATED ALWAYS AS ({vector}) STORED",
+            f"COMMENT ON COLUMN {idx.table}.search_tsv IS '{vector.replace(chr(39), chr(39) * 2)}'",
+            f"CREATE INDEX IF NOT EXISTS idx_{idx.table}_search_tsv ON {idx.table} USING GIN (search_tsv)",
+        )
+
+
+def _fts_ready(db) -> bool:
+    try:
+        return db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'community_posts_fts'"
+        ).fetchone() is not None
+    except sqlite3.Error:
+        return False
+
+
+# ─── Queries ─────────────────────────────────────────────
+
+
+def _terms(q: str) -> list[list[str]]:
+    """Split user input into terms, each a list of word tokens."""
+    if _CJK_RE.search(q):
+        return []
+    terms = []
+    for raw in q.split():
+        tokens = _TERM_RE.findall(raw)
+        if tokens:
+            terms.append(tokens)
+    return terms
+
+
+def build_fts_query(q: str) -> str | None:
+    """FTS5 MATCH expression: each term is a prefix phrase, terms are ANDed."""
+    terms = _terms(q)
+    if not terms:
+        return None
+    return " ".join('"' + " ".join(tokens) + '"*' for tokens in terms)
+
+
+def build_tsquery(q: str) -> str | None:
+    """Postgres to_tsquery expression with the same semantics as :func:`build_fts_query`."""
+    terms = _terms(q)
+    if not terms:
+        return None
+    return " & ".join(
+        "(" + " <-> ".join(tokens[:-1] + [tokens[-1] + ":*"]) + ")" for tokens in terms
+    )
+
+
+def _highlight(snippet: str | None) -> str:
+    """Escape snippet text (stored text may already be HTML-escaped) and mark hits."""
+    if not snippet:
+        return ""
+    text = html.escape(html.unescape(snippet))
+    return text.replace(_HL_START, "<mark>").replace(_HL_END, "</mark>")
+
+
+def search(db, index: str, q: str, limit: int, offset: int = 0) -> SearchHits | None:
+    """Return ids ranked by relevance (BM25 on SQLite, ts_rank_cd on Postgres)."""
+    idx = INDEXES[index]
+    if _is_sqlite(db):
+        match = build_fts_query(q)
+        if match is None or not _fts_ready(db):
+            return None
+        weights = ", ".join(str(w) for w in (0.0, *idx.weights))  # the id column carries no weight
+        try:
+            rows = db.execute(
+                f"""
+                SELECT src.id AS id,
+                       snippet({idx.fts}, -1, char(2), char(3), '…', 16) AS snippet
+                FROM {idx.fts} f
+                JOIN {idx.table} src ON src.id = f.id
+                WHERE {idx.fts} MATCH ?
+                ORDER BY bm25({idx.fts}, {weights}), src.rowid DESC
+                LIMIT ? OFFSET ?
+                """,
+                (match, limit, offset),
+            ).fetchall()
+            total = db.execute(
+                f"SELECT COUNT(*) FROM {idx.fts} WHERE {idx.fts} MATCH ?", (match,)
+            ).fetchone()[0]
+        except sqlite3.OperationalError as exc:
+            logger.warning("FTS query failed for %r: %s", q, exc)
+            return None
+    else:
+        tsquery = build_tsquery(q)
+        if tsquery is None:
+            return None
+        try:
+            rows = db.execute(
+                f"""
+                SELECT id, ts_headline('simple', coalesce({idx.pg_snippet_column}, ''), query,
+                                       'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=24, MinWords=8') AS snippet
+                FROM {idx.table}, to_tsquery('simple', ?) query
+                WHERE search_tsv @@ query
+                ORDER BY ts_rank_cd(search_tsv, query) DESC, created_at DESC
+                LIMIT ? OFFSET ?
+                """,
+                (tsquery, limit, offset),
+            ).fetchall()
+            total = db.execute(
+                f"SELECT COUNT(*) AS c FROM {idx.table} WHERE search_tsv @@ to_tsquery('simple', ?)",
+                (tsquery,),
+            ).fetchone()["c"]
+        except Exception as exc:
+            logger.warning("tsvector query failed for %r: %s", q, exc)
+            db.rollback()
+            return None
+
+    ids = [row["id"] for row in rows]
+    return SearchHits(
+        ids=ids,
+        snippets={row["id"]: _highlight(row["snippet"]) for row in rows},
+        total=int(total),
+    )
+
+
+def fetch_ranked(db, select_sql: str, ids: list[str]) -> list:
+    """Fetch rows for ranked ids with one IN query, preserving the ranking order."""
+    if not ids:
+        return []
+    placeholders = ",".join("?" * len(ids))
+    rows = db.execute(f"{select_sql} WHERE id IN ({placeholders})", ids).fetchall()
+    by_id = {row["id"]: row for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
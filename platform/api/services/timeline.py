@@ -0,0 +1,191 @@
+"""Follow timelines — fan-out-on-write home timelines for the personalized feed.
+
+``create_post`` pushes the new post ID into ``timeline_entries`` for every
+follower of its author, so reading "posts by people I follow" is one indexed
+lookup on the reader's own timeline instead of an ``IN (...)`` list built from
+their whole follow list.
+
+Authors with more than ``FANOUT_MAX_FOLLOWERS`` followers are not fanned out:
+they are recorded in ``timeline_pull_authors`` and readers merge their posts
+at read time (fan-out-on-read). Timelines keep the newest
+``TIMELINE_MAX_LENGTH`` entries; older ones are trimmed every
+``TIMELINE_TRIM_INTERVAL_S`` seconds and when a follow backfills a timeline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+
+from .. import database
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_MAX_LENGTH = int(os.environ.get("TIMELINE_MAX_LENGTH", "500"))
+FANOUT_MAX_FOLLOWERS = int(os.environ.get("FANOUT_MAX_FOLLOWERS", "10000"))
+TIMELINE_TRIM_INTERVAL_S = int(os.environ.get("TIMELINE_TRIM_INTERVAL_S", "600"))
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS timeline_entries (
+        user_id TEXT NOT NULL,
+        post_id TEXT NOT NULL,
+        author_id TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, post_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_timeline_user_created ON timeline_entries(user_id, created_at, post_id)",
+    "CREATE INDEX IF NOT EXISTS idx_timeline_post ON timeline_entries(post_id)",
+    """CREATE TABLE IF NOT EXISTS timeline_pull_authors (
+        author_id TEXT PRIMARY KEY,
+        follower_count INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )""",
+]
+
+
+def init_timelines(db) -> None:
+    """Create the timeline tables; build timelines from ``follows`` on first run."""
+    for sql in _SCHEMA:
+        db.execute(sql)
+    if db.execute("SELECT 1 FROM timeline_entries LIMIT 1").fetchone() is None:
+        if db.execute("SELECT 1 FROM follows LIMIT 1").fetchone() is not None:
+            rebuild_timelines(db)
+
+
+def rebuild_timelines(db) -> None:
+    """Recompute every timeline from ``follows`` and ``community_posts``."""
+    db.execute("DELETE FROM timeline_entries")
+    db.execute(
+        """
+        INSERT INTO timeline_entries (user_id, post_id, author_id, created_at)
+        SELECT f.follower_id, p.id, p.author_id, p.created_at
+        FROM follows f JOIN community_posts p ON p.author_id = f.following_id
+        WHERE f.following_id NOT IN (SELECT author_id FROM timeline_pull_authors)
+        """
+    )
+    trim_timelines(db)
+    logger.info("Follow timelines rebuilt")
+
+
+def _is_pull_author(db, author_id: str) -> bool:
+    return db.execute(
+        "SELECT 1 FROM timeline_pull_authors WHERE author_id = ?", (author_id,)
+    ).fetchone() is not None
+
+
+def fan_out_post(db, post_id: str, author_id: str, created_at: str) -> int:
+    """Push a new post into its author's followers' timelines; returns entries written."""
+    followers = db.execute(
+        "SELECT COUNT(*) AS n FROM follows WHERE following_id = ?", (author_id,)
+    ).fetchone()["n"]
+    if followers > FANOUT_MAX_FOLLOWERS or _is_pull_author(db, author_id):
+        # Too many followers to write to: readers pull this author's posts instead
+        db.execute(
+            """
+            INSERT INTO timeline_pull_authors (author_id, follower_count, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (author_id) DO UPDATE SET follower_count = excluded.follower_count,
+                updated_at = excluded.updated_at
+            """,
+            (author_id, followers, datetime.now(timezone.utc).isoformat()),
+        )
+        return 0
+    if followers:
+        db.execute(
+            """
+            INSERT INTO timeline_entries (user_id, post_id, author_id, created_at)
+            SELECT follower_id, ?, ?, ? FROM follows WHERE following_id = ?
+            ON CONFLICT (user_id, post_id) DO NOTHING
+            """,
+            (post_id, author_id, created_at, author_id),
+        )
+    return followers
+
+
+def on_follow(db, follower_id: str, author_id: str) -> None:
+    """Backfill the new follower's timeline with the author's recent posts."""
+    if _is_pull_author(db, author_id):
+        return
+    db.execute(
+        """
+        INSERT INTO timeline_entries (user_id, post_id, author_id, created_at)
+        SELECT ?, id, author_id, created_at FROM community_posts WHERE author_id = ?
+        ORDER BY created_at DESC LIMIT ?
+        ON CONFLICT (user_id, post_id) DO NOTHING
+        """,
+        (follower_id, author_id, TIMELINE_MAX_LENGTH),
+    )
+    trim_timelines(db, follower_id)
+
+
+def on_unfollow(db, follower_id: str, author_id: str) -> None:
+    db.execute(
+        "DELETE FROM timeline_entries WHERE user_id = ? AND author_id = ?", (follower_id, author_id)
+    )
+
+
+def remove_user(db, user_id: str) -> None:
+    """Drop a deleted account's timeline and its posts from everyone else's."""
+    db.execute("DELETE FROM timeline_entries WHERE user_id = ? OR author_id = ?", (user_id, user_id))
+    db.execute("DELETE FROM timeline_pull_authors WHERE author_id = ?", (user_id,))
+
+
+def trim_timelines(db, user_id: str | None = None) -> int:
+    """Keep the newest ``TIMELINE_MAX_LENGTH`` entries per user (or for one user)."""
+    where, params = ("WHERE user_id = ?", [user_id]) if user_id else ("", [])
+    cursor = db.execute(
+        f"""
+        DELETE FROM timeline_entries WHERE (user_id, post_id) IN (
+            SELECT user_id, post_id FROM (
+                SELECT user_id, post_id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id ORDER BY created_at DESC, post_id DESC
+                ) AS rn
+                FROM timeline_entries {where}
+            ) ranked WHERE rn > ?
+        )
+        """,
+        params + [TIMELINE_MAX_LENGTH],
+    )
+    return max(cursor.rowcount, 0)
+
+
+def followed_posts_clause(db, user_id: str) -> tuple[str, list]:
+    """SQL predicate on ``community_posts`` matching posts in ``user_id``'s home timeline.
+
+    The parameter list is bounded by the number of followed pull authors,
+    never by the size of the follow list.
+    """
+    pull_ids = [
+        r["following_id"]
+        for r in db.execute(
+            """
+            SELECT f.following_id FROM follows f
+            JOIN timeline_pull_authors pa ON pa.author_id = f.following_id
+            WHERE f.follower_id = ?
+            """,
+            (user_id,),
+        ).fetchall()
+    ]
+    clause = "community_posts.id IN (SELECT post_id FROM timeline_entries WHERE user_id = ?)"
+    params: list = [user_id]
+    if pull_ids:
+        clause += f" OR community_posts.author_id IN ({','.join('?' for _ in pull_ids)})"
+        params.extend(pull_ids)
+    return f"({clause})", params
+
+
+def _trim_once() -> int:
+    with database.get_db() as db:
+        return trim_timelines(db)
+
+
+async def trim_loop(interval: float = TIMELINE_TRIM_INTERVAL_S) -> None:
+    """Background task started from the app lifespan."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            count = await asyncio.to_thread(_trim_once)
+            logger.debug("Timeline trim: %d entries removed", count)
+        except Exception:
+            logger.exception("Timeline trim failed")
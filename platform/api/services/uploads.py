@@ -0,0 +1,214 @@
+"""Streaming file storage for uploads.
+
+``POST /files/upload`` parses its ``multipart/form-data`` body straight off
+the request stream with :class:`MultipartSpool`: the file part is written
+into a temporary file on the upload filesystem while SHA-256 and size are
+computed incrementally, so an oversized upload is rejected as soon as the
+limit is crossed rather than after the whole body was received (a
+``Content-Length`` that is already too large is refused before reading).
+The finished file is moved into the content-addressed blob store with an
+atomic ``os.replace``. Peak memory per upload is one chunk, not the whole
+file.
+
+Resumable uploads (``/files/uploads``) append ``Content-Range`` chunks to a
+part file tracked in ``upload_sessions``; sessions left unfinished for
+``UPLOAD_SESSION_TTL_H`` hours are purged with their part files.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_IO_CHUNK = 1024 * 1024
+RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024  # suggested client chunk size
+MAX_RESUMABLE_FILE_SIZE = int(os.environ.get("UPLOAD_RESUMABLE_MAX_MB", "500")) * 1024 * 1024
+UPLOAD_SESSION_TTL_H = int(os.environ.get("UPLOAD_SESSION_TTL_H", "24"))
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class HashingWriter:
+    """Temp file in ``directory`` that hashes and counts what is written to it."""
+
+    def __init__(self, directory: Path, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, name = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self.temp_path = Path(name)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadTooLarge(self.size)
+        self._hash.update(data)
+        self._file.write(data)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def abort(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        self.temp_path.unlink(missing_ok=True)
+
+
+def spool_stream(src: BinaryIO, directory: Path, max_size: int) -> tuple[Path, int, str]:
+    """Copy ``src`` into a temp file in ``directory``; returns (temp path, size, sha256 hex).
+
+    The caller moves the temp file into place (see ``BlobStore.adopt``).
+    Raises :class:`UploadTooLarge` as soon as more than ``max_size`` bytes
+    were read; nothing is left behind in that case.
+    """
+    writer = HashingWriter(directory, max_size)
+    try:
+        while chunk := src.read(UPLOAD_IO_CHUNK):
+            writer.write(chunk)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.temp_path, writer.size, writer.sha256
+
+
+class MultipartSpool:
+    """Spools the ``field`` file part of a ``multipart/form-data`` body fed in chunks.
+
+    Other parts are discarded. :meth:`feed` raises :class:`UploadTooLarge`
+    as soon as the part outgrows ``max_size`` and ``ValueError`` for a body
+    that is not valid multipart; call :meth:`abort` on any error.
+    """
+
+    def __init__(self, content_type: str, field: str, directory: Path, max_size: int):
+        media_type, options = parse_options_header(content_type or "")
+        boundary = options.get(b"boundary")
+        if media_type != b"multipart/form-data" or not boundary:
+            raise ValueError("Expected a multipart/form-data body")
+        self.field = field
+        self.directory = directory
+        self.max_size = max_size
+        self.filename: str | None = None
+        self.writer: HashingWriter | None = None
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._target: HashingWriter | None = None
+        self._parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self) -> None:
+        self._disposition = b""
+        self._target = None
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("latin-1")
+        if name != self.field or b"filename" not in options or self.writer is not None:
+            return
+        self.filename = options[b"filename"].decode("utf-8", "replace")
+        self.writer = self._target = HashingWriter(self.directory, self.max_size)
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._target is not None:
+            self._target.write(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._target is not None:
+            self._target.close()
+            self._target = None
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.write(chunk)
+
+    def finish(self) -> tuple[str, Path, int, str] | None:
+        """(filename, temp path, size, sha256 hex) of the spooled part, or None if there was none."""
+        self._parser.finalize()
+        writer = self.writer
+        if writer is None:
+            return None
+        if not writer.closed:
+            raise ValueError("Multipart body ended inside the file part")
+        return self.filename, writer.temp_path, writer.size, writer.sha256
+
+    def abort(self) -> None:
+        if self.writer is not None:
+            self.writer.abort()
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_IO_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_content_range(header: str) -> tuple[int, int, int]:
+    """``bytes start-end/total`` → (start, end, total); ValueError when malformed."""
+    match = _CONTENT_RANGE.match(header.strip())
+    if not match:
+        raise ValueError("Content-Range must look like 'bytes start-end/total'")
+    start, end, total = (int(g) for g in match.groups())
+    if start > end or end >= total:
+        raise ValueError("Content-Range is out of bounds")
+    return start, end, total
+
+
+def purge_expired_sessions(db, now: datetime) -> int:
+    """Delete resumable sessions past their expiry together with their part files."""
+    rows = db.execute(
+        "SELECT id, part_path FROM upload_sessions WHERE expires_at < ?", (now.isoformat(),)
+    ).fetchall()
+    for row in rows:
+        Path(row["part_path"]).unlink(missing_ok=True)
+        db.execute("DELETE FROM upload_sessions WHERE id = ?", (row["id"],))
+    if rows:
+        logger.info("Purged %d expired upload sessions", len(rows))
+    return len(rows)
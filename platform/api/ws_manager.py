@@ -1,12 +1,23 @@
-"""WebSocket connection manager for RealWorldClaw."""
+"""WebSocket connection manager for RealWorldClaw.
+
+Every connection owns a bounded outbound queue drained by its own writer
+task, so a slow client only delays itself. Messages are JSON-encoded once
+per send/broadcast and the same string is queued for every recipient. When a
+queue is full the oldest message is dropped; messages sent with a
+``coalesce_key`` (e.g. printer status) replace a still-queued message with
+the same key, so slow dashboards get the latest state instead of a backlog.
+"""
 
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
+import os
 import time
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Any, Callable
 
 from fastapi import WebSocket
 from starlette.websockets import WebSocketState
@@ -15,6 +26,15 @@
 
 HEARTBEAT_INTERVAL = 15  # seconds
 HEARTBEAT_PONG_TIMEOUT = 30  # seconds
+WS_QUEUE_MAX = int(os.environ.get("WS_QUEUE_MAX", "256"))  # messages per connection
+WS_SEND_TIMEOUT_S = float(os.environ.get("WS_SEND_TIMEOUT_S", "10"))
+_LATENCY_SAMPLES = 1024
+
+
+def _set_event() -> asyncio.Event:
+    event = asyncio.Event()
+    event.set()
+    return event
 
 
 @dataclass
@@ -25,21 +45,69 @@ class Connection:
     user_id: str
     connected_at: float = field(default_factory=time.time)
     last_pong: float = field(default_factory=time.time)
+    # Outbound queue entries are [coalesce_key, text, enqueued_at]
+    queue: deque = field(default_factory=deque, compare=False, repr=False)
+    pending: dict[str, list] = field(default_factory=dict, compare=False, repr=False)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event, compare=False, repr=False)
+    idle: asyncio.Event = field(default_factory=_set_event, compare=False, repr=False)
+    writer: asyncio.Task | None = field(default=None, compare=False, repr=False)
+    dropped: int = field(default=0, compare=False)
+    coalesced: int = field(default=0, compare=False)
 
 
 class ConnectionManager:
     """Manage WebSocket connections grouped by channel and target_id."""
 
-    def __init__(self) -> None:
+    def __init__(self, queue_max: int = WS_QUEUE_MAX, send_timeout: float = WS_SEND_TIMEOUT_S) -> None:
         # channel -> target_id -> list[Connection]
         self._connections: dict[str, dict[str, list[Connection]]] = {}
         self._heartbeat_task: asyncio.Task | None = None
+        self.queue_max = queue_max
+        self.send_timeout = send_timeout
+        self._sent = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self._target_listeners: list[Callable[[str, str, bool], None]] = []
+
+    # ─── Target listeners ────────────────────────────────
+
+    def add_target_listener(self, listener: Callable[[str, str, bool], None]) -> None:
+        """Call ``listener(channel, target_id, held)`` when the first socket for a
+        target connects (held=True) or the last one goes away (held=False)."""
+        self._target_listeners.append(listener)
+
+    def remove_target_listener(self, listener: Callable[[str, str, bool], None]) -> None:
+        try:
+            self._target_listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _notify_target(self, channel: str, target_id: str, held: bool) -> None:
+        for listener in list(self._target_listeners):
+            try:
+                listener(channel, target_id, held)
+            except Exception:
+                logger.exception("WS target listener failed")
+
+    def targets(self) -> list[tuple[str, str]]:
+        """(channel, target_id) pairs with at least one local connection."""
+        return [
+            (channel, target_id)
+            for channel, targets in self._connections.items()
+            for target_id, conns in targets.items()
+            if conns
+        ]
 
     async def connect(self, ws: WebSocket, channel: str, target_id: str, user_id: str) -> Connection:
         if ws.application_state != WebSocketState.CONNECTED:
             await ws.accept()
         conn = Connection(websocket=ws, channel=channel, target_id=target_id, user_id=user_id)
-        self._connections.setdefault(channel, {}).setdefault(target_id, []).append(conn)
+        bucket = self._connections.setdefault(channel, {}).setdefault(target_id, [])
+        bucket.append(conn)
+        if len(bucket) == 1:
+            self._notify_target(channel, target_id, True)
+        self._start_writer(conn)
         logger.info("WS connected: channel=%s target=%s user=%s", channel, target_id, user_id)
         return conn
 
@@ -50,32 +118,114 @@ def disconnect(self, conn: Connection) -> None:
         except ValueError:
             pass
         # cleanup empty buckets
-        if not bucket:
-            self._connections.get(conn.channel, {}).pop(conn.target_id, None)
+        if not bucket and self._connections.get(conn.channel, {}).pop(conn.target_id, None) is not None:
+            self._notify_target(conn.channel, conn.target_id, False)
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        conn.writer = None
+        conn.queue.clear()
+        conn.pending.clear()
+        conn.idle.set()
         logger.info("WS disconnected: channel=%s target=%s user=%s", conn.channel, conn.target_id, conn.user_id)
 
-    async def send_to(self, channel: str, target_id: str, data: dict[str, Any]) -> int:
-        """Send message to all connections on channel/target_id. Returns count sent."""
+    # ─── Outbound queues ─────────────────────────────────
+
+    def _start_writer(self, conn: Connection) -> None:
+        if conn.writer is None or conn.writer.done():
+            conn.writer = asyncio.create_task(self._writer(conn))
+
+    def _enqueue(self, conn: Connection, text: str, coalesce_key: str | None = None) -> None:
+        if coalesce_key is not None:
+            entry = conn.pending.get(coalesce_key)
+            if entry is not None:
+                # Latest state wins: replace the unsent message in place
+                entry[1], entry[2] = text, time.monotonic()
+                conn.coalesced += 1
+                self._coalesced += 1
+                return
+        if len(conn.queue) >= self.queue_max:
+            old_key, _, _ = conn.queue.popleft()
+            if old_key is not None:
+                conn.pending.pop(old_key, None)
+            conn.dropped += 1
+            self._dropped += 1
+        entry = [coalesce_key, text, time.monotonic()]
+        conn.queue.append(entry)
+        if coalesce_key is not None:
+            conn.pending[coalesce_key] = entry
+        conn.idle.clear()
+        conn.wakeup.set()
+        self._start_writer(conn)
+
+    async def _writer(self, conn: Connection) -> None:
+        ws = conn.websocket
+        while True:
+            if not conn.queue:
+                conn.idle.set()
+                conn.wakeup.clear()
+                await conn.wakeup.wait()
+                continue
+            entry = conn.queue.popleft()
+            key, text, enqueued_at = entry
+            if key is not None and conn.pending.get(key) is entry:
+                del conn.pending[key]
+            try:
+                await asyncio.wait_for(ws.send_text(text), timeout=self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.info("WS send failed, dropping connection: channel=%s target=%s (%s)",
+                            conn.channel, conn.target_id, type(exc).__name__)
+                self.disconnect(conn)
+                try:
+                    if ws.client_state == WebSocketState.CONNECTED:
+                        await ws.close(code=1011, reason="Send failed")
+                except Exception:
+                    pass
+                return
+            self._sent += 1
+            self._latencies.append(time.monotonic() - enqueued_at)
+
+    async def drain(self, timeout: float | None = None) -> bool:
+        """Wait until every outbound queue is flushed; False if ``timeout`` expired first."""
+        waits = [
+            conn.idle.wait()
+            for targets in self._connections.values()
+            for conns in targets.values()
+            for conn in conns
+            if conn.queue or not conn.idle.is_set()
+        ]
+        if not waits:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.gather(*waits), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    # ─── Sending ─────────────────────────────────────────
+
+    async def send_to(
+        self, channel: str, target_id: str, data: dict[str, Any], coalesce_key: str | None = None
+    ) -> int:
+        """Queue a message for all connections on channel/target_id. Returns count queued."""
         conns = self._connections.get(channel, {}).get(target_id, [])
-        sent = 0
-        dead: list[Connection] = []
+        if not conns:
+            return 0
+        text = json.dumps(data)
         for conn in conns:
-            try:
-                await conn.websocket.send_json(data)
-                sent += 1
-            except Exception:
-                dead.append(conn)
-        for c in dead:
-            self.disconnect(c)
-        return sent
-
-    async def broadcast(self, channel: str, data: dict[str, Any]) -> int:
-        """Broadcast to ALL connections in a channel."""
-        targets = self._connections.get(channel, {})
-        sent = 0
-        for target_id in list(targets.keys()):
-            sent += await self.send_to(channel, target_id, data)
-        return sent
+            self._enqueue(conn, text, coalesce_key)
+        return len(conns)
+
+    async def broadcast(self, channel: str, data: dict[str, Any], coalesce_key: str | None = None) -> int:
+        """Broadcast to ALL connections in a channel, encoding the message once."""
+        text = json.dumps(data)
+        queued = 0
+        for conns in list(self._connections.get(channel, {}).values()):
+            for conn in conns:
+                self._enqueue(conn, text, coalesce_key)
+                queued += 1
+        return queued
 
     def start_heartbeat(self) -> None:
         if self._heartbeat_task is None or self._heartbeat_task.done():
@@ -87,8 +237,8 @@ def stop_heartbeat(self) -> None:
 
     async def _heartbeat_once(self) -> None:
         now = time.time()
-        dead: list[Connection] = []
         stale: list[Connection] = []
+        ping = json.dumps({"type": "ping", "ts": now})
 
         # Iterate over a snapshot to avoid mutating while iterating.
         for channel_targets in list(self._connections.values()):
@@ -97,21 +247,15 @@ async def _heartbeat_once(self) -> None:
                     if (now - conn.last_pong) > HEARTBEAT_PONG_TIMEOUT:
                         stale.append(conn)
                         continue
-                    try:
-                        await conn.websocket.send_json({"type": "ping", "ts": now})
-                    except Exception:
-                        dead.append(conn)
+                    self._enqueue(conn, ping, coalesce_key="ping")
 
         for conn in stale:
+            self.disconnect(conn)
             try:
                 if conn.websocket.client_state == WebSocketState.CONNECTED:
                     await conn.websocket.close(code=4008, reason="Pong timeout")
             except Exception:
                 pass
-            self.disconnect(conn)
-
-        for conn in dead:
-            self.disconnect(conn)
 
     async def _heartbeat_loop(self) -> None:
         while True:
@@ -126,6 +270,32 @@ def connection_count(self) -> int:
             for conns in targets.values()
         )
 
+    def stats(self) -> dict:
+        """Queue depth and send latency figures for monitoring."""
+        depths = [
+            len(conn.queue)
+            for targets in self._connections.values()
+            for conns in targets.values()
+            for conn in conns
+        ]
+        latencies = sorted(self._latencies)
+
+        def pct(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+        return {
+            "connections": len(depths),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "sent": self._sent,
+            "dropped": self._dropped,
+            "coalesced": self._coalesced,
+            "send_latency_ms_p50": pct(0.50),
+            "send_latency_ms_p99": pct(0.99),
+        }
+
 
 # Singleton
 manager = ConnectionManager()
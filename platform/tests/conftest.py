@@ -2,6 +2,10 @@
 import os
 os.environ["TESTING"] = "1"
 os.environ.setdefault("JWT_SECRET_KEY", "test-jwt-secret-key")
+# Write heartbeats through so API reads see them immediately
+os.environ.setdefault("HEARTBEAT_FLUSH_MS", "0")
+# Minimum bcrypt cost keeps the many register/login calls fast
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
 
 import pytest
 import uuid
@@ -14,13 +18,45 @@
 
 @pytest.fixture(autouse=True)
 def _fresh_db(tmp_path, monkeypatch):
-    """Give each test a fresh SQLite database."""
+    """Give each test a fresh SQLite database, upload tree and log directory."""
     import api.database as db_mod
+    import api.logging_config as logging_config
+    from api.identity_cache import identity_cache
+    from api.routers import admin, agents, files
+    from api.services.blob_store import BlobStore
+    from api.services.counters import counter_snapshot
+    from api.services.response_cache import response_cache
     monkeypatch.setattr(db_mod, "DB_PATH", tmp_path / "test.db")
+    uploads = tmp_path / "uploads"
+    (uploads / ".partial").mkdir(parents=True)
+    monkeypatch.setattr(files, "UPLOAD_DIR", uploads)
+    monkeypatch.setattr(files, "PARTIAL_DIR", uploads / ".partial")
+    monkeypatch.setattr(files, "blob_store", BlobStore(uploads / "blobs"))
+    monkeypatch.setattr(agents, "AVATAR_UPLOAD_DIR", uploads / "avatars")
+    monkeypatch.setattr(logging_config, "LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(admin, "LOG_DIR", tmp_path / "logs")
     db_mod.init_db()
+    identity_cache.clear()
+    counter_snapshot.clear()
+    response_cache.clear()
     yield
 
 
+@pytest.fixture(params=["numpy", "python"])
+def vector_backend(request, monkeypatch):
+    """Run a test once on the NumPy code paths and once on the pure-Python fallbacks."""
+    import api.pricing as pricing
+    from api.services import matching, mesh_analysis
+    modules = (matching, mesh_analysis, pricing)
+    if request.param == "numpy":
+        assert all(module.np is not None for module in modules), "numpy is a declared dependency"
+    else:
+        for module in modules:
+            monkeypatch.setattr(module, "np", None)
+    monkeypatch.setattr(matching, "_snapshot", None)  # snapshots hold backend-specific columns
+    return request.param
+
+
 def _agent_auth(client, name: str = "test-agent", description: str = "Test agent"):
     """Register a user and return auth headers. Legacy helper for e2e tests."""
     uid = uuid.uuid4().hex[:8]
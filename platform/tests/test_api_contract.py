@@ -257,8 +257,8 @@ def test_json_content_type(self, client):
 
     def test_all_endpoints_return_json(self, client, auth_headers, admin_headers):
         """All major GET endpoints return JSON content type."""
-        from api.rate_limit import _bucket
-        _bucket._hits.clear()
+        from api.rate_limit import limiter
+        limiter.reset()
         endpoints = [
             ("/", None),
             ("/health", None),
@@ -159,3 +159,52 @@ def test_filter_by_date(self, client):
         resp = client.get(f"{API}/audit/logs?date={today}", headers=headers)
         assert resp.status_code == 200
         assert resp.json()["total"] >= 0
+
+
+class TestAuditSink:
+    """Test the batched audit writer directly."""
+
+    @staticmethod
+    def _count():
+        from api.database import get_db
+        with get_db() as db:
+            return db.execute("SELECT COUNT(*) AS c FROM audit_log").fetchone()["c"]
+
+    def test_batches_and_drains_on_stop(self):
+        import asyncio
+        from api.audit import AuditSink, init_audit_table
+
+        init_audit_table()
+        sink = AuditSink(flush_ms=60_000, batch_size=3)
+
+        async def run():
+            await sink.start()
+            for i in range(4):
+                sink.submit(f"TEST {i}", method="POST", path="/x")
+                await asyncio.sleep(0.1)  # a full batch is written without waiting for the interval
+            written_early = sink.stats()["written"]
+            await sink.stop()
+            return written_early
+
+        written_early = asyncio.run(run())
+        assert written_early == 3
+        assert self._count() == 4
+        stats = sink.stats()
+        assert stats["pending"] == 0 and stats["written"] == 4 and stats["batches"] == 2
+
+    def test_overflow_policies(self):
+        import asyncio
+        from api.audit import AuditSink, init_audit_table
+
+        init_audit_table()
+
+        async def fill(policy):
+            sink = AuditSink(flush_ms=60_000, batch_size=100, max_queue=2, overflow=policy)
+            await sink.start()
+            results = [sink.submit(f"E{i}") for i in range(4)]
+            kept = [row[4] for row in sink._queue]
+            await sink.stop()
+            return results, kept, sink.stats()["dropped"]
+
+        assert asyncio.run(fill("drop_newest")) == ([True, True, False, False], ["E0", "E1"], 2)
+        assert asyncio.run(fill("drop_oldest")) == ([True, True, True, True], ["E2", "E3"], 2)
@@ -216,3 +216,143 @@ class TestLogout:
     def test_logout(self):
         r = client.post("/api/v1/auth/logout")
         assert r.status_code == 200
+
+
+# ─── Identity cache ──────────────────────────────────────
+
+class TestIdentityCache:
+    def test_repeat_requests_are_served_from_cache(self):
+        from api.identity_cache import identity_cache
+
+        _register()
+        headers = _auth_header(_login().json()["access_token"])
+        before = identity_cache.stats()
+        for _ in range(3):
+            assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+        after = identity_cache.stats()
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 2
+
+    def test_profile_change_invalidates(self):
+        _register()
+        headers = _auth_header(_login().json()["access_token"])
+        assert client.get("/api/v1/auth/me", headers=headers).json()["username"] == "testuser"
+        assert client.put("/api/v1/auth/me", json={"username": "renamed"}, headers=headers).status_code == 200
+        assert client.get("/api/v1/auth/me", headers=headers).json()["username"] == "renamed"
+
+    def test_deleted_account_is_rejected(self):
+        _register()
+        headers = _auth_header(_login().json()["access_token"])
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+        assert client.delete("/api/v1/auth/me", headers=headers).status_code == 200
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 401
+
+    def test_bad_api_key_is_negatively_cached(self):
+        from api.identity_cache import identity_cache
+
+        headers = {"x-agent-api-key": "rwc_sk_live_nope"}
+        before = identity_cache.stats()
+        for _ in range(3):
+            assert client.get("/api/v1/files/my", headers=headers).status_code == 401
+        after = identity_cache.stats()
+        assert after["misses"] - before["misses"] == 1
+        assert after["negative_hits"] - before["negative_hits"] == 2
+
+    def test_store_racing_an_invalidation_is_dropped(self):
+        from api.identity_cache import IdentityCache
+
+        cache = IdentityCache(ttl=60, negative_ttl=5, max_size=2)
+        identity = {"identity_type": "user", "identity_id": "u1", "role": "user"}
+        generation = cache.generation
+        cache.invalidate("user", "u1")
+        cache.put("bearer", "tok", identity, generation)
+        assert cache.get("bearer", "tok") == (False, None)
+
+        cache.put("bearer", "tok", identity, cache.generation)
+        assert cache.get("bearer", "tok") == (True, identity)
+        assert cache.invalidate("user", "u1") == 1
+        assert cache.get("bearer", "tok") == (False, None)
+
+    def test_ttl_is_capped_and_size_bounded(self):
+        from api.identity_cache import IdentityCache
+
+        cache = IdentityCache(ttl=60, negative_ttl=5, max_size=2)
+        cache.put("bearer", "expired", {"identity_type": "user", "identity_id": "u1"}, cache.generation, max_age=-1)
+        assert cache.get("bearer", "expired") == (False, None)
+        for key in ("a", "b", "c"):
+            cache.put("agent", key, None, cache.generation)
+        assert cache.get("agent", "a") == (False, None)
+        assert cache.get("agent", "c") == (True, None)
+        assert cache.stats()["evictions"] == 1
+
+
+# ─── Password hashing pool ───────────────────────────────
+
+class TestPasswordPool:
+    def test_login_upgrades_hash_cost(self, monkeypatch):
+        from passlib.context import CryptContext
+
+        import api.security as sec_mod
+        from api.database import get_db
+
+        _register()
+        stronger = CryptContext(
+            schemes=["bcrypt"], deprecated="auto",
+            bcrypt__default_rounds=5, bcrypt__min_rounds=5, bcrypt__max_rounds=5,
+        )
+        monkeypatch.setattr(sec_mod, "pwd_context", stronger)
+
+        assert _login().status_code == 200
+        with get_db() as db:
+            stored = db.execute("SELECT hashed_password FROM users WHERE email = 'test@example.com'").fetchone()[0]
+        assert stored.startswith("$2b$05$")
+        assert _login().status_code == 200
+
+    def test_full_queue_sheds_with_503(self, monkeypatch):
+        import threading
+
+        import api.routers.auth as auth_mod
+        from api.services.passwords import PasswordPool
+
+        _register()
+        pool = PasswordPool(workers=1, queue_max=1)
+        monkeypatch.setattr(auth_mod, "password_pool", pool)
+        release = threading.Event()
+        blocker = pool._submit("hash", release.wait)
+        try:
+            r = _login()
+            assert r.status_code == 503
+            assert r.headers["retry-after"] == "1"
+            assert pool.stats()["rejected"] == 1
+        finally:
+            release.set()
+            blocker.result()
+        assert _login().status_code == 200
+
+        stats = pool.stats()
+        assert stats["verified"] == 1 and stats["pending"] == 0
+        assert stats["latency"]["verify"]["p95_ms"] is not None
+        pool.shutdown()
+
+    def test_db_and_rate_checks_run_off_the_event_loop(self, monkeypatch):
+        import asyncio
+
+        import api.routers.auth as auth_mod
+
+        on_loop = []
+
+        def watch(fn):
+            def wrapper(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(fn.__name__)
+                except RuntimeError:
+                    pass
+                return fn(*args, **kwargs)
+            return wrapper
+
+        monkeypatch.setattr(auth_mod, "get_db", watch(auth_mod.get_db))
+        monkeypatch.setattr(auth_mod, "_rate_check", watch(auth_mod._rate_check))
+        assert _register().status_code == 201
+        assert _login().status_code == 200
+        assert on_loop == []
@@ -3,12 +3,13 @@
 from __future__ import annotations
 
 import io
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 import pytest
 from fastapi.testclient import TestClient
 
 from api.database import get_db, init_db
+from api.events import identity_changed
 from api.main import app
 
 client = TestClient(app)
@@ -128,6 +129,8 @@ def test_pin_and_lock_post_admin_only(self, authenticated_user):
 
         with get_db() as db:
             db.execute("UPDATE users SET role = 'admin' WHERE email = ?", ("test@example.com",))
+            user_id = db.execute("SELECT id FROM users WHERE email = ?", ("test@example.com",)).fetchone()["id"]
+        identity_changed("user", user_id)
 
         r_pin = client.post(f"/api/v1/community/posts/{p['id']}/pin", headers=authenticated_user)
         r_lock = client.post(f"/api/v1/community/posts/{p['id']}/lock", headers=authenticated_user)
@@ -186,6 +189,318 @@ def test_set_best_answer_by_post_endpoint_persists_fields(self, authenticated_us
         assert detail["resolved_at"] is not None
 
 
+def _insert_post(db, post_id, author_id, created_at, upvotes=0, comment_count=0, feed_score=0.0):
+    db.execute(
+        """
+        INSERT INTO community_posts (
+            id, title, content, post_type, author_id, author_type, comment_count, likes_count,
+            upvotes, downvotes, feed_score, created_at, updated_at
+        ) VALUES (?, ?, 'body', 'discussion', ?, 'user', ?, 0, ?, 0, ?, ?, ?)
+        """,
+        (post_id, f"title {post_id}", author_id, comment_count, upvotes, feed_score, created_at, created_at),
+    )
+
+
+def _collect_pages(path, headers=None):
+    ids, cursor = [], None
+    while True:
+        r = client.get(path + (f"&cursor={cursor}" if cursor else ""), headers=headers or {})
+        assert r.status_code == 200
+        data = r.json()
+        ids.extend(p["id"] for p in data["posts"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            assert not data["has_next"]
+            return ids
+
+
+class TestPostRanking:
+    def test_hot_sort_reads_stored_score_updated_on_vote(self, authenticated_user):
+        ids = [_create_post(authenticated_user, title=f"hot {i}").json()["id"] for i in range(3)]
+        r = client.post(f"/api/v1/community/posts/{ids[0]}/vote", headers=authenticated_user, json={"vote_type": "up"})
+        assert r.status_code == 200
+        with get_db() as db:
+            score = db.execute("SELECT hot_score FROM community_posts WHERE id = ?", (ids[0],)).fetchone()[0]
+        assert score == pytest.approx(0.5, rel=0.01)  # 1 vote / (~0h + 2)
+
+        paged = _collect_pages("/api/v1/community/posts?sort=hot&limit=1")
+        assert paged[0] == ids[0]
+        assert sorted(paged) == sorted(ids)
+
+    def test_decay_scores_reages_old_posts(self):
+        from api.services.post_ranking import decay_scores
+
+        now = datetime.now(timezone.utc)
+        old = (now - timedelta(hours=48)).isoformat()
+        with get_db() as db:
+            _insert_post(db, "unscored", "a", old, upvotes=5, comment_count=1)
+            _insert_post(db, "stale-boost", "a", old, feed_score=1.5)
+            _insert_post(db, "fresh", "a", now.isoformat(), feed_score=1.5)
+            assert decay_scores(db, now) == 1
+            rows = {r["id"]: r for r in db.execute("SELECT id, hot_score, feed_score FROM community_posts")}
+        assert rows["unscored"]["hot_score"] == pytest.approx(5 / 50)
+        assert rows["unscored"]["feed_score"] == pytest.approx(1.2)
+        assert rows["stale-boost"]["feed_score"] == pytest.approx(1.0)
+        assert rows["fresh"]["feed_score"] == pytest.approx(1.5)
+
+    def test_decay_pass_is_bounded_by_the_horizon(self):
+        from api.services.post_ranking import HOT_SCORE_HORIZON_DAYS, decay_scores
+
+        now = datetime.now(timezone.utc)
+        crossed = (now - timedelta(days=HOT_SCORE_HORIZON_DAYS, hours=1)).isoformat()
+        ancient = (now - timedelta(days=HOT_SCORE_HORIZON_DAYS * 3)).isoformat()
+        with get_db() as db:
+            _insert_post(db, "crossed", "a", crossed, upvotes=50)
+            _insert_post(db, "ancient", "a", ancient, upvotes=50)
+            db.execute("UPDATE community_posts SET hot_score = 1.0")
+            assert decay_scores(db, now) == 1
+            assert decay_scores(db, now) == 0  # unchanged scores are not rewritten
+            scores = dict(db.execute("SELECT id, hot_score FROM community_posts").fetchall())
+            assert scores == {"crossed": 0.0, "ancient": 1.0}
+            decay_scores(db, now, expire_all=True)
+            assert db.execute("SELECT MAX(hot_score) FROM community_posts").fetchone()[0] == 0.0
+
+    def test_feed_ranks_followed_authors_first_across_cursor_pages(self, authenticated_user):
+        from api.services.post_ranking import decay_scores
+        from api.services.timeline import rebuild_timelines
+
+        me = client.get("/api/v1/auth/me", headers=authenticated_user).json()["id"]
+        now = datetime.now(timezone.utc)
+        recent, old = (now - timedelta(hours=1)).isoformat(), (now - timedelta(hours=48)).isoformat()
+        with get_db() as db:
+            db.execute(
+                "INSERT INTO follows (id, follower_id, following_id, created_at) VALUES ('f1', ?, 'friend', ?)",
+                (me, recent),
+            )
+            _insert_post(db, "friend-old", "friend", old)
+            _insert_post(db, "friend-new", "friend", recent)
+            _insert_post(db, "other-hot", "stranger", recent, comment_count=3)
+            _insert_post(db, "other-new", "stranger", recent)
+            _insert_post(db, "other-old", "stranger", old, comment_count=1)
+            decay_scores(db, now)
+            rebuild_timelines(db)
+
+        expected = ["friend-new", "friend-old", "other-hot", "other-new", "other-old"]
+        assert _collect_pages("/api/v1/community/feed?limit=2", authenticated_user) == expected
+        page2 = client.get("/api/v1/community/feed?page=2&limit=2", headers=authenticated_user).json()
+        assert [p["id"] for p in page2["posts"]] == expected[2:4]
+        assert client.get("/api/v1/community/feed?cursor=bogus", headers=authenticated_user).status_code == 400
+
+
+def _register(email, username):
+    client.post("/api/v1/auth/register", json={"email": email, "username": username, "password": "securepass123"})
+    r = client.post("/api/v1/auth/login", json={"email": email, "password": "securepass123"})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    return headers, client.get("/api/v1/auth/me", headers=headers).json()["id"]
+
+
+class TestFollowTimelines:
+    def _timeline(self, user_id):
+        with get_db() as db:
+            return [r["post_id"] for r in db.execute(
+                "SELECT post_id FROM timeline_entries WHERE user_id = ? ORDER BY created_at DESC", (user_id,)
+            )]
+
+    def test_posts_fan_out_to_followers_and_follow_backfills(self, authenticated_user):
+        author, author_id = _register("author@example.com", "author")
+        reader_id = client.get("/api/v1/auth/me", headers=authenticated_user).json()["id"]
+        early = _create_post(author, title="before follow").json()["id"]
+
+        assert client.post(f"/api/v1/social/follow/{author_id}", headers=authenticated_user).status_code == 200
+        assert self._timeline(reader_id) == [early]
+        late = _create_post(author, title="after follow").json()["id"]
+        assert self._timeline(reader_id) == [late, early]
+
+        following = client.get("/api/v1/community/posts?sort=following", headers=authenticated_user).json()
+        assert [p["id"] for p in following["posts"]] == [late, early]
+
+        client.delete(f"/api/v1/social/follow/{author_id}", headers=authenticated_user)
+        assert self._timeline(reader_id) == []
+
+    def test_high_follower_authors_are_read_on_demand(self, authenticated_user, monkeypatch):
+        from api.services import timeline
+
+        monkeypatch.setattr(timeline, "FANOUT_MAX_FOLLOWERS", 0)
+        author, author_id = _register("star@example.com", "star")
+        reader_id = client.get("/api/v1/auth/me", headers=authenticated_user).json()["id"]
+        client.post(f"/api/v1/social/follow/{author_id}", headers=authenticated_user)
+        post_id = _create_post(author, title="from a star").json()["id"]
+        _create_post(authenticated_user, title="my own")
+
+        assert self._timeline(reader_id) == []
+        feed = client.get("/api/v1/community/feed?limit=10", headers=authenticated_user).json()
+        assert feed["posts"][0]["id"] == post_id
+
+    def test_trim_keeps_newest_entries(self, monkeypatch):
+        from api.services import timeline
+
+        monkeypatch.setattr(timeline, "TIMELINE_MAX_LENGTH", 2)
+        with get_db() as db:
+            for i in range(4):
+                db.execute(
+                    "INSERT INTO timeline_entries (user_id, post_id, author_id, created_at) VALUES ('u', ?, 'a', ?)",
+                    (f"p{i}", f"2026-01-0{i + 1}T00:00:00+00:00"),
+                )
+            assert timeline.trim_timelines(db) == 2
+        assert self._timeline("u") == ["p3", "p2"]
+
+
+class TestBatchHydration:
+    def test_post_listing_uses_constant_queries(self, authenticated_user):
+        from api.routers.community import _rows_to_post_responses
+
+        for i in range(12):
+            _create_post(authenticated_user, title=f"post {i}", tags=["PLA", "3D Printing"])
+
+        with get_db() as db:
+            rows = db.execute("SELECT * FROM community_posts").fetchall()
+            statements: list[str] = []
+            db.set_trace_callback(statements.append)
+            try:
+                posts = _rows_to_post_responses(rows, db)
+            finally:
+                db.set_trace_callback(None)
+
+        assert len(posts) == 12
+        assert len(statements) == 3  # agents + users + post_tags
+        assert all(p.author_name == "testuser" for p in posts)
+        assert all(p.author_type == "human" for p in posts)
+        assert all(p.tags == ["3D Printing", "PLA"] for p in posts)
+
+    def test_listing_marks_agent_authors(self, authenticated_user):
+        now = datetime.now(timezone.utc).isoformat()
+        with get_db() as db:
+            db.execute(
+                """
+                INSERT INTO agents (id, name, description, type, status, api_key, created_at, updated_at)
+                VALUES ('agent-hydrate', 'hydrate_bot', 'd', 'openclaw', 'active', 'hydrate-key', ?, ?)
+                """,
+                (now, now),
+            )
+        client.post(
+            "/api/v1/community/posts",
+            headers={"x-agent-api-key": "hydrate-key"},
+            json={"title": "from agent", "content": "x", "post_type": "discussion"},
+        )
+        _create_post(authenticated_user, title="from human")
+
+        posts = {p["title"]: p for p in client.get("/api/v1/community/posts").json()["posts"]}
+        assert posts["from agent"]["author_type"] == "agent"
+        assert posts["from human"]["author_type"] == "human"
+        assert posts["from human"]["author_name"] == "testuser"
+
+    def test_space_detail_lists_posts_with_author_names(self, authenticated_user):
+        r = client.post(
+            "/api/v1/spaces",
+            headers=authenticated_user,
+            json={"name": "hydrate", "display_name": "Hydrate"},
+        )
+        space_id = r.json()["id"]
+        post_id = _create_post(authenticated_user, title="in space").json()["id"]
+        with get_db() as db:
+            db.execute("UPDATE community_posts SET space_id = ? WHERE id = ?", (space_id, post_id))
+
+        r = client.get("/api/v1/spaces/hydrate")
+        assert r.status_code == 200
+        posts = r.json()["posts"]
+        assert posts[0]["title"] == "in space"
+        assert posts[0]["author_name"] == "testuser"
+
+
+def _insert_comment(db, post_id, comment_id, created_at, parent_id=None, author_id="someone"):
+    db.execute(
+        """
+        INSERT INTO community_comments (id, post_id, content, author_id, author_type, parent_id, created_at, updated_at)
+        VALUES (?, ?, ?, ?, 'user', ?, ?, ?)
+        """,
+        (comment_id, post_id, f"body {comment_id}", author_id, parent_id, created_at, created_at),
+    )
+
+
+class TestCommentTree:
+    def test_reply_older_than_parent_is_kept(self, authenticated_user):
+        post_id = _create_post(authenticated_user).json()["id"]
+        with get_db() as db:
+            _insert_comment(db, post_id, "root", "2026-01-02T00:00:00")
+            _insert_comment(db, post_id, "early-reply", "2026-01-01T00:00:00", parent_id="root")
+
+        comments = client.get(f"/api/v1/community/posts/{post_id}/comments").json()
+        assert [c["id"] for c in comments] == ["root"]
+        assert [r["id"] for r in comments[0]["replies"]] == ["early-reply"]
+        assert comments[0]["reply_count"] == 1
+
+    def test_top_level_cursor_pagination(self, authenticated_user):
+        post_id = _create_post(authenticated_user).json()["id"]
+        with get_db() as db:
+            for i in range(5):
+                _insert_comment(db, post_id, f"c{i}", f"2026-01-0{i + 1}T00:00:00")
+            _insert_comment(db, post_id, "c0-reply", "2026-01-09T00:00:00", parent_id="c0")
+
+        r = client.get(f"/api/v1/community/posts/{post_id}/comments?limit=2")
+        assert [c["id"] for c in r.json()] == ["c0", "c1"]
+        assert r.json()[0]["replies"][0]["id"] == "c0-reply"
+        seen = [c["id"] for c in r.json()]
+        while "x-next-cursor" in r.headers:
+            r = client.get(
+                f"/api/v1/community/posts/{post_id}/comments?limit=2&cursor={r.headers['x-next-cursor']}"
+            )
+            seen.extend(c["id"] for c in r.json())
+        assert seen == ["c0", "c1", "c2", "c3", "c4"]
+
+    def test_bad_cursor_is_rejected(self, authenticated_user):
+        post_id = _create_post(authenticated_user).json()["id"]
+        r = client.get(f"/api/v1/community/posts/{post_id}/comments?cursor=%%%")
+        assert r.status_code == 400
+
+    def test_depth_collapses_and_replies_endpoint_expands(self, authenticated_user):
+        post_id = _create_post(authenticated_user).json()["id"]
+        with get_db() as db:
+            _insert_comment(db, post_id, "root", "2026-01-01T00:00:00")
+            _insert_comment(db, post_id, "child", "2026-01-02T00:00:00", parent_id="root")
+            _insert_comment(db, post_id, "grandchild-a", "2026-01-03T00:00:00", parent_id="child")
+            _insert_comment(db, post_id, "grandchild-b", "2026-01-04T00:00:00", parent_id="child")
+
+        comments = client.get(f"/api/v1/community/posts/{post_id}/comments?depth=1").json()
+        child = comments[0]["replies"][0]
+        assert child["id"] == "child"
+        assert child["replies"] == []
+        assert child["reply_count"] == 2
+
+        r = client.get("/api/v1/community/comments/child/replies?limit=1")
+        assert r.status_code == 200
+        assert [c["id"] for c in r.json()] == ["grandchild-a"]
+        r = client.get(f"/api/v1/community/comments/child/replies?limit=1&cursor={r.headers['x-next-cursor']}")
+        assert [c["id"] for c in r.json()] == ["grandchild-b"]
+        assert "x-next-cursor" not in r.headers
+
+        assert client.get("/api/v1/community/comments/missing/replies").status_code == 404
+
+    def test_large_thread_uses_constant_queries(self, authenticated_user):
+        from api.routers.community import _load_comment_page
+
+        post_id = _create_post(authenticated_user).json()["id"]
+        with get_db() as db:
+            for i in range(30):
+                _insert_comment(db, post_id, f"r{i:02d}", f"2026-01-01T00:00:{i:02d}", author_id=f"user-{i}")
+                for j in range(3):
+                    _insert_comment(
+                        db, post_id, f"r{i:02d}-{j}", f"2026-01-02T00:00:{i:02d}",
+                        parent_id=f"r{i:02d}", author_id=f"user-{j}",
+                    )
+
+            statements: list[str] = []
+            db.set_trace_callback(statements.append)
+            try:
+                tree, _ = _load_comment_page(db, post_id, None, limit=100)
+            finally:
+                db.set_trace_callback(None)
+
+        assert len(tree) == 30
+        assert all(len(c.replies) == 3 for c in tree)
+        # page + subtree CTE + frontier counts + agents + users
+        assert len([s for s in statements if s.lstrip().upper().startswith(("SELECT", "WITH"))]) <= 5
+
+
 class TestCommunitySearch:
     def test_search_posts_agents_nodes_and_relevance(self, authenticated_user):
         now = datetime.now(timezone.utc).isoformat()
@@ -263,6 +578,56 @@ def test_search_pagination(self, authenticated_user):
         assert len(data["posts"]) == 1
         assert data["total"] == 2
 
+    def test_search_uses_fulltext_index_with_snippets(self, authenticated_user):
+        post = _create_post(
+            authenticated_user,
+            title="Nozzle guide",
+            content="Swapping a hardened nozzle for PLA & abrasive filament",
+        ).json()
+        _create_post(authenticated_user, title="Other", content="bed leveling")
+
+        r = client.get("/api/v1/community/search?q=harden%20noz")
+        assert r.status_code == 200
+        data = r.json()
+        assert [p["id"] for p in data["posts"]] == [post["id"]]
+        snippet = data["posts"][0]["snippet"]
+        assert "<mark>hardened</mark>" in snippet
+        assert "PLA &amp; abrasive" in snippet  # stored text is escaped once, not twice
+
+    def test_search_index_follows_updates_and_deletes(self, authenticated_user):
+        post = _create_post(authenticated_user, title="Gearbox housing", content="x").json()
+        with get_db() as db:
+            db.execute("UPDATE community_posts SET title = ? WHERE id = ?", ("Pulley mount", post["id"]))
+
+        assert client.get("/api/v1/community/search?q=gearbox").json()["posts"] == []
+        assert len(client.get("/api/v1/community/search?q=pulley").json()["posts"]) == 1
+
+        with get_db() as db:
+            db.execute("DELETE FROM community_posts WHERE id = ?", (post["id"],))
+        assert client.get("/api/v1/community/search?q=pulley").json()["total"] == 0
+
+    def test_search_index_survives_renumbered_rowids(self, authenticated_user):
+        from api.services.search_index import init_search_index
+
+        post = _create_post(authenticated_user, title="Gearbox housing", content="x").json()
+        _create_post(authenticated_user, title="Other", content="y")
+        with get_db() as db:
+            # What a VACUUM that renumbers rowids leaves behind
+            db.execute("UPDATE community_posts_fts SET rowid = rowid + 100")
+        assert [p["id"] for p in client.get("/api/v1/community/search?q=gearbox").json()["posts"]] == [post["id"]]
+
+        with get_db() as db:
+            init_search_index(db)
+            db.execute("UPDATE community_posts SET title = ? WHERE id = ?", ("Pulley mount", post["id"]))
+        assert client.get("/api/v1/community/search?q=gearbox").json()["posts"] == []
+        assert [p["id"] for p in client.get("/api/v1/community/search?q=pulley").json()["posts"]] == [post["id"]]
+
+    def test_cjk_query_falls_back_to_substring_match(self, authenticated_user):
+        _create_post(authenticated_user, title="开源机械臂", content="桌面级三维打印件")
+
+        data = client.get("/api/v1/community/search", params={"q": "机械"}).json()
+        assert len(data["posts"]) == 1
+
 
 class TestCommunityAgentAuth:
     def test_create_post_with_x_agent_api_key_only(self):
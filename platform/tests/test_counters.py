@@ -0,0 +1,121 @@
+"""Platform counter tests - RealWorldClaw Team"""
+
+from __future__ import annotations
+
+import uuid
+
+from fastapi.testclient import TestClient
+
+from api.database import get_db
+from api.main import app
+from api.services.counters import (
+    counter_snapshot,
+    estimate_distinct,
+    init_counters,
+    read_counters,
+    rebuild_counters,
+    record_activity,
+)
+
+client = TestClient(app)
+
+_MAKER = {
+    "maker_type": "maker", "printer_model": "Ender 3 V2", "printer_brand": "Creality",
+    "build_volume_x": 220.0, "build_volume_y": 220.0, "build_volume_z": 250.0,
+    "materials": ["PLA"], "capabilities": ["fdm_printing"],
+    "location_province": "上海市", "location_city": "上海市", "location_district": "浦东新区",
+    "availability": "open", "pricing_per_hour_cny": 15.0, "description": "counter test maker",
+}
+
+
+def _user() -> dict:
+    uid = uuid.uuid4().hex[:8]
+    r = client.post("/api/v1/auth/register", json={
+        "email": f"c-{uid}@example.com", "username": f"c_{uid}", "password": "securepass123",
+    })
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _post(headers: dict) -> str:
+    r = client.post("/api/v1/community/posts", headers=headers,
+                    json={"title": "hello", "content": "world", "post_type": "discussion"})
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def _counters() -> dict:
+    with get_db() as db:
+        return read_counters(db)
+
+
+class TestPlatformCounters:
+    def test_stats_follow_writes(self):
+        alice, bob = _user(), _user()
+        post_id = _post(alice)
+        _post(alice)
+        r = client.post(f"/api/v1/community/posts/{post_id}/comments", headers=bob, json={"content": "nice"})
+        assert r.status_code == 201, r.text
+
+        stats = client.get("/api/v1/stats").json()
+        assert stats["users"] == 2 and stats["posts"] == 2 and stats["comments"] == 1
+        assert stats["posts_today"] == 2 and stats["comments_today"] == 1
+        assert stats["active_today"] == 2
+
+        # Served from the snapshot until it expires or is cleared
+        with get_db() as db:
+            db.execute("DELETE FROM community_comments")
+        assert client.get("/api/v1/stats").json()["comments"] == 1
+        counter_snapshot.clear()
+        stats = client.get("/api/v1/stats").json()
+        assert stats["comments"] == 0 and stats["comments_today"] == 0
+
+    def test_conditional_counter_tracks_updates(self):
+        headers = _user()
+        assert client.post("/api/v1/makers/register", headers=headers, json=_MAKER).status_code == 201
+        assert _counters()["makers"] == 1 and _counters()["makers_open"] == 1
+
+        with get_db() as db:
+            db.execute("UPDATE makers SET availability = 'busy'")
+        assert _counters()["makers_open"] == 0
+        with get_db() as db:
+            db.execute("UPDATE makers SET availability = 'open'")
+            db.execute("UPDATE makers SET description = 'still open'")
+        assert _counters()["makers_open"] == 1
+        with get_db() as db:
+            db.execute("DELETE FROM makers")
+        assert _counters()["makers"] == 0 and _counters()["makers_open"] == 0
+
+    def test_seed_and_rebuild_match_triggers(self):
+        headers = _user()
+        _post(headers)
+        incremental = _counters()
+
+        with get_db() as db:
+            db.execute("DELETE FROM platform_counters")
+            db.execute("DELETE FROM platform_daily")
+            db.execute("DELETE FROM platform_activity")
+            init_counters(db)
+        assert _counters() == incremental
+
+        with get_db() as db:
+            rebuild_counters(db)
+        assert _counters() == incremental
+
+
+class TestActivitySketch:
+    def test_small_counts_are_exact(self):
+        assert estimate_distinct([]) == 0
+        with get_db() as db:
+            for actor in ("a", "b", "c", "a", "b"):
+                record_activity(db, actor, "2026-01-02T10:00:00+00:00")
+            ranks = [r["rank"] for r in db.execute(
+                "SELECT rank FROM platform_activity WHERE day = '2026-01-02'").fetchall()]
+        assert estimate_distinct(ranks) == 3
+
+    def test_large_counts_are_close(self):
+        day = "2026-01-03"
+        with get_db() as db:
+            for i in range(20000):
+                record_activity(db, f"user-{i}", day)
+            estimate = read_counters(db, day)["active_today"]
+        assert abs(estimate - 20000) / 20000 < 0.1
@@ -0,0 +1,263 @@
+"""Tests for the SQLite connection pool behind get_db()."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from api.db_pool import SQLitePool
+
+
+API = "/api/v1"
+
+
+def test_connections_are_reused(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["reused"] == 1
+    assert stats["in_use"] == 1
+
+
+def test_pragmas_applied_once_per_connection(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"))
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    pool.release(conn)
+
+
+def test_overflow_connections_are_not_retained(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), size=1)
+    a = pool.acquire()
+    b = pool.acquire()  # nested checkout must not block
+    pool.release(a)
+    pool.release(b)
+    stats = pool.stats()
+    assert stats["overflow"] == 1
+    assert stats["idle"] == 1
+    assert stats["discarded"] == 1
+
+
+def test_open_transaction_is_rolled_back_on_release(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), size=1)
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    assert conn.in_transaction
+    pool.release(conn)
+
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.release(conn)
+
+
+def test_pool_is_shared_across_threads(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), size=4)
+    errors: list[Exception] = []
+
+    def _worker():
+        try:
+            for _ in range(20):
+                conn = pool.acquire()
+                conn.execute("SELECT 1").fetchone()
+                pool.release(conn)
+        except Exception as exc:  # pragma: no cover - surfaced by assert
+            errors.append(exc)
+
+    threads = [threading.Thread(target=_worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    stats = pool.stats()
+    assert stats["in_use"] == 0
+    assert stats["checkouts"] == 160
+    assert stats["idle"] <= 4
+
+
+def test_get_db_follows_db_path_changes(tmp_path, monkeypatch):
+    import api.database as db_mod
+
+    monkeypatch.setattr(db_mod, "DB_PATH", tmp_path / "first.db")
+    with db_mod.get_db() as db:
+        db.execute("CREATE TABLE marker (x INTEGER)")
+    first = db_mod._get_sqlite_pool()
+
+    monkeypatch.setattr(db_mod, "DB_PATH", tmp_path / "second.db")
+    with db_mod.get_db() as db:
+        tables = db.execute("SELECT name FROM sqlite_master WHERE name = 'marker'").fetchall()
+    assert tables == []
+    assert db_mod._get_sqlite_pool() is not first
+
+
+def test_health_detailed_reports_pool_stats(client):
+    resp = client.get(f"{API}/health/detailed")
+    assert resp.status_code == 200
+    pool = resp.json()["database_pool"]
+    assert pool["backend"] == "sqlite"
+    assert pool["checkouts"] >= 1
+
+
+# ─── PostgreSQL pool (fake psycopg2 connections) ─────────
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, params=None):
+        if self._conn.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+        self._conn.statements.append((sql, params))
+
+    def close(self):
+        pass
+
+
+class _FakePgConn:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.in_tx = False
+        self.statements: list = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def commit(self):
+        self.in_tx = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_tx = False
+
+    def get_transaction_status(self):
+        return 2 if self.in_tx else 0
+
+    def close(self):
+        self.closed = 1
+
+
+def _pg_pool(**kwargs):
+    from api.db_pool import PgPool
+
+    created: list[_FakePgConn] = []
+
+    def _connect():
+        conn = _FakePgConn()
+        created.append(conn)
+        return conn
+
+    return PgPool(_connect, **kwargs), created
+
+
+def test_pg_pool_reuses_and_sets_statement_timeout_once():
+    pool, created = _pg_pool(maxconn=2, statement_timeout_ms=5000)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert len(created) == 1
+    timeouts = [s for s in conn.statements if s[0].startswith("SET statement_timeout")]
+    assert timeouts == [("SET statement_timeout = %s", (5000,))]
+    pool.release(conn)
+
+    conn = pool.acquire(statement_timeout_ms=100)
+    assert conn.statements[-1] == ("SET statement_timeout = %s", (100,))
+
+
+def test_pg_pool_waits_then_times_out_when_saturated():
+    from api.db_pool import PoolTimeoutError
+
+    pool, _ = _pg_pool(maxconn=1, timeout=0.05)
+    conn = pool.acquire()
+    try:
+        pool.acquire()
+    except PoolTimeoutError:
+        pass
+    else:  # pragma: no cover
+        raise AssertionError("expected PoolTimeoutError")
+    stats = pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["saturation"] == 1.0
+    pool.release(conn)
+
+
+def test_pg_pool_waiter_gets_released_connection():
+    pool, created = _pg_pool(maxconn=1, timeout=2)
+    conn = pool.acquire()
+    got: list = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    threading.Timer(0.05, pool.release, args=(conn,)).start()
+    waiter.join()
+
+    assert got == [conn]
+    assert len(created) == 1
+    assert pool.stats()["waits"] == 1
+
+
+def test_pg_pool_pre_ping_discards_dead_connection():
+    pool, created = _pg_pool(maxconn=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.broken = True
+
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert conn.closed
+    stats = pool.stats()
+    assert stats["ping_failures"] == 1
+    assert stats["open"] == 1
+
+
+def test_pg_pool_failed_pings_respect_the_timeout():
+    from api.db_pool import PgPool, PoolTimeoutError
+
+    def _connect_to_dead_server():
+        time.sleep(0.02)
+        conn = _FakePgConn()
+        conn.broken = True
+        return conn
+
+    pool = PgPool(_connect_to_dead_server, maxconn=2, timeout=0.1)
+    started = time.monotonic()
+    try:
+        pool.acquire()
+    except PoolTimeoutError:
+        pass
+    else:  # pragma: no cover
+        raise AssertionError("expected PoolTimeoutError")
+    assert time.monotonic() - started < 0.5
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["ping_failures"] >= 1 and stats["open"] == 0
+
+
+def test_pg_pool_rolls_back_dirty_connection_on_release():
+    pool, _ = _pg_pool(maxconn=1)
+    conn = pool.acquire()
+    conn.in_tx = True
+    pool.release(conn)
+    assert conn.rollbacks == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_pg_pool_recycles_idle_connections():
+    pool, created = _pg_pool(maxconn=2, minconn=0, max_idle=0.01)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.02)
+    assert pool.prune() == 1
+    assert conn.closed
+    assert pool.acquire() is not conn
+    assert len(created) == 2
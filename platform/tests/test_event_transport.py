@@ -0,0 +1,314 @@
+"""Tests for cross-worker WebSocket event delivery through the event transports."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import socketserver
+import threading
+import time
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from api.event_transport import EventBroker, MultiprocessTransport, RedisTransport, topic_for
+from api.events import Event, EventBridge, EventBus
+from api.ws_manager import ConnectionManager
+
+
+class _FakeWebSocket:
+    def __init__(self):
+        self.sent: list[dict] = []
+        self.client_state = WebSocketState.CONNECTED
+        self.application_state = WebSocketState.CONNECTED
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+async def _until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+_AUTHKEY = b"test-broker-key"
+
+
+@pytest.fixture
+def broker():
+    broker = EventBroker(("127.0.0.1", 0), _AUTHKEY).start()
+    yield broker
+    broker.close()
+
+
+def _mp_transport(broker: EventBroker, **kwargs) -> MultiprocessTransport:
+    return MultiprocessTransport(broker.address, authkey=_AUTHKEY, host_broker=False, **kwargs)
+
+
+def test_event_reaches_socket_on_another_worker(broker):
+    topic = topic_for("printer", "p1")
+
+    async def run():
+        ws_a, ws_b = ConnectionManager(), ConnectionManager()
+        bridge_a, bridge_b = EventBridge(ws_a), EventBridge(ws_b)
+        await bridge_a.start(_mp_transport(broker, batch_ms=1))
+        await bridge_b.start(_mp_transport(broker, batch_ms=1))
+        await bridge_a.transport.wait_ready()
+        await bridge_b.transport.wait_ready()
+
+        dashboard = _FakeWebSocket()
+        conn = await ws_b.connect(dashboard, "printer", "p1", "u1")
+        await _until(lambda: broker.subscribers(topic) == 1)
+
+        await bridge_a.send("printer", "p1", {"type": "print_progress", "data": {"pct": 40}})
+        await bridge_a.send("printer", "p2", {"type": "print_progress", "data": {"pct": 1}})
+        await _until(lambda: dashboard.sent)
+        stats_a, stats_b = bridge_a.stats(), bridge_b.stats()
+
+        ws_b.disconnect(conn)
+        await _until(lambda: broker.subscribers(topic) == 0)
+        await bridge_a.stop()
+        await bridge_b.stop()
+        return dashboard.sent, stats_a, stats_b
+
+    sent, stats_a, stats_b = asyncio.run(run())
+
+    assert sent == [{"type": "print_progress", "data": {"pct": 40}}]
+    assert stats_a["published"] == 2 and stats_a["received"] == 0  # A holds no sockets
+    assert stats_b["subscriptions"] == 1
+    assert stats_b["delivered"] == 1
+
+
+def test_broadcast_reaches_every_worker(broker):
+    topic = topic_for("identity", "*")
+
+    async def run():
+        got_a: list[dict] = []
+        got_b: list[dict] = []
+        bridge_a, bridge_b = EventBridge(ConnectionManager()), EventBridge(ConnectionManager())
+        bridge_a.on_broadcast("identity", got_a.append)
+        bridge_b.on_broadcast("identity", got_b.append)
+        await bridge_a.start(_mp_transport(broker, batch_ms=1))
+        await bridge_b.start(_mp_transport(broker, batch_ms=1))
+        await _until(lambda: broker.subscribers(topic) == 2)
+
+        # Sync routes call it from the threadpool
+        change = {"identity_type": "agent", "identity_id": "ag_1"}
+        await asyncio.to_thread(bridge_a.broadcast, "identity", change)
+        await _until(lambda: got_a and got_b)
+
+        await bridge_a.stop()
+        await bridge_b.stop()
+        return got_a, got_b
+
+    got_a, got_b = asyncio.run(run())
+    assert got_a == got_b == [{"identity_type": "agent", "identity_id": "ag_1"}]
+
+
+def test_messages_are_batched_per_topic(broker):
+    async def run():
+        sender = _mp_transport(broker, batch_ms=50)
+        receiver = _mp_transport(broker, batch_ms=50)
+        got: list[dict] = []
+
+        async def deliver(message):
+            got.append(message)
+
+        receiver.subscribe("rwc:orders:u1")
+        await sender.start(deliver)
+        await receiver.start(deliver)
+        await receiver.wait_ready()
+        await _until(lambda: broker.subscribers("rwc:orders:u1") == 1)
+
+        for i in range(10):
+            sender.publish("rwc:orders:u1", {"n": i})
+        await sender.flush()
+        await _until(lambda: len(got) == 10)
+        stats = sender.stats(), receiver.stats()
+        await sender.stop()
+        await receiver.stop()
+        return got, stats
+
+    got, (sent, received) = asyncio.run(run())
+
+    assert [m["n"] for m in got] == list(range(10))
+    assert sent["batches_sent"] == 1
+    assert received["batches_received"] == 1 and received["delivered"] == 10
+
+
+def test_broker_requires_authkey_and_json_frames(broker):
+    from multiprocessing.connection import Client
+
+    with pytest.raises(RuntimeError):
+        EventBroker(("127.0.0.1", 0))
+    with pytest.raises(RuntimeError):
+        MultiprocessTransport(("127.0.0.1", 1), authkey=b"")
+
+    # A pickled frame is rejected unread and the peer disconnected
+    conn = Client(broker.address, authkey=_AUTHKEY)
+    conn.send(("sub", ["rwc:x:1"]))
+    assert conn.poll(5)
+    with pytest.raises(EOFError):
+        conn.recv_bytes()
+    assert broker.subscribers("rwc:x:1") == 0
+    conn.close()
+
+
+def test_pack_splits_batches_at_payload_limit():
+    transport = MultiprocessTransport(("127.0.0.1", 1), authkey=_AUTHKEY)
+    transport.max_payload = 40
+    messages = [json.dumps({"n": i, "pad": "x" * 5}) for i in range(4)]
+    packed = transport._pack(messages + [json.dumps({"pad": "y" * 60})])
+
+    assert [count for _, count in packed] == [1, 1, 1, 1]
+    assert all(len(payload) <= 40 for payload, _ in packed)
+    assert transport.metrics["publish_errors"] == 1  # oversized message dropped
+
+
+def test_bridge_without_transport_sends_locally():
+    async def run():
+        ws = ConnectionManager()
+        bridge = EventBridge(ws)
+        await bridge.start(None)
+        dashboard = _FakeWebSocket()
+        await ws.connect(dashboard, "notifications", "u1", "u1")
+        bus = EventBus()
+
+        async def handler(event: Event):
+            await bridge.send("notifications", event.data["user_id"], event.to_dict())
+
+        bus.subscribe("notification", handler)
+        await bus.publish(Event("notification", {"user_id": "u1"}))
+        await ws.drain(timeout=1)
+        return dashboard.sent, bridge.stats()
+
+    sent, stats = asyncio.run(run())
+    assert sent[0]["type"] == "notification"
+    assert stats == {"transport": "local"}
+
+
+def test_only_state_events_are_coalesced(monkeypatch):
+    from api import events
+
+    sent = []
+
+    class _Recorder:
+        async def send(self, channel, target, data, coalesce_key=None):
+            sent.append((data["type"], coalesce_key))
+
+    monkeypatch.setattr(events, "event_bridge", _Recorder())
+    for event_type in ("printer_status_changed", "print_progress", "module_discovered"):
+        asyncio.run(events._ws_printer_handler(Event(event_type, {"printer_id": "p1"})))
+    assert sent == [
+        ("printer_status_changed", "printer_status_changed"),
+        ("print_progress", "print_progress"),
+        ("module_discovered", None),
+    ]
+
+
+# ─── Redis-protocol pub/sub against a local stand-in ─────
+
+
+class _FakePubSub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _FakePubSubHandler)
+        self.channels: dict[str, set] = {}
+        self.lock = threading.Lock()
+
+
+class _FakePubSubHandler(socketserver.StreamRequestHandler):
+    def _read_command(self) -> list[str] | None:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2].decode())
+        return args
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, str):
+            return f"${len(value.encode())}\r\n{value}\r\n".encode()
+        return f"*{len(value)}\r\n".encode() + b"".join(_FakePubSubHandler._encode(v) for v in value)
+
+    def handle(self) -> None:
+        server: _FakePubSub = self.server
+        self.write_lock = threading.Lock()
+        try:
+            while (args := self._read_command()) is not None:
+                name = args[0].upper()
+                if name in ("SUBSCRIBE", "UNSUBSCRIBE"):
+                    for channel in args[1:]:
+                        with server.lock:
+                            subs = server.channels.setdefault(channel, set())
+                            (subs.add if name == "SUBSCRIBE" else subs.discard)(self)
+                        self._send(self._encode([name.lower(), channel, 1]))
+                elif name == "PUBLISH":
+                    with server.lock:
+                        subs = list(server.channels.get(args[1], ()))
+                    for sub in subs:
+                        sub._send(self._encode(["message", args[1], args[2]]))
+                    self._send(self._encode(len(subs)))
+        finally:
+            with server.lock:
+                for subs in server.channels.values():
+                    subs.discard(self)
+
+    def _send(self, data: bytes) -> None:
+        with self.write_lock:
+            self.wfile.write(data)
+
+
+@pytest.fixture
+def fake_pubsub():
+    server = _FakePubSub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_redis_transport_delivers_only_subscribed_topics(fake_pubsub):
+    url = f"redis://127.0.0.1:{fake_pubsub.server_address[1]}/0"
+
+    async def run():
+        sender, receiver = RedisTransport(url, batch_ms=1), RedisTransport(url, batch_ms=1)
+        got: list[dict] = []
+
+        async def deliver(message):
+            got.append(message)
+
+        await sender.start(deliver)
+        await receiver.start(deliver)
+        await receiver.wait_ready()
+        receiver.subscribe("rwc:printer:p1")
+        await _until(lambda: fake_pubsub.channels.get("rwc:printer:p1"))
+
+        sender.publish("rwc:printer:p1", {"n": 1})
+        sender.publish("rwc:printer:p9", {"n": 9})
+        await sender.flush()
+        await _until(lambda: got)
+        receiver.unsubscribe("rwc:printer:p1")
+        await _until(lambda: not fake_pubsub.channels.get("rwc:printer:p1"))
+        stats = receiver.stats()
+        await sender.stop()
+        await receiver.stop()
+        return got, stats
+
+    got, stats = asyncio.run(run())
+    assert got == [{"n": 1}]
+    assert stats["received"] == 1 and stats["subscriptions"] == 0
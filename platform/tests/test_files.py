@@ -178,6 +178,68 @@ def test_download_file(self, authenticated_user):
         assert r.content == file_content
         assert r.headers["content-disposition"] == f'attachment; filename="{filename}"'
     
+    @staticmethod
+    def _upload(headers, content):
+        r = client.post("/api/v1/files/upload", headers=headers,
+                        files={"file": ("model.stl", io.BytesIO(content), "model/stl")})
+        return r.json()
+
+    def test_download_ranges_and_etag(self, authenticated_user):
+        content = bytes(range(256)) * 8
+        info = self._upload(authenticated_user, content)
+        url = f"/api/v1/files/{info['file_id']}/download"
+
+        full = client.get(url, headers=authenticated_user)
+        etag = full.headers["etag"]
+        assert etag == f'"{info["sha256"]}"' and full.headers["accept-ranges"] == "bytes"
+
+        part = client.get(url, headers={**authenticated_user, "Range": "bytes=100-199"})
+        assert part.status_code == 206 and part.content == content[100:200]
+        assert part.headers["content-range"] == f"bytes 100-199/{len(content)}"
+
+        tail = client.get(url, headers={**authenticated_user, "Range": "bytes=-10", "If-Range": etag})
+        assert tail.status_code == 206 and tail.content == content[-10:]
+        stale = client.get(url, headers={**authenticated_user, "Range": "bytes=0-9", "If-Range": '"other"'})
+        assert stale.status_code == 200 and stale.content == content
+
+        unsatisfiable = client.get(url, headers={**authenticated_user, "Range": f"bytes={len(content)}-"})
+        assert unsatisfiable.status_code == 416
+
+        cached = client.get(url, headers={**authenticated_user, "If-None-Match": f'W/"x", {etag}'})
+        assert cached.status_code == 304 and cached.content == b""
+
+    def test_signed_url(self, authenticated_user):
+        content = b"solid signed\nendsolid signed\n"
+        info = self._upload(authenticated_user, content)
+        r = client.post(f"/api/v1/files/{info['file_id']}/signed-url", headers=authenticated_user)
+        assert r.status_code == 200
+        url = r.json()["url"]
+
+        download = client.get(url)  # no credentials
+        assert download.status_code == 200 and download.content == content
+        assert client.get(url, headers={"Range": "bytes=0-4"}).content == content[:5]
+
+        assert client.get(url.replace("signature=", "signature=0")).status_code == 403
+        assert client.get(url.replace("model.stl", "other.stl")).status_code == 403
+
+    def test_signed_url_expiry(self):
+        from api.services.downloads import sign_download, verify_download
+
+        signature = sign_download("a" * 64, "x.stl", 1000)
+        assert verify_download("a" * 64, "x.stl", 1000, signature, now=999)
+        assert not verify_download("a" * 64, "x.stl", 1000, signature, now=1001)
+
+    def test_download_offloaded_to_proxy(self, authenticated_user, monkeypatch):
+        import api.services.downloads as downloads
+
+        info = self._upload(authenticated_user, b"solid proxied\nendsolid proxied\n")
+        monkeypatch.setattr(downloads, "FILES_SENDFILE_HEADER", "X-Accel-Redirect")
+        r = client.get(f"/api/v1/files/{info['file_id']}/download", headers=authenticated_user)
+        sha = info["sha256"]
+        assert r.status_code == 200 and r.content == b""
+        assert r.headers["x-accel-redirect"] == f"/_uploads/blobs/{sha[:2]}/{sha[2:4]}/{sha}"
+        assert r.headers["etag"] == f'"{sha}"'
+
     def test_download_nonexistent_file(self, authenticated_user):
         """Test downloading non-existent file."""
         r = client.get("/api/v1/files/nonexistent-id/download", headers=authenticated_user)
@@ -225,4 +287,306 @@ def test_get_my_files_without_auth(self):
         """Test getting files without authentication."""
         r = client.get("/api/v1/files/my")
         
-        assert r.status_code == 422  # Missing header
\ No newline at end of file
+        assert r.status_code == 422  # Missing header
+
+class TestStreamingUpload:
+    def test_upload_reports_sha256(self, authenticated_user):
+        """The stored file's SHA-256 is computed while streaming."""
+        import hashlib
+
+        file_content = b"solid cube\nendsolid cube\n" * 1000
+        r = client.post(
+            "/api/v1/files/upload",
+            headers=authenticated_user,
+            files={"file": ("cube.stl", io.BytesIO(file_content), "model/stl")}
+        )
+        assert r.status_code == 200
+        assert r.json()["sha256"] == hashlib.sha256(file_content).hexdigest()
+
+    def test_oversized_upload_leaves_no_partial_file(self, tmp_path):
+        """Hitting the limit mid-stream removes the temp file."""
+        from api.services.uploads import UploadTooLarge, spool_stream
+
+        dest = tmp_path / "store"
+        dest.mkdir()
+        with pytest.raises(UploadTooLarge):
+            spool_stream(io.BytesIO(b"x" * 3000), dest, max_size=2048)
+        assert list(dest.iterdir()) == []
+
+        temp_path, size, _ = spool_stream(io.BytesIO(b"x" * 2048), dest, max_size=2048)
+        assert size == 2048 and list(dest.iterdir()) == [temp_path]
+
+    def test_multipart_limit_applies_while_streaming(self, tmp_path):
+        """The file part is spooled as it is fed; the limit trips before the body ends."""
+        from api.services.uploads import MultipartSpool, UploadTooLarge
+
+        dest = tmp_path / "store"
+        dest.mkdir()
+        head = (b'--b\r\nContent-Disposition: form-data; name="note"\r\n\r\nhi\r\n'
+                b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.stl"\r\n'
+                b"Content-Type: model/stl\r\n\r\n")
+        spool = MultipartSpool("multipart/form-data; boundary=b", "file", dest, max_size=2048)
+        spool.feed(head + b"x" * 1024)
+        assert spool.filename == "a.stl" and spool.writer.size == 1024
+        with pytest.raises(UploadTooLarge):
+            spool.feed(b"x" * 1025)
+        spool.abort()
+        assert list(dest.iterdir()) == []
+
+        spool = MultipartSpool("multipart/form-data; boundary=b", "file", dest, max_size=2048)
+        spool.feed(head + b"x" * 2048 + b"\r\n--b--\r\n")
+        filename, temp_path, size, _ = spool.finish()
+        assert (filename, size) == ("a.stl", 2048) and list(dest.iterdir()) == [temp_path]
+
+    def test_oversized_stream_rejected_without_draining(self, authenticated_user):
+        """Without Content-Length the limit trips mid-body and the rest is never received."""
+        import asyncio
+
+        from api.routers.files import MAX_FILE_SIZE
+
+        total = MAX_FILE_SIZE // (1024 * 1024) * 3
+        chunks = [b'--b\r\nContent-Disposition: form-data; name="file"; filename="big.stl"\r\n\r\n']
+        chunks += [b"x" * (1024 * 1024)] * total + [b"\r\n--b--\r\n"]
+        pending, sent = iter(chunks), []
+
+        async def receive():
+            body = next(pending, None)
+            if body is None:
+                return {"type": "http.disconnect"}
+            sent.append(len(body))
+            return {"type": "http.request", "body": body, "more_body": len(sent) < len(chunks)}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        status = []
+        headers = [(k.lower().encode(), v.encode()) for k, v in authenticated_user.items()]
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": "/api/v1/files/upload", "raw_path": b"/api/v1/files/upload",
+            "root_path": "", "query_string": b"", "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+            "headers": [*headers, (b"content-type", b"multipart/form-data; boundary=b")],
+        }
+        asyncio.run(app(scope, receive, send))
+        assert status == [413]
+        assert len(sent) < total // 2
+
+    def test_declared_oversize_body_rejected_before_reading(self, authenticated_user):
+        from api.routers.files import MAX_FILE_SIZE
+
+        def body():
+            raise AssertionError("body should not be read")
+            yield b""
+
+        r = client.post(
+            "/api/v1/files/upload",
+            headers={**authenticated_user, "Content-Type": "multipart/form-data; boundary=b",
+                     "Content-Length": str(MAX_FILE_SIZE * 2)},
+            content=body(),
+        )
+        assert r.status_code == 413
+
+
+class TestDeduplicatedStorage:
+    @pytest.fixture(autouse=True)
+    def _blob_root(self, tmp_path, monkeypatch):
+        from api.routers import files as files_router
+        from api.services.blob_store import BlobStore
+
+        self.store = BlobStore(tmp_path / "blobs")
+        monkeypatch.setattr(files_router, "blob_store", self.store)
+
+    @staticmethod
+    def _upload(headers, content, filename="part.stl"):
+        r = client.post("/api/v1/files/upload", headers=headers,
+                        files={"file": (filename, io.BytesIO(content), "model/stl")})
+        assert r.status_code == 200
+        return r.json()
+
+    def _blob(self, sha256):
+        from api.database import get_db
+
+        with get_db() as db:
+            return self.store.lookup(db, sha256)
+
+    def test_identical_uploads_share_one_blob(self, authenticated_user):
+        content = b"solid shared\nendsolid shared\n"
+        first = self._upload(authenticated_user, content, "a.stl")
+        second = self._upload(authenticated_user, content, "b.stl")
+        assert first["file_id"] != second["file_id"] and first["sha256"] == second["sha256"]
+
+        blob = self._blob(first["sha256"])
+        assert blob["ref_count"] == 2
+        assert [p for p in self.store.root.rglob("*") if p.is_file()] == [self.store.path_for(first["sha256"])]
+        for info in (first, second):
+            r = client.get(f"/api/v1/files/{info['file_id']}/download", headers=authenticated_user)
+            assert r.content == content
+
+    def test_head_and_claim_skip_the_upload(self, authenticated_user):
+        import hashlib
+
+        content = b"solid known\nendsolid known\n"
+        digest = hashlib.sha256(content).hexdigest()
+        assert client.head(f"/api/v1/files/blobs/{digest}", headers=authenticated_user).status_code == 404
+        claim = client.post(f"/api/v1/files/blobs/{digest}", headers=authenticated_user,
+                            json={"filename": "known.stl"})
+        assert claim.status_code == 404
+
+        self._upload(authenticated_user, content)
+        head = client.head(f"/api/v1/files/blobs/{digest}", headers=authenticated_user)
+        assert head.status_code == 200 and head.headers["X-File-Size"] == str(len(content))
+
+        claim = client.post(f"/api/v1/files/blobs/{digest}", headers=authenticated_user,
+                            json={"filename": "copy.stl"})
+        assert claim.status_code == 200
+        assert claim.json()["size"] == len(content) and claim.json()["filename"] == "copy.stl"
+        assert self._blob(digest)["ref_count"] == 2
+
+        assert client.head("/api/v1/files/blobs/not-a-hash", headers=authenticated_user).status_code == 422
+        bad_type = client.post(f"/api/v1/files/blobs/{digest}", headers=authenticated_user,
+                               json={"filename": "copy.exe"})
+        assert bad_type.status_code == 400
+
+    def test_delete_releases_blob_for_gc(self, authenticated_user):
+        from api.database import get_db
+
+        content = b"solid temp\nendsolid temp\n"
+        first = self._upload(authenticated_user, content)
+        second = self._upload(authenticated_user, content)
+        path = self.store.path_for(first["sha256"])
+
+        assert client.delete(f"/api/v1/files/{first['file_id']}", headers=authenticated_user).status_code == 200
+        assert client.get(f"/api/v1/files/{first['file_id']}").status_code == 404
+        assert self._blob(first["sha256"])["ref_count"] == 1
+
+        assert client.delete(f"/api/v1/files/{second['file_id']}", headers=authenticated_user).status_code == 200
+        with get_db() as db:
+            assert self.store.collect_garbage(db, grace_s=3600) == 0  # still within the grace period
+            assert self.store.collect_garbage(db, grace_s=0) == 1
+        assert not path.exists() and self._blob(first["sha256"]) is None
+
+    def test_delete_requires_owner(self, authenticated_user):
+        info = self._upload(authenticated_user, b"solid mine\nendsolid mine\n")
+        client.post("/api/v1/auth/register", json={
+            "email": "other@example.com", "username": "otheruser", "password": "securepass123",
+        })
+        token = client.post("/api/v1/auth/login", json={
+            "email": "other@example.com", "password": "securepass123",
+        }).json()["access_token"]
+        r = client.delete(f"/api/v1/files/{info['file_id']}", headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 403
+
+    @staticmethod
+    def _other_user():
+        client.post("/api/v1/auth/register", json={
+            "email": "other@example.com", "username": "otheruser", "password": "securepass123",
+        })
+        token = client.post("/api/v1/auth/login", json={
+            "email": "other@example.com", "password": "securepass123",
+        }).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_hash_alone_does_not_grant_access(self, authenticated_user):
+        content = b"solid private\nendsolid private\n"
+        digest = self._upload(authenticated_user, content)["sha256"]
+        other = self._other_user()
+
+        assert client.head(f"/api/v1/files/blobs/{digest}", headers=other).status_code == 404
+        claim = client.post(f"/api/v1/files/blobs/{digest}", headers=other, json={"filename": "stolen.stl"})
+        assert claim.status_code == 404
+        assert self._blob(digest)["ref_count"] == 1
+
+        # Uploading the bytes themselves still shares the stored blob
+        assert self._upload(other, content)["sha256"] == digest
+        assert self._blob(digest)["ref_count"] == 2
+
+    def test_hash_shown_to_uploader_only(self, authenticated_user):
+        info = self._upload(authenticated_user, b"solid hidden\nendsolid hidden\n")
+        url = f"/api/v1/files/{info['file_id']}"
+
+        assert client.get(url, headers=authenticated_user).json()["sha256"] == info["sha256"]
+        for headers in ({}, self._other_user(), {"Authorization": "Bearer not-a-token"}):
+            public = client.get(url, headers=headers).json()
+            assert public["sha256"] is None and public["mesh"]["status"] in ("pending", "done")
+
+    def test_failed_insert_leaves_no_files(self, authenticated_user, monkeypatch):
+        from api.routers import files as files_router
+
+        partial_before = set(files_router.PARTIAL_DIR.iterdir())
+
+        def broken(filename):
+            raise RuntimeError("insert failed")
+
+        monkeypatch.setattr(files_router, "_get_mime_type", broken)
+        with pytest.raises(RuntimeError):
+            client.post("/api/v1/files/upload", headers=authenticated_user,
+                        files={"file": ("part.stl", io.BytesIO(b"solid lost\nendsolid lost\n"), "model/stl")})
+        assert not [p for p in self.store.root.rglob("*") if p.is_file()]
+        assert set(files_router.PARTIAL_DIR.iterdir()) == partial_before
+
+
+class TestResumableUpload:
+    @staticmethod
+    def _put(upload_id, headers, data, start, total):
+        return client.put(
+            f"/api/v1/files/uploads/{upload_id}",
+            headers={**headers, "Content-Range": f"bytes {start}-{start + len(data) - 1}/{total}"},
+            content=data,
+        )
+
+    def test_chunked_upload_with_retry_and_resume(self, authenticated_user):
+        """Chunks append in order; a retried chunk is skipped and a gap is refused."""
+        import hashlib
+
+        payload = bytes(range(256)) * 40  # 10 KB
+        r = client.post("/api/v1/files/uploads", headers=authenticated_user,
+                        json={"filename": "bundle.3mf", "size": len(payload)})
+        assert r.status_code == 200
+        upload_id = r.json()["upload_id"]
+
+        assert self._put(upload_id, authenticated_user, payload[:4000], 0, len(payload)).json()["received"] == 4000
+        # Gap: the server only has 4000 bytes
+        gap = self._put(upload_id, authenticated_user, payload[6000:], 6000, len(payload))
+        assert gap.status_code == 409 and gap.headers["Upload-Offset"] == "4000"
+        # Retry overlapping what is already stored
+        r = self._put(upload_id, authenticated_user, payload[2000:7000], 2000, len(payload))
+        assert r.json()["received"] == 7000
+
+        early = client.post(f"/api/v1/files/uploads/{upload_id}/complete", headers=authenticated_user)
+        assert early.status_code == 409
+
+        assert client.get(f"/api/v1/files/uploads/{upload_id}", headers=authenticated_user).json()["received"] == 7000
+        self._put(upload_id, authenticated_user, payload[7000:], 7000, len(payload))
+
+        digest = hashlib.sha256(payload).hexdigest()
+        done = client.post(f"/api/v1/files/uploads/{upload_id}/complete", headers=authenticated_user,
+                           json={"sha256": digest})
+        assert done.status_code == 200
+        data = done.json()
+        assert data["sha256"] == digest and data["size"] == len(payload) and data["file_type"] == ".3mf"
+
+        download = client.get(f"/api/v1/files/{data['file_id']}/download", headers=authenticated_user)
+        assert download.content == payload
+        assert client.get(f"/api/v1/files/uploads/{upload_id}", headers=authenticated_user).status_code == 404
+
+    def test_checksum_mismatch_and_abort(self, authenticated_user):
+        r = client.post("/api/v1/files/uploads", headers=authenticated_user,
+                        json={"filename": "part.stl", "size": 5})
+        upload_id = r.json()["upload_id"]
+        self._put(upload_id, authenticated_user, b"hello", 0, 5)
+
+        bad = client.post(f"/api/v1/files/uploads/{upload_id}/complete", headers=authenticated_user,
+                          json={"sha256": "0" * 64})
+        assert bad.status_code == 422
+
+        assert client.delete(f"/api/v1/files/uploads/{upload_id}", headers=authenticated_user).status_code == 200
+        assert client.get(f"/api/v1/files/uploads/{upload_id}", headers=authenticated_user).status_code == 404
+
+    def test_session_rejects_bad_type_and_size(self, authenticated_user):
+        r = client.post("/api/v1/files/uploads", headers=authenticated_user,
+                        json={"filename": "virus.exe", "size": 10})
+        assert r.status_code == 400
+        r = client.post("/api/v1/files/uploads", headers=authenticated_user,
+                        json={"filename": "huge.3mf", "size": 10 ** 12})
+        assert r.status_code == 413
@@ -116,3 +116,65 @@ def test_budget_filter(self):
         matches = resp.json()["matches"]
         if len(matches) == 2:
             assert matches[0]["score"] >= matches[1]["score"]
+
+
+# ─── 倒排索引 ────────────────────────────────────────────
+
+class TestMatchIndex:
+    def test_chinese_need_without_spaces(self):
+        """中文需求无需空格分词即可命中"""
+        _seed_agent()
+        _seed_component("phone-stand", tags=["手机支架"])
+        _seed_component("cable-clip", tags=["线夹"])
+        resp = client.post("/api/v1/match", json={"need": "我需要一个手机支架", "limit": 5})
+        assert resp.status_code == 200
+        assert [m["component"]["id"] for m in resp.json()["matches"]] == ["phone-stand"]
+
+    def test_index_picks_up_new_and_flagged_components(self):
+        _seed_agent()
+        _seed_component("servo-mount", tags=["servo"])
+        body = {"need": "servo mount bracket", "limit": 5}
+        assert [m["component"]["id"] for m in client.post("/api/v1/match", json=body).json()["matches"]] == ["servo-mount"]
+
+        _seed_component("servo-arm", tags=["servo"])
+        ids = {m["component"]["id"] for m in client.post("/api/v1/match", json=body).json()["matches"]}
+        assert ids == {"servo-mount", "servo-arm"}
+
+        with get_db() as db:
+            db.execute(
+                "UPDATE components SET status = 'flagged', updated_at = ? WHERE id = 'servo-mount'",
+                (datetime.now(timezone.utc).isoformat(),),
+            )
+        ids = [m["component"]["id"] for m in client.post("/api/v1/match", json=body).json()["matches"]]
+        assert ids == ["servo-arm"]
+
+    def test_unrelated_components_are_not_scored(self):
+        """与需求无任何词项重叠的组件不会仅凭预算入选"""
+        _seed_agent()
+        _seed_component("cheap-widget", tags=["widget"], cost=5.0)
+        resp = client.post("/api/v1/match", json={"need": "robot arm gripper", "budget_cny": 50.0})
+        assert resp.json()["matches"] == []
+
+    def test_refresh_does_not_mutate_index_in_use(self):
+        """刷新索引时正在进行的查询仍使用旧的完整快照"""
+        from api.models.schemas import MatchRequest
+        from api.services.component_index import get_component_index
+
+        _seed_agent()
+        _seed_component("servo-mount", tags=["servo"])
+        with get_db() as db:
+            before = get_component_index(db)
+        req = MatchRequest(need="servo mount", limit=5)
+        expanded = before._expand("servo")
+
+        with get_db() as db:
+            db.execute(
+                "UPDATE components SET status = 'flagged', updated_at = ? WHERE id = 'servo-mount'",
+                (datetime.now(timezone.utc).isoformat(),),
+            )
+            after = get_component_index(db)
+
+        assert after is not before
+        assert all(token in before.postings for token in expanded)
+        assert [cid for _, _, cid in before.search(req, 5)] == ["servo-mount"]
+        assert after.search(req, 5) == []
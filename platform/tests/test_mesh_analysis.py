@@ -0,0 +1,172 @@
+"""Mesh analysis tests - RealWorldClaw Team"""
+
+from __future__ import annotations
+
+import io
+import struct
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.services.mesh_analysis import MeshError, analyze_mesh
+
+client = TestClient(app)
+
+# Unit cube, outward-facing triangles
+_CUBE_VERTICES = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]
+_CUBE_FACES = [
+    (0, 2, 1), (0, 3, 2), (4, 5, 6), (4, 6, 7), (0, 1, 5), (0, 5, 4),
+    (1, 2, 6), (1, 6, 5), (2, 3, 7), (2, 7, 6), (3, 0, 4), (3, 4, 7),
+]
+
+
+def _cube(size: float = 10.0, offset=(0.0, 0.0, 0.0)):
+    return [tuple(c * size + o for c, o in zip(v, offset)) for v in _CUBE_VERTICES]
+
+
+def _binary_stl(vertices, faces) -> bytes:
+    body = b"".join(
+        struct.pack("<12fH", 0, 0, 0, *vertices[a], *vertices[b], *vertices[c], 0) for a, b, c in faces
+    )
+    return b"\0" * 80 + struct.pack("<I", len(faces)) + body
+
+
+def _ascii_stl(vertices, faces) -> bytes:
+    lines = ["solid cube"]
+    for face in faces:
+        lines += ["facet normal 0 0 0", "outer loop"]
+        lines += ["vertex {} {} {}".format(*vertices[i]) for i in face]
+        lines += ["endloop", "endfacet"]
+    return ("\n".join(lines + ["endsolid cube"]) + "\n").encode()
+
+
+def _three_mf(vertices, faces, unit="millimeter", transform=None) -> bytes:
+    verts = "".join(f'<vertex x="{x}" y="{y}" z="{z}"/>' for x, y, z in vertices)
+    tris = "".join(f'<triangle v1="{a}" v2="{b}" v3="{c}"/>' for a, b, c in faces)
+    item = f'<item objectid="2" transform="{transform}"/>' if transform else '<item objectid="2"/>'
+    model = (
+        f'<model unit="{unit}" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">'
+        f'<resources><object id="1" type="model"><mesh><vertices>{verts}</vertices>'
+        f'<triangles>{tris}</triangles></mesh></object>'
+        '<object id="2" type="model"><components><component objectid="1"/></components></object>'
+        f"</resources><build>{item}</build></model>"
+    )
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("3D/3dmodel.model", model)
+    return buf.getvalue()
+
+
+def _write(tmp_path, name, data: bytes):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path
+
+
+@pytest.mark.usefixtures("vector_backend")
+class TestAnalyzeMesh:
+    def _assert_cube(self, stats, size=10.0, lo=(0.0, 0.0, 0.0)):
+        assert stats.triangles == 12
+        assert stats.volume_mm3 == pytest.approx(size ** 3)
+        assert stats.surface_area_mm2 == pytest.approx(6 * size ** 2)
+        assert stats.bbox_min == pytest.approx(lo)
+        assert stats.size_mm == pytest.approx((size, size, size))
+        assert stats.watertight
+
+    def test_binary_stl(self, tmp_path):
+        stats = analyze_mesh(_write(tmp_path, "cube.stl", _binary_stl(_cube(offset=(5, -5, 2)), _CUBE_FACES)))
+        assert stats.format == "stl"
+        self._assert_cube(stats, lo=(5, -5, 2))
+
+    def test_binary_stl_with_solid_header(self, tmp_path):
+        data = bytearray(_binary_stl(_cube(), _CUBE_FACES))
+        data[:5] = b"solid"
+        self._assert_cube(analyze_mesh(_write(tmp_path, "cube.stl", bytes(data))))
+
+    def test_ascii_stl(self, tmp_path):
+        stats = analyze_mesh(_write(tmp_path, "cube.stl", _ascii_stl(_cube(), _CUBE_FACES)))
+        assert stats.format == "stl"
+        self._assert_cube(stats)
+
+    def test_obj_with_quads_and_negative_indices(self, tmp_path):
+        lines = ["v {} {} {}".format(*v) for v in _cube()]
+        lines += ["f 1/1/1 4/4/4 3/3/3 2/2/2", "f -4 -3 -2 -1"]  # bottom and top as quads
+        lines += ["f {} {} {}".format(*(i + 1 for i in face)) for face in _CUBE_FACES[4:]]
+        stats = analyze_mesh(_write(tmp_path, "cube.obj", "\n".join(lines).encode()))
+        assert stats.format == "obj"
+        self._assert_cube(stats)
+
+    def test_3mf_units_and_build_transform(self, tmp_path):
+        data = _three_mf(_cube(size=1.0), _CUBE_FACES, unit="centimeter", transform="1 0 0 0 1 0 0 0 1 2 3 4")
+        stats = analyze_mesh(_write(tmp_path, "cube.3mf", data))
+        assert stats.format == "3mf"
+        self._assert_cube(stats, lo=(20, 30, 40))
+
+    def test_open_mesh_is_not_watertight(self, tmp_path):
+        stats = analyze_mesh(_write(tmp_path, "open.stl", _binary_stl(_cube(), _CUBE_FACES[:-1])))
+        assert stats.triangles == 11 and not stats.watertight
+
+    @pytest.mark.parametrize("bad", [float("nan"), float("inf")])
+    def test_non_finite_vertex_raises(self, tmp_path, bad):
+        vertices = _cube()
+        vertices[6] = (bad, 10.0, 10.0)
+        with pytest.raises(MeshError):
+            analyze_mesh(_write(tmp_path, "bad.stl", _binary_stl(vertices, _CUBE_FACES)))
+        lines = ["v {} {} {}".format(*v) for v in vertices]
+        lines += ["f {} {} {}".format(*(i + 1 for i in face)) for face in _CUBE_FACES]
+        with pytest.raises(MeshError):
+            analyze_mesh(_write(tmp_path, "bad.obj", "\n".join(lines).encode()))
+
+    def test_garbage_raises(self, tmp_path):
+        with pytest.raises(MeshError):
+            analyze_mesh(_write(tmp_path, "junk.stl", b"not a mesh at all"))
+        with pytest.raises(MeshError):
+            analyze_mesh(_write(tmp_path, "junk.3mf", b"PK\x03\x04broken"))
+
+
+class TestMeshAnalysisStage:
+    @pytest.fixture
+    def headers(self):
+        client.post("/api/v1/auth/register", json={
+            "email": "mesh@example.com", "username": "meshuser", "password": "securepass123",
+        })
+        r = client.post("/api/v1/auth/login", json={"email": "mesh@example.com", "password": "securepass123"})
+        return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    def _upload(self, headers, name, data):
+        r = client.post("/api/v1/files/upload", headers=headers,
+                        files={"file": (name, io.BytesIO(data), "application/octet-stream")})
+        assert r.status_code == 200
+        return r.json()["file_id"]
+
+    def test_results_are_cached_by_hash_and_exposed(self, headers):
+        from api.services.mesh_analysis import MeshAnalyzer
+
+        cube = _binary_stl(_cube(), _CUBE_FACES)
+        first = self._upload(headers, "a.stl", cube)
+        second = self._upload(headers, "b.stl", cube)
+        broken = self._upload(headers, "broken.obj", b"f 1 2 3\n")
+        image = self._upload(headers, "photo.png", b"\x89PNG")
+
+        assert client.get(f"/api/v1/files/{first}").json()["mesh"] == {"status": "pending", **dict.fromkeys([
+            "format", "triangles", "volume_mm3", "surface_area_mm2", "bbox_min", "bbox_max", "size_mm",
+            "watertight", "error"])}
+
+        analyzer = MeshAnalyzer()
+        assert analyzer.analyze_pending() == 2  # one per distinct mesh body
+        assert analyzer.analyze_pending() == 0
+        assert analyzer.metrics["analyzed"] == 1 and analyzer.metrics["failed"] == 1
+
+        for file_id in (first, second):
+            mesh = client.get(f"/api/v1/files/{file_id}").json()["mesh"]
+            assert mesh["status"] == "done" and mesh["triangles"] == 12 and mesh["watertight"]
+            assert mesh["volume_mm3"] == pytest.approx(1000.0)
+            assert mesh["size_mm"] == pytest.approx([10.0, 10.0, 10.0])
+        failed = client.get(f"/api/v1/files/{broken}").json()["mesh"]
+        assert failed["status"] == "failed" and failed["error"]
+        assert client.get(f"/api/v1/files/{image}").json()["mesh"] is None
+
+        listed = client.get("/api/v1/files/my", headers=headers).json()["files"]
+        assert sorted(f["mesh"]["status"] for f in listed if f["mesh"]) == ["done", "done", "failed"]
@@ -0,0 +1,111 @@
+"""Direct message tests - RealWorldClaw Team"""
+
+from __future__ import annotations
+
+import uuid
+
+from fastapi.testclient import TestClient
+
+from api.database import get_db
+from api.main import app
+from api.services.conversations import rebuild_conversations
+
+client = TestClient(app)
+
+
+def _user(name: str) -> tuple[str, dict]:
+    uid = uuid.uuid4().hex[:6]
+    r = client.post("/api/v1/auth/register", json={
+        "email": f"{name}-{uid}@example.com", "username": f"{name}_{uid}", "password": "securepass123",
+    })
+    data = r.json()
+    return data["user"]["id"], {"Authorization": f"Bearer {data['access_token']}"}
+
+
+def _send(headers: dict, recipient_id: str, content: str):
+    r = client.post("/api/v1/messages", json={"recipient_id": recipient_id, "content": content}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _inbox(headers: dict, **params) -> dict:
+    r = client.get("/api/v1/messages", params=params, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+class TestConversations:
+    def test_summary_tracks_last_message_and_unread(self):
+        alice, alice_h = _user("alice")
+        bob, bob_h = _user("bob")
+
+        _send(alice_h, bob, "hi bob")
+        last = _send(alice_h, bob, "x" * 400)
+
+        [conv] = _inbox(bob_h)["conversations"]
+        assert conv["user_id"] == alice and conv["username"].startswith("alice_")
+        assert conv["unread_count"] == 2
+        assert conv["last_message"]["id"] == last["id"]
+        assert conv["last_message"]["sender_id"] == alice and conv["last_message"]["recipient_id"] == bob
+        assert conv["last_message"]["content"] == "x" * 280
+        assert conv["last_message"]["read"] is False
+
+        [mine] = _inbox(alice_h)["conversations"]
+        assert mine["user_id"] == bob and mine["unread_count"] == 0
+
+        # Bob replying reads Alice's messages
+        _send(bob_h, alice, "hey")
+        assert _inbox(bob_h)["conversations"][0]["unread_count"] == 0
+        assert _inbox(alice_h)["conversations"][0]["unread_count"] == 1
+
+    def test_bulk_mark_read(self):
+        alice, alice_h = _user("alice")
+        bob, bob_h = _user("bob")
+        for i in range(3):
+            _send(alice_h, bob, f"msg {i}")
+
+        r = client.post(f"/api/v1/messages/{alice}/read", headers=bob_h)
+        assert r.json() == {"user_id": alice, "marked_read": 3}
+        assert _inbox(bob_h)["conversations"][0]["unread_count"] == 0
+        # The sender sees their last message as read
+        assert _inbox(alice_h)["conversations"][0]["last_message"]["read"] is True
+
+        history = client.get(f"/api/v1/messages/{bob}", headers=alice_h).json()["messages"]
+        assert all(m["read"] for m in history)
+
+    def test_keyset_pagination(self):
+        me, me_h = _user("me")
+        peers = []
+        for i in range(5):
+            peer, peer_h = _user(f"peer{i}")
+            _send(peer_h, me, f"from {i}")
+            peers.append(peer)
+
+        seen, cursor = [], None
+        while True:
+            page = _inbox(me_h, limit=2, **({"cursor": cursor} if cursor else {}))
+            seen += [c["user_id"] for c in page["conversations"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert seen == peers[::-1]
+        assert client.get("/api/v1/messages", params={"cursor": "@@"}, headers=me_h).status_code == 400
+
+    def test_rebuild_matches_incremental_summaries(self):
+        alice, alice_h = _user("alice")
+        bob, bob_h = _user("bob")
+        carol, carol_h = _user("carol")
+        _send(alice_h, bob, "one")
+        _send(bob_h, alice, "two")
+        _send(carol_h, alice, "three")
+        _send(carol_h, alice, "four")
+
+        def snapshot():
+            with get_db() as db:
+                rows = db.execute("SELECT * FROM conversations ORDER BY owner_id, peer_id").fetchall()
+            return [dict(r) for r in rows]
+
+        before = snapshot()
+        with get_db() as db:
+            rebuild_conversations(db)
+        assert snapshot() == before
@@ -317,6 +317,52 @@ def test_heartbeat_without_auth(self):
         assert response.status_code == 422  # FastAPI returns 422 for missing required fields
         assert "authorization" in str(response.json()["detail"]).lower()
 
+    def test_bulk_heartbeat_accepts_only_owned_nodes(self, mock_agent):
+        """Bulk heartbeats update owned nodes and report the rest as rejected."""
+        headers = {"Authorization": f"Bearer {mock_agent['api_key']}"}
+        ids = [
+            client.post("/api/v1/nodes/register", json={**SAMPLE_NODE_DATA, "name": f"P{i}"}, headers=headers).json()["id"]
+            for i in range(2)
+        ]
+        response = client.post("/api/v1/nodes/heartbeats", json={"heartbeats": [
+            {"node_id": ids[0], "status": "busy", "current_job_id": "job-1", "queue_length": 2},
+            {"node_id": ids[1], "status": "online"},
+            {"node_id": "someone-elses-node", "status": "online"},
+        ]}, headers=headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == ids
+        assert data["rejected"] == ["someone-elses-node"]
+        with get_db() as db:
+            row = db.execute("SELECT status, queue_length, last_heartbeat FROM nodes WHERE id = ?", (ids[0],)).fetchone()
+        assert row["status"] == "busy" and row["queue_length"] == 2
+        assert row["last_heartbeat"] == data["timestamp"]
+
+    def test_buffered_heartbeats_coalesce_per_node(self, mock_agent):
+        """Between flushes only the latest heartbeat per node is written, in one batch."""
+        from api.services.heartbeats import Heartbeat, HeartbeatBuffer
+
+        headers = {"Authorization": f"Bearer {mock_agent['api_key']}"}
+        node_id = client.post("/api/v1/nodes/register", json=SAMPLE_NODE_DATA, headers=headers).json()["id"]
+        buffer = HeartbeatBuffer(flush_ms=1000)
+        with get_db() as db:
+            assert buffer.owned_nodes(db, mock_agent["id"], [node_id]) == {node_id}
+            assert buffer.owned_nodes(db, "intruder", [node_id]) == set()
+        assert buffer.stats()["owner_cache_hits"] == 1
+
+        for queue_length in (1, 2, 3):
+            buffer.submit(node_id, Heartbeat("online", None, queue_length, datetime.now(timezone.utc).isoformat()))
+        with get_db() as db:
+            assert db.execute("SELECT status FROM nodes WHERE id = ?", (node_id,)).fetchone()["status"] == "offline"
+
+        assert buffer.flush() == 1
+        with get_db() as db:
+            row = db.execute("SELECT status, queue_length FROM nodes WHERE id = ?", (node_id,)).fetchone()
+        assert (row["status"], row["queue_length"]) == ("online", 3)
+        stats = buffer.stats()
+        assert stats["coalesced"] == 2 and stats["flushes"] == 1 and stats["pending"] == 0
+
 
 class TestNearbyNodes:
     """Test nearby nodes search functionality."""
@@ -372,6 +418,31 @@ def test_nearby_nodes_invalid_params(self):
         response = client.get("/api/v1/nodes/nearby?lat=39.9042&lng=116.4074&radius=0")
         assert response.status_code == 422
 
+    def test_nearby_nodes_k_nearest(self, mock_agent):
+        """Test k returns only the nearest nodes, nearest first."""
+        headers = {"Authorization": f"Bearer {mock_agent['api_key']}"}
+        for name, latitude in [("far", 41.9), ("near", 39.9), ("mid", 40.5)]:
+            data = {**SAMPLE_NODE_DATA, "name": name, "latitude": latitude, "longitude": 116.4}
+            node_id = client.post("/api/v1/nodes/register", json=data, headers=headers).json()["id"]
+            client.post(f"/api/v1/nodes/{node_id}/heartbeat", json={"status": "online", "queue_length": 0}, headers=headers)
+
+        response = client.get("/api/v1/nodes/nearby?lat=39.9&lng=116.4&radius=1000&k=2")
+
+        assert response.status_code == 200
+        assert [n["name"] for n in response.json()["nodes"]] == ["near", "mid"]
+
+    def test_nearby_nodes_across_antimeridian(self, mock_agent):
+        """Test the bounding-box prefilter wraps around longitude 180."""
+        headers = {"Authorization": f"Bearer {mock_agent['api_key']}"}
+        data = {**SAMPLE_NODE_DATA, "latitude": -16.5, "longitude": -179.9}
+        node_id = client.post("/api/v1/nodes/register", json=data, headers=headers).json()["id"]
+        client.post(f"/api/v1/nodes/{node_id}/heartbeat", json={"status": "online", "queue_length": 0}, headers=headers)
+
+        response = client.get("/api/v1/nodes/nearby?lat=-16.5&lng=179.9&radius=50")
+
+        assert response.status_code == 200
+        assert [n["id"] for n in response.json()["nodes"]] == [node_id]
+
 
 class TestNodeMatching:
     """Test node matching functionality."""
@@ -447,6 +518,25 @@ def test_match_nodes_build_volume(self, mock_agent):
         data = response.json()
         assert len(data["matches"]) == 1  # Match found
 
+    def test_match_nodes_k_nearest_after_filters(self, mock_agent):
+        """Test k applies to nodes that pass the material filter, nearest first."""
+        headers = {"Authorization": f"Bearer {mock_agent['api_key']}"}
+        for name, latitude, materials in [("near-abs", 39.9, ["abs"]), ("mid-pla", 40.5, ["pla"]), ("far-pla", 45.0, ["pla"])]:
+            data = {**SAMPLE_NODE_DATA, "name": name, "latitude": latitude, "materials": materials}
+            node_id = client.post("/api/v1/nodes/register", json=data, headers=headers).json()["id"]
+            client.post(f"/api/v1/nodes/{node_id}/heartbeat", json={"status": "online", "queue_length": 0}, headers=headers)
+
+        match_request = {"required_materials": ["pla"], "latitude": 39.9, "longitude": 116.4, "k": 1}
+        response = client.post("/api/v1/nodes/match", json=match_request)
+
+        assert response.status_code == 200
+        assert [n["name"] for n in response.json()["matches"]] == ["mid-pla"]
+
+        response = client.get("/api/v1/nodes/match?material=pla&lat=39.9&lng=116.4&radius=5000&k=2")
+        matches = response.json()["matches"]
+        assert [m["node"]["name"] for m in matches] == ["mid-pla", "far-pla"]
+        assert matches[0]["distance_km"] < matches[1]["distance_km"]
+
 
 class TestNodeManagement:
     """Test node management functionality."""
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import json
 import secrets
 from datetime import datetime, timezone
 
@@ -655,3 +656,186 @@ def test_cancel_completed_order_fails(self):
         resp = client.post(f"/api/v1/orders/{order_id}/cancel", headers=_auth(CUSTOMER_KEY))
         assert resp.status_code == 400
         assert "Order cannot be cancelled" in resp.json()["detail"]
+
+
+# ─── Maker匹配引擎 ───────────────────────────────────────
+
+def _insert_maker(maker_id: str, province: str, city: str, district: str, materials: list[str],
+                  price: float, rating: float = 0.0, maker_type: str = "maker", availability: str = "open"):
+    now = datetime.now(timezone.utc).isoformat()
+    with get_db() as db:
+        db.execute(
+            """INSERT INTO makers
+               (id, owner_id, maker_type, printer_model, printer_brand,
+                build_volume_x, build_volume_y, build_volume_z, materials,
+                location_province, location_city, location_district,
+                availability, pricing_per_hour_cny, rating, created_at, updated_at)
+               VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+            (maker_id, "owner", maker_type, "P1S", "Bambu Lab", 256, 256, 256, json.dumps(materials),
+             province, city, district, availability, price, rating, now, now),
+        )
+
+
+@pytest.mark.usefixtures("vector_backend")
+class TestMakerMatching:
+    def _seed(self):
+        _insert_maker("m-same-district", "广东省", "深圳市", "南山区", ["PLA"], 30.0, rating=4.0)
+        _insert_maker("m-same-city", "广东省", "深圳市", "福田区", ["PETG"], 10.0, rating=5.0)
+        _insert_maker("m-other-province", "浙江省", "杭州市", "西湖区", ["pla+"], 20.0, maker_type="builder")
+        _insert_maker("m-busy", "广东省", "深圳市", "南山区", ["PLA"], 10.0, rating=5.0, availability="busy")
+
+    def test_ranking_and_score_breakdown(self):
+        from api.services.matching import match_maker_for_order
+
+        self._seed()
+        with get_db() as db:
+            matches = match_maker_for_order(db, "广东省", "深圳市", "南山区", "PLA")
+
+        assert [m["id"] for m in matches] == ["m-same-district", "m-same-city", "m-other-province"]
+        best = matches[0]
+        assert (best["geo_score"], best["material_score"], best["rating_score"], best["price_score"]) == (1.0, 1.0, 0.8, 0.0)
+        assert best["score"] == 0.76
+        assert best["materials_list"] == ["PLA"]
+        assert matches[2]["material_score"] == 1.0  # "pla+" contains the preference
+
+    def test_full_build_limit_and_weights(self):
+        from api.services.matching import MatchWeights, match_maker_for_order
+
+        self._seed()
+        with get_db() as db:
+            builders = match_maker_for_order(db, "广东省", "深圳市", "南山区", order_type="full_build")
+            cheapest = match_maker_for_order(
+                db, "广东省", "深圳市", "南山区", limit=1,
+                weights=MatchWeights(geo=0, material=0, rating=0, price=1),
+            )
+
+        assert [m["id"] for m in builders] == ["m-other-province"]
+        assert [m["id"] for m in cheapest] == ["m-same-city"]
+
+    def test_snapshot_reused_until_makers_change(self):
+        from api.services import matching
+
+        self._seed()
+        with get_db() as db:
+            matching.match_maker_for_order(db, "广东省", "深圳市", "南山区")
+            first = matching._snapshot
+            matching.match_maker_for_order(db, "广东省", "深圳市", "南山区")
+            assert matching._snapshot is first
+
+            db.execute(
+                "UPDATE makers SET availability = 'busy', updated_at = ? WHERE id = 'm-same-district'",
+                (datetime.now(timezone.utc).isoformat(),),
+            )
+            matches = matching.match_maker_for_order(db, "广东省", "深圳市", "南山区")
+
+        assert matching._snapshot is not first
+        assert "m-same-district" not in [m["id"] for m in matches]
+
+
+# ─── Geometry-aware pricing ─────────────────────────────
+
+_BOX_FACES = [
+    (0, 2, 1), (0, 3, 2), (4, 5, 6), (4, 6, 7), (0, 1, 5), (0, 5, 4),
+    (1, 2, 6), (1, 6, 5), (2, 3, 7), (2, 7, 6), (3, 0, 4), (3, 4, 7),
+]
+
+
+def _box_stl(x: float, y: float, z: float) -> bytes:
+    import struct
+
+    corners = [(0, 0, 0), (x, 0, 0), (x, y, 0), (0, y, 0), (0, 0, z), (x, 0, z), (x, y, z), (0, y, z)]
+    body = b"".join(
+        struct.pack("<12fH", 0, 0, 0, *corners[a], *corners[b], *corners[c], 0) for a, b, c in _BOX_FACES
+    )
+    return b"\0" * 80 + struct.pack("<I", len(_BOX_FACES)) + body
+
+
+def _analysed_file(data: bytes) -> str:
+    import io
+    from api.services.mesh_analysis import MeshAnalyzer
+
+    resp = client.post("/api/v1/files/upload", headers=_auth(CUSTOMER_KEY),
+                       files={"file": ("part.stl", io.BytesIO(data), "model/stl")})
+    assert resp.status_code == 200
+    MeshAnalyzer().analyze_pending()
+    return resp.json()["file_id"]
+
+
+@pytest.mark.usefixtures("vector_backend")
+class TestPricing:
+    def test_print_estimate_follows_geometry_and_profile(self):
+        from api.pricing import estimate_print, slice_profile
+
+        cube = estimate_print(8000.0, 2400.0, 20.0, slice_profile())
+        assert 0.2 < cube.hours_per_unit < 1.0
+        assert 4.0 < cube.filament_g("PLA") < 10.0
+        assert cube.filament_g("ABS") < cube.filament_g("PLA")
+        assert cube.layers == 100
+
+        solid = estimate_print(8000.0, 2400.0, 20.0, slice_profile({"infill_density": 100}))
+        fine = estimate_print(8000.0, 2400.0, 20.0, slice_profile({"layer_height": 0.1}))
+        assert solid.extruded_cm3 > cube.extruded_cm3 and solid.hours_per_unit > cube.hours_per_unit
+        assert fine.hours_per_unit > cube.hours_per_unit and fine.layers == 200
+
+    def test_estimate_cache_keys_on_hash_and_profile(self):
+        from api.pricing import _EstimateCache, slice_profile
+
+        cache = _EstimateCache(max_size=2)
+        metrics = {"volume_mm3": 8000.0, "surface_area_mm2": 2400.0, "height_mm": 20.0}
+        first = cache.get("a" * 64, metrics, slice_profile())
+        assert cache.get("a" * 64, metrics, slice_profile({"nozzle_temp": 230})) is first  # irrelevant field
+        cache.get("a" * 64, metrics, slice_profile({"infill_density": 50}))
+        assert cache.stats() == {"size": 2, "hits": 1, "misses": 2}
+
+    def test_batch_estimate_without_geometry(self):
+        _, _, maker_reg_id = _seed_world()
+        resp = client.post("/api/v1/orders/estimate/batch", json={"options": [
+            {"material": "PLA", "quantity": 2},
+            {"material": "PETG", "quantity": 1, "urgency": "express"},
+            {"material": "ABS", "quantity": 1},
+        ]}, headers=_auth(CUSTOMER_KEY))
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["hours_source"] == "default" and data["hours_per_unit"] == 2.0
+        pla, petg, abs_ = data["quotes"]
+        assert pla["makers"] == [{"maker_id": maker_reg_id, "maker_rate_per_hour": 15.0, "estimated_price_cny": 60.0}]
+        assert pla["default_rate_price_cny"] == 120.0
+        assert petg["makers"][0]["estimated_price_cny"] == 45.0
+        assert abs_["candidates"] == 0 and abs_["makers"] == []
+
+    def test_batch_estimate_uses_mesh_and_build_volume(self):
+        _, _, maker_reg_id = _seed_world()
+        small = _analysed_file(_box_stl(20, 20, 20))
+        huge = _analysed_file(_box_stl(300, 10, 10))
+
+        resp = client.post("/api/v1/orders/estimate/batch", json={
+            "file_id": small,
+            "profile": {"infill_density": 40},
+            "options": [{"material": "PLA", "quantity": q} for q in (1, 10)],
+        }, headers=_auth(CUSTOMER_KEY))
+        data = resp.json()
+        assert data["hours_source"] == "geometry" and data["geometry"]["volume_mm3"] == 8000.0
+        hours = data["hours_per_unit"]
+        assert hours < 2.0
+        one, ten = data["quotes"]
+        assert one["makers"][0]["maker_id"] == maker_reg_id
+        assert ten["makers"][0]["estimated_price_cny"] == round(15.0 * hours * 10, 2)
+        assert one["filament_g_per_unit"] > 0
+
+        too_big = client.post("/api/v1/orders/estimate/batch", json={
+            "file_id": huge, "options": [{"material": "PLA"}],
+        }, headers=_auth(CUSTOMER_KEY)).json()
+        assert too_big["quotes"][0]["candidates"] == 0
+        named = client.post("/api/v1/orders/estimate/batch", json={
+            "file_id": huge, "maker_ids": [maker_reg_id], "options": [{"material": "PLA"}],
+        }, headers=_auth(CUSTOMER_KEY)).json()
+        assert named["quotes"][0]["candidates"] == 1
+
+        single = client.post("/api/v1/orders/estimate", json={"file_id": small, "quantity": 1},
+                             headers=_auth(CUSTOMER_KEY)).json()
+        assert single["breakdown"]["hours_source"] == "geometry"
+        assert single["breakdown"]["hours_per_unit"] == pytest.approx(
+            client.post("/api/v1/orders/estimate/batch", json={
+                "file_id": small, "options": [{"material": "PLA"}],
+            }, headers=_auth(CUSTOMER_KEY)).json()["hours_per_unit"]
+        )
@@ -15,8 +15,8 @@
 
 
 def _reset_rate_limiter():
-    from api.rate_limit import _bucket
-    _bucket._hits.clear()
+    from api.rate_limit import limiter
+    limiter.reset()
 
 
 def percentile(data: list[float], p: float) -> float:
@@ -0,0 +1,261 @@
+"""Tests for the shared GCRA rate limiter and its local / Redis-protocol backends."""
+
+from __future__ import annotations
+
+import hashlib
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import rate_limit
+from api.rate_limit import LocalRateLimiter, RateLimitMiddleware, RedisRateLimiter
+from api.resp import RespConnection
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_burst_then_steady_rate():
+    clock = _Clock()
+    rl = LocalRateLimiter(clock=clock)
+    results = [rl.hit("k", 5, 60) for _ in range(6)]
+    assert [r.allowed for r in results] == [True] * 5 + [False]
+    assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+    assert results[5].retry_after == pytest.approx(12.0)
+
+    clock.now += 12.0  # one emission interval refills one token
+    assert rl.hit("k", 5, 60).allowed
+    assert not rl.hit("k", 5, 60).allowed
+
+
+def test_denied_hits_do_not_consume():
+    clock = _Clock()
+    rl = LocalRateLimiter(clock=clock)
+    for _ in range(2):
+        rl.hit("k", 2, 10)
+    for _ in range(10):
+        assert not rl.hit("k", 2, 10).allowed
+    clock.now += 5.0
+    assert rl.hit("k", 2, 10).allowed
+
+
+def test_keys_are_bounded_lru():
+    rl = LocalRateLimiter(max_keys=3, clock=_Clock())
+    for key in ("a", "b", "c"):
+        rl.hit(key, 1, 60)
+    rl.hit("a", 5, 60)  # touch "a" so "b" is least recently used
+    rl.hit("d", 1, 60)
+    assert len(rl) == 3
+    assert "b" not in rl._tat
+    assert not rl.hit("c", 1, 60).allowed
+
+
+def test_eviction_drops_refilled_keys():
+    clock = _Clock()
+    rl = LocalRateLimiter(clock=clock)
+    rl.hit("short", 1, 1)
+    rl.hit("long", 1, 3600)
+    clock.now += 2.0
+    assert rl.evict() == 1
+    assert list(rl._tat) == ["long"]
+
+
+def test_middleware_returns_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_is_testing", lambda: False)
+    monkeypatch.setattr(rate_limit, "limiter", LocalRateLimiter())
+    monkeypatch.setattr(rate_limit, "DEFAULT_LIMIT", 2)
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware)
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    client = TestClient(app)
+    first = client.get("/ping")
+    assert first.status_code == 200
+    assert first.headers["X-RateLimit-Remaining"] == "1"
+    assert client.get("/ping").status_code == 200
+    blocked = client.get("/ping")
+    assert blocked.status_code == 429
+    assert blocked.json()["detail"].startswith("Too many requests")
+    assert int(blocked.headers["Retry-After"]) == 30
+
+
+def test_check_rate_shares_the_process_limiter(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_is_testing", lambda: False)
+    monkeypatch.setattr(rate_limit, "limiter", LocalRateLimiter())
+    from api.routers import auth, community
+
+    assert community._rate_check("post:u1", max_calls=1, window=3600)
+    assert not community._rate_check("post:u1", max_calls=1, window=3600)
+    assert auth._rate_check("post:u1", max_calls=1, window_sec=3600)  # separate namespace
+    assert len(rate_limit.limiter) == 2
+
+
+# ─── Redis-protocol backend against a local stand-in ─────
+
+
+class _FakeRedis(socketserver.ThreadingTCPServer):
+    """Tiny RESP server: SCRIPT LOAD / EVALSHA / EVAL run the GCRA script's logic in Python."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _FakeRedisHandler)
+        self.store: dict[str, tuple[float, float]] = {}  # key -> (tat, expires_at)
+        self.scripts: set[str] = set()
+        self.commands: list[str] = []
+        self.lock = threading.Lock()
+
+    def gcra(self, key: str, limit: int, window: float) -> list:
+        now = time.time()
+        with self.lock:
+            tat, expires = self.store.get(key, (now, 0.0))
+            if expires <= now or tat < now:
+                tat = now
+            interval = window / limit
+            new_tat = tat + interval
+            if new_tat - window - now > 1e-9:
+                return [0, 0, str(new_tat - window - now)]
+            self.store[key] = (new_tat, new_tat)
+            return [1, int((window - (new_tat - now)) / interval + 1e-9), "0"]
+
+
+class _FakeRedisHandler(socketserver.StreamRequestHandler):
+    def _read_command(self) -> list[str] | None:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2].decode())
+        return args
+
+    def _write(self, value) -> None:
+        if isinstance(value, Exception):
+            data = f"-{value}\r\n".encode()
+        elif isinstance(value, int):
+            data = f":{value}\r\n".encode()
+        elif isinstance(value, str):
+            data = f"${len(value.encode())}\r\n{value}\r\n".encode()
+        else:
+            self._write_array(value)
+            return
+        self.wfile.write(data)
+
+    def _write_array(self, items: list) -> None:
+        self.wfile.write(f"*{len(items)}\r\n".encode())
+        for item in items:
+            self._write(item)
+
+    def handle(self) -> None:
+        server: _FakeRedis = self.server
+        while (args := self._read_command()) is not None:
+            name = args[0].upper()
+            server.commands.append(name)
+            if name == "SCRIPT":
+                sha = hashlib.sha1(args[2].encode()).hexdigest()
+                server.scripts.add(sha)
+                self._write(sha)
+            elif name in ("EVALSHA", "EVAL"):
+                if name == "EVALSHA" and args[1] not in server.scripts:
+                    self._write(RuntimeError("NOSCRIPT No matching script"))
+                    continue
+                self._write(server.gcra(args[3], int(args[4]), float(args[5])))
+            elif name == "SCAN":
+                prefix = args[3].rstrip("*")
+                self._write(["0", [k for k in server.store if k.startswith(prefix)]])
+            elif name == "DEL":
+                self._write(sum(server.store.pop(k, None) is not None for k in args[1:]))
+            else:
+                self._write(RuntimeError(f"ERR unknown command '{name}'"))
+
+
+@pytest.fixture
+def fake_redis():
+    server = _FakeRedis()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_redis_backend_limits_across_clients(fake_redis):
+    url = f"redis://127.0.0.1:{fake_redis.server_address[1]}/0"
+    a, b = RedisRateLimiter(url), RedisRateLimiter(url)
+    assert a.hit("ip:1", 2, 60).remaining == 1
+    assert b.hit("ip:1", 2, 60).allowed
+    denied = a.hit("ip:1", 2, 60)
+    assert not denied.allowed
+    assert denied.retry_after == pytest.approx(30.0, abs=1.0)
+    assert "rl:ip:1" in fake_redis.store
+
+    a.reset()
+    assert fake_redis.store == {}
+    assert b.hit("ip:1", 2, 60).allowed
+
+
+def test_redis_backend_reloads_flushed_script(fake_redis):
+    rl = RedisRateLimiter(f"redis://127.0.0.1:{fake_redis.server_address[1]}")
+    assert rl.hit("k", 3, 60).allowed
+    fake_redis.scripts.clear()  # e.g. server restart
+    assert rl.hit("k", 3, 60).remaining == 1
+    assert fake_redis.commands == ["SCRIPT", "EVALSHA", "EVALSHA", "EVAL"]
+
+
+def test_redis_backend_fails_open_when_unreachable():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    now = [0.0]
+    rl = RedisRateLimiter(f"redis://127.0.0.1:{port}", clock=lambda: now[0])
+    result = rl.hit("k", 1, 60)
+    assert result.allowed and result.remaining == 1
+
+    # Within the backoff the server is not contacted at all
+    attempts = []
+    rl._connect = lambda: attempts.append(1) or RespConnection.open(rl.url, rl.timeout)
+    assert rl.hit("k", 1, 60).allowed and attempts == []
+    now[0] = 0.6
+    assert rl.hit("k", 1, 60).allowed and attempts == [1]
+    now[0] = 1.2  # second failure doubled the backoff to 1s
+    assert rl.hit("k", 1, 60).allowed and attempts == [1]
+
+
+def test_middleware_runs_redis_hits_off_the_loop(fake_redis, monkeypatch):
+    on_loop = []
+    hit_threads = []
+    rl = RedisRateLimiter(f"redis://127.0.0.1:{fake_redis.server_address[1]}")
+    real_hit = rl.hit
+    rl.hit = lambda *args: hit_threads.append(threading.get_ident()) or real_hit(*args)
+    monkeypatch.setattr(rate_limit, "_is_testing", lambda: False)
+    monkeypatch.setattr(rate_limit, "limiter", rl)
+    monkeypatch.setattr(rate_limit, "DEFAULT_LIMIT", 1)
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        # The hit for this request already ran; compare while both threads are alive
+        on_loop.append(threading.get_ident() in hit_threads)
+        return {"ok": True}
+
+    # The context keeps one event-loop thread alive for both requests
+    with TestClient(app) as client:
+        assert client.get("/ping").status_code == 200
+        assert client.get("/ping").status_code == 429
+    assert len(hit_threads) == 2 and on_loop == [False]
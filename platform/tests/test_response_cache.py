@@ -0,0 +1,147 @@
+"""Aggregate response cache tests - RealWorldClaw Team"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+
+from api.database import get_db
+from api.events import aggregates_changed
+from api.services.response_cache import ResponseCache, response_cache
+
+API = "/api/v1"
+
+_NODE = {
+    "name": "Cache Printer", "node_type": "3d_printer", "latitude": 39.9042, "longitude": 116.4074,
+    "capabilities": ["printing"], "materials": ["pla"],
+    "build_volume_x": 220.0, "build_volume_y": 220.0, "build_volume_z": 250.0,
+}
+
+
+def _agent(client) -> tuple[str, dict]:
+    r = client.post(f"{API}/agents/register", json={
+        "name": f"cache-{uuid.uuid4().hex[:6]}", "description": "A test agent for cached aggregates.",
+        "type": "openclaw",
+    })
+    assert r.status_code == 201, r.text
+    data = r.json()
+    agent_id = data["agent"]["id"]
+    with get_db() as db:
+        claim_token = db.execute("SELECT claim_token FROM agents WHERE id = ?", (agent_id,)).fetchone()["claim_token"]
+    assert client.post(f"{API}/agents/claim", params={"claim_token": claim_token, "human_email": "t@test.com"}).status_code == 200
+    return agent_id, {"Authorization": f"Bearer {data['api_key']}"}
+
+
+class TestAggregateEndpoints:
+    def test_etag_and_not_modified(self, client):
+        r = client.get(f"{API}/tags")
+        assert r.status_code == 200 and r.json()["categories"]
+        etag = r.headers["etag"]
+        assert r.headers["cache-control"].startswith("public, max-age=")
+        assert "stale-while-revalidate=" in r.headers["cache-control"]
+
+        r2 = client.get(f"{API}/tags", headers={"If-None-Match": f'"other", W/{etag}'})
+        assert r2.status_code == 304 and r2.content == b""
+        assert r2.headers["etag"] == etag
+
+        # Identical content gets the same tag after a recompute (e.g. on another worker)
+        response_cache.clear()
+        assert client.get(f"{API}/tags").headers["etag"] == etag
+        assert client.get(f"{API}/tags", params={"category": "craft"}).headers["etag"] != etag
+
+    def test_node_registration_invalidates_region_map(self, client):
+        _, headers = _agent(client)
+        assert client.get(f"{API}/nodes/map", params={"level": "region"}).json() == []
+
+        assert client.post(f"{API}/nodes/register", json=_NODE, headers=headers).status_code == 200
+        [region] = client.get(f"{API}/nodes/map", params={"level": "region"}).json()
+        assert region["node_count"] == 1
+
+    def test_xp_grant_invalidates_leaderboard(self, client, admin_headers):
+        agent_id, _ = _agent(client)
+        first = client.get(f"{API}/evolution/leaderboard")
+        assert first.json()["items"][0]["evolution_xp"] == 0
+
+        r = client.post(f"{API}/evolution/{agent_id}/grant-xp", headers=admin_headers, json={"xp": 600})
+        assert r.status_code == 200
+        second = client.get(f"{API}/evolution/leaderboard", headers={"If-None-Match": first.headers["etag"]})
+        assert second.status_code == 200
+        assert second.json()["items"][0]["evolution_xp"] == 600
+
+    def test_unannounced_writes_wait_for_invalidation(self, client):
+        before = client.get(f"{API}/community/map/regions").json()
+        with get_db() as db:
+            db.execute(
+                """INSERT INTO community_posts (id, title, content, post_type, author_id, author_type, country_code,
+                                                created_at, updated_at)
+                   VALUES ('p1', 't', 'c', 'discussion', 'u1', 'human', 'CN', '2026-01-01', '2026-01-01')"""
+            )
+        assert client.get(f"{API}/community/map/regions").json() == before
+        aggregates_changed("community_regions")
+        assert client.get(f"{API}/community/map/regions").json() == [{"country_code": "CN", "post_count": 1}]
+
+
+class TestResponseCache:
+    def test_stale_entry_served_while_refreshing(self):
+        cache = ResponseCache(ttl=60, stale=60)
+        cache.get("g", lambda: {"v": 1})
+        slot = ("g", ())
+        cache._entries[slot] = cache._entries[slot]._replace(expires=time.monotonic() - 1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return {"v": 2}
+
+        refresher = threading.Thread(target=cache.get, args=("g", slow))
+        refresher.start()
+        started.wait(5)
+        assert cache.get("g", lambda: {"v": 3}).body == b'{"v":1}'
+        release.set()
+        refresher.join(5)
+        assert cache.get("g", lambda: {"v": 3}).body == b'{"v":2}'
+        assert cache.stats()["stale_hits"] == 1
+
+    def test_store_racing_invalidation_is_dropped(self):
+        cache = ResponseCache(ttl=60, stale=0)
+
+        def compute():
+            cache.invalidate("g")
+            return {"v": 1}
+
+        cache.get("g", compute)
+        assert cache.stats()["size"] == 0
+        cache.get("g", lambda: {"v": 2})
+        assert cache.stats()["size"] == 1
+        assert cache.invalidate("g", "other") == 1
+
+    def test_misses_after_invalidation_share_one_computation(self):
+        cache = ResponseCache(ttl=60, stale=60)
+        cache.get("g", lambda: {"v": 1})
+        cache.invalidate("g")
+        calls, started, release = [], threading.Event(), threading.Event()
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"v": 2}
+
+        first = threading.Thread(target=cache.get, args=("g", slow))
+        first.start()
+        started.wait(5)
+        bodies = []
+        waiters = [threading.Thread(target=lambda: bodies.append(cache.get("g", slow).body)) for _ in range(3)]
+        for waiter in waiters:
+            waiter.start()
+        release.set()
+        for thread in (first, *waiters):
+            thread.join(5)
+        assert len(calls) == 1 and bodies == [b'{"v":2}'] * 3
+
+    def test_unknown_tag_categories_are_not_cached(self, client):
+        assert client.get(f"{API}/tags", params={"category": "no-such-category"}).json()["tags"] == []
+        assert "etag" not in client.get(f"{API}/tags", params={"category": "nope"}).headers
+        assert response_cache.stats()["size"] == 0
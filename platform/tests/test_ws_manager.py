@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import time
 
 from starlette.websockets import WebSocketState
@@ -17,6 +19,9 @@ def __init__(self):
     async def send_json(self, data: dict):
         self.sent.append(data)
 
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
     async def close(self, code: int = 1000, reason: str | None = None):
         self.closed = True
         self.client_state = WebSocketState.DISCONNECTED
@@ -28,8 +33,6 @@ def test_heartbeat_disconnects_stale_connections():
     conn = Connection(websocket=ws, channel="orders", target_id="u1", user_id="u1", last_pong=time.time() - 31)
     manager._connections = {"orders": {"u1": [conn]}}
 
-    import asyncio
-
     asyncio.run(manager._heartbeat_once())
 
     assert ws.closed is True
@@ -42,10 +45,108 @@ def test_heartbeat_sends_ping_to_alive_connection():
     conn = Connection(websocket=ws, channel="orders", target_id="u1", user_id="u1", last_pong=time.time())
     manager._connections = {"orders": {"u1": [conn]}}
 
-    import asyncio
+    async def run():
+        await manager._heartbeat_once()
+        assert await manager.drain(timeout=1)
 
-    asyncio.run(manager._heartbeat_once())
+    asyncio.run(run())
 
     assert any(msg.get("type") == "ping" for msg in ws.sent)
     assert ws.closed is False
     assert manager.connection_count == 1
+
+
+class _SlowWebSocket(_FakeWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.texts: list[str] = []
+
+    async def send_text(self, text: str):
+        self.texts.append(text)
+        await self.release.wait()
+        self.sent.append(json.loads(text))
+
+
+def _attach(manager, ws, channel="printer", target_id="p1"):
+    conn = Connection(websocket=ws, channel=channel, target_id=target_id, user_id="u1")
+    manager._connections.setdefault(channel, {}).setdefault(target_id, []).append(conn)
+    return conn
+
+
+def test_slow_client_does_not_block_others():
+    async def run():
+        manager = ConnectionManager()
+        slow, fast = _SlowWebSocket(), _FakeWebSocket()
+        _attach(manager, slow)
+        _attach(manager, fast)
+        assert await manager.send_to("printer", "p1", {"n": 1}) == 2
+        assert await manager.send_to("printer", "p1", {"n": 2}) == 2
+        await asyncio.sleep(0.01)
+        assert fast.sent == [{"n": 1}, {"n": 2}]
+        assert slow.sent == []
+        slow.release.set()
+        assert await manager.drain(timeout=1)
+        assert slow.sent == [{"n": 1}, {"n": 2}]
+        assert manager.stats()["sent"] == 4
+
+    asyncio.run(run())
+
+
+def test_broadcast_encodes_once_and_coalesces_status():
+    async def run():
+        manager = ConnectionManager()
+        a, b = _SlowWebSocket(), _SlowWebSocket()
+        _attach(manager, a, target_id="p1")
+        _attach(manager, b, target_id="p2")
+        await manager.broadcast("printer", {"status": "printing", "v": 0}, coalesce_key="status")
+        await asyncio.sleep(0.01)  # writers now block on the first message
+        for v in range(1, 5):
+            await manager.broadcast("printer", {"status": "printing", "v": v}, coalesce_key="status")
+        assert manager.stats()["coalesced"] == 6
+        assert manager.stats()["max_queue_depth"] == 1
+
+        a.release.set()
+        b.release.set()
+        assert await manager.drain(timeout=1)
+        assert [m["v"] for m in a.sent] == [0, 4]
+        assert a.texts[0] is b.texts[0]  # one encoded payload shared by every recipient
+
+    asyncio.run(run())
+
+
+def test_full_queue_drops_oldest():
+    async def run():
+        manager = ConnectionManager(queue_max=3)
+        ws = _SlowWebSocket()
+        _attach(manager, ws)
+        await manager.send_to("printer", "p1", {"n": 0})
+        await asyncio.sleep(0.01)
+        for n in range(1, 6):
+            await manager.send_to("printer", "p1", {"n": n})
+        assert manager.stats()["dropped"] == 2
+        ws.release.set()
+        assert await manager.drain(timeout=1)
+        assert [m["n"] for m in ws.sent] == [0, 3, 4, 5]
+
+    asyncio.run(run())
+
+
+def test_failed_send_disconnects_only_that_client():
+    class _BrokenWebSocket(_FakeWebSocket):
+        async def send_text(self, text: str):
+            raise RuntimeError("gone")
+
+    async def run():
+        manager = ConnectionManager()
+        broken, ok = _BrokenWebSocket(), _FakeWebSocket()
+        _attach(manager, broken)
+        _attach(manager, ok)
+        await manager.send_to("printer", "p1", {"n": 1})
+        await manager.drain(timeout=1)
+        await asyncio.sleep(0.01)
+        assert manager.connection_count == 1
+        assert broken.closed is True
+        assert ok.sent == [{"n": 1}]
+
+    asyncio.run(run())